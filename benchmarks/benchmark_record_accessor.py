@@ -0,0 +1,51 @@
+# Write the benchmarking functions here.
+# See "Writing benchmarks" in the asv docs for more information.
+
+import pandas as pd
+
+from py_entitymatching.utils.record_helper import RecordAccessor
+
+NUM_RECORDS = 10000
+NUM_PAIRS = 100000
+
+
+def _get_table(prefix):
+    return pd.DataFrame({'ID': [prefix + str(i) for i in range(NUM_RECORDS)],
+                         'name': ['name ' + str(i) for i in range(NUM_RECORDS)],
+                         'zipcode': [i % 100 for i in range(NUM_RECORDS)]})
+
+
+class TimeLookupPerPair:
+    """
+    Per pair lookup overhead of the left and the right tuples of a candidate
+    set: label based lookup (the approach used before) vs. record accessor.
+    """
+    def setup(self):
+        self.A = _get_table('a')
+        self.B = _get_table('b')
+        rand = pd.np.random.RandomState(0)
+        self.l_ids = self.A['ID'].values[rand.randint(0, NUM_RECORDS, NUM_PAIRS)]
+        self.r_ids = self.B['ID'].values[rand.randint(0, NUM_RECORDS, NUM_PAIRS)]
+
+    def time_label_lookup(self):
+        l_df = self.A.set_index('ID', drop=False)
+        r_df = self.B.set_index('ID', drop=False)
+        l_dict, r_dict = {}, {}
+        for l_id, r_id in zip(self.l_ids, self.r_ids):
+            if l_id not in l_dict:
+                l_dict[l_id] = l_df.loc[l_id]
+            if r_id not in r_dict:
+                r_dict[r_id] = r_df.loc[r_id]
+            l_dict[l_id]['name'] == r_dict[r_id]['name']
+
+    def time_record_accessor(self):
+        l_rows = RecordAccessor(self.A, 'ID').get_records(self.l_ids)
+        r_rows = RecordAccessor(self.B, 'ID').get_records(self.r_ids)
+        for ltuple, rtuple in zip(l_rows, r_rows):
+            ltuple['name'] == rtuple['name']
+
+    def teardown(self):
+        del self.A
+        del self.B
+        del self.l_ids
+        del self.r_ids
@@ -36,10 +36,18 @@ from py_entitymatching.explorer.pandastable.pandastable_wrapper import data_expl
 from py_entitymatching.blocker.attr_equiv_blocker import AttrEquivalenceBlocker
 from py_entitymatching.blocker.black_box_blocker import BlackBoxBlocker
 from py_entitymatching.blocker.overlap_blocker import OverlapBlocker
+from py_entitymatching.blocker.overlap_index import OverlapIndex
 from py_entitymatching.blocker.rule_based_blocker import RuleBasedBlocker
+from py_entitymatching.blocker.sorted_neighborhood_blocker import SortedNeighborhoodBlocker
+from py_entitymatching.blocker.lsh_blocker import LSHBlocker
+from py_entitymatching.blocker.tfidf_blocker import TfidfBlocker
+from py_entitymatching.blocker.pair_set import PairSet
+from py_entitymatching.blocker.blocking_state import AttrEquivalenceBlockingState, \
+    OverlapBlockingState
 
 # # blocker debugger
-from py_entitymatching.debugblocker.debugblocker import debug_blocker
+from py_entitymatching.debugblocker.debugblocker import debug_blocker, \
+    BlockerDebugger
 
 # # blocker combiner
 from py_entitymatching.blockercombiner.blockercombiner import combine_blocker_outputs_via_union
@@ -66,7 +74,8 @@ from py_entitymatching.feature.autofeaturegen import get_features, get_features_
     get_features_for_matching
 from py_entitymatching.feature.addfeatures import get_feature_fn, add_feature, \
     add_blackbox_feature, create_feature_table
-from py_entitymatching.feature.extractfeatures import extract_feature_vecs
+from py_entitymatching.feature.extractfeatures import extract_feature_vecs, \
+    extract_feature_vecs_by_chunks, extract_feature_vecs_to_file
 
 # # matcher related stuff
 from py_entitymatching.matcher.matcherutils import split_train_test, impute_table
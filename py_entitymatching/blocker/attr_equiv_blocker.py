@@ -1,14 +1,17 @@
 import logging
 
+import numpy as np
 import pandas as pd
-import pyprind
 import six
-from joblib import Parallel, delayed
 
 import py_entitymatching.catalog.catalog_manager as cm
 from py_entitymatching.blocker.blocker import Blocker
+from py_entitymatching.blocker.blocking_key import encode_keys, join_codes, \
+    get_missing_pairs, get_join_tasks, get_normalizer
 from py_entitymatching.utils.catalog_helper import log_info, get_name_for_key, add_key_column
-from py_entitymatching.utils.generic_helper import rem_nan
+from py_entitymatching.utils.generic_helper import get_candset_for_pairs
+from py_entitymatching.utils.parallel_helper import get_num_tasks, run_tasks
+from py_entitymatching.utils.record_helper import RecordAccessor
 from py_entitymatching.utils.validation_helper import validate_object_type
 
 logger = logging.getLogger(__name__)
@@ -22,12 +25,17 @@ class AttrEquivalenceBlocker(Blocker):
     def block_tables(self, ltable, rtable, l_block_attr, r_block_attr,
                      l_output_attrs=None, r_output_attrs=None,
                      l_output_prefix='ltable_', r_output_prefix='rtable_',
-                     allow_missing=False, verbose=False, n_jobs=1):
+                     allow_missing=False, verbose=False, n_jobs=1,
+                     normalizer=None):
         """Blocks two tables based on attribute equivalence.
 
         Conceptually, this will check `l_block_attr=r_block_attr` for each tuple
         pair from the Cartesian product of tables `ltable` and `rtable`. It outputs a
         Pandas dataframe object with tuple pairs that satisfy the equality condition.
+        The blocking attributes can be lists of attributes (a composite
+        blocking key), in which case all the attributes must be equal, and
+        their values can be normalized (e.g., converted to lower case) before
+        they are compared.
         The dataframe will include attributes '_id', key attribute from
         ltable, key attributes from rtable, followed by lists `l_output_attrs` and
         `r_output_attrs` if they are specified. Each of these output and key attributes will be
@@ -42,9 +50,13 @@ class AttrEquivalenceBlocker(Blocker):
 
             rtable (DataFrame): The right input table.
 
-            l_block_attr (string): The blocking attribute in left table.
+            l_block_attr (string or list): The blocking attribute in left
+                table, or a list of blocking attributes.
 
-            r_block_attr (string): The blocking attribute in right table.
+            r_block_attr (string or list): The blocking attribute in right
+                table, or a list of blocking attributes (of the same length
+                as `l_block_attr`). The i-th attribute of `l_block_attr` is
+                compared with the i-th attribute of `r_block_attr`.
 
             l_output_attrs (list): A list of attribute names from the left
                                    table to be included in the
@@ -70,6 +82,9 @@ class AttrEquivalenceBlocker(Blocker):
                                      tuple in ltable with missing value in the
                                      blocking attribute will be matched with
                                      every tuple in rtable and vice versa.
+                                     With a list of blocking attributes, a
+                                     tuple has a missing value if any of its
+                                     blocking attributes is missing.
 
             verbose (boolean): A flag to indicate whether the debug information
                 should be logged (defaults to False).
@@ -83,6 +98,19 @@ class AttrEquivalenceBlocker(Blocker):
                 machine). Thus, for n_jobs = -2, all CPUs but one are used.
                 If (n_cpus + 1 + n_jobs) is less than 1, then no parallel
                 computation is used (i.e., equivalent to the default).
+                The join is split into tasks with about the same number of
+                tuple pairs, so that a frequent key value is spread over
+                several processes.
+
+            normalizer (function, string or list): The normalization applied
+                to the values of the blocking attributes before they are
+                compared (defaults to None, i.e. no normalization). It can
+                be a function that takes a value and returns the
+                normalized value, one of the names 'lowercase', 'strip',
+                'soundex' and 'first_k' (where k is a number, e.g.
+                'first_3' keeps the first 3 characters), or a list of them,
+                which are applied in order. If the normalized value is
+                missing (e.g., None), the value is considered missing.
 
         Returns:
             A candidate set of tuple pairs that survived blocking (DataFrame).
@@ -92,8 +120,14 @@ class AttrEquivalenceBlocker(Blocker):
                 DataFrame.
             AssertionError: If `rtable` is not of type pandas
                 DataFrame.
-            AssertionError: If `l_block_attr` is not of type string.
-            AssertionError: If `r_block_attr` is not of type string.
+            AssertionError: If `l_block_attr` is not of type string or
+                list of strings.
+            AssertionError: If `r_block_attr` is not of type string or
+                list of strings.
+            AssertionError: If `l_block_attr` and `r_block_attr` do not
+                have the same number of attributes.
+            AssertionError: If `normalizer` is not a function, a
+                normalizer name or a list of them.
             AssertionError: If `l_output_attrs` is not of type of
                 list.
             AssertionError: If `r_output_attrs` is not of type of
@@ -124,6 +158,10 @@ class AttrEquivalenceBlocker(Blocker):
             >>> C1 = ab.block_tables(A, B, 'zipcode', 'zipcode', l_output_attrs=['name'], r_output_attrs=['name'])
             # Include all possible tuple pairs with missing values
             >>> C2 = ab.block_tables(A, B, 'zipcode', 'zipcode', l_output_attrs=['name'], r_output_attrs=['name'], allow_missing=True)
+            # Block on a composite key, comparing the names case insensitively
+            >>> C3 = ab.block_tables(A, B, ['zipcode', 'name'], ['zipcode', 'name'], normalizer=['strip', 'lowercase'])
+            # Block on the soundex codes of the last names
+            >>> C4 = ab.block_tables(A, B, 'last_name', 'last_name', normalizer='soundex')
 
 
         """
@@ -140,6 +178,9 @@ class AttrEquivalenceBlocker(Blocker):
         # validate data type of allow_missing
         self.validate_allow_missing(allow_missing)
 
+        # validate the normalizer
+        self.validate_normalizer(normalizer)
+
         # validate input parameters
         self.validate_block_attrs(ltable, rtable, l_block_attr, r_block_attr)
         self.validate_output_attrs(ltable, rtable, l_output_attrs,
@@ -160,56 +201,46 @@ class AttrEquivalenceBlocker(Blocker):
 
         # do blocking
 
-        # # do projection of required attributes from the tables
-        l_proj_attrs = self.get_attrs_to_project(l_key, l_block_attr,
-                                                 l_output_attrs)
-        ltable_proj = ltable[l_proj_attrs]
-        r_proj_attrs = self.get_attrs_to_project(r_key, r_block_attr,
-                                                 r_output_attrs)
-        rtable_proj = rtable[r_proj_attrs]
-
-        # # remove records with nans in the blocking attribute
-        l_df = rem_nan(ltable_proj, l_block_attr)
-        r_df = rem_nan(rtable_proj, r_block_attr)
+        # # encode the blocking keys of both the tables with the same integer
+        # # codes (missing keys are coded as -1)
+        l_codes, r_codes = encode_keys(ltable, rtable,
+                                       _get_attr_list(l_block_attr),
+                                       _get_attr_list(r_block_attr),
+                                       normalizer)
 
         # # determine number of processes to launch parallely
-        n_procs = self.get_num_procs(n_jobs, len(l_df) * len(r_df))
+        n_procs = self.get_num_procs(n_jobs, min(len(ltable), len(rtable)))
 
         if n_procs <= 1:
             # single process
-            candset = _block_tables_split(l_df, r_df, l_key, r_key,
-                                          l_block_attr, r_block_attr,
-                                          l_output_attrs, r_output_attrs,
-                                          l_output_prefix, r_output_prefix,
-                                          allow_missing)
+            l_pos, r_pos = join_codes(l_codes, r_codes)
         else:
             # multiprocessing
-            m, n = self.get_split_params(n_procs, len(l_df), len(r_df))
-            l_splits = pd.np.array_split(l_df, m)
-            r_splits = pd.np.array_split(r_df, n)
-            c_splits = Parallel(n_jobs=m * n)(
-                delayed(_block_tables_split)(l, r, l_key, r_key,
-                                             l_block_attr, r_block_attr,
-                                             l_output_attrs, r_output_attrs,
-                                             l_output_prefix, r_output_prefix,
-                                             allow_missing)
-                for l in l_splits for r in r_splits)
-            candset = pd.concat(c_splits, ignore_index=True)
-
-        # if allow_missing flag is True, then compute
+            # # split the join into tasks with about the same number of
+            # # tuple pairs (based on the frequencies of the key codes)
+            tasks, costs = get_join_tasks(
+                l_codes, r_codes, get_num_tasks(n_procs, len(l_codes)))
+            pos_splits = list(run_tasks(
+                join_codes, [(l_codes[l], r_codes[r], l, r)
+                             for l, r in tasks], n_procs, costs, verbose))
+            l_pos = np.concatenate([l for l, _ in pos_splits])
+            r_pos = np.concatenate([r for _, r in pos_splits])
+
+        # if allow_missing flag is True, then add
         # all pairs with missing value in left table, and
         # all pairs with missing value in right table
         if allow_missing:
-            missing_pairs = self.get_pairs_with_missing_value(ltable_proj,
-                                                              rtable_proj,
-                                                              l_key, r_key,
-                                                              l_block_attr,
-                                                              r_block_attr,
-                                                              l_output_attrs,
-                                                              r_output_attrs,
-                                                              l_output_prefix,
-                                                              r_output_prefix)
-            candset = pd.concat([candset, missing_pairs], ignore_index=True)
+            l_missing, r_missing = get_missing_pairs(l_codes, r_codes)
+            l_pos = np.concatenate([l_pos, l_missing])
+            r_pos = np.concatenate([r_pos, r_missing])
+
+        # # sort the tuple pairs, so that the output does not depend on the
+        # # number of processes
+        order = np.lexsort((r_pos, l_pos))
+        candset = get_candset_for_pairs(ltable, rtable, l_key, r_key,
+                                        l_pos[order], r_pos[order],
+                                        l_output_attrs, r_output_attrs,
+                                        l_output_prefix, r_output_prefix)
 
         # update catalog
         key = get_name_for_key(candset.columns)
@@ -222,7 +253,7 @@ class AttrEquivalenceBlocker(Blocker):
 
     def block_candset(self, candset, l_block_attr, r_block_attr,
                       allow_missing=False, verbose=False, show_progress=True,
-                      n_jobs=1):
+                      n_jobs=1, normalizer=None):
         """Blocks an input candidate set of tuple pairs based on attribute equivalence.
 
         Finds tuple pairs from an input candidate set of tuple pairs
@@ -233,9 +264,12 @@ class AttrEquivalenceBlocker(Blocker):
         Args:
             candset (DataFrame): The input candidate set of tuple pairs.
 
-            l_block_attr (string): The blocking attribute in left table.
+            l_block_attr (string or list): The blocking attribute in left
+                table, or a list of blocking attributes.
 
-            r_block_attr (string): The blocking attribute in right table.
+            r_block_attr (string or list): The blocking attribute in right
+                table, or a list of blocking attributes (of the same length
+                as `l_block_attr`).
 
             allow_missing (boolean): A flag to indicate whether tuple pairs
                                      with missing value in at least one of the
@@ -260,6 +294,15 @@ class AttrEquivalenceBlocker(Blocker):
                 machine). Thus, for n_jobs = -2, all CPUs but one are used.
                 If (n_cpus + 1 + n_jobs) is less than 1, then no parallel
                 computation is used (i.e., equivalent to the default).
+                Note that the values of the blocking attributes are compared
+                for all the tuple pairs at once, using arrays, so this
+                parameter is only validated and the blocking always runs in
+                a single process.
+
+            normalizer (function, string or list): The normalization applied
+                to the values of the blocking attributes before they are
+                compared (defaults to None). See `block_tables` for the
+                supported normalizers.
 
         Returns:
             A candidate set of tuple pairs that survived blocking (DataFrame).
@@ -267,8 +310,14 @@ class AttrEquivalenceBlocker(Blocker):
         Raises:
             AssertionError: If `candset` is not of type pandas
                 DataFrame.
-            AssertionError: If `l_block_attr` is not of type string.
-            AssertionError: If `r_block_attr` is not of type string.
+            AssertionError: If `l_block_attr` is not of type string or
+                list of strings.
+            AssertionError: If `r_block_attr` is not of type string or
+                list of strings.
+            AssertionError: If `l_block_attr` and `r_block_attr` do not
+                have the same number of attributes.
+            AssertionError: If `normalizer` is not a function, a
+                normalizer name or a list of them.
             AssertionError: If `verbose` is not of type
                 boolean.
             AssertionError: If `n_jobs` is not of type
@@ -298,6 +347,9 @@ class AttrEquivalenceBlocker(Blocker):
         # validate data types of input blocking attributes
         self.validate_types_block_attrs(l_block_attr, r_block_attr)
 
+        # validate the normalizer
+        self.validate_normalizer(normalizer)
+
         # get and validate metadata
         log_info(logger, 'Required metadata: cand.set key, fk ltable, '
                          'fk rtable, ltable, rtable, ltable key, rtable key',
@@ -317,35 +369,11 @@ class AttrEquivalenceBlocker(Blocker):
 
         # do blocking
 
-        # # do projection before merge
-        l_df = ltable[[l_key, l_block_attr]]
-        r_df = rtable[[r_key, r_block_attr]]
-
-        # # set index for convenience
-        l_df = l_df.set_index(l_key, drop=False)
-        r_df = r_df.set_index(r_key, drop=False)
-
-        # # determine number of processes to launch parallely
-        n_procs = self.get_num_procs(n_jobs, len(candset))
-
-        valid = []
-        if n_procs <= 1:
-            # single process
-            valid = _block_candset_split(candset, l_df, r_df, l_key, r_key,
-                                         l_block_attr, r_block_attr, fk_ltable,
-                                         fk_rtable, allow_missing, show_progress)
-        else:
-            c_splits = pd.np.array_split(candset, n_procs)
-            valid_splits = Parallel(n_jobs=n_procs)(
-                delayed(_block_candset_split)(c_splits[i],
-                                              l_df, r_df,
-                                              l_key, r_key,
-                                              l_block_attr, r_block_attr,
-                                              fk_ltable, fk_rtable, allow_missing,
-                                              show_progress and i == len(
-                                                  c_splits) - 1)
-                for i in range(len(c_splits)))
-            valid = sum(valid_splits, [])
+        # # compare the values of the blocking attributes for all the tuple
+        # # pairs at once
+        valid = _get_valid_pairs(candset, ltable, rtable, l_key, r_key,
+                                 l_block_attr, r_block_attr, fk_ltable,
+                                 fk_rtable, allow_missing, normalizer)
 
         # construct output table
         if len(candset) > 0:
@@ -361,7 +389,7 @@ class AttrEquivalenceBlocker(Blocker):
         return out_table
 
     def block_tuples(self, ltuple, rtuple, l_block_attr, r_block_attr,
-                     allow_missing=False):
+                     allow_missing=False, normalizer=None):
         """Blocks a tuple pair based on attribute equivalence.
 
         Args:
@@ -369,9 +397,11 @@ class AttrEquivalenceBlocker(Blocker):
 
             rtuple (Series): The input right tuple.
             
-            l_block_attr (string): The blocking attribute in left tuple.
+            l_block_attr (string or list): The blocking attribute in left
+                tuple, or a list of blocking attributes.
 
-            r_block_attr (string): The blocking attribute in right tuple.
+            r_block_attr (string or list): The blocking attribute in right
+                tuple, or a list of blocking attributes.
 
             allow_missing (boolean): A flag to indicate whether a tuple pair
                                      with missing value in at least one of the
@@ -382,6 +412,11 @@ class AttrEquivalenceBlocker(Blocker):
                                      or rtuple has missing value in r_block_attr
                                      or both.
 
+            normalizer (function, string or list): The normalization applied
+                to the values of the blocking attributes before they are
+                compared (defaults to None). See `block_tables` for the
+                supported normalizers.
+
         Returns:
             A status indicating if the tuple pair is blocked, i.e., the values
             of l_block_attr in ltuple and r_block_attr in rtuple are different
@@ -394,14 +429,25 @@ class AttrEquivalenceBlocker(Blocker):
             >>> ab = em.AttrEquivalenceBlocker()
             >>> status = ab.block_tuples(A.ix[0], B.ix[0], 'zipcode', 'zipcode')
         """
-        l_val, r_val = ltuple[l_block_attr], rtuple[r_block_attr]
+        fn = get_normalizer(normalizer)
+        is_missing, is_equal = False, True
+        for l_attr, r_attr in zip(_get_attr_list(l_block_attr),
+                                  _get_attr_list(r_block_attr)):
+            l_val, r_val = ltuple[l_attr], rtuple[r_attr]
+            if fn is not None:
+                l_val = l_val if pd.isnull(l_val) else fn(l_val)
+                r_val = r_val if pd.isnull(r_val) else fn(r_val)
+            if pd.isnull(l_val) or pd.isnull(r_val):
+                is_missing = True
+            elif l_val != r_val:
+                is_equal = False
         if allow_missing:
-            if pd.isnull(l_val) or pd.isnull(r_val) or l_val == r_val:
+            if is_missing or is_equal:
                 return False
             else:
                 return True
         else:
-            if pd.notnull(l_val) and pd.notnull(r_val) and l_val == r_val:
+            if not is_missing and is_equal:
                 return False
             else:
                 return True
@@ -410,161 +456,64 @@ class AttrEquivalenceBlocker(Blocker):
     # ------------------------------------------------------------
     # utility functions specific to attribute equivalence blocking
 
-    # validate the data types of the blocking attributes 
+    # validate the data types of the blocking attributes
     def validate_types_block_attrs(self, l_block_attr, r_block_attr):
-        validate_object_type(l_block_attr, six.string_types, error_prefix='Blocking attribute name of left table')
-        validate_object_type(r_block_attr, six.string_types, error_prefix='Blocking attribute name of right table')
+        for block_attr, prefix in [(l_block_attr, 'Blocking attribute name of left table'),
+                                   (r_block_attr, 'Blocking attribute name of right table')]:
+            if isinstance(block_attr, list) and len(block_attr) > 0:
+                for attr in block_attr:
+                    validate_object_type(attr, six.string_types, error_prefix=prefix)
+            else:
+                validate_object_type(block_attr, six.string_types, error_prefix=prefix)
+        if len(_get_attr_list(l_block_attr)) != len(_get_attr_list(r_block_attr)):
+            logger.error('Left and right blocking attributes do not have the '
+                         'same number of attributes')
+            raise AssertionError('Left and right blocking attributes do not '
+                                 'have the same number of attributes')
 
     # validate the blocking attributes
     def validate_block_attrs(self, ltable, rtable, l_block_attr, r_block_attr):
-        if l_block_attr not in ltable.columns:
-            raise AssertionError(
-                'Left block attribute is not in the left table')
-
-        if r_block_attr not in rtable.columns:
-            raise AssertionError(
-                'Right block attribute is not in the right table')
-
-    def get_pairs_with_missing_value(self, l_df, r_df, l_key, r_key,
-                                     l_block_attr, r_block_attr,
-                                     l_output_attrs, r_output_attrs,
-                                     l_output_prefix, r_output_prefix):
-
-        l_df.is_copy, r_df.is_copy = False, False  # to avoid setwithcopy warning
-        l_df['ones'] = pd.np.ones(len(l_df))
-        r_df['ones'] = pd.np.ones(len(r_df))
-
-        # find ltable records with missing value in l_block_attr
-        l_df_missing = l_df[pd.isnull(l_df[l_block_attr])]
-
-        # find ltable records with no missing value in l_block_attr
-        l_df_no_missing = l_df[pd.notnull(l_df[l_block_attr])]
-
-        # find rtable records with missing value in r_block_attr
-        r_df_missing = r_df[pd.isnull(r_df[r_block_attr])]
-
-        missing_pairs_1 = pd.merge(l_df_missing, r_df, left_on='ones',
-                                   right_on='ones',
-                                   suffixes=('_ltable', '_rtable'))
-
-        missing_pairs_2 = pd.merge(l_df_no_missing, r_df_missing,
-                                   left_on='ones',
-                                   right_on='ones',
-                                   suffixes=('_ltable', '_rtable'))
-
-        missing_pairs = pd.concat([missing_pairs_1, missing_pairs_2],
-                                  ignore_index=True)
-
-        retain_cols, final_cols = _output_columns(l_key, r_key,
-                                                  list(missing_pairs.columns),
-                                                  l_output_attrs,
-                                                  r_output_attrs,
-                                                  l_output_prefix,
-                                                  r_output_prefix)
-        missing_pairs = missing_pairs[retain_cols]
-        missing_pairs.columns = final_cols
-        return missing_pairs
-
-
-def _block_tables_split(l_df, r_df, l_key, r_key, l_block_attr, r_block_attr,
-                        l_output_attrs, r_output_attrs, l_output_prefix,
-                        r_output_prefix, allow_missing):
-    # perform an inner join of the two data frames with no missing values
-    candset = pd.merge(l_df, r_df, left_on=l_block_attr,
-                       right_on=r_block_attr, suffixes=('_ltable', '_rtable'))
-
-    retain_cols, final_cols = _output_columns(l_key, r_key,
-                                              list(candset.columns),
-                                              l_output_attrs, r_output_attrs,
-                                              l_output_prefix, r_output_prefix)
-    candset = candset[retain_cols]
-    candset.columns = final_cols
-    return candset
-
-
-def _block_candset_split(c_df, l_df, r_df, l_key, r_key,
-                         l_block_attr, r_block_attr, fk_ltable, fk_rtable,
-                         allow_missing, show_progress):
-    # initialize progress bar
-    if show_progress:
-        prog_bar = pyprind.ProgBar(len(c_df))
-
-    # initialize list to keep track of valid ids
-    valid = []
-
-    # get the indexes for the key attributes in the candset
-    col_names = list(c_df.columns)
-    lkey_idx = col_names.index(fk_ltable)
-    rkey_idx = col_names.index(fk_rtable)
-
-    # create a look up table for the blocking attribute values
-    l_dict = {}
-    r_dict = {}
-
-    # iterate the rows in candset
-    for row in c_df.itertuples(index=False):
-
-        # # update the progress bar
-        if show_progress:
-            prog_bar.update()
-
-        # # get the value of block attributes
-        row_lkey = row[lkey_idx]
-        if row_lkey not in l_dict:
-            l_dict[row_lkey] = l_df.ix[row_lkey, l_block_attr]
-        l_val = l_dict[row_lkey]
-
-        row_rkey = row[rkey_idx]
-        if row_rkey not in r_dict:
-            r_dict[row_rkey] = r_df.ix[row_rkey, r_block_attr]
-        r_val = r_dict[row_rkey]
-
-        if allow_missing:
-            if pd.isnull(l_val) or pd.isnull(r_val) or l_val == r_val:
-                valid.append(True)
-            else:
-                valid.append(False)
-        else:
-            if pd.notnull(l_val) and pd.notnull(r_val) and l_val == r_val:
-                valid.append(True)
-            else:
-                valid.append(False)
-
+        for attr in _get_attr_list(l_block_attr):
+            if attr not in ltable.columns:
+                raise AssertionError(
+                    'Left block attribute is not in the left table')
+
+        for attr in _get_attr_list(r_block_attr):
+            if attr not in rtable.columns:
+                raise AssertionError(
+                    'Right block attribute is not in the right table')
+
+    # validate the normalizer of the blocking attributes
+    def validate_normalizer(self, normalizer):
+        get_normalizer(normalizer)
+
+
+def _get_valid_pairs(candset, ltable, rtable, l_key, r_key, l_block_attr,
+                     r_block_attr, fk_ltable, fk_rtable, allow_missing,
+                     normalizer=None):
+    # encode the blocking keys of both the tables with the same integer
+    # codes (missing keys are coded as -1)
+    l_codes, r_codes = encode_keys(ltable, rtable,
+                                   _get_attr_list(l_block_attr),
+                                   _get_attr_list(r_block_attr), normalizer)
+
+    # get the codes of the keys for the tuple pairs, using the positions of
+    # the tuples referred by the candset
+    l_pos = RecordAccessor(ltable[[l_key]], l_key).get_positions(
+        candset[fk_ltable].values)
+    r_pos = RecordAccessor(rtable[[r_key]], r_key).get_positions(
+        candset[fk_rtable].values)
+    l_codes, r_codes = l_codes[l_pos], r_codes[r_pos]
+
+    # compare the codes
+    is_missing = (l_codes < 0) | (r_codes < 0)
+    valid = (l_codes == r_codes) & ~is_missing
+    if allow_missing:
+        valid |= is_missing
     return valid
 
 
-def _output_columns(l_key, r_key, col_names, l_output_attrs, r_output_attrs,
-                    l_output_prefix, r_output_prefix):
-    # retain id columns from merge
-    ret_cols = [_retain_names(l_key, col_names, '_ltable')]
-    ret_cols.append(_retain_names(r_key, col_names, '_rtable'))
-
-    # final columns in the output                                           
-    fin_cols = [_final_names(l_key, l_output_prefix)]
-    fin_cols.append(_final_names(r_key, r_output_prefix))
-
-    # retain output attrs from merge                                        
-    if l_output_attrs:
-        for at in l_output_attrs:
-            if at != l_key:
-                ret_cols.append(_retain_names(at, col_names, '_ltable'))
-                fin_cols.append(_final_names(at, l_output_prefix))
-
-    if r_output_attrs:
-        for at in r_output_attrs:
-            if at != r_key:
-                ret_cols.append(_retain_names(at, col_names, '_rtable'))
-                fin_cols.append(_final_names(at, r_output_prefix))
-
-    return ret_cols, fin_cols
-
-
-def _retain_names(x, col_names, suffix):
-    if x in col_names:
-        return x
-    else:
-        return str(x) + suffix
-
-
-def _final_names(col, prefix):
-    return prefix + str(col)
+def _get_attr_list(block_attr):
+    if isinstance(block_attr, list):
+        return block_attr
+    return [block_attr]
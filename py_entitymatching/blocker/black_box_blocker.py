@@ -1,20 +1,29 @@
-from collections import OrderedDict
 import logging
 import time
 import sys
 
+import numpy as np
 import pandas as pd
 import pyprind
-from joblib import Parallel, delayed
 import cloudpickle as cp
 import pickle
+import six
 
 from py_entitymatching.blocker.blocker import Blocker
+from py_entitymatching.blocker.rule_compiler import cartesian_blocks
 import py_entitymatching.catalog.catalog_manager as cm
 from py_entitymatching.utils.catalog_helper import log_info, get_name_for_key, add_key_column
+from py_entitymatching.utils.generic_helper import get_candset_for_pairs
+from py_entitymatching.utils.parallel_helper import SharedTable, get_table, \
+    get_num_tasks, run_tasks, split_cartesian_product, split_ranges
+from py_entitymatching.utils.record_helper import RecordAccessor
 
 logger = logging.getLogger(__name__)
 
+# Default number of tuple pairs passed together to a batch black box
+# function.
+pair_batch_size = 100000
+
 class BlackBoxBlocker(Blocker):
     """
     Blocks based on a black box function specified by the user.
@@ -23,14 +32,86 @@ class BlackBoxBlocker(Blocker):
     def __init__(self, *args, **kwargs):
         super(Blocker, self).__init__(*args, **kwargs)
         self.black_box_function = None
+        self.batch_black_box_function = None
+        self.batch_size = pair_batch_size
+        self.batch_l_attrs = None
+        self.batch_r_attrs = None
 
     def set_black_box_function(self, function):
         """Sets black box function to be used for blocking.
 
+        The function is called on each tuple pair, and it replaces the batch
+        black box function (if it was set).
+
         Args:
             function (function): the black box function to be used for blocking .
         """
         self.black_box_function = function
+        self.batch_black_box_function = None
+
+    def set_batch_black_box_function(self, function, batch_size=None,
+                                     l_attrs=None, r_attrs=None):
+        """Sets a batch black box function to be used for blocking.
+
+        A batch black box function is called on a batch of tuple pairs at
+        once, instead of on each tuple pair. It takes two DataFrames with
+        one row per tuple pair of the batch (the i-th row of the first
+        DataFrame is the left tuple of the i-th pair, and the i-th row of the
+        second DataFrame is its right tuple), and returns an array-like of
+        booleans with one value per tuple pair: True if the tuple pair should
+        be dropped, False if it should be kept. So the function can be
+        written with vectorized pandas or NumPy operations over the columns.
+
+        The batch black box function replaces the black box function (if it
+        was set).
+
+        Args:
+            function (function): The batch black box function.
+            batch_size (int): The maximum number of tuple pairs in a batch
+                (defaults to None, i.e. 100000).
+            l_attrs (list): The attributes of the left tuples passed to the
+                function (defaults to None, i.e. all the attributes).
+            r_attrs (list): The attributes of the right tuples passed to the
+                function (defaults to None, i.e. all the attributes).
+
+        Raises:
+            AssertionError: If `function` is not callable.
+            AssertionError: If `batch_size` is not a positive integer.
+            AssertionError: If `l_attrs` or `r_attrs` is not a list.
+
+        Examples:
+            >>> def match_last_name(ltuples, rtuples):
+                # ltuples and rtuples are DataFrames with the left and the
+                # right tuples of a batch of tuple pairs
+                l_last_name = ltuples['name'].str.split().str[-1]
+                r_last_name = rtuples['name'].str.split().str[-1]
+                return (l_last_name != r_last_name).values
+            >>> import py_entitymatching as em
+            >>> bb = em.BlackBoxBlocker()
+            >>> bb.set_batch_black_box_function(match_last_name, l_attrs=['name'], r_attrs=['name'])
+            >>> C = bb.block_tables(A, B, l_output_attrs=['name'], r_output_attrs=['name'])
+        """
+        if not callable(function):
+            logger.error('Batch black box function is not callable')
+            raise AssertionError('Batch black box function is not callable')
+        if batch_size is None:
+            batch_size = pair_batch_size
+        if not isinstance(batch_size, int) or isinstance(batch_size, bool) \
+                or batch_size <= 0:
+            logger.error('Parameter batch_size is not a positive integer')
+            raise AssertionError('Parameter batch_size is not a positive '
+                                 'integer')
+        for attrs in [l_attrs, r_attrs]:
+            if attrs is not None and not isinstance(attrs, list):
+                logger.error('Attributes passed to the batch black box '
+                             'function are not of type list')
+                raise AssertionError('Attributes passed to the batch black '
+                                     'box function are not of type list')
+        self.batch_black_box_function = function
+        self.batch_size = batch_size
+        self.batch_l_attrs = l_attrs
+        self.batch_r_attrs = r_attrs
+        self.black_box_function = None
 
     def block_tables(self, ltable, rtable,
                      l_output_attrs=None, r_output_attrs=None,
@@ -46,6 +127,11 @@ class BlackBoxBlocker(Blocker):
         the function returns False for that pair, otherwise the tuple pair is
         dropped.
 
+        If a batch black box function is set (see
+        set_batch_black_box_function), the cartesian product of the tables is
+        split into batches of tuple pairs, and the function is called once
+        per batch instead of once per tuple pair.
+
         Args:
             ltable (DataFrame): The left input table.
 
@@ -112,6 +198,9 @@ class BlackBoxBlocker(Blocker):
                 int.
             AssertionError: If `l_out_attrs` are not in the ltable.
             AssertionError: If `r_out_attrs` are not in the rtable.
+            AssertionError: If no black box function is set.
+            AssertionError: If the batch black box function does not return
+                one value per tuple pair.
 
         Examples:
 
@@ -141,11 +230,14 @@ class BlackBoxBlocker(Blocker):
         self.validate_show_progress(show_progress)
 
         # validate black box function
-        assert self.black_box_function != None, 'Black box function is not set'
+        self.validate_black_box_function()
 
         # validate output attributes
         self.validate_output_attrs(ltable, rtable, l_output_attrs,r_output_attrs)
 
+        # validate the attributes passed to the batch black box function
+        self.validate_batch_attrs(ltable, rtable)
+
         # get and validate metadata
         log_info(logger, 'Required metadata: ltable key, rtable key', verbose)
 
@@ -173,29 +265,19 @@ class BlackBoxBlocker(Blocker):
         # # determine the number of processes to launch parallely
         n_procs = self.get_num_procs(n_jobs, len(l_df) * len(r_df))
 
-        # # pickle the black-box function before passing it as an arg to
-        # # _block_tables_split to be executed by each child process
-        black_box_function_pkl = cp.dumps(self.black_box_function)
-
-        if n_procs <= 1:
-            # single process
-            candset = _block_tables_split(l_df, r_df, l_key, r_key,
-                                          l_output_attrs_1, r_output_attrs_1,
-                                          l_output_prefix, r_output_prefix,
-                                          black_box_function_pkl, show_progress)
+        # # find the positions of the tuple pairs that survive blocking
+        if self.batch_black_box_function is not None:
+            # # apply the batch black box function to blocks of tuple pairs
+            l_pos, r_pos = self._block_tables_batch(l_df, r_df, n_procs,
+                                                    show_progress, verbose)
         else:
-            # multiprocessing
-            m, n = self.get_split_params(n_procs, len(l_df), len(r_df))
-            l_splits = pd.np.array_split(l_df, m)
-            r_splits = pd.np.array_split(r_df, n)
-            c_splits = Parallel(n_jobs=m*n)(delayed(_block_tables_split)(l_splits[i], r_splits[j],
-                                                l_key, r_key, 
-                                                l_output_attrs_1, r_output_attrs_1,
-                                                l_output_prefix, r_output_prefix,
-                                                black_box_function_pkl,
-                                                show_progress and i == len(l_splits) - 1 and j == len(r_splits) - 1)
-                                                for i in range(len(l_splits)) for j in range(len(r_splits)))
-            candset = pd.concat(c_splits, ignore_index=True)
+            l_pos, r_pos = self._block_tables_tuples(l_df, r_df, n_procs,
+                                                     show_progress, verbose)
+
+        # # gather the output attributes of the surviving tuple pairs at once
+        candset = get_candset_for_pairs(l_df, r_df, l_key, r_key, l_pos, r_pos,
+                                        l_output_attrs_1, r_output_attrs_1,
+                                        l_output_prefix, r_output_prefix)
 
         # # determine the attributes to retain in the output candidate set
         retain_cols = self.get_attrs_to_retain(l_key, r_key,
@@ -226,6 +308,10 @@ class BlackBoxBlocker(Blocker):
         blocking function if the function returns False for that pair,
         otherwise the tuple pair is dropped.
 
+        If a batch black box function is set (see
+        set_batch_black_box_function), the function is called once per batch
+        of tuple pairs of the candidate set.
+
         Args:
             candset (DataFrame): The input candidate set of tuple pairs.
 
@@ -257,6 +343,7 @@ class BlackBoxBlocker(Blocker):
             AssertionError: If `show_progress` is not of type boolean.
             AssertionError: If `l_block_attr` is not in the ltable columns.
             AssertionError: If `r_block_attr` is not in the rtable columns.
+            AssertionError: If no black box function is set.
 
         Examples:
             >>> def match_last_name(ltuple, rtuple):
@@ -280,7 +367,7 @@ class BlackBoxBlocker(Blocker):
         self.validate_types_params_candset(candset, verbose, show_progress, n_jobs)
 
         # validate black box functionn
-        assert self.black_box_function != None, 'Black box function is not set'
+        self.validate_black_box_function()
 
         # get and validate metadata
         log_info(logger, 'Required metadata: cand.set key, fk ltable, fk rtable, '
@@ -305,28 +392,21 @@ class BlackBoxBlocker(Blocker):
         # # determine the number of processes to launch parallely
         n_procs = self.get_num_procs(n_jobs, len(c_df))
 
-        # # pickle the black-box function before passing it as an arg to
-        # # _block_candset_split to be executed by each child process
-        black_box_function_pkl = cp.dumps(self.black_box_function)
-
-        valid = []
-        if n_procs <= 1:
-            # single process
-            valid = _block_candset_split(c_df, l_df, r_df, l_key, r_key,
-                                         fk_ltable, fk_rtable,
-                                         black_box_function_pkl, show_progress)
+        if self.batch_black_box_function is not None:
+            # # apply the batch black box function to blocks of tuple pairs
+            self.validate_batch_attrs(ltable, rtable)
+            l_pos = RecordAccessor(ltable, l_key).get_positions(
+                c_df[fk_ltable].values)
+            r_pos = RecordAccessor(rtable, r_key).get_positions(
+                c_df[fk_rtable].values)
+            valid = ~self._get_batch_drop_mask(l_df, r_df, l_pos, r_pos,
+                                               n_procs, show_progress,
+                                               verbose)
         else:
-            # multiprocessing
-            c_splits = pd.np.array_split(c_df, n_procs)
-            valid_splits = Parallel(n_jobs=n_procs)(delayed(_block_candset_split)(c_splits[i],
-                                                            l_df, r_df,
-                                                            l_key, r_key,
-                                                            fk_ltable, fk_rtable,
-                                                            black_box_function_pkl,
-                                                            show_progress and i == len(c_splits) - 1)
-                                                            for i in range(len(c_splits)))
-            valid = sum(valid_splits, [])
- 
+            valid = self._block_candset_tuples(c_df, l_df, r_df, l_key, r_key,
+                                               fk_ltable, fk_rtable,
+                                               n_procs, show_progress, verbose)
+
         # construct output table
         if len(c_df) > 0:
             c_df = candset[valid]
@@ -375,127 +455,305 @@ class BlackBoxBlocker(Blocker):
         """
 
         # validate black box function
-        assert self.black_box_function is not None, 'Black box function is not set'
+        self.validate_black_box_function()
+
+        if self.batch_black_box_function is not None:
+            # # apply the batch black box function to a batch with this
+            # # tuple pair only
+            l_df = pd.DataFrame([ltuple]).reset_index(drop=True)
+            r_df = pd.DataFrame([rtuple]).reset_index(drop=True)
+            drop = _apply_batch_black_box_function(
+                self.batch_black_box_function,
+                _project(l_df, self.batch_l_attrs),
+                _project(r_df, self.batch_r_attrs),
+                np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64))
+            return bool(drop[0])
         return self.black_box_function(ltuple, rtuple)
 
+    def validate_black_box_function(self):
+        if self.black_box_function is None and \
+                self.batch_black_box_function is None:
+            logger.error('Black box function is not set')
+            raise AssertionError('Black box function is not set')
+
+    def validate_batch_attrs(self, ltable, rtable):
+        if self.batch_black_box_function is None:
+            return
+        for attrs, table, name in [(self.batch_l_attrs, ltable, 'ltable'),
+                                   (self.batch_r_attrs, rtable, 'rtable')]:
+            if attrs is not None and not set(attrs).issubset(table.columns):
+                logger.error('Attributes passed to the batch black box '
+                             'function are not in the %s' % name)
+                raise AssertionError('Attributes passed to the batch black '
+                                     'box function are not in the %s' % name)
+
+    def _block_tables_batch(self, l_df, r_df, n_procs, show_progress,
+                            verbose=False):
+        # project the tables on the attributes passed to the batch black box
+        # function, and pickle the function before passing it to the workers
+        l_df = _project(l_df, self.batch_l_attrs)
+        r_df = _project(r_df, self.batch_r_attrs)
+        function_pkl = cp.dumps(self.batch_black_box_function)
+        return self._block_cartesian_product(_block_tables_batch_split,
+                                             l_df, r_df, n_procs,
+                                             show_progress,
+                                             (function_pkl, self.batch_size),
+                                             verbose)
+
+    def _block_tables_tuples(self, l_df, r_df, n_procs, show_progress,
+                             verbose=False):
+        # pickle the black-box function before passing it as an arg to
+        # _block_tables_split to be executed by each child process
+        black_box_function_pkl = cp.dumps(self.black_box_function)
+        return self._block_cartesian_product(_block_tables_split,
+                                             l_df, r_df, n_procs,
+                                             show_progress,
+                                             (black_box_function_pkl,),
+                                             verbose)
+
+    def _block_cartesian_product(self, split_fn, l_df, r_df, n_procs,
+                                 show_progress, args, verbose=False):
+        # applies split_fn to the cartesian product of the tables (split into
+        # tiles with the same number of tuple pairs, if several processes
+        # are used), and returns the positions of the left and the right
+        # tuples of the tuple pairs that survive
+        if n_procs <= 1:
+            # single process
+            return split_fn(l_df, r_df, 0, 0, *(args + (show_progress,)))
+
+        # multiprocessing
+        tiles = split_cartesian_product(
+            len(l_df), len(r_df), get_num_tasks(n_procs,
+                                                len(l_df) * len(r_df)))
+        costs = [(l_stop - l_start) * (r_stop - r_start)
+                 for (l_start, l_stop), (r_start, r_stop) in tiles]
+        # # share the tables with the workers through memory-mapped files,
+        # # each worker reads only the tiles of the tables it processes
+        with SharedTable(l_df) as l_shared, SharedTable(r_df) as r_shared:
+            tasks = [(l_shared.slice(l_start, l_stop),
+                      r_shared.slice(r_start, r_stop), l_start, r_start) +
+                     args + (show_progress and i == len(tiles) - 1,)
+                     for i, ((l_start, l_stop), (r_start, r_stop))
+                     in enumerate(tiles)]
+            pos_splits = list(run_tasks(split_fn, tasks, n_procs, costs,
+                                        verbose))
+        l_pos = np.concatenate([l for l, _ in pos_splits])
+        r_pos = np.concatenate([r for _, r in pos_splits])
+        # sort the tuple pairs the same way as in a single process
+        order = np.lexsort((r_pos, l_pos))
+        return l_pos[order], r_pos[order]
+
+    def _get_batch_drop_mask(self, l_df, r_df, l_pos, r_pos, n_procs,
+                             show_progress, verbose=False):
+        l_df = _project(l_df, self.batch_l_attrs)
+        r_df = _project(r_df, self.batch_r_attrs)
+        function_pkl = cp.dumps(self.batch_black_box_function)
 
-def _block_tables_split(l_df, r_df, l_key, r_key,
-                        l_output_attrs, r_output_attrs,
-                        l_output_prefix, r_output_prefix,
+        if n_procs <= 1:
+            # single process
+            return _block_pairs_batch_split(l_df, r_df, l_pos, r_pos,
+                                            function_pkl, self.batch_size,
+                                            show_progress)
+
+        # multiprocessing
+        ranges = split_ranges(len(l_pos), get_num_tasks(n_procs, len(l_pos)))
+        # # share the tables with the workers through memory-mapped files,
+        # # each worker reads only the tuples of the tuple pairs it processes
+        with SharedTable(l_df) as l_shared, SharedTable(r_df) as r_shared:
+            tasks = [(l_shared, r_shared, l_pos[start:stop],
+                      r_pos[start:stop], function_pkl, self.batch_size,
+                      show_progress and i == len(ranges) - 1)
+                     for i, (start, stop) in enumerate(ranges)]
+            drop_splits = list(run_tasks(_block_pairs_batch_split, tasks,
+                                         n_procs, verbose=verbose))
+        return np.concatenate(drop_splits)
+
+    def _block_candset_tuples(self, c_df, l_df, r_df, l_key, r_key,
+                              fk_ltable, fk_rtable, n_procs, show_progress,
+                              verbose=False):
+        # pickle the black-box function before passing it as an arg to
+        # _block_candset_split to be executed by each child process
+        black_box_function_pkl = cp.dumps(self.black_box_function)
+
+        if n_procs <= 1:
+            # single process
+            return _block_candset_split(c_df, l_df, r_df, l_key, r_key,
+                                        fk_ltable, fk_rtable,
+                                        black_box_function_pkl, show_progress)
+
+        # multiprocessing
+        c_splits = [c_df.iloc[start:stop]
+                    for start, stop in split_ranges(
+                        len(c_df), get_num_tasks(n_procs, len(c_df)))]
+        # # share the tables with the workers through memory-mapped
+        # # files, each worker reads only the tuples in its split
+        with SharedTable(l_df) as l_shared, SharedTable(r_df) as r_shared:
+            tasks = [(c_split, l_shared, r_shared, l_key, r_key, fk_ltable,
+                      fk_rtable, black_box_function_pkl,
+                      show_progress and i == len(c_splits) - 1)
+                     for i, c_split in enumerate(c_splits)]
+            valid_splits = list(run_tasks(_block_candset_split, tasks,
+                                          n_procs, verbose=verbose))
+        return np.concatenate(valid_splits)
+
+
+def _block_tables_split(l_df, r_df, l_offset, r_offset,
                         black_box_function_pkl, show_progress):
 
+    # get the tables (if they are shared by the parent process)
+    l_df, r_df = get_table(l_df), get_table(r_df)
+
     # initialize progress bar
     if show_progress:
         bar = pyprind.ProgBar(len(l_df)*len(r_df))
 
-    # create look up dictionaries for faster processing
-    l_dict = {}
-    for k, r in l_df.iterrows():
-        l_dict[k] = r
-    r_dict = {}
-    for k, r in r_df.iterrows():
-        r_dict[k] = r
-
-    # get the position of the ID attribute in the tables
-    l_id_pos = list(l_df.columns).index(l_key)
-    r_id_pos = list(r_df.columns).index(r_key)
+    # get the tuples of the tables
+    l_records = RecordAccessor(l_df)
+    r_records = RecordAccessor(r_df)
+    r_tuples = [r_records.get_record_at(j) for j in range(len(r_df))]
 
-    # create candset column names for the ID attributes of the tables
-    ltable_id = l_output_prefix + l_key
-    rtable_id = r_output_prefix + r_key
-
-    # list to keep the tuple pairs that survive blocking
-    valid = []
+    # lists to keep the positions of the tuple pairs that survive blocking
+    l_valid, r_valid = [np.zeros(0, dtype=np.int64)], \
+                       [np.zeros(0, dtype=np.int64)]
 
     # unpickle the black box function
     black_box_function = pickle.loads(black_box_function_pkl)
 
     # iterate through the two tables
-    for l_t in l_df.itertuples(index=False):
-        # # get ltuple from the look up dictionary
-        ltuple = l_dict[l_t[l_id_pos]]
-        for r_t in r_df.itertuples(index=False):
-            # # update the progress bar
-            if show_progress:
-                bar.update()
-
-            # # get rtuple from the look up dictionary
-            rtuple = r_dict[r_t[r_id_pos]]
-
-            # # apply the black box function to the tuple pair
-            res = black_box_function(ltuple, rtuple)
-
-            if res != True:
-                # # this tuple pair survives blocking
-    
-                # # an ordered dictionary to keep a surviving tuple pair
-                d = OrderedDict()
-
-                # # add ltable and rtable ids to an ordered dictionary
-                d[ltable_id] = ltuple[l_key]
-                d[rtable_id] = rtuple[r_key]
-
-                # # add l/r output attributes to the ordered dictionary
-                l_out = ltuple[l_output_attrs]
-                l_out.index = l_output_prefix + l_out.index
-                d.update(l_out)
+    for i in range(len(l_df)):
+        ltuple = l_records.get_record_at(i)
 
-                r_out = rtuple[r_output_attrs]
-                r_out.index = r_output_prefix + r_out.index
-                d.update(r_out)
+        # # apply the black box function to the tuple pairs of this ltuple,
+        # # a tuple pair survives if the function does not return True
+        keep = np.fromiter((black_box_function(ltuple, rtuple) != True
+                            for rtuple in r_tuples),
+                           dtype=bool, count=len(r_tuples))
+        r_pos = np.flatnonzero(keep) + r_offset
+        l_valid.append(np.full(len(r_pos), i + l_offset, dtype=np.int64))
+        r_valid.append(r_pos)
 
-                # # add the ordered dict to the list
-                valid.append(d)
+        # # update the progress bar
+        if show_progress and len(r_tuples) > 0:
+            bar.update(iterations=len(r_tuples))
 
-    # construct candidate set
-    candset = pd.DataFrame(valid)
-
-    return candset
+    return np.concatenate(l_valid), np.concatenate(r_valid)
 
 def _block_candset_split(c_df, l_df, r_df, l_key, r_key, fk_ltable, fk_rtable,
                          black_box_function_pkl, show_progress):
 
+    # get the tuples referred by the candset (if the tables are shared by
+    # the parent process)
+    l_df = get_table(l_df, c_df[fk_ltable].values)
+    r_df = get_table(r_df, c_df[fk_rtable].values)
+
     # initialize the progress bar
     if show_progress:
         bar = pyprind.ProgBar(len(c_df))
 
-    # create lookup dictionaries for faster processing
-    l_dict = {}
-    r_dict = {}
-
-    # list to keep track of valid ids
-    valid = []
-
-    # find positions of the ID attributes of the two tables in the candset
-    l_id_pos = list(c_df.columns).index(fk_ltable)
-    r_id_pos = list(c_df.columns).index(fk_rtable)
+    # get the left and the right tuples of the candset
+    l_rows = RecordAccessor(l_df).get_records(c_df[fk_ltable].values)
+    r_rows = RecordAccessor(r_df).get_records(c_df[fk_rtable].values)
 
     # unpickle the black box function
     black_box_function = pickle.loads(black_box_function_pkl)
 
+    # array to keep track of the valid tuple pairs
+    valid = np.zeros(len(c_df), dtype=bool)
+
     # iterate candidate set
-    for row in c_df.itertuples(index=False):
+    for i, (ltuple, rtuple) in enumerate(zip(l_rows, r_rows)):
         # # update progress bar
         if show_progress:
             bar.update()
-        
-        # # get ltuple, try dictionary first, then dataframe
-        row_lkey = row[l_id_pos]
-        if row_lkey not in l_dict:
-            l_dict[row_lkey] = l_df.ix[row_lkey]
-        ltuple = l_dict[row_lkey]
-
-        # # get rtuple, try dictionary first, then dataframe
-        row_rkey = row[r_id_pos]
-        if row_rkey not in r_dict:
-            r_dict[row_rkey] = r_df.ix[row_rkey]
-        rtuple = r_dict[row_rkey]
 
         # # apply the black box function to the tuple pair
-        res = black_box_function(ltuple, rtuple)
-        if res != True:
-            valid.append(True)
-        else:
-            valid.append(False)
+        valid[i] = black_box_function(ltuple, rtuple) != True
 
     return valid
+
+
+def _block_tables_batch_split(l_df, r_df, l_offset, r_offset,
+                              function_pkl, batch_size, show_progress):
+
+    # get the tables (if they are shared by the parent process)
+    l_df, r_df = get_table(l_df), get_table(r_df)
+
+    # unpickle the batch black box function
+    function = pickle.loads(function_pkl)
+
+    # initialize progress bar
+    if show_progress:
+        num_pairs = len(l_df) * len(r_df)
+        bar = pyprind.ProgBar(max(1, -(-num_pairs // batch_size)))
+
+    # apply the function to each block of the cartesian product of the
+    # tables, and keep the positions of the tuple pairs that survive
+    l_valid, r_valid = [np.zeros(0, dtype=np.int64)], \
+                       [np.zeros(0, dtype=np.int64)]
+    for l_pos, r_pos in cartesian_blocks(len(l_df), len(r_df), batch_size):
+        drop = _apply_batch_black_box_function(function, l_df, r_df,
+                                               l_pos, r_pos)
+        l_valid.append(l_pos[~drop] + l_offset)
+        r_valid.append(r_pos[~drop] + r_offset)
+        if show_progress:
+            bar.update()
+
+    return np.concatenate(l_valid), np.concatenate(r_valid)
+
+
+def _block_pairs_batch_split(l_df, r_df, l_pos, r_pos, function_pkl,
+                             batch_size, show_progress):
+
+    # get the tuples of the tuple pairs (if the tables are shared by the
+    # parent process)
+    l_df, l_pos = _take_rows(l_df, l_pos)
+    r_df, r_pos = _take_rows(r_df, r_pos)
+
+    # unpickle the batch black box function
+    function = pickle.loads(function_pkl)
+
+    # initialize progress bar
+    if show_progress:
+        bar = pyprind.ProgBar(max(1, -(-len(l_pos) // batch_size)))
+
+    # apply the function to each block of tuple pairs
+    drop = np.zeros(len(l_pos), dtype=bool)
+    for start in six.moves.range(0, len(l_pos), batch_size):
+        stop = start + batch_size
+        drop[start:stop] = _apply_batch_black_box_function(
+            function, l_df, r_df, l_pos[start:stop], r_pos[start:stop])
+        if show_progress:
+            bar.update()
+
+    return drop
+
+
+def _apply_batch_black_box_function(function, l_df, r_df, l_pos, r_pos):
+    # the i-th rows of ltuples and rtuples are the tuples of the i-th tuple
+    # pair, and both are indexed from 0 so that their columns can be
+    # compared directly
+    ltuples = l_df.iloc[l_pos].reset_index(drop=True)
+    rtuples = r_df.iloc[r_pos].reset_index(drop=True)
+    res = np.asarray(function(ltuples, rtuples))
+    if res.shape != (len(l_pos),):
+        logger.error('Batch black box function returned %d values for %d '
+                     'tuple pairs' % (res.size, len(l_pos)))
+        raise AssertionError('Batch black box function returned %d values '
+                             'for %d tuple pairs' % (res.size, len(l_pos)))
+    # a tuple pair is dropped if the function returns True for it
+    return res == True
+
+
+def _take_rows(table, positions):
+    # materialize only the rows of a shared table at the given positions,
+    # and return the positions of the same rows in the materialized table
+    if isinstance(table, SharedTable):
+        rows, positions = np.unique(positions, return_inverse=True)
+        return table.take(rows), positions
+    return table, positions
+
+
+def _project(table, attrs):
+    if attrs is None:
+        return table
+    return table[attrs]
@@ -1,10 +1,9 @@
 import logging
 
-import math
 import pandas as pd
 import six
-import multiprocessing
 
+from py_entitymatching.utils.parallel_helper import get_num_procs
 from py_entitymatching.utils.validation_helper import validate_object_type
 
 logger = logging.getLogger(__name__)
@@ -82,19 +81,6 @@ class Blocker(object):
             proj_attrs.append(block_attr)                                     
         return proj_attrs
 
-    def get_split_params(self, n_procs, min_m, min_n):
-        m = int(math.sqrt(n_procs))
-        while n_procs % m != 0:
-            m = m - 1
-        n = int(n_procs / m)
-        # to safeguard against small tables, do not split less than min values
-        return min(m, min_m), min(n, min_n)
-    
-    def get_num_procs(self, n_jobs, min_procs):        
+    def get_num_procs(self, n_jobs, min_procs):
         # determine number of processes to launch parallely
-        n_cpus = multiprocessing.cpu_count()
-        n_procs = n_jobs
-        if n_jobs < 0:
-            n_procs = n_cpus + 1 + n_jobs
-        # cannot launch less than min_procs to safeguard against small tables
-        return min(n_procs, min_procs)
+        return get_num_procs(n_jobs, min_procs)
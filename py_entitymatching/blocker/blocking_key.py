@@ -0,0 +1,284 @@
+"""
+This module contains functions to compute and join blocking keys, i.e.,
+the (possibly normalized) values of one or more attributes that must be
+equal for a tuple pair to survive attribute equivalence blocking.
+
+The key values of both the tables are encoded with the same integer codes,
+so that the tables can be joined by comparing integers instead of the
+original values. The normalization functions are applied once per
+distinct value of each blocking attribute.
+"""
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+import six
+
+from py_entitymatching.utils.parallel_helper import split_by_cost
+
+logger = logging.getLogger(__name__)
+
+_soundex_codes = dict((c, d) for letters, d in
+                      [('AEIOUY', '0'), ('BFPV', '1'), ('CGJKQSXZ', '2'),
+                       ('DT', '3'), ('L', '4'), ('MN', '5'), ('R', '6')]
+                      for c in letters)
+
+_first_k_re = re.compile(r'^first_(\d+)$')
+
+
+def lowercase(value):
+    """
+    Converts a string to lower case (other values are returned unchanged).
+    """
+    if isinstance(value, six.string_types):
+        return value.lower()
+    return value
+
+
+def strip(value):
+    """
+    Removes the leading and trailing whitespace of a string (other values
+    are returned unchanged).
+    """
+    if isinstance(value, six.string_types):
+        return value.strip()
+    return value
+
+
+def soundex(value):
+    """
+    Returns the American Soundex code of a string (e.g., 'R163' for
+    'Robert'), so that names that sound alike get the same key. Values that
+    are not strings are converted to strings first. Returns None if the
+    value does not contain any letter.
+    """
+    letters = [c for c in six.text_type(value).upper()
+               if c in _soundex_codes or c in 'HW']
+    if len(letters) == 0:
+        return None
+    code = [letters[0]]
+    prev = _soundex_codes.get(letters[0], '0')
+    for c in letters[1:]:
+        # H and W do not separate two consonants with the same code
+        if c in 'HW':
+            continue
+        digit = _soundex_codes[c]
+        if digit != '0' and digit != prev:
+            code.append(digit)
+        prev = digit
+    return ''.join(code)[:4].ljust(4, '0')
+
+
+def first_k(k):
+    """
+    Returns a function that keeps the first k characters of a value (values
+    that are not strings are converted to strings first).
+    """
+    if not isinstance(k, int) or isinstance(k, bool) or k <= 0:
+        logger.error('The number of characters should be a positive integer')
+        raise AssertionError('The number of characters should be a positive '
+                             'integer')
+
+    def _first_k(value):
+        return six.text_type(value)[:k]
+
+    _first_k.__name__ = 'first_' + str(k)
+    return _first_k
+
+
+normalizers = {'lowercase': lowercase, 'strip': strip, 'soundex': soundex}
+
+
+def get_normalizer(normalizer):
+    """
+    Returns the function for a normalizer specification: a function, the
+    name of a normalizer ('lowercase', 'strip', 'soundex' or 'first_<k>',
+    e.g. 'first_3'), or a list of them, which are applied in order.
+
+    Raises:
+        AssertionError: If the normalizer is not a function, a known
+            normalizer name or a list of them.
+    """
+    if normalizer is None:
+        return None
+    if isinstance(normalizer, list):
+        fns = [get_normalizer(n) for n in normalizer]
+
+        def _normalize(value):
+            for fn in fns:
+                if pd.isnull(value):
+                    break
+                value = fn(value)
+            return value
+
+        return _normalize
+    if isinstance(normalizer, six.string_types):
+        if normalizer in normalizers:
+            return normalizers[normalizer]
+        match = _first_k_re.match(normalizer)
+        if match is not None and int(match.group(1)) > 0:
+            return first_k(int(match.group(1)))
+        logger.error('Unknown normalizer: %s' % normalizer)
+        raise AssertionError('Unknown normalizer: %s' % normalizer)
+    if callable(normalizer):
+        return normalizer
+    logger.error('Normalizer is not a function, a normalizer name or a list '
+                 'of them')
+    raise AssertionError('Normalizer is not a function, a normalizer name or '
+                         'a list of them')
+
+
+def encode_values(l_vals, r_vals, normalizer=None):
+    """
+    Encodes the values of an attribute of the left and the right tables with
+    the same integer codes, so that two values get the same code if and only
+    if their normalized values are equal. Missing values (and values
+    normalized to a missing value) are coded as -1.
+    """
+    codes, uniques = pd.factorize(np.concatenate(
+        [np.asarray(l_vals, dtype=object), np.asarray(r_vals, dtype=object)]))
+    fn = get_normalizer(normalizer)
+    if fn is not None and len(uniques) > 0:
+        norm_uniques = np.empty(len(uniques), dtype=object)
+        norm_uniques[:] = [fn(u) for u in uniques]
+        norm_codes, _ = pd.factorize(norm_uniques)
+        codes = np.where(codes < 0, -1, norm_codes[np.maximum(codes, 0)])
+    codes = codes.astype(np.int64)
+    return codes[:len(l_vals)], codes[len(l_vals):]
+
+
+def encode_keys(l_df, r_df, l_attrs, r_attrs, normalizer=None):
+    """
+    Encodes the (composite) blocking keys of the tuples of two tables with
+    the same integer codes. A key is missing (coded as -1) if the value of
+    any of its attributes is missing.
+
+    Args:
+        l_df, r_df (DataFrame): The left and the right tables.
+        l_attrs, r_attrs (list): The blocking attributes of the left and the
+            right tables (the i-th attributes of both the lists are
+            compared).
+        normalizer: The normalizer applied to the values of each blocking
+            attribute (see get_normalizer, defaults to None).
+
+    Returns:
+        The codes of the keys of the left and the right tuples (NumPy
+        arrays).
+    """
+    num_l = len(l_df)
+    key = None
+    for l_attr, r_attr in zip(l_attrs, r_attrs):
+        l_codes, r_codes = encode_values(l_df[l_attr].values,
+                                         r_df[r_attr].values, normalizer)
+        codes = np.concatenate([l_codes, r_codes])
+        if key is None:
+            key = codes
+            continue
+        # combine the codes of the key so far with the codes of the
+        # attribute, and renumber the combinations so that the codes stay
+        # smaller than the number of tuples
+        is_missing = (key < 0) | (codes < 0)
+        combined = key * (codes.max() + 1) + codes
+        key = np.full(len(combined), -1, dtype=np.int64)
+        key[~is_missing] = pd.factorize(combined[~is_missing])[0]
+    return key[:num_l], key[num_l:]
+
+
+def join_codes(l_codes, r_codes, l_pos=None, r_pos=None):
+    """
+    Finds the pairs of left and right tuples with the same (non-missing)
+    key code, using a sort-based hash join.
+
+    Args:
+        l_codes, r_codes (array): The key codes of the left and the right
+            tuples.
+        l_pos, r_pos (array): The positions of these tuples in the tables
+            (defaults to None, i.e. 0, 1, ...).
+
+    Returns:
+        The positions of the left and the right tuples of each pair, sorted
+        by the position of the left tuple and then of the right tuple.
+    """
+    l_codes = np.asarray(l_codes, dtype=np.int64)
+    r_codes = np.asarray(r_codes, dtype=np.int64)
+    if l_pos is None:
+        l_pos = np.arange(len(l_codes), dtype=np.int64)
+    if r_pos is None:
+        r_pos = np.arange(len(r_codes), dtype=np.int64)
+    l_valid, r_valid = l_codes >= 0, r_codes >= 0
+    l_codes, l_pos = l_codes[l_valid], np.asarray(l_pos)[l_valid]
+    r_codes, r_pos = r_codes[r_valid], np.asarray(r_pos)[r_valid]
+
+    # sort the right tuples by code (and position, as the sort is stable if
+    # the positions are increasing) and find the range of right tuples
+    # with the code of each left tuple
+    r_order = np.lexsort((r_pos, r_codes))
+    r_sorted = r_codes[r_order]
+    starts = np.searchsorted(r_sorted, l_codes, side='left')
+    counts = np.searchsorted(r_sorted, l_codes, side='right') - starts
+    offsets = np.arange(counts.sum(), dtype=np.int64) - np.repeat(
+        np.cumsum(counts) - counts, counts)
+    pair_l_pos = np.repeat(l_pos, counts)
+    pair_r_pos = r_pos[r_order][np.repeat(starts, counts) + offsets]
+    order = np.lexsort((pair_r_pos, pair_l_pos))
+    return pair_l_pos[order], pair_r_pos[order]
+
+
+def get_missing_pairs(l_codes, r_codes):
+    """
+    Returns the positions of the left and the right tuples of the pairs
+    where at least one of the tuples has a missing key (coded as -1).
+    """
+    l_missing = np.flatnonzero(np.asarray(l_codes) < 0)
+    l_present = np.flatnonzero(np.asarray(l_codes) >= 0)
+    r_missing = np.flatnonzero(np.asarray(r_codes) < 0)
+    num_r = len(r_codes)
+    l_pos = np.concatenate([np.repeat(l_missing, num_r),
+                            np.repeat(l_present, len(r_missing))])
+    r_pos = np.concatenate([np.tile(np.arange(num_r, dtype=np.int64),
+                                    len(l_missing)),
+                            np.tile(r_missing, len(l_present))])
+    return l_pos.astype(np.int64), r_pos.astype(np.int64)
+
+
+def get_join_tasks(l_codes, r_codes, num_tasks):
+    """
+    Splits the join of two tables on their key codes into at most num_tasks
+    tasks with about the same number of tuple pairs, and returns the
+    positions of the left and the right tuples of each task.
+
+    The left tuples are sorted by key code and split into contiguous ranges,
+    where each left tuple weighs the number of right tuples with its key
+    code (plus one), so a frequent key is spread over several tasks instead
+    of overloading a single task. Each task gets the right
+    tuples with the key codes of its left tuples, so joining the left and
+    the right tuples of each task finds every pair exactly once.
+    """
+    l_codes = np.asarray(l_codes, dtype=np.int64)
+    r_codes = np.asarray(r_codes, dtype=np.int64)
+    l_valid = np.flatnonzero(l_codes >= 0)
+    l_sorted = l_valid[np.argsort(l_codes[l_valid], kind='mergesort')]
+    r_valid = np.flatnonzero(r_codes >= 0)
+    r_sorted = r_valid[np.argsort(r_codes[r_valid], kind='mergesort')]
+    r_sorted_codes = r_codes[r_sorted]
+
+    # the number of right tuples with the key code of each left tuple
+    l_sorted_codes = l_codes[l_sorted]
+    r_counts = np.searchsorted(r_sorted_codes, l_sorted_codes,
+                               side='right') - \
+        np.searchsorted(r_sorted_codes, l_sorted_codes, side='left')
+
+    tasks, costs = [], []
+    for start, stop in split_by_cost(r_counts + 1, num_tasks):
+        r_start = np.searchsorted(r_sorted_codes, l_sorted_codes[start],
+                                  side='left')
+        r_stop = np.searchsorted(r_sorted_codes, l_sorted_codes[stop - 1],
+                                 side='right')
+        tasks.append((l_sorted[start:stop], r_sorted[r_start:r_stop]))
+        costs.append(int(r_counts[start:stop].sum()))
+    if len(tasks) == 0:
+        # no left tuple has a key
+        tasks.append((l_sorted, r_sorted[:0]))
+        costs.append(0)
+    return tasks, costs
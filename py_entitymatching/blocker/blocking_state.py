@@ -0,0 +1,587 @@
+"""
+This module contains the blocking states, which keep what a blocker computed
+on two tables (the normalized blocking keys or the token sets of the tuples,
+indexed by key or by token) so that the tables can be blocked incrementally
+as new tuples are appended to them.
+"""
+import logging
+import os
+import pickle
+
+import cloudpickle as cp
+import numpy as np
+import pandas as pd
+import six
+from py_stringmatching.tokenizer.qgram_tokenizer import QgramTokenizer
+from py_stringmatching.tokenizer.whitespace_tokenizer import WhitespaceTokenizer
+
+import py_entitymatching.catalog.catalog_manager as cm
+from py_entitymatching.blocker.attr_equiv_blocker import \
+    AttrEquivalenceBlocker, _get_attr_list
+from py_entitymatching.blocker.blocking_key import get_missing_pairs, \
+    get_normalizer
+from py_entitymatching.blocker.overlap_blocker import OverlapBlocker
+from py_entitymatching.utils.catalog_helper import log_info, \
+    get_name_for_key, add_key_column
+from py_entitymatching.utils.generic_helper import get_candset_for_pairs
+from py_entitymatching.utils.validation_helper import validate_object_type
+
+logger = logging.getLogger(__name__)
+
+
+class BlockingState(object):
+    """
+    Base class of the blocking states.
+
+    A blocking state describes each tuple of the left and the right tables
+    by a set of integer codes (the code of its normalized blocking key, or
+    the ids of its tokens), and keeps the (code, position) postings of both
+    the tables sorted by code. A pair of tuples survives the blocking if
+    the tuples share at least `min_shared` codes, or if allow_missing is
+    True and the blocking value of one of the tuples is missing.
+
+    When tuples are appended to the tables, only the new tuples are encoded,
+    the new left tuples are probed against the postings of all the right
+    tuples and the old left tuples against the new right tuples, and the
+    new postings are merged into the sorted postings. So the update finds
+    exactly the pairs that a full rerun of the blocker would add to its
+    output, in time proportional to the size of the new tuples and of their
+    pairs.
+
+    The subclasses encode the tuples in `_get_postings(table, is_left)`,
+    which returns the codes of the tuples of the table (along with the
+    position of the tuple in the table for each code) and flags the tuples
+    whose blocking value is missing.
+    """
+
+    def __getstate__(self):
+        # the tables are not saved along with the state (see load)
+        state = self.__dict__.copy()
+        state['ltable'] = None
+        state['rtable'] = None
+        return state
+
+    def get_candset(self, verbose=False):
+        """
+        Returns the candidate set of all the tuple pairs of the current
+        tables that survive the blocking (i.e., the output of the blocker on
+        the current tables).
+
+        Args:
+            verbose (boolean): A flag to indicate whether the debug
+                information should be logged (defaults to False).
+
+        Returns:
+            A candidate set (pandas DataFrame) over the current tables.
+        """
+        self._get_tables()
+        l_pos, r_pos = self._probe(self.l_postings, self.r_postings)
+        if self.allow_missing:
+            l_missing, r_missing = get_missing_pairs(
+                -self.l_is_missing.astype(np.int64),
+                -self.r_is_missing.astype(np.int64))
+            l_pos = np.concatenate([l_pos, l_missing])
+            r_pos = np.concatenate([r_pos, r_missing])
+        log_info(logger, 'Number of tuple pairs: %d' % len(l_pos), verbose)
+        return self._get_candset_for_pairs(l_pos, r_pos)
+
+    def update(self, delta_ltable=None, delta_rtable=None, verbose=False):
+        """
+        Appends new tuples to the left and/or the right tables, and returns
+        the candidate set of the new tuple pairs that survive the blocking
+        (the pairs of a new left tuple and any right tuple, and of an old
+        left tuple and a new right tuple).
+
+        The current tables are replaced with the tables with the new tuples
+        appended (see the `ltable` and `rtable` attributes): the union of
+        the candidate sets returned so far is the candidate set that the
+        blocker would return on the new tables. The tables are not modified
+        in place, and the candidate set returned by the update refers to the
+        new tables.
+
+        Args:
+            delta_ltable (DataFrame): The tuples to append to the left table
+                (defaults to None, i.e., no tuples). It must have the same
+                attributes as the left table.
+            delta_rtable (DataFrame): The tuples to append to the right
+                table (defaults to None).
+            verbose (boolean): A flag to indicate whether the debug
+                information should be logged (defaults to False).
+
+        Returns:
+            A candidate set (pandas DataFrame) with the new tuple pairs.
+
+        Raises:
+            AssertionError: If `delta_ltable` or `delta_rtable` is not of
+                type pandas DataFrame.
+            AssertionError: If `delta_ltable` or `delta_rtable` does not
+                have the same attributes as the table it is appended to.
+            AssertionError: If the key attribute of a table is not a key
+                once the new tuples are appended (e.g., if a new tuple has
+                the key value of an old tuple).
+        """
+        ltable, rtable = self._get_tables()
+        validate_object_type(verbose, bool, 'Parameter verbose')
+        new_ltable = _append_tuples(ltable, delta_ltable, self.l_key,
+                                    'left')
+        new_rtable = _append_tuples(rtable, delta_rtable, self.r_key,
+                                    'right')
+        num_l, num_r = len(ltable), len(rtable)
+        log_info(logger, 'Appending %d tuples to the left table and %d '
+                         'tuples to the right table' %
+                 (len(new_ltable) - num_l, len(new_rtable) - num_r), verbose)
+
+        # encode the new tuples (the rows of the postings are positions in
+        # the new tables)
+        l_codes, l_rows, l_is_missing = self._get_postings(
+            new_ltable.iloc[num_l:], True)
+        r_codes, r_rows, r_is_missing = self._get_postings(
+            new_rtable.iloc[num_r:], False)
+        delta_l_postings = (l_codes, l_rows + num_l)
+        delta_r_postings = (r_codes, r_rows + num_r)
+
+        # find the new pairs: the new left tuples with all the right tuples,
+        # and the old left tuples with the new right tuples
+        self.r_postings = _merge_postings(self.r_postings, delta_r_postings)
+        new_l_pos, r_pos_1 = self._probe(delta_l_postings, self.r_postings)
+        r_pos_2, l_pos_2 = self._probe(delta_r_postings, self.l_postings)
+        self.l_postings = _merge_postings(self.l_postings, delta_l_postings)
+        l_pos = np.concatenate([new_l_pos, l_pos_2])
+        r_pos = np.concatenate([r_pos_1, r_pos_2])
+
+        old_l_is_missing = self.l_is_missing
+        self.l_is_missing = np.concatenate([self.l_is_missing, l_is_missing])
+        self.r_is_missing = np.concatenate([self.r_is_missing, r_is_missing])
+        if self.allow_missing:
+            # the new pairs with a missing value in at least one of the
+            # tuples
+            l_missing_1, r_missing_1 = get_missing_pairs(
+                -l_is_missing.astype(np.int64),
+                -self.r_is_missing.astype(np.int64))
+            l_missing_2, r_missing_2 = get_missing_pairs(
+                -old_l_is_missing.astype(np.int64),
+                -r_is_missing.astype(np.int64))
+            l_pos = np.concatenate([l_pos, l_missing_1 + num_l, l_missing_2])
+            r_pos = np.concatenate([r_pos, r_missing_1, r_missing_2 + num_r])
+
+        self.ltable, self.rtable = new_ltable, new_rtable
+        self.l_key_values = np.asarray(new_ltable[self.l_key].values)
+        self.r_key_values = np.asarray(new_rtable[self.r_key].values)
+        log_info(logger, 'Number of new tuple pairs: %d' % len(l_pos),
+                 verbose)
+        return self._get_candset_for_pairs(l_pos, r_pos)
+
+    def save(self, file_path):
+        """
+        Saves the state to disk. The tables are not saved along with the
+        state, they must be given when the state is loaded.
+
+        Args:
+            file_path (string): The file path where the state must be saved.
+
+        Raises:
+            AssertionError: If `file_path` is not of type string.
+        """
+        validate_object_type(file_path, six.string_types,
+                             error_prefix='Input file path')
+        if os.path.exists(file_path):
+            logger.warning('File already exists at %s; Overwriting it',
+                           file_path)
+        # the normalizers can be lambda functions, so the state is pickled
+        # with cloudpickle
+        with open(file_path, 'wb') as file_handler:
+            cp.dump(self, file_handler, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(file_path, ltable, rtable):
+        """
+        Loads a state from disk.
+
+        Args:
+            file_path (string): The file path to load the state from.
+            ltable (DataFrame): The current left table of the state.
+            rtable (DataFrame): The current right table of the state.
+
+        Returns:
+            A blocking state object.
+
+        Raises:
+            AssertionError: If `file_path` is not of type string.
+            AssertionError: If a file does not exist at the given
+                `file_path`.
+            AssertionError: If the key values of `ltable` or `rtable` are not
+                the key values of the tables of the state.
+        """
+        validate_object_type(file_path, six.string_types,
+                             error_prefix='Input file path')
+        validate_object_type(ltable, pd.DataFrame,
+                             error_prefix='Input left table')
+        validate_object_type(rtable, pd.DataFrame,
+                             error_prefix='Input right table')
+        if not os.path.exists(file_path):
+            logger.error('File does not exist at path %s', file_path)
+            raise AssertionError('File does not exist at path %s' % file_path)
+        with open(file_path, 'rb') as file_handler:
+            state = pickle.load(file_handler)
+
+        for table, key, key_values in [(ltable, state.l_key,
+                                        state.l_key_values),
+                                       (rtable, state.r_key,
+                                        state.r_key_values)]:
+            if key not in table.columns or \
+                    not np.array_equal(np.asarray(table[key].values),
+                                       key_values):
+                logger.error('The tables are not the tables of the state')
+                raise AssertionError('The tables are not the tables of the '
+                                     'state')
+        state.ltable, state.rtable = ltable, rtable
+        return state
+
+    # ------------------------------------------------------------
+    # helper functions
+
+    def _init_state(self, ltable, rtable, l_output_attrs, r_output_attrs,
+                    l_output_prefix, r_output_prefix, allow_missing,
+                    verbose):
+        # get and validate the keys of the tables
+        log_info(logger, 'Required metadata: ltable key, rtable key', verbose)
+        self.l_key, self.r_key = cm.get_keys_for_ltable_rtable(
+            ltable, rtable, logger, verbose)
+        cm._validate_metadata_for_table(ltable, self.l_key, 'ltable', logger,
+                                        verbose)
+        cm._validate_metadata_for_table(rtable, self.r_key, 'rtable', logger,
+                                        verbose)
+
+        self.ltable, self.rtable = ltable, rtable
+        self.l_key_values = np.asarray(ltable[self.l_key].values)
+        self.r_key_values = np.asarray(rtable[self.r_key].values)
+        self.l_output_attrs = l_output_attrs
+        self.r_output_attrs = r_output_attrs
+        self.l_output_prefix = l_output_prefix
+        self.r_output_prefix = r_output_prefix
+        self.allow_missing = allow_missing
+
+        # encode the tuples of both the tables
+        l_codes, l_rows, self.l_is_missing = self._get_postings(ltable, True)
+        r_codes, r_rows, self.r_is_missing = self._get_postings(rtable,
+                                                                False)
+        empty = np.zeros(0, dtype=np.int64)
+        self.l_postings = _merge_postings((empty, empty), (l_codes, l_rows))
+        self.r_postings = _merge_postings((empty, empty), (r_codes, r_rows))
+
+    def _probe(self, postings, index_postings):
+        # finds the pairs of tuples of the postings and of the index
+        # postings that share at least min_shared codes, and returns their
+        # positions
+        codes, rows = postings
+        index_codes, index_rows = index_postings
+        starts = np.searchsorted(index_codes, codes, side='left')
+        counts = np.searchsorted(index_codes, codes, side='right') - starts
+        offsets = np.arange(counts.sum(), dtype=np.int64) - np.repeat(
+            np.cumsum(counts) - counts, counts)
+        hit_rows = np.repeat(rows, counts)
+        hit_index_rows = index_rows[np.repeat(starts, counts) + offsets]
+        if self.min_shared <= 1 and self._is_single_code:
+            # each tuple has at most one code, so the pairs are distinct
+            return hit_rows, hit_index_rows
+        num_index = (index_rows.max() + 1) if len(index_rows) else 1
+        pairs, pair_counts = np.unique(hit_rows * num_index + hit_index_rows,
+                                       return_counts=True)
+        pairs = pairs[pair_counts >= self.min_shared]
+        return pairs // num_index, pairs % num_index
+
+    def _get_candset_for_pairs(self, l_pos, r_pos):
+        order = np.lexsort((r_pos, l_pos))
+        candset = get_candset_for_pairs(self.ltable, self.rtable, self.l_key,
+                                        self.r_key, l_pos[order],
+                                        r_pos[order], self.l_output_attrs,
+                                        self.r_output_attrs,
+                                        self.l_output_prefix,
+                                        self.r_output_prefix)
+        key = get_name_for_key(candset.columns)
+        candset = add_key_column(candset, key)
+        cm.set_candset_properties(candset, key,
+                                  self.l_output_prefix + self.l_key,
+                                  self.r_output_prefix + self.r_key,
+                                  self.ltable, self.rtable)
+        return candset
+
+    def _get_tables(self):
+        if self.ltable is None or self.rtable is None:
+            logger.error('The tables of the state are not set')
+            raise AssertionError('The tables of the state are not set')
+        return self.ltable, self.rtable
+
+
+class AttrEquivalenceBlockingState(BlockingState):
+    """
+    The blocking state of the attribute equivalence blocker: the tables can
+    be blocked incrementally (with `update`) as new tuples are appended to
+    them, and the union of the candidate sets is the output of
+    `AttrEquivalenceBlocker.block_tables` on the final tables.
+
+    The state keeps the dictionary from the normalized blocking keys to
+    integer codes, the codes of the tuples of both the tables and their
+    postings sorted by code, so the values of the old tuples are never
+    normalized again.
+
+    Args:
+        ltable (DataFrame): The left input table.
+        rtable (DataFrame): The right input table.
+        l_block_attr (string or list): The blocking attribute in left table,
+            or a list of blocking attributes.
+        r_block_attr (string or list): The blocking attribute in right
+            table, or a list of blocking attributes.
+        normalizer (function, string or list): The normalizer applied to the
+            values of each blocking attribute, as in
+            `AttrEquivalenceBlocker.block_tables` (defaults to None).
+        l_output_attrs (list): A list of attribute names from the left
+            table to be included in the candidate sets (defaults to None).
+        r_output_attrs (list): A list of attribute names from the right
+            table to be included in the candidate sets (defaults to None).
+        l_output_prefix (string): The prefix to be used for the attribute
+            names coming from the left table (defaults to 'ltable\\_').
+        r_output_prefix (string): The prefix to be used for the attribute
+            names coming from the right table (defaults to 'rtable\\_').
+        allow_missing (boolean): A flag to indicate whether the tuple pairs
+            with missing value in at least one of the blocking attributes
+            should be included in the candidate sets (defaults to False).
+        verbose (boolean): A flag to indicate whether the debug information
+            should be logged (defaults to False).
+
+    Raises:
+        AssertionError: If `ltable` or `rtable` is not of type pandas
+            DataFrame.
+        AssertionError: If the blocking attributes are not strings or lists
+            of strings of the same length, or are not in the tables.
+        AssertionError: If `normalizer` is not a valid normalizer.
+        AssertionError: If the output attributes or prefixes are not valid.
+        AssertionError: If `allow_missing` is not of type boolean.
+
+    Examples:
+        >>> import py_entitymatching as em
+        >>> state = em.AttrEquivalenceBlockingState(A, B, 'zipcode', 'zipcode', l_output_attrs=['name'], r_output_attrs=['name'])
+        >>> C = state.get_candset()
+        >>> D = state.update(delta_ltable=A_new, delta_rtable=B_new)
+        >>> state.save('./zipcode_state.pkl')
+        >>> state = em.AttrEquivalenceBlockingState.load('./zipcode_state.pkl', state.ltable, state.rtable)
+    """
+
+    def __init__(self, ltable, rtable, l_block_attr, r_block_attr,
+                 normalizer=None, l_output_attrs=None, r_output_attrs=None,
+                 l_output_prefix='ltable_', r_output_prefix='rtable_',
+                 allow_missing=False, verbose=False):
+        self.blocker = AttrEquivalenceBlocker()
+
+        # validate the input parameters
+        self.blocker.validate_types_params_tables(ltable, rtable,
+                                                  l_output_attrs,
+                                                  r_output_attrs,
+                                                  l_output_prefix,
+                                                  r_output_prefix, verbose, 1)
+        self.blocker.validate_types_block_attrs(l_block_attr, r_block_attr)
+        self.blocker.validate_allow_missing(allow_missing)
+        self.blocker.validate_normalizer(normalizer)
+        self.blocker.validate_block_attrs(ltable, rtable, l_block_attr,
+                                          r_block_attr)
+        self.blocker.validate_output_attrs(ltable, rtable, l_output_attrs,
+                                           r_output_attrs)
+
+        self.l_block_attr = _get_attr_list(l_block_attr)
+        self.r_block_attr = _get_attr_list(r_block_attr)
+        self.normalizer = normalizer
+        self.min_shared = 1
+        self._is_single_code = True
+        self._key_codes = {}
+        self._init_state(ltable, rtable, l_output_attrs, r_output_attrs,
+                         l_output_prefix, r_output_prefix, allow_missing,
+                         verbose)
+
+    def _get_postings(self, table, is_left):
+        attrs = self.l_block_attr if is_left else self.r_block_attr
+        fn = get_normalizer(self.normalizer)
+
+        # normalize each distinct value of each blocking attribute once
+        columns = []
+        is_missing = np.zeros(len(table), dtype=bool)
+        for attr in attrs:
+            codes, uniques = pd.factorize(np.asarray(table[attr].values,
+                                                     dtype=object))
+            values = np.empty(len(uniques) + 1, dtype=object)
+            values[:len(uniques)] = uniques if fn is None else \
+                [fn(u) for u in uniques]
+            values[len(uniques)] = None
+            column = values[codes]
+            is_missing |= np.asarray(pd.isnull(column), dtype=bool)
+            columns.append(column)
+
+        # map each distinct (normalized) blocking key to its code, adding
+        # the keys that were not seen before
+        rows = np.flatnonzero(~is_missing).astype(np.int64)
+        keys = pd.Series(list(six.moves.zip(*[c[rows] for c in columns])),
+                         dtype=object)
+        key_ids, unique_keys = pd.factorize(keys)
+        unique_codes = np.asarray(
+            [self._key_codes.setdefault(k, len(self._key_codes))
+             for k in unique_keys], dtype=np.int64)
+        return unique_codes[key_ids], rows, is_missing
+
+
+class OverlapBlockingState(BlockingState):
+    """
+    The blocking state of the overlap blocker: the tables can be blocked
+    incrementally (with `update`) as new tuples are appended to them, and
+    the union of the candidate sets is the output of
+    `OverlapBlocker.block_tables` on the final tables.
+
+    The values of the overlap attributes are cleaned up and tokenized the
+    same way as in the overlap blocker. The state keeps the token vocabulary
+    and the postings of the tokens of both the tables, so the values of the
+    old tuples are never cleaned up or tokenized again.
+
+    Args:
+        ltable (DataFrame): The left input table.
+        rtable (DataFrame): The right input table.
+        l_overlap_attr (string): The overlap attribute in left table.
+        r_overlap_attr (string): The overlap attribute in right table.
+        rem_stop_words (boolean): A flag to indicate whether stop words
+            (e.g., a, an, the) should be removed from the token sets
+            (defaults to False).
+        q_val (int): The value of q to use if the attribute values are to be
+            tokenized as qgrams (defaults to None).
+        word_level (boolean): A flag to indicate whether the attribute
+            values should be tokenized as words (defaults to True).
+        overlap_size (int): The minimum number of tokens that must overlap
+            (defaults to 1).
+        l_output_attrs (list): A list of attribute names from the left
+            table to be included in the candidate sets (defaults to None).
+        r_output_attrs (list): A list of attribute names from the right
+            table to be included in the candidate sets (defaults to None).
+        l_output_prefix (string): The prefix to be used for the attribute
+            names coming from the left table (defaults to 'ltable\\_').
+        r_output_prefix (string): The prefix to be used for the attribute
+            names coming from the right table (defaults to 'rtable\\_').
+        allow_missing (boolean): A flag to indicate whether the tuple pairs
+            with missing value in at least one of the overlap attributes
+            should be included in the candidate sets (defaults to False).
+        verbose (boolean): A flag to indicate whether the debug information
+            should be logged (defaults to False).
+
+    Raises:
+        AssertionError: If `ltable` or `rtable` is not of type pandas
+            DataFrame.
+        AssertionError: If the overlap attributes are not strings or are not
+            in the tables.
+        AssertionError: If `rem_stop_words`, `word_level` or
+            `allow_missing` is not of type boolean.
+        AssertionError: If `q_val` or `overlap_size` is not of type int.
+        SyntaxError: If `q_val` is set to a valid value and `word_level`
+            is set to True.
+        SyntaxError: If `q_val` is set to None and `word_level` is set to
+            False.
+
+    Examples:
+        >>> import py_entitymatching as em
+        >>> state = em.OverlapBlockingState(A, B, 'address', 'address', overlap_size=2, rem_stop_words=True)
+        >>> C = state.get_candset()
+        >>> D = state.update(delta_rtable=B_new)
+    """
+
+    def __init__(self, ltable, rtable, l_overlap_attr, r_overlap_attr,
+                 rem_stop_words=False, q_val=None, word_level=True,
+                 overlap_size=1, l_output_attrs=None, r_output_attrs=None,
+                 l_output_prefix='ltable_', r_output_prefix='rtable_',
+                 allow_missing=False, verbose=False):
+        self.blocker = OverlapBlocker()
+
+        # validate the input parameters
+        self.blocker.validate_types_params_tables(ltable, rtable,
+                                                  l_output_attrs,
+                                                  r_output_attrs,
+                                                  l_output_prefix,
+                                                  r_output_prefix, verbose, 1)
+        self.blocker.validate_types_other_params(l_overlap_attr,
+                                                 r_overlap_attr,
+                                                 rem_stop_words, q_val,
+                                                 word_level, overlap_size)
+        self.blocker.validate_allow_missing(allow_missing)
+        self.blocker.validate_overlap_attrs(ltable, rtable, l_overlap_attr,
+                                            r_overlap_attr)
+        self.blocker.validate_output_attrs(ltable, rtable, l_output_attrs,
+                                           r_output_attrs)
+        self.blocker.validate_word_level_qval(word_level, q_val)
+
+        self.l_overlap_attr = l_overlap_attr
+        self.r_overlap_attr = r_overlap_attr
+        self.rem_stop_words = rem_stop_words
+        self.q_val = q_val
+        self.word_level = word_level
+        self.min_shared = overlap_size
+        self._is_single_code = False
+        self._vocabulary = {}
+        self._init_state(ltable, rtable, l_output_attrs, r_output_attrs,
+                         l_output_prefix, r_output_prefix, allow_missing,
+                         verbose)
+
+    def _get_postings(self, table, is_left):
+        attr = self.l_overlap_attr if is_left else self.r_overlap_attr
+        cleaned = self.blocker.get_cleaned_column(table, attr,
+                                                  self.rem_stop_words)
+        is_missing = np.asarray(pd.isnull(cleaned), dtype=bool)
+        if self.word_level:
+            tokenizer = WhitespaceTokenizer(return_set=True)
+        else:
+            tokenizer = QgramTokenizer(qval=self.q_val, return_set=True)
+
+        # tokenize each distinct value once, adding the tokens that were not
+        # seen before to the vocabulary
+        codes, uniques = pd.factorize(np.asarray(cleaned, dtype=object))
+        value_tokens = []
+        for val in uniques:
+            ids = [self._vocabulary.setdefault(token, len(self._vocabulary))
+                   for token in tokenizer.tokenize(val)]
+            value_tokens.append(np.unique(np.asarray(ids, dtype=np.int64)))
+        present = np.flatnonzero(codes >= 0)
+        sizes = np.asarray([len(t) for t in value_tokens], dtype=np.int64)
+        rows = np.repeat(present, sizes[codes[present]]).astype(np.int64)
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64), rows, is_missing
+        tokens = np.concatenate([value_tokens[c] for c in codes[present]])
+        return tokens.astype(np.int64), rows, is_missing
+
+
+def _merge_postings(postings, new_postings):
+    # merges new postings (of tuples after the tuples of the postings) into
+    # postings sorted by code and then by position
+    codes, rows = postings
+    new_codes, new_rows = new_postings
+    order = np.lexsort((new_rows, new_codes))
+    codes = np.concatenate([codes, new_codes[order]])
+    rows = np.concatenate([rows, new_rows[order]])
+    # the stable sort keeps the old postings before the new ones for each
+    # code
+    order = np.argsort(codes, kind='mergesort')
+    return codes[order], rows[order]
+
+
+def _append_tuples(table, delta_table, key, side):
+    # returns the table with the new tuples appended, with the same key
+    if delta_table is None:
+        return table
+    validate_object_type(delta_table, pd.DataFrame,
+                         error_prefix='Input %s delta table' % side)
+    if len(delta_table) == 0:
+        return table
+    if set(delta_table.columns) != set(table.columns):
+        logger.error('The %s delta table does not have the attributes of '
+                     'the %s table' % (side, side))
+        raise AssertionError('The %s delta table does not have the '
+                             'attributes of the %s table' % (side, side))
+    new_table = pd.concat([table, delta_table[list(table.columns)]],
+                          ignore_index=True)
+    if not cm.set_key(new_table, key):
+        logger.error('Attribute %s is not a key of the %s table once the '
+                     'new tuples are appended' % (key, side))
+        raise AssertionError('Attribute %s is not a key of the %s table '
+                             'once the new tuples are appended' % (key, side))
+    return new_table
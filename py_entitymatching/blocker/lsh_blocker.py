@@ -0,0 +1,633 @@
+import logging
+
+import cloudpickle as cp
+import numpy as np
+import pandas as pd
+import pickle
+import six
+
+import py_entitymatching.catalog.catalog_manager as cm
+from py_entitymatching.blocker.blocker import Blocker
+from py_entitymatching.blocker.blocking_key import get_missing_pairs
+from py_entitymatching.blocker.minhash import get_hash_params, \
+    compute_signatures, get_candidate_pairs, collide, estimate_jaccard, \
+    get_expected_recall, get_optimal_params
+from py_entitymatching.feature.tokenizers import tok_wspace
+from py_entitymatching.utils.catalog_helper import log_info, get_name_for_key, add_key_column
+from py_entitymatching.utils.generic_helper import get_candset_for_pairs
+from py_entitymatching.utils.parallel_helper import get_num_tasks, \
+    get_value_costs, run_tasks, split_by_cost
+from py_entitymatching.utils.record_helper import RecordAccessor
+from py_entitymatching.utils.validation_helper import validate_object_type
+
+logger = logging.getLogger(__name__)
+
+
+class LSHBlocker(Blocker):
+    """
+    Blocks based on the estimated Jaccard similarity of the token sets of an
+    attribute, using MinHash signatures and locality sensitive hashing.
+
+    The signature of a tuple is made of `num_bands * rows_per_band` MinHash
+    values of the tokens of its blocking attribute. The signatures are split
+    into `num_bands` bands of `rows_per_band` values, and a tuple pair is a
+    candidate if the signatures of its tuples are equal in at least one
+    band. A candidate tuple pair survives blocking if the Jaccard similarity
+    estimated from the signatures is at least the threshold.
+
+    A tuple pair with Jaccard similarity s is a candidate with probability
+    1 - (1 - s^rows_per_band)^num_bands (the expected recall for this
+    similarity), so more bands increase the recall and more rows per band
+    decrease the number of candidates.
+    """
+
+    def block_tables(self, ltable, rtable, l_block_attr, r_block_attr,
+                     threshold=0.5, tokenizer=None, num_perm=128,
+                     num_bands=None, rows_per_band=None,
+                     l_output_attrs=None, r_output_attrs=None,
+                     l_output_prefix='ltable_', r_output_prefix='rtable_',
+                     allow_missing=False, seed=0, verbose=False, n_jobs=1):
+        """Blocks two tables based on the estimated Jaccard similarity of
+        the token sets of an attribute.
+
+        Finds tuple pairs from left and right tables such that the
+        estimated Jaccard similarity of the tokens of the value of attribute
+        `l_block_attr` of a tuple from the left table and the tokens of the
+        value of attribute `r_block_attr` of a tuple from the right table is
+        at least `threshold`, considering only the tuple pairs whose MinHash
+        signatures collide in at least one band. The number of bands and
+        rows per band are chosen for the threshold if they are not given,
+        and the expected recall at the threshold is logged if `verbose` is
+        True (see `get_lsh_params`).
+        The signatures are computed in time linear in the number of tuples
+        (tokenizing each distinct value once), and the tuples are bucketed
+        by band with a sort-based join.
+        The dataframe will include attributes '_id', key attribute from
+        ltable, key attributes from rtable, followed by lists `l_output_attrs` and
+        `r_output_attrs` if they are specified. Each of these output and key attributes will be
+        prefixed with given `l_output_prefix` and `r_output_prefix`.
+        Further, this will update the following metadata in the catalog for the output table:
+        (1) key, (2) ltable, (3) rtable, (4) fk_ltable, and (5) fk_rtable.
+
+        Args:
+            ltable (DataFrame): The left input table.
+
+            rtable (DataFrame): The right input table.
+
+            l_block_attr (string): The blocking attribute in left table.
+
+            r_block_attr (string): The blocking attribute in right table.
+
+            threshold (float): The minimum estimated Jaccard similarity of a
+                tuple pair (defaults to 0.5). It must be in [0, 1].
+
+            tokenizer (function): The function that returns the list of
+                tokens of a value, e.g., a tokenizer returned by
+                `get_tokenizers_for_blocking` (defaults to None, i.e.,
+                `tok_wspace`). The tokens are treated as a set.
+
+            num_perm (int): The number of hash functions that can be used
+                when `num_bands` and `rows_per_band` are chosen for the
+                threshold (defaults to 128).
+
+            num_bands (int): The number of bands (defaults to None). It must
+                be given along with `rows_per_band`.
+
+            rows_per_band (int): The number of signature values per band
+                (defaults to None). It must be given along with `num_bands`.
+
+            l_output_attrs (list): A list of attribute names from the left
+                                   table to be included in the
+                                   output candidate set (defaults to None).
+
+            r_output_attrs (list): A list of attribute names from the right
+                                   table to be included in the
+                                   output candidate set (defaults to None).
+
+            l_output_prefix (string): The prefix to be used for the attribute names
+                                   coming from the left table in the output
+                                   candidate set (defaults to 'ltable\_').
+
+            r_output_prefix (string): The prefix to be used for the attribute names
+                                   coming from the right table in the output
+                                   candidate set (defaults to 'rtable\_').
+
+            allow_missing (boolean): A flag to indicate whether tuple pairs
+                                     with missing value (or no tokens) in at
+                                     least one of the tuples should be
+                                     included in the output candidate set
+                                     (defaults to False). If this flag is set
+                                     to True, a tuple in ltable with missing
+                                     value in the blocking attribute will be
+                                     matched with every tuple in rtable and
+                                     vice versa.
+
+            seed (int): The seed of the hash functions (defaults to 0).
+
+            verbose (boolean): A flag to indicate whether the debug information
+                should be logged (defaults to False).
+
+            n_jobs (int): The number of parallel jobs to be used for computation
+                (defaults to 1). If -1 all CPUs are used. If 0 or 1,
+                no parallel computation is used at all, which is useful for
+                debugging. For n_jobs below -1, (n_cpus + 1 + n_jobs) are
+                used (where n_cpus is the total number of CPUs in the
+                machine). Thus, for n_jobs = -2, all CPUs but one are used.
+                If (n_cpus + 1 + n_jobs) is less than 1, then no parallel
+                computation is used (i.e., equivalent to the default).
+                The signatures are computed in parallel.
+
+        Returns:
+            A candidate set of tuple pairs that survived blocking (DataFrame).
+
+        Raises:
+            AssertionError: If `ltable` is not of type pandas
+                DataFrame.
+            AssertionError: If `rtable` is not of type pandas
+                DataFrame.
+            AssertionError: If `l_block_attr` is not of type string.
+            AssertionError: If `r_block_attr` is not of type string.
+            AssertionError: If `threshold` is not a number in [0, 1].
+            AssertionError: If `tokenizer` is not a function.
+            AssertionError: If `num_perm` is not a positive integer.
+            AssertionError: If only one of `num_bands` and `rows_per_band`
+                is given, or if they are not positive integers.
+            AssertionError: If `l_output_attrs` is not of type of
+                list.
+            AssertionError: If `r_output_attrs` is not of type of
+                list.
+            AssertionError: If the values in `l_output_attrs` is not of type
+                string.
+            AssertionError: If the values in `r_output_attrs` is not of type
+                string.
+            AssertionError: If `l_output_prefix` is not of type
+                string.
+            AssertionError: If `r_output_prefix` is not of type
+                string.
+            AssertionError: If `verbose` is not of type
+                boolean.
+            AssertionError: If `allow_missing` is not of type boolean.
+            AssertionError: If `seed` is not of type int.
+            AssertionError: If `n_jobs` is not of type
+                int.
+            AssertionError: If `l_block_attr` is not in the ltable columns.
+            AssertionError: If `r_block_attr` is not in the rtable columns.
+            AssertionError: If `l_out_attrs` are not in the ltable.
+            AssertionError: If `r_out_attrs` are not in the rtable.
+
+        Examples:
+            >>> import py_entitymatching as em
+            >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='ID')
+            >>> B = em.read_csv_metadata('path_to_csv_dir/table_B.csv', key='ID')
+            >>> lb = em.LSHBlocker()
+            >>> C1 = lb.block_tables(A, B, 'name', 'name', threshold=0.6, l_output_attrs=['name'], r_output_attrs=['name'])
+            # Use 3-grams, with 20 bands of 5 rows
+            >>> block_t = em.get_tokenizers_for_blocking()
+            >>> C2 = lb.block_tables(A, B, 'name', 'name', tokenizer=block_t['qgm_3'], num_bands=20, rows_per_band=5)
+
+        """
+
+        # validate data types of input parameters
+        self.validate_types_params_tables(ltable, rtable,
+                                          l_output_attrs, r_output_attrs,
+                                          l_output_prefix,
+                                          r_output_prefix, verbose, n_jobs)
+
+        # validate data types of the parameters specific to lsh blocker
+        self.validate_types_block_attrs(l_block_attr, r_block_attr)
+        self.validate_lsh_params(threshold, tokenizer, num_perm, num_bands,
+                                 rows_per_band, seed)
+
+        # validate data type of allow_missing
+        self.validate_allow_missing(allow_missing)
+
+        # validate input parameters
+        self.validate_block_attrs(ltable, rtable, l_block_attr, r_block_attr)
+        self.validate_output_attrs(ltable, rtable, l_output_attrs,
+                                   r_output_attrs)
+
+        # get and validate required metadata
+        log_info(logger, 'Required metadata: ltable key, rtable key', verbose)
+
+        # # get metadata
+        l_key, r_key = cm.get_keys_for_ltable_rtable(ltable, rtable, logger,
+                                                     verbose)
+
+        # # validate metadata
+        cm._validate_metadata_for_table(ltable, l_key, 'ltable', logger,
+                                        verbose)
+        cm._validate_metadata_for_table(rtable, r_key, 'rtable', logger,
+                                        verbose)
+
+        # do blocking
+
+        # # compute the signatures of both the tables
+        num_bands, rows_per_band = self._get_bands(threshold, num_perm,
+                                                   num_bands, rows_per_band,
+                                                   verbose)
+        l_sigs, l_missing, r_sigs, r_missing = self._get_signatures(
+            ltable[l_block_attr].values, rtable[r_block_attr].values,
+            tokenizer, num_bands * rows_per_band, seed, n_jobs, verbose)
+
+        # # find the tuple pairs colliding in a band, and keep the ones with
+        # # estimated similarity above the threshold
+        l_pos, r_pos = get_candidate_pairs(l_sigs, r_sigs, l_missing,
+                                           r_missing, num_bands,
+                                           rows_per_band)
+        log_info(logger, 'Number of tuple pairs colliding in a band: %d'
+                 % len(l_pos), verbose)
+        valid = estimate_jaccard(l_sigs, r_sigs, l_pos, r_pos) >= threshold
+        l_pos, r_pos = l_pos[valid], r_pos[valid]
+
+        if allow_missing:
+            l_miss_pos, r_miss_pos = get_missing_pairs(
+                np.where(l_missing, -1, 0), np.where(r_missing, -1, 0))
+            l_pos = np.concatenate([l_pos, l_miss_pos])
+            r_pos = np.concatenate([r_pos, r_miss_pos])
+            order = np.lexsort((r_pos, l_pos))
+            l_pos, r_pos = l_pos[order], r_pos[order]
+
+        # # gather the output attributes of the tuple pairs
+        candset = get_candset_for_pairs(ltable, rtable, l_key, r_key,
+                                        l_pos, r_pos,
+                                        l_output_attrs, r_output_attrs,
+                                        l_output_prefix, r_output_prefix)
+
+        # update catalog
+        key = get_name_for_key(candset.columns)
+        candset = add_key_column(candset, key)
+        cm.set_candset_properties(candset, key, l_output_prefix + l_key,
+                                  r_output_prefix + r_key, ltable, rtable)
+
+        # return candidate set
+        return candset
+
+    def block_candset(self, candset, l_block_attr, r_block_attr,
+                      threshold=0.5, tokenizer=None, num_perm=128,
+                      num_bands=None, rows_per_band=None, allow_missing=False,
+                      seed=0, verbose=False, show_progress=True, n_jobs=1):
+        """Blocks an input candidate set of tuple pairs based on the
+        estimated Jaccard similarity of the token sets of an attribute.
+
+        Finds the tuple pairs from an input candidate set of tuple pairs
+        whose MinHash signatures collide in at least one band and whose
+        estimated Jaccard similarity is at least `threshold` (see
+        `block_tables`).
+
+        Args:
+            candset (DataFrame): The input candidate set of tuple pairs.
+
+            l_block_attr (string): The blocking attribute in left table.
+
+            r_block_attr (string): The blocking attribute in right table.
+
+            threshold (float): The minimum estimated Jaccard similarity of a
+                tuple pair (defaults to 0.5).
+
+            tokenizer (function): The function that returns the list of
+                tokens of a value (defaults to None, i.e., `tok_wspace`).
+
+            num_perm (int): The number of hash functions that can be used
+                when `num_bands` and `rows_per_band` are chosen for the
+                threshold (defaults to 128).
+
+            num_bands (int): The number of bands (defaults to None).
+
+            rows_per_band (int): The number of signature values per band
+                (defaults to None).
+
+            allow_missing (boolean): A flag to indicate whether tuple pairs
+                                     with missing value in at least one of
+                                     the tuples should be retained in the
+                                     output candidate set (defaults to
+                                     False).
+
+            seed (int): The seed of the hash functions (defaults to 0).
+
+            verbose (boolean): A flag to indicate whether the debug
+                information should be logged (defaults to False).
+
+            show_progress (boolean): A flag to indicate whether progress should
+                                     be displayed to the user (defaults to
+                                     True). Note that the tuple pairs are
+                                     compared all at once, using arrays, so
+                                     this parameter is only validated.
+
+            n_jobs (int): The number of parallel jobs to be used for computation
+                (defaults to 1). See `block_tables` for more details.
+
+        Returns:
+            A candidate set of tuple pairs that survived blocking (DataFrame).
+
+        Raises:
+            AssertionError: If `candset` is not of type pandas
+                DataFrame.
+            AssertionError: If `l_block_attr` is not of type string.
+            AssertionError: If `r_block_attr` is not of type string.
+            AssertionError: If `threshold` is not a number in [0, 1].
+            AssertionError: If `tokenizer` is not a function.
+            AssertionError: If `num_perm` is not a positive integer.
+            AssertionError: If only one of `num_bands` and `rows_per_band`
+                is given, or if they are not positive integers.
+            AssertionError: If `verbose` is not of type
+                boolean.
+            AssertionError: If `show_progress` is not of type boolean.
+            AssertionError: If `allow_missing` is not of type boolean.
+            AssertionError: If `seed` is not of type int.
+            AssertionError: If `n_jobs` is not of type
+                int.
+            AssertionError: If `l_block_attr` is not in the ltable columns.
+            AssertionError: If `r_block_attr` is not in the rtable columns.
+
+        Examples:
+            >>> import py_entitymatching as em
+            >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='ID')
+            >>> B = em.read_csv_metadata('path_to_csv_dir/table_B.csv', key='ID')
+            >>> ab = em.AttrEquivalenceBlocker()
+            >>> C = ab.block_tables(A, B, 'zipcode', 'zipcode', l_output_attrs=['name'], r_output_attrs=['name'])
+            >>> lb = em.LSHBlocker()
+            >>> D = lb.block_candset(C, 'address', 'address', threshold=0.4)
+
+        """
+
+        # validate data types of input parameters
+        self.validate_types_params_candset(candset, verbose, show_progress,
+                                           n_jobs)
+
+        # validate data types of the parameters specific to lsh blocker
+        self.validate_types_block_attrs(l_block_attr, r_block_attr)
+        self.validate_lsh_params(threshold, tokenizer, num_perm, num_bands,
+                                 rows_per_band, seed)
+
+        # validate data type of allow_missing
+        self.validate_allow_missing(allow_missing)
+
+        # get and validate metadata
+        log_info(logger, 'Required metadata: cand.set key, fk ltable, '
+                         'fk rtable, ltable, rtable, ltable key, rtable key',
+                 verbose)
+
+        # # get metadata
+        key, fk_ltable, fk_rtable, ltable, rtable, l_key, r_key = cm.get_metadata_for_candset(
+            candset, logger, verbose)
+
+        # # validate metadata
+        cm._validate_metadata_for_candset(candset, key, fk_ltable, fk_rtable,
+                                          ltable, rtable, l_key, r_key,
+                                          logger, verbose)
+
+        # validate input parameters
+        self.validate_block_attrs(ltable, rtable, l_block_attr, r_block_attr)
+
+        # do blocking
+
+        # # compute the signatures of the tuples referred by the candset
+        num_bands, rows_per_band = self._get_bands(threshold, num_perm,
+                                                   num_bands, rows_per_band,
+                                                   verbose)
+        l_pos = RecordAccessor(ltable[[l_key]], l_key).get_positions(
+            candset[fk_ltable].values)
+        r_pos = RecordAccessor(rtable[[r_key]], r_key).get_positions(
+            candset[fk_rtable].values)
+        l_sigs, l_missing, r_sigs, r_missing = self._get_signatures(
+            ltable[l_block_attr].values[l_pos],
+            rtable[r_block_attr].values[r_pos], tokenizer,
+            num_bands * rows_per_band, seed, n_jobs, verbose)
+
+        # # compare the signatures of each tuple pair
+        pos = np.arange(len(candset), dtype=np.int64)
+        is_missing = l_missing | r_missing
+        valid = collide(l_sigs, r_sigs, pos, pos, num_bands,
+                        rows_per_band) & \
+            (estimate_jaccard(l_sigs, r_sigs, pos, pos) >= threshold) & \
+            ~is_missing
+        if allow_missing:
+            valid |= is_missing
+
+        # construct output table
+        if len(candset) > 0:
+            out_table = candset[valid]
+        else:
+            out_table = pd.DataFrame(columns=candset.columns)
+
+        # update the catalog
+        cm.set_candset_properties(out_table, key, fk_ltable, fk_rtable,
+                                  ltable, rtable)
+
+        # return the output table
+        return out_table
+
+    def block_tuples(self, ltuple, rtuple, l_block_attr, r_block_attr,
+                     threshold=0.5, tokenizer=None, num_perm=128,
+                     num_bands=None, rows_per_band=None, allow_missing=False,
+                     seed=0):
+        """Blocks a tuple pair based on the estimated Jaccard similarity of
+        the token sets of an attribute.
+
+        Args:
+            ltuple (Series): The input left tuple.
+
+            rtuple (Series): The input right tuple.
+
+            l_block_attr (string): The blocking attribute in left tuple.
+
+            r_block_attr (string): The blocking attribute in right tuple.
+
+            threshold (float): The minimum estimated Jaccard similarity of
+                the tuple pair (defaults to 0.5).
+
+            tokenizer (function): The function that returns the list of
+                tokens of a value (defaults to None, i.e., `tok_wspace`).
+
+            num_perm (int): The number of hash functions that can be used
+                when `num_bands` and `rows_per_band` are chosen for the
+                threshold (defaults to 128).
+
+            num_bands (int): The number of bands (defaults to None).
+
+            rows_per_band (int): The number of signature values per band
+                (defaults to None).
+
+            allow_missing (boolean): A flag to indicate whether a tuple pair
+                                     with missing value in at least one of
+                                     the tuples should be kept (defaults to
+                                     False).
+
+            seed (int): The seed of the hash functions (defaults to 0).
+
+        Returns:
+            A status indicating if the tuple pair is blocked, i.e., the
+            signatures of the tuples do not collide in any band or the
+            estimated Jaccard similarity is below the threshold (boolean).
+
+        Examples:
+            >>> import py_entitymatching as em
+            >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='ID')
+            >>> B = em.read_csv_metadata('path_to_csv_dir/table_B.csv', key='ID')
+            >>> lb = em.LSHBlocker()
+            >>> status = lb.block_tuples(A.ix[0], B.ix[0], 'name', 'name', threshold=0.6)
+        """
+        num_bands, rows_per_band = self._get_bands(threshold, num_perm,
+                                                   num_bands, rows_per_band,
+                                                   False)
+        if tokenizer is None:
+            tokenizer = tok_wspace
+        a, b = get_hash_params(num_bands * rows_per_band, seed)
+        l_sigs, l_missing = compute_signatures([ltuple[l_block_attr]],
+                                               tokenizer, a, b)
+        r_sigs, r_missing = compute_signatures([rtuple[r_block_attr]],
+                                               tokenizer, a, b)
+        if l_missing[0] or r_missing[0]:
+            return not allow_missing
+        pos = np.zeros(1, dtype=np.int64)
+        return not (collide(l_sigs, r_sigs, pos, pos, num_bands,
+                            rows_per_band)[0] and
+                    estimate_jaccard(l_sigs, r_sigs, pos, pos)[0] >= threshold)
+
+    def get_lsh_params(self, threshold=0.5, num_perm=128, num_bands=None,
+                       rows_per_band=None):
+        """Returns the number of bands and of rows per band used for a
+        threshold, along with the expected recall at the threshold.
+
+        If `num_bands` and `rows_per_band` are not given, they are chosen
+        among the ones using at most `num_perm` hash functions, to minimize
+        the probability that a tuple pair below the threshold is a candidate
+        plus the probability that a tuple pair above the threshold is not a
+        candidate. The expected recall at the threshold is the probability
+        that a tuple pair with Jaccard similarity equal to the threshold is
+        a candidate, i.e., 1 - (1 - threshold^rows_per_band)^num_bands (the
+        tuple pairs with higher similarity are more likely to be
+        candidates).
+
+        Args:
+            threshold (float): The Jaccard similarity threshold (defaults to
+                0.5).
+            num_perm (int): The maximum number of hash functions (defaults
+                to 128).
+            num_bands (int): The number of bands (defaults to None).
+            rows_per_band (int): The number of signature values per band
+                (defaults to None).
+
+        Returns:
+            A tuple (num_bands, rows_per_band, expected_recall).
+
+        Examples:
+            >>> import py_entitymatching as em
+            >>> lb = em.LSHBlocker()
+            >>> num_bands, rows_per_band, recall = lb.get_lsh_params(threshold=0.8)
+        """
+        self.validate_lsh_params(threshold, None, num_perm, num_bands,
+                                 rows_per_band, 0)
+        num_bands, rows_per_band = self._get_bands(threshold, num_perm,
+                                                   num_bands, rows_per_band,
+                                                   False)
+        return num_bands, rows_per_band, get_expected_recall(
+            threshold, num_bands, rows_per_band)
+
+    # ------------------------------------------------------------
+    # utility functions specific to lsh blocking
+
+    # validate the data types of the blocking attributes
+    def validate_types_block_attrs(self, l_block_attr, r_block_attr):
+        validate_object_type(l_block_attr, six.string_types,
+                             error_prefix='Blocking attribute name of left table')
+        validate_object_type(r_block_attr, six.string_types,
+                             error_prefix='Blocking attribute name of right table')
+
+    # validate the blocking attributes
+    def validate_block_attrs(self, ltable, rtable, l_block_attr, r_block_attr):
+        if l_block_attr not in ltable.columns:
+            raise AssertionError(
+                'Left block attribute is not in the left table')
+
+        if r_block_attr not in rtable.columns:
+            raise AssertionError(
+                'Right block attribute is not in the right table')
+
+    # validate the parameters of the signatures and of the bands
+    def validate_lsh_params(self, threshold, tokenizer, num_perm, num_bands,
+                            rows_per_band, seed):
+        if not isinstance(threshold, (int, float)) or \
+                isinstance(threshold, bool) or not 0 <= threshold <= 1:
+            logger.error('Parameter threshold is not a number in [0, 1]')
+            raise AssertionError('Parameter threshold is not a number in '
+                                 '[0, 1]')
+
+        if tokenizer is not None and not callable(tokenizer):
+            logger.error('Parameter tokenizer is not a function')
+            raise AssertionError('Parameter tokenizer is not a function')
+
+        for param, name in [(num_perm, 'num_perm'), (num_bands, 'num_bands'),
+                            (rows_per_band, 'rows_per_band')]:
+            if param is None and name != 'num_perm':
+                continue
+            if not isinstance(param, int) or isinstance(param, bool) or \
+                    param < 1:
+                logger.error('Parameter %s is not a positive integer' % name)
+                raise AssertionError('Parameter %s is not a positive '
+                                     'integer' % name)
+
+        if (num_bands is None) != (rows_per_band is None):
+            logger.error('Parameters num_bands and rows_per_band must be '
+                         'given together')
+            raise AssertionError('Parameters num_bands and rows_per_band '
+                                 'must be given together')
+
+        validate_object_type(seed, int, error_prefix='Parameter seed')
+
+    def _get_bands(self, threshold, num_perm, num_bands, rows_per_band,
+                   verbose):
+        if num_bands is None:
+            num_bands, rows_per_band = get_optimal_params(threshold,
+                                                          num_perm)
+        log_info(logger, 'Number of bands: %d, rows per band: %d, expected '
+                         'recall at threshold %s: %.4f'
+                 % (num_bands, rows_per_band, threshold,
+                    get_expected_recall(threshold, num_bands,
+                                        rows_per_band)), verbose)
+        return num_bands, rows_per_band
+
+    def _get_signatures(self, l_values, r_values, tokenizer, num_perm, seed,
+                        n_jobs, verbose=False):
+        if tokenizer is None:
+            tokenizer = tok_wspace
+        a, b = get_hash_params(num_perm, seed)
+
+        # # determine number of processes to launch parallely
+        n_procs = self.get_num_procs(n_jobs,
+                                     max(len(l_values), len(r_values)))
+
+        if n_procs <= 1:
+            # single process
+            l_sigs, l_missing = compute_signatures(l_values, tokenizer, a, b)
+            r_sigs, r_missing = compute_signatures(r_values, tokenizer, a, b)
+            return l_sigs, l_missing, r_sigs, r_missing
+
+        # multiprocessing
+        # # split both the tables into chunks of values with about the same
+        # # total length (the tokenization cost), and pickle the tokenizer
+        # # (that can be a closure) before passing it to the processes
+        tokenizer_pkl = cp.dumps(tokenizer)
+        chunks, costs = [], []
+        for values in [l_values, r_values]:
+            value_costs = get_value_costs(values)
+            ranges = split_by_cost(value_costs,
+                                   get_num_tasks(n_procs, len(values)))
+            chunks.append([values[start:stop]
+                           for start, stop in ranges or [(0, 0)]])
+            costs.extend(value_costs[start:stop].sum()
+                         for start, stop in ranges or [(0, 0)])
+        results = list(run_tasks(_compute_signatures_split,
+                                 [(chunk, tokenizer_pkl, a, b)
+                                  for chunk in chunks[0] + chunks[1]],
+                                 n_procs, costs, verbose))
+        l_results = results[:len(chunks[0])]
+        r_results = results[len(chunks[0]):]
+        return (np.concatenate([s for s, _ in l_results]),
+                np.concatenate([m for _, m in l_results]),
+                np.concatenate([s for s, _ in r_results]),
+                np.concatenate([m for _, m in r_results]))
+
+
+def _compute_signatures_split(values, tokenizer_pkl, a, b):
+    return compute_signatures(values, pickle.loads(tokenizer_pkl), a, b)
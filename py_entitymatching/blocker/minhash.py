@@ -0,0 +1,198 @@
+"""
+This module contains functions to compute the MinHash signatures of the
+token sets of attribute values, and to find the tuple pairs whose signatures
+collide in at least one band (locality sensitive hashing).
+
+The tokens are hashed with CRC32, so the hashes (and the signatures) do not
+depend on the process computing them, and the permutations are simulated
+with the universal hash functions h(x) = (a * x + b) mod p, where p is the
+Mersenne prime 2^31 - 1. The probability that the signatures of two token
+sets with Jaccard similarity s collide in at least one of b bands of r rows
+is 1 - (1 - s^r)^b.
+"""
+import logging
+import zlib
+
+import numpy as np
+import pandas as pd
+import six
+
+from py_entitymatching.blocker.blocking_key import join_codes
+from py_entitymatching.utils.generic_helper import convert_to_str_unicode
+
+logger = logging.getLogger(__name__)
+
+# The prime of the universal hash functions, and the value of the
+# signatures of the empty token sets.
+mersenne_prime = (1 << 31) - 1
+
+# Maximum number of tuple pairs whose signatures are compared at once, which
+# bounds the size of the temporary arrays.
+pair_chunk_size = 100000
+
+
+def get_hash_params(num_perm, seed=0):
+    """
+    Returns the parameters (a, b) of num_perm universal hash functions,
+    drawn with the given seed.
+    """
+    state = np.random.RandomState(seed)
+    a = state.randint(1, mersenne_prime, size=num_perm).astype(np.uint64)
+    b = state.randint(0, mersenne_prime, size=num_perm).astype(np.uint64)
+    return a, b
+
+
+def hash_tokens(tokens):
+    """
+    Returns the sorted distinct CRC32 hashes of a list of tokens (a NumPy
+    array of unsigned integers).
+    """
+    hashes = set(zlib.crc32(convert_to_str_unicode(t).encode('utf-8')) &
+                 0xffffffff for t in tokens)
+    return np.asarray(sorted(hashes), dtype=np.uint64)
+
+
+def compute_signatures(values, tokenizer, a, b):
+    """
+    Computes the MinHash signatures of the token sets of the given values.
+
+    Each distinct value is tokenized once. The values that are missing or
+    have no tokens get a signature made of mersenne_prime values, and are
+    flagged as missing.
+
+    Args:
+        values (array): The attribute values.
+        tokenizer (function): The function that returns the list of tokens
+            of a value.
+        a, b (array): The parameters of the hash functions (see
+            get_hash_params).
+
+    Returns:
+        The signatures (a NumPy array of shape (len(values), len(a))) and a
+        boolean NumPy array flagging the missing values.
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    num_perm = len(a)
+
+    # # hash the tokens of each distinct value
+    token_hashes = []
+    for val in uniques:
+        tokens = tokenizer(val)
+        if not isinstance(tokens, list):
+            # the tokenizers return NaN for missing values
+            tokens = []
+        token_hashes.append(hash_tokens(tokens))
+    sizes = np.asarray([len(h) for h in token_hashes], dtype=np.int64)
+
+    # # compute the minimum of each hash function over the tokens of each
+    # # distinct value
+    unique_sigs = np.full((len(uniques), num_perm), mersenne_prime,
+                          dtype=np.uint32)
+    non_empty = np.flatnonzero(sizes > 0)
+    if len(non_empty) > 0:
+        flat = np.concatenate([token_hashes[i] for i in non_empty])
+        starts = np.concatenate([[0], np.cumsum(sizes[non_empty])[:-1]])
+        for i in six.moves.range(num_perm):
+            hashes = (a[i] * flat + b[i]) % np.uint64(mersenne_prime)
+            unique_sigs[non_empty, i] = np.minimum.reduceat(hashes, starts)
+
+    is_missing = np.ones(len(codes), dtype=bool)
+    signatures = np.full((len(codes), num_perm), mersenne_prime,
+                         dtype=np.uint32)
+    present = np.flatnonzero(codes >= 0)
+    signatures[present] = unique_sigs[codes[present]]
+    is_missing[present] = sizes[codes[present]] == 0
+    return signatures, is_missing
+
+
+def get_band_codes(l_sigs, r_sigs, l_missing, r_missing, band,
+                   rows_per_band):
+    """
+    Encodes the values of a band of the left and the right signatures with
+    the same integer codes (missing signatures are coded as -1).
+    """
+    cols = slice(band * rows_per_band, (band + 1) * rows_per_band)
+    sigs = np.concatenate([l_sigs[:, cols], r_sigs[:, cols]]).astype(
+        np.uint64)
+    # combine the rows of the band into a single key
+    keys = np.zeros(len(sigs), dtype=np.uint64)
+    for j in six.moves.range(sigs.shape[1]):
+        keys = keys * np.uint64(1000003) ^ sigs[:, j]
+    codes = pd.factorize(keys)[0].astype(np.int64)
+    codes[np.concatenate([l_missing, r_missing])] = -1
+    return codes[:len(l_sigs)], codes[len(l_sigs):]
+
+
+def get_candidate_pairs(l_sigs, r_sigs, l_missing, r_missing, num_bands,
+                        rows_per_band):
+    """
+    Finds the pairs of left and right signatures that collide in at least
+    one band, and returns the positions of their tuples (sorted by the
+    position of the left tuple and then of the right tuple).
+    """
+    num_r = max(len(r_sigs), 1)
+    pair_codes = [np.zeros(0, dtype=np.int64)]
+    for band in six.moves.range(num_bands):
+        l_codes, r_codes = get_band_codes(l_sigs, r_sigs, l_missing,
+                                          r_missing, band, rows_per_band)
+        l_pos, r_pos = join_codes(l_codes, r_codes)
+        pair_codes.append(l_pos * num_r + r_pos)
+    codes = np.unique(np.concatenate(pair_codes))
+    return codes // num_r, codes % num_r
+
+
+def collide(l_sigs, r_sigs, l_pos, r_pos, num_bands, rows_per_band):
+    """
+    Returns a boolean NumPy array flagging the given tuple pairs whose
+    signatures collide in at least one band.
+    """
+    collides = np.zeros(len(l_pos), dtype=bool)
+    for start in six.moves.range(0, len(l_pos), pair_chunk_size):
+        stop = start + pair_chunk_size
+        equal = l_sigs[l_pos[start:stop]] == r_sigs[r_pos[start:stop]]
+        bands = equal[:, :num_bands * rows_per_band].reshape(
+            -1, num_bands, rows_per_band)
+        collides[start:stop] = bands.all(axis=2).any(axis=1)
+    return collides
+
+
+def estimate_jaccard(l_sigs, r_sigs, l_pos, r_pos):
+    """
+    Estimates the Jaccard similarity of the token sets of the given tuple
+    pairs, as the fraction of equal values in their signatures.
+    """
+    estimates = np.zeros(len(l_pos), dtype=np.float64)
+    for start in six.moves.range(0, len(l_pos), pair_chunk_size):
+        stop = start + pair_chunk_size
+        estimates[start:stop] = (l_sigs[l_pos[start:stop]] ==
+                                 r_sigs[r_pos[start:stop]]).mean(axis=1)
+    return estimates
+
+
+def get_expected_recall(similarity, num_bands, rows_per_band):
+    """
+    Returns the probability that a tuple pair with the given Jaccard
+    similarity collides in at least one band.
+    """
+    return 1.0 - (1.0 - float(similarity) ** rows_per_band) ** num_bands
+
+
+def get_optimal_params(threshold, num_perm):
+    """
+    Returns the number of bands and of rows per band (using at most
+    num_perm hash functions) that minimize the sum of the probabilities of
+    a false positive (a tuple pair below the threshold colliding in a band)
+    and of a false negative (a tuple pair above the threshold not colliding
+    in any band), integrated over the similarities.
+    """
+    below = np.linspace(0.0, threshold, 101)
+    above = np.linspace(threshold, 1.0, 101)
+    best, best_error = (1, 1), None
+    for num_bands in six.moves.range(1, num_perm + 1):
+        for rows_per_band in six.moves.range(1, num_perm // num_bands + 1):
+            fp = np.trapz(1.0 - (1.0 - below ** rows_per_band) ** num_bands,
+                          below)
+            fn = np.trapz((1.0 - above ** rows_per_band) ** num_bands, above)
+            if best_error is None or fp + fn < best_error:
+                best, best_error = (num_bands, rows_per_band), fp + fn
+    return best
@@ -1,4 +1,5 @@
 # coding=utf-8
+from collections import OrderedDict
 import logging
 import re
 import string
@@ -13,6 +14,8 @@ from py_stringsimjoin.join.overlap_join import overlap_join
 
 import py_entitymatching.catalog.catalog_manager as cm
 from py_entitymatching.blocker.blocker import Blocker
+from py_entitymatching.blocker.text_cleanup import clean_values, \
+    cleaned_column_cache
 from py_entitymatching.utils.catalog_helper import log_info, get_name_for_key, \
     add_key_column
 from py_entitymatching.utils.generic_helper import remove_non_ascii
@@ -112,6 +115,9 @@ class OverlapBlocker(Blocker):
                 machine). Thus, for n_jobs = -2, all CPUs but one are used.
                 If (n_cpus + 1 + n_jobs) is less than 1, then no parallel
                 computation is used (i.e., equivalent to the default).
+                The cleanup of the overlap attribute values is split across
+                the processes as well if the attributes have many distinct
+                values.
 
 
         Returns:
@@ -253,15 +259,14 @@ class OverlapBlocker(Blocker):
 
 
         # # cleanup the tables from non-ascii characters, punctuations, and stop words
+        # # (the cleaned columns are cached, so they are reused if the same
+        # # tables are blocked again)
         l_dummy_overlap_attr = '@#__xx__overlap_ltable__#@'
         r_dummy_overlap_attr = '@#__xx__overlap_rtable__#@'
-        l_df[l_dummy_overlap_attr] = l_df[l_overlap_attr]
-        r_df[r_dummy_overlap_attr] = r_df[r_overlap_attr]
-
-        if not l_df.empty:
-            self.cleanup_table(l_df, l_dummy_overlap_attr, rem_stop_words)
-        if not r_df.empty:
-            self.cleanup_table(r_df, r_dummy_overlap_attr, rem_stop_words)
+        l_df[l_dummy_overlap_attr] = self.get_cleaned_column(
+            ltable, l_overlap_attr, rem_stop_words, n_jobs)
+        r_df[r_dummy_overlap_attr] = self.get_cleaned_column(
+            rtable, r_overlap_attr, rem_stop_words, n_jobs)
 
         # # determine which tokenizer to use
         if word_level == True:
@@ -354,6 +359,9 @@ class OverlapBlocker(Blocker):
                 machine).Thus, for n_jobs = -2, all CPUs but one are used.
                 If (n_cpus + 1 + n_jobs) is less than 1, then no parallel
                 computation is used (i.e., equivalent to the default).
+                The cleanup of the overlap attribute values is split across
+                the processes as well if the attributes have many distinct
+                values.
 
         Returns:
             A candidate set of tuple pairs that survived blocking (DataFrame).
@@ -434,14 +442,13 @@ class OverlapBlocker(Blocker):
         l_df = ltable[[l_key, l_overlap_attr]]
         r_df = rtable[[r_key, r_overlap_attr]]
 
-        # # case the overlap attribute to string if required.
-        l_df.is_copy, r_df.is_copy = False, False  # to avoid setwithcopy warning
-        ssj.dataframe_column_to_str(l_df, l_overlap_attr, inplace=True)
-        ssj.dataframe_column_to_str(r_df, r_overlap_attr, inplace=True)
-
         # # cleanup the tables from non-ascii characters, punctuations, and stop words
-        self.cleanup_table(l_df, l_overlap_attr, rem_stop_words)
-        self.cleanup_table(r_df, r_overlap_attr, rem_stop_words)
+        # # (the overlap attributes are cast to string if required)
+        l_df.is_copy, r_df.is_copy = False, False  # to avoid setwithcopy warning
+        l_df[l_overlap_attr] = self.get_cleaned_column(
+            ltable, l_overlap_attr, rem_stop_words, n_jobs)
+        r_df[r_overlap_attr] = self.get_cleaned_column(
+            rtable, r_overlap_attr, rem_stop_words, n_jobs)
 
         # # determine which tokenizer to use
         if word_level == True:
@@ -598,21 +605,38 @@ class OverlapBlocker(Blocker):
 
 
     # cleanup a table from non-ascii characters, punctuations and stop words
-    def cleanup_table(self, table, overlap_attr, rem_stop_words):
+    def cleanup_table(self, table, overlap_attr, rem_stop_words, n_jobs=1):
+        table.is_copy = False
+        table[overlap_attr] = self.cleanup_column(table[overlap_attr].values,
+                                                  rem_stop_words, n_jobs)
 
-        # get overlap_attr column
-        attr_col_values = table[overlap_attr]
+    # cleanup the values of a column, processing each distinct value once
+    def cleanup_column(self, values, rem_stop_words, n_jobs=1):
+        n_procs = self.get_num_procs(n_jobs, max(len(values), 1))
+        return clean_values(values, rem_stop_words, self.stop_words,
+                            self.regex_punctuation, n_procs)
 
-        values = []
-        for val in attr_col_values:
-            if pd.isnull(val):
-                values.append(val)
-            else:
-                processed_val = self.process_string(val, rem_stop_words)
-                values.append(processed_val)
+    def get_cleaned_column(self, table, overlap_attr, rem_stop_words,
+                           n_jobs=1):
+        """
+        Returns the cleaned up values of an attribute of a table (cast to
+        string if required), as a NumPy array.
 
-        table.is_copy = False
-        table[overlap_attr] = values
+        The cleaned up values are cached along with the table, the
+        attribute and the cleanup options (including the stop words), and
+        they are reused as long as the values of the attribute do not
+        change.
+        """
+        options = (rem_stop_words, tuple(self.stop_words),
+                   self.regex_punctuation.pattern)
+        cleaned = cleaned_column_cache.get(table, overlap_attr, options)
+        if cleaned is None:
+            column = table[[overlap_attr]].copy()
+            ssj.dataframe_column_to_str(column, overlap_attr, inplace=True)
+            cleaned = self.cleanup_column(column[overlap_attr].values,
+                                          rem_stop_words, n_jobs)
+            cleaned_column_cache.put(table, overlap_attr, options, cleaned)
+        return cleaned.copy()
 
     # cleanup a tuple from non-ascii characters, punctuations and stop words
     def cleanup_tuple_val(self, val, rem_stop_words):
@@ -633,8 +657,9 @@ class OverlapBlocker(Blocker):
         input_string = self.rem_punctuations(input_string)
 
         # remove stopwords
-        # chop the attribute values and convert into a set
-        val_chopped = list(set(input_string.strip().split()))
+        # chop the attribute values and remove the duplicate words (keeping
+        # the first occurrence of each word)
+        val_chopped = list(OrderedDict.fromkeys(input_string.strip().split()))
 
         # remove stop words
         if rem_stop_words:
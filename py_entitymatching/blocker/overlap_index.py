@@ -0,0 +1,464 @@
+"""
+This module contains the OverlapIndex, an inverted index over the token sets
+of an attribute of a table that can be reused to block the table with other
+tables for different overlap sizes.
+"""
+import logging
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import six
+from py_stringmatching.tokenizer.qgram_tokenizer import QgramTokenizer
+from py_stringmatching.tokenizer.whitespace_tokenizer import WhitespaceTokenizer
+
+import py_entitymatching.catalog.catalog_manager as cm
+from py_entitymatching.blocker.blocking_key import get_missing_pairs
+from py_entitymatching.blocker.overlap_blocker import OverlapBlocker
+from py_entitymatching.utils.catalog_helper import log_info, \
+    get_name_for_key, add_key_column
+from py_entitymatching.utils.generic_helper import get_candset_for_pairs
+from py_entitymatching.utils.validation_helper import validate_object_type
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of postings read at once while probing the index, which
+# bounds the size of the temporary arrays.
+max_hits_per_chunk = 10000000
+
+
+class OverlapIndex(object):
+    """
+    An inverted index over the token sets of an attribute of a table (the
+    left table), used to find the tuples of another table (the right table)
+    that share at least a given number of tokens with the tuples of the left
+    table.
+
+    The values of the attribute are cleaned up and tokenized the same way as
+    in the overlap blocker. The index keeps the token vocabulary, the sorted
+    postings (the positions of the tuples containing each token) and the
+    token frequencies, so it can be built once and then used to block the
+    left table for any overlap size, to count the candidate set size for
+    every overlap size at once, or be saved to disk and loaded later.
+
+    Args:
+        table (DataFrame): The left table.
+        overlap_attr (string): The overlap attribute in the left table.
+        rem_stop_words (boolean): A flag to indicate whether stop words
+            (e.g., a, an, the) should be removed from the token sets
+            (defaults to False).
+        q_val (int): The value of q to use if the attribute values are to be
+            tokenized as qgrams (defaults to None).
+        word_level (boolean): A flag to indicate whether the attribute
+            values should be tokenized as words (defaults to True).
+        n_jobs (int): The number of parallel jobs to be used to clean up the
+            attribute values (defaults to 1).
+        verbose (boolean): A flag to indicate whether the debug information
+            should be logged (defaults to False).
+
+    Attributes:
+        tokens (list): The token vocabulary (the i-th token has id i).
+        token_freqs (NumPy array): The number of tuples of the left table
+            containing each token.
+        postings (NumPy array): The positions of the tuples containing each
+            token, sorted by token id and then by position.
+        posting_offsets (NumPy array): The postings of the token with id i
+            are postings[posting_offsets[i]:posting_offsets[i + 1]].
+
+    Raises:
+        AssertionError: If `table` is not of type pandas DataFrame.
+        AssertionError: If `overlap_attr` is not of type string.
+        AssertionError: If `overlap_attr` is not in the table columns.
+        AssertionError: If `rem_stop_words` is not of type boolean.
+        AssertionError: If `q_val` is not of type int.
+        AssertionError: If `word_level` is not of type boolean.
+        SyntaxError: If `q_val` is set to a valid value and `word_level`
+            is set to True.
+        SyntaxError: If `q_val` is set to None and `word_level` is set to
+            False.
+
+    Examples:
+        >>> import py_entitymatching as em
+        >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='ID')
+        >>> B = em.read_csv_metadata('path_to_csv_dir/table_B.csv', key='ID')
+        >>> index = em.OverlapIndex(A, 'address', rem_stop_words=True)
+        >>> sizes = index.get_candset_sizes(B, 'address')
+        >>> C = index.block_tables(B, 'address', overlap_size=3, l_output_attrs=['name'], r_output_attrs=['name'])
+        >>> index.save('./address_index.pkl')
+        >>> index = em.OverlapIndex.load('./address_index.pkl', A)
+    """
+
+    def __init__(self, table, overlap_attr, rem_stop_words=False, q_val=None,
+                 word_level=True, n_jobs=1, verbose=False):
+        self.blocker = OverlapBlocker()
+
+        # validate the input parameters
+        validate_object_type(table, pd.DataFrame, error_prefix='Input table')
+        self.blocker.validate_types_other_params(overlap_attr, overlap_attr,
+                                                 rem_stop_words, q_val,
+                                                 word_level, 1)
+        self.blocker.validate_word_level_qval(word_level, q_val)
+        if overlap_attr not in table.columns:
+            logger.error('Overlap attribute is not in the table')
+            raise AssertionError('Overlap attribute is not in the table')
+        validate_object_type(n_jobs, int, error_prefix='Parameter n_jobs')
+
+        # get and validate the key of the table
+        log_info(logger, 'Required metadata: table key', verbose)
+        self.key = cm.get_key(table)
+        cm._validate_metadata_for_table(table, self.key, 'table', logger,
+                                        verbose)
+
+        self.table = table
+        self.overlap_attr = overlap_attr
+        self.rem_stop_words = rem_stop_words
+        self.q_val = q_val
+        self.word_level = word_level
+        self.key_values = np.asarray(table[self.key].values)
+
+        # clean up and tokenize the values of the overlap attribute
+        cleaned = self.blocker.get_cleaned_column(table, overlap_attr,
+                                                  rem_stop_words, n_jobs)
+        self.is_missing = np.asarray(pd.isnull(cleaned), dtype=bool)
+        self.tokens = []
+        vocabulary = {}
+        row_tokens, row_ids = self._tokenize(cleaned, vocabulary,
+                                             add_tokens=True)
+
+        # build the postings of the tokens, sorted by token id and then by
+        # position (as the rows are already sorted by position)
+        order = np.argsort(row_tokens, kind='mergesort')
+        self.postings = row_ids[order]
+        self.token_freqs = np.bincount(row_tokens,
+                                       minlength=len(self.tokens)).astype(
+            np.int64)
+        self.posting_offsets = np.concatenate(
+            [[0], np.cumsum(self.token_freqs)]).astype(np.int64)
+        self._vocabulary = vocabulary
+
+    def __getstate__(self):
+        # the table is not saved along with the index (see load)
+        state = self.__dict__.copy()
+        state['table'] = None
+        return state
+
+    def get_token_frequencies(self):
+        """
+        Returns the number of tuples of the left table containing each token
+        (a pandas Series indexed by token, sorted by decreasing frequency).
+        """
+        freqs = pd.Series(self.token_freqs, index=self.tokens)
+        return freqs.sort_values(ascending=False)
+
+    def get_overlaps(self, rtable, r_overlap_attr, n_jobs=1):
+        """
+        Finds the pairs of tuples of the left and the right tables that
+        share at least one token, along with the number of shared tokens.
+
+        Args:
+            rtable (DataFrame): The right table.
+            r_overlap_attr (string): The overlap attribute in the right
+                table.
+            n_jobs (int): The number of parallel jobs to be used to clean up
+                the attribute values of the right table (defaults to 1).
+
+        Returns:
+            The positions of the left and the right tuples of each pair and
+            the number of tokens they share (three NumPy arrays, sorted by
+            the position of the left tuple and then of the right tuple).
+        """
+        self._validate_rtable(rtable, r_overlap_attr)
+        l_pos, r_pos, overlap, _ = self._probe(rtable, r_overlap_attr, n_jobs)
+        return l_pos, r_pos, overlap
+
+    def get_candset_sizes(self, rtable, r_overlap_attr, allow_missing=False,
+                          n_jobs=1):
+        """
+        Computes the size of the candidate set that block_tables would
+        return for every overlap size, by probing the index once.
+
+        Args:
+            rtable (DataFrame): The right table.
+            r_overlap_attr (string): The overlap attribute in the right
+                table.
+            allow_missing (boolean): A flag to indicate whether the tuple
+                pairs with missing value in at least one of the overlap
+                attributes are included in the candidate sets (defaults to
+                False).
+            n_jobs (int): The number of parallel jobs to be used to clean up
+                the attribute values of the right table (defaults to 1).
+
+        Returns:
+            A pandas Series, indexed by overlap size (from 1 to the largest
+            number of tokens shared by a tuple pair), with the number of
+            tuple pairs in the candidate set for each overlap size.
+        """
+        self._validate_rtable(rtable, r_overlap_attr)
+        validate_object_type(allow_missing, bool,
+                             error_prefix='Parameter allow_missing')
+        _, _, overlap, r_missing = self._probe(rtable, r_overlap_attr, n_jobs)
+
+        # number of pairs with overlap >= k, for each k
+        counts = np.bincount(overlap, minlength=2)[1:]
+        sizes = np.cumsum(counts[::-1])[::-1]
+        if allow_missing:
+            l_missing = self.is_missing.sum()
+            sizes = sizes + l_missing * len(r_missing) + \
+                (len(self.key_values) - l_missing) * r_missing.sum()
+        return pd.Series(sizes, index=pd.Index(
+            np.arange(1, len(sizes) + 1), name='overlap_size'),
+            name='candset_size')
+
+    def block_tables(self, rtable, r_overlap_attr, overlap_size=1,
+                     l_output_attrs=None, r_output_attrs=None,
+                     l_output_prefix='ltable_', r_output_prefix='rtable_',
+                     allow_missing=False, verbose=False, n_jobs=1):
+        """
+        Blocks the left table of the index and a right table based on the
+        overlap of token sets of attribute values, the same way as
+        OverlapBlocker.block_tables with the tokenization settings of the
+        index.
+
+        Args:
+            rtable (DataFrame): The right input table.
+            r_overlap_attr (string): The overlap attribute in right table.
+            overlap_size (int): The minimum number of tokens that must
+                overlap (defaults to 1).
+            l_output_attrs (list): A list of attribute names from the left
+                table to be included in the output candidate set (defaults
+                to None).
+            r_output_attrs (list): A list of attribute names from the right
+                table to be included in the output candidate set (defaults
+                to None).
+            l_output_prefix (string): The prefix to be used for the
+                attribute names coming from the left table in the output
+                candidate set (defaults to 'ltable\_').
+            r_output_prefix (string): The prefix to be used for the
+                attribute names coming from the right table in the output
+                candidate set (defaults to 'rtable\_').
+            allow_missing (boolean): A flag to indicate whether tuple pairs
+                with missing value in at least one of the overlap attributes
+                should be included in the output candidate set (defaults to
+                False).
+            verbose (boolean): A flag to indicate whether the debug
+                information should be logged (defaults to False).
+            n_jobs (int): The number of parallel jobs to be used to clean up
+                the attribute values of the right table (defaults to 1).
+
+        Returns:
+            A candidate set of tuple pairs that survived blocking
+            (DataFrame).
+
+        Raises:
+            AssertionError: If the left table of the index is not set (see
+                load).
+            AssertionError: If `rtable` is not of type pandas DataFrame.
+            AssertionError: If `r_overlap_attr` is not of type string or is
+                not in the rtable columns.
+            AssertionError: If `overlap_size` is not of type int.
+            AssertionError: If the output attributes, the output prefixes,
+                `allow_missing`, `verbose` or `n_jobs` are not of the
+                expected types.
+            AssertionError: If `l_output_attrs` are not in the ltable.
+            AssertionError: If `r_output_attrs` are not in the rtable.
+        """
+        ltable = self._get_table()
+        self.blocker.validate_types_params_tables(ltable, rtable,
+                                                  l_output_attrs,
+                                                  r_output_attrs,
+                                                  l_output_prefix,
+                                                  r_output_prefix, verbose,
+                                                  n_jobs)
+        self._validate_rtable(rtable, r_overlap_attr)
+        validate_object_type(overlap_size, int,
+                             error_prefix='Parameter overlap_size')
+        self.blocker.validate_allow_missing(allow_missing)
+        self.blocker.validate_output_attrs(ltable, rtable, l_output_attrs,
+                                           r_output_attrs)
+
+        # get and validate required metadata
+        log_info(logger, 'Required metadata: ltable key, rtable key', verbose)
+        l_key, r_key = cm.get_keys_for_ltable_rtable(ltable, rtable, logger,
+                                                     verbose)
+        cm._validate_metadata_for_table(rtable, r_key, 'rtable', logger,
+                                        verbose)
+
+        # probe the index and keep the pairs with enough shared tokens
+        l_pos, r_pos, overlap, r_missing = self._probe(rtable,
+                                                       r_overlap_attr, n_jobs)
+        keep = overlap >= overlap_size
+        l_pos, r_pos = l_pos[keep], r_pos[keep]
+
+        if allow_missing:
+            l_codes = np.where(self.is_missing, -1, 0)
+            r_codes = np.where(r_missing, -1, 0)
+            l_missing_pos, r_missing_pos = get_missing_pairs(l_codes, r_codes)
+            l_pos = np.concatenate([l_pos, l_missing_pos])
+            r_pos = np.concatenate([r_pos, r_missing_pos])
+            order = np.lexsort((r_pos, l_pos))
+            l_pos, r_pos = l_pos[order], r_pos[order]
+
+        candset = get_candset_for_pairs(ltable, rtable, l_key, r_key,
+                                        l_pos, r_pos, l_output_attrs,
+                                        r_output_attrs, l_output_prefix,
+                                        r_output_prefix)
+
+        # update metadata in the catalog
+        key = get_name_for_key(candset.columns)
+        candset = add_key_column(candset, key)
+        cm.set_candset_properties(candset, key, l_output_prefix + l_key,
+                                  r_output_prefix + r_key, ltable, rtable)
+        return candset
+
+    def save(self, file_path):
+        """
+        Saves the index to disk. The left table is not saved along with the
+        index, it must be given when the index is loaded.
+
+        Args:
+            file_path (string): The file path where the index must be saved.
+
+        Raises:
+            AssertionError: If `file_path` is not of type string.
+        """
+        validate_object_type(file_path, six.string_types,
+                             error_prefix='Input file path')
+        if os.path.exists(file_path):
+            logger.warning('File already exists at %s; Overwriting it',
+                           file_path)
+        with open(file_path, 'wb') as file_handler:
+            pickle.dump(self, file_handler, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(file_path, table):
+        """
+        Loads an index from disk.
+
+        Args:
+            file_path (string): The file path to load the index from.
+            table (DataFrame): The left table the index was built on.
+
+        Returns:
+            An OverlapIndex object.
+
+        Raises:
+            AssertionError: If `file_path` is not of type string.
+            AssertionError: If a file does not exist at the given
+                `file_path`.
+            AssertionError: If the key values of `table` are not the key
+                values of the table the index was built on.
+        """
+        validate_object_type(file_path, six.string_types,
+                             error_prefix='Input file path')
+        validate_object_type(table, pd.DataFrame, error_prefix='Input table')
+        if not os.path.exists(file_path):
+            logger.error('File does not exist at path %s', file_path)
+            raise AssertionError('File does not exist at path %s' % file_path)
+        with open(file_path, 'rb') as file_handler:
+            index = pickle.load(file_handler)
+
+        if index.key not in table.columns or \
+                not np.array_equal(np.asarray(table[index.key].values),
+                                   index.key_values):
+            logger.error('The table is not the table the index was built on')
+            raise AssertionError('The table is not the table the index was '
+                                 'built on')
+        index.table = table
+        return index
+
+    # ------------------------------------------------------------
+    # helper functions
+
+    def _get_table(self):
+        if self.table is None:
+            logger.error('The left table of the index is not set')
+            raise AssertionError('The left table of the index is not set')
+        return self.table
+
+    def _validate_rtable(self, rtable, r_overlap_attr):
+        validate_object_type(rtable, pd.DataFrame, error_prefix='Input table')
+        validate_object_type(r_overlap_attr, six.string_types,
+                             error_prefix='Overlap attribute name of right '
+                                          'table')
+        if r_overlap_attr not in rtable.columns:
+            logger.error('Right block attribute is not in the right table')
+            raise AssertionError('Right block attribute is not in the right '
+                                 'table')
+
+    def _get_tokenizer(self):
+        if self.word_level:
+            return WhitespaceTokenizer(return_set=True)
+        return QgramTokenizer(qval=self.q_val, return_set=True)
+
+    def _tokenize(self, cleaned, vocabulary, add_tokens):
+        # tokenize each distinct value once, and return the token ids of
+        # each row along with the position of the row (the tokens that are
+        # not in the vocabulary are ignored, unless add_tokens is True)
+        codes, uniques = pd.factorize(np.asarray(cleaned, dtype=object))
+        tokenizer = self._get_tokenizer()
+        value_tokens = []
+        for val in uniques:
+            ids = []
+            for token in tokenizer.tokenize(val):
+                token_id = vocabulary.get(token)
+                if token_id is None and add_tokens:
+                    token_id = vocabulary[token] = len(self.tokens)
+                    self.tokens.append(token)
+                if token_id is not None:
+                    ids.append(token_id)
+            value_tokens.append(np.unique(np.asarray(ids, dtype=np.int64)))
+
+        sizes = np.asarray([len(t) for t in value_tokens], dtype=np.int64)
+        present = np.flatnonzero(codes >= 0)
+        row_sizes = sizes[codes[present]]
+        row_ids = np.repeat(present, row_sizes).astype(np.int64)
+        if len(row_ids) == 0:
+            return np.zeros(0, dtype=np.int64), row_ids
+        row_tokens = np.concatenate(
+            [value_tokens[c] for c in codes[present]]).astype(np.int64)
+        return row_tokens, row_ids
+
+    def _probe(self, rtable, r_overlap_attr, n_jobs):
+        cleaned = self.blocker.get_cleaned_column(rtable, r_overlap_attr,
+                                                  self.rem_stop_words, n_jobs)
+        r_missing = np.asarray(pd.isnull(cleaned), dtype=bool)
+        r_tokens, r_rows = self._tokenize(cleaned, self._vocabulary,
+                                          add_tokens=False)
+
+        # read the postings of the tokens of the right tuples in chunks of
+        # tokens, so that at most (about) max_hits_per_chunk postings are
+        # read at once
+        num_r = len(rtable)
+        hits = self.token_freqs[r_tokens]
+        cum_hits = np.cumsum(hits)
+        num_chunks = max(1, int(np.ceil(float(cum_hits[-1] if len(hits)
+                                              else 0) / max_hits_per_chunk)))
+        bounds = np.searchsorted(cum_hits, np.arange(1, num_chunks) *
+                                 max_hits_per_chunk)
+        # # do not split the tokens of a right tuple across chunks
+        bounds = np.searchsorted(r_rows, r_rows[np.minimum(bounds,
+                                                           len(r_rows) - 1)])
+        starts = np.concatenate([[0], bounds])
+        stops = np.concatenate([bounds, [len(r_rows)]])
+
+        l_pos, r_pos, overlap = [], [], []
+        for start, stop in zip(starts, stops):
+            tokens, rows = r_tokens[start:stop], r_rows[start:stop]
+            counts = self.token_freqs[tokens]
+            offsets = np.arange(counts.sum(), dtype=np.int64) - np.repeat(
+                np.cumsum(counts) - counts, counts)
+            hit_l = self.postings[np.repeat(self.posting_offsets[tokens],
+                                            counts) + offsets]
+            hit_r = np.repeat(rows, counts)
+            # count the shared tokens of each pair
+            pairs, pair_counts = np.unique(hit_l * num_r + hit_r,
+                                           return_counts=True)
+            l_pos.append(pairs // num_r)
+            r_pos.append(pairs % num_r)
+            overlap.append(pair_counts)
+
+        l_pos, r_pos = np.concatenate(l_pos), np.concatenate(r_pos)
+        overlap = np.concatenate(overlap).astype(np.int64)
+        order = np.lexsort((r_pos, l_pos))
+        return l_pos[order], r_pos[order], overlap[order], r_missing
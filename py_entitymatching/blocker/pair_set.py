@@ -0,0 +1,289 @@
+"""
+This module contains the PairSet, a compact representation of a set of tuple
+pairs of two tables, with set operations that do not go through DataFrames.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+import six
+
+import py_entitymatching.catalog.catalog_manager as cm
+from py_entitymatching.utils.catalog_helper import get_name_for_key, \
+    add_key_column
+from py_entitymatching.utils.generic_helper import get_candset_for_pairs
+from py_entitymatching.utils.record_helper import RecordAccessor
+from py_entitymatching.utils.validation_helper import validate_object_type
+
+logger = logging.getLogger(__name__)
+
+
+class PairSet(object):
+    """
+    A set of tuple pairs of two tables, stored as the sorted codes
+    l_pos * len(rtable) + r_pos of the positions of their left and right
+    tuples (a NumPy array of int64).
+
+    The set operations merge the sorted codes of the two sets (the merge of
+    two sorted arrays by the stable sort of NumPy is linear), so they take
+    time linear in the number of tuple pairs, and the membership of tuple
+    pairs is tested with a binary search. The attributes of the tuples are
+    only fetched from the tables when the set is converted to a candidate
+    set.
+
+    Args:
+        ltable (DataFrame): The left table.
+        rtable (DataFrame): The right table.
+        l_pos (array): The positions of the left tuples of the pairs
+            (defaults to None, i.e., no pairs).
+        r_pos (array): The positions of the right tuples of the pairs
+            (defaults to None).
+
+    Examples:
+        >>> import py_entitymatching as em
+        >>> ab = em.AttrEquivalenceBlocker()
+        >>> C = ab.block_tables(A, B, 'zipcode', 'zipcode')
+        >>> D = ab.block_tables(A, B, 'birth_year', 'birth_year')
+        >>> pairs = em.PairSet.from_candset(C) | em.PairSet.from_candset(D)
+        >>> E = pairs.to_candset(l_output_attrs=['name'], r_output_attrs=['name'])
+    """
+
+    def __init__(self, ltable, rtable, l_pos=None, r_pos=None):
+        validate_object_type(ltable, pd.DataFrame,
+                             error_prefix='Input left table')
+        validate_object_type(rtable, pd.DataFrame,
+                             error_prefix='Input right table')
+        if (l_pos is None) != (r_pos is None) or \
+                (l_pos is not None and len(l_pos) != len(r_pos)):
+            logger.error('The positions of the left and the right tuples do '
+                         'not have the same length')
+            raise AssertionError('The positions of the left and the right '
+                                 'tuples do not have the same length')
+        self.ltable = ltable
+        self.rtable = rtable
+        self._num_r = max(len(rtable), 1)
+        if l_pos is None:
+            self._codes = np.zeros(0, dtype=np.int64)
+        else:
+            l_pos = np.asarray(l_pos, dtype=np.int64)
+            r_pos = np.asarray(r_pos, dtype=np.int64)
+            if len(l_pos) > 0 and (
+                    l_pos.min() < 0 or l_pos.max() >= len(ltable) or
+                    r_pos.min() < 0 or r_pos.max() >= len(rtable)):
+                logger.error('Some positions are not in the tables')
+                raise AssertionError('Some positions are not in the tables')
+            self._codes = np.unique(l_pos * self._num_r + r_pos)
+
+    @classmethod
+    def from_candset(cls, candset, verbose=False):
+        """
+        Creates the set of the tuple pairs of a candidate set (the candidate
+        set must have the catalog metadata of a candidate set).
+        """
+        validate_object_type(candset, pd.DataFrame, 'Input candset')
+        key, fk_ltable, fk_rtable, ltable, rtable, l_key, r_key = \
+            cm.get_metadata_for_candset(candset, logger, verbose)
+        cm._validate_metadata_for_candset(candset, key, fk_ltable, fk_rtable,
+                                          ltable, rtable, l_key, r_key,
+                                          logger, verbose)
+        return cls.from_ids(ltable, rtable, candset[fk_ltable].values,
+                            candset[fk_rtable].values)
+
+    @classmethod
+    def from_ids(cls, ltable, rtable, l_ids, r_ids):
+        """
+        Creates the set of the tuple pairs with the given key values of the
+        left and the right tuples (the tables must have a key in the
+        catalog).
+
+        Raises:
+            KeyError: If some key value is not present in the tables.
+        """
+        l_key, r_key = cm.get_key(ltable), cm.get_key(rtable)
+        l_pos = RecordAccessor(ltable[[l_key]], l_key).get_positions(l_ids)
+        r_pos = RecordAccessor(rtable[[r_key]], r_key).get_positions(r_ids)
+        return cls(ltable, rtable, l_pos, r_pos)
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __iter__(self):
+        l_ids, r_ids = self.get_ids()
+        return six.moves.zip(l_ids, r_ids)
+
+    def __contains__(self, pair):
+        return bool(self.contains([pair[0]], [pair[1]])[0])
+
+    def __eq__(self, other):
+        if not isinstance(other, PairSet):
+            return NotImplemented
+        return other.ltable is self.ltable and \
+            other.rtable is self.rtable and \
+            np.array_equal(self._codes, other._codes)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    def __sub__(self, other):
+        return self.difference(other)
+
+    def __repr__(self):
+        return 'PairSet(%d tuple pairs)' % len(self)
+
+    @property
+    def l_pos(self):
+        """
+        The positions of the left tuples of the pairs (sorted by the position
+        of the left tuple and then of the right tuple).
+        """
+        return self._codes // self._num_r
+
+    @property
+    def r_pos(self):
+        """
+        The positions of the right tuples of the pairs.
+        """
+        return self._codes % self._num_r
+
+    def get_ids(self):
+        """
+        Returns the key values of the left and the right tuples of the pairs
+        (two NumPy arrays).
+        """
+        return (self.ltable[cm.get_key(self.ltable)].values[self.l_pos],
+                self.rtable[cm.get_key(self.rtable)].values[self.r_pos])
+
+    def contains(self, l_ids, r_ids):
+        """
+        Returns a boolean NumPy array flagging the tuple pairs (given by the
+        key values of their left and right tuples) that are in the set. The
+        key values that are not in the tables are not in the set.
+        """
+        l_pos = _get_positions(self.ltable, l_ids)
+        r_pos = _get_positions(self.rtable, r_ids)
+        present = (l_pos >= 0) & (r_pos >= 0)
+        is_in = np.zeros(len(l_pos), dtype=bool)
+        is_in[present] = self._contains_codes(
+            l_pos[present] * self._num_r + r_pos[present])
+        return is_in
+
+    def contains_positions(self, l_pos, r_pos):
+        """
+        Returns a boolean NumPy array flagging the tuple pairs (given by the
+        positions of their left and right tuples) that are in the set.
+        """
+        return self._contains_codes(np.asarray(l_pos, dtype=np.int64) *
+                                    self._num_r +
+                                    np.asarray(r_pos, dtype=np.int64))
+
+    def union(self, other):
+        """
+        Returns the set of the tuple pairs that are in this set or in the
+        other set.
+        """
+        self._validate_same_tables(other)
+        merged, _ = _merge(self._codes, other._codes)
+        is_first = np.ones(len(merged), dtype=bool)
+        is_first[1:] = merged[1:] != merged[:-1]
+        return self._from_codes(merged[is_first])
+
+    def intersection(self, other):
+        """
+        Returns the set of the tuple pairs that are in both this set and the
+        other set.
+        """
+        self._validate_same_tables(other)
+        merged, _ = _merge(self._codes, other._codes)
+        return self._from_codes(merged[:-1][merged[1:] == merged[:-1]])
+
+    def difference(self, other):
+        """
+        Returns the set of the tuple pairs that are in this set but not in
+        the other set.
+        """
+        self._validate_same_tables(other)
+        merged, is_self = _merge(self._codes, other._codes)
+        # the codes of each set are distinct, so a code of this set is in
+        # the other set if it is next to an equal code
+        is_dup = np.zeros(len(merged), dtype=bool)
+        is_dup[1:] = merged[1:] == merged[:-1]
+        is_dup[:-1] |= is_dup[1:]
+        return self._from_codes(merged[is_self & ~is_dup])
+
+    def to_candset(self, l_output_attrs=None, r_output_attrs=None,
+                   l_output_prefix='ltable_', r_output_prefix='rtable_'):
+        """
+        Converts the set to a candidate set, like the ones returned by the
+        blockers: the dataframe will include attributes '_id', key attribute
+        from ltable, key attributes from rtable, followed by lists
+        `l_output_attrs` and `r_output_attrs` if they are specified, and
+        the catalog metadata of the candidate set will be set. The tuple
+        pairs are sorted by the position of the left tuple and then of the
+        right tuple.
+        """
+        if l_output_attrs:
+            validate_object_type(l_output_attrs, list,
+                                 'Output attributes of left table')
+        if r_output_attrs:
+            validate_object_type(r_output_attrs, list,
+                                 'Output attributes of right table')
+        validate_object_type(l_output_prefix, six.string_types,
+                             'Output prefix of left table')
+        validate_object_type(r_output_prefix, six.string_types,
+                             'Output prefix of right table')
+        l_key, r_key = cm.get_key(self.ltable), cm.get_key(self.rtable)
+        candset = get_candset_for_pairs(self.ltable, self.rtable, l_key,
+                                        r_key, self.l_pos, self.r_pos,
+                                        l_output_attrs, r_output_attrs,
+                                        l_output_prefix, r_output_prefix)
+        key = get_name_for_key(candset.columns)
+        candset = add_key_column(candset, key)
+        cm.set_candset_properties(candset, key, l_output_prefix + l_key,
+                                  r_output_prefix + r_key, self.ltable,
+                                  self.rtable)
+        return candset
+
+    def _from_codes(self, codes):
+        pairs = PairSet(self.ltable, self.rtable)
+        pairs._codes = codes
+        return pairs
+
+    def _contains_codes(self, codes):
+        codes = np.asarray(codes, dtype=np.int64)
+        if len(self._codes) == 0:
+            return np.zeros(len(codes), dtype=bool)
+        idx = np.minimum(np.searchsorted(self._codes, codes),
+                         len(self._codes) - 1)
+        return self._codes[idx] == codes
+
+    def _validate_same_tables(self, other):
+        validate_object_type(other, PairSet, 'Input pair set')
+        if other.ltable is not self.ltable or \
+                other.rtable is not self.rtable:
+            logger.error('The pair sets are not over the same tables')
+            raise AssertionError('The pair sets are not over the same tables')
+
+
+def _merge(codes_1, codes_2):
+    # merges two sorted arrays (the stable sort of NumPy is a timsort for
+    # int64, which merges the two sorted runs in linear time), and returns
+    # the merged array along with flags of the values from the first array
+    codes = np.concatenate([codes_1, codes_2])
+    order = np.argsort(codes, kind='mergesort')
+    return codes[order], order < len(codes_1)
+
+
+def _get_positions(table, ids):
+    # the positions of the tuples with the given key values, -1 if they are
+    # not present in the table
+    keys = pd.Index(table[cm.get_key(table)].values)
+    return keys.get_indexer(np.asarray(ids)).astype(np.int64)
@@ -1,19 +1,32 @@
 import logging
+import re
 from collections import OrderedDict
 
 import pandas as pd
 import pyprind
 import six
-from joblib import Parallel, delayed
+from py_stringmatching.tokenizer.alphabetic_tokenizer import AlphabeticTokenizer
+from py_stringmatching.tokenizer.alphanumeric_tokenizer import AlphanumericTokenizer
 from py_stringmatching.tokenizer.qgram_tokenizer import QgramTokenizer
+from py_stringmatching.tokenizer.tokenizer import Tokenizer
 from py_stringmatching.tokenizer.whitespace_tokenizer import WhitespaceTokenizer
 import cloudpickle as cp
 import pickle
 
 import py_entitymatching.catalog.catalog_manager as cm
 from py_entitymatching.blocker.blocker import Blocker
+from py_entitymatching.blocker.rule_compiler import cartesian_blocks, \
+    compile_rules
+import py_entitymatching.blocker.rule_planner as rp
 import py_stringsimjoin as ssj
+from py_entitymatching.feature.batchfeatures import TokenCache, \
+    get_tokenizer_fn
 from py_entitymatching.utils.catalog_helper import log_info, get_name_for_key, add_key_column
+from py_entitymatching.utils.generic_helper import get_candset_for_pairs
+from py_entitymatching.utils.parallel_helper import SharedTable, get_table, \
+    get_num_tasks, run_tasks, split_cartesian_product, split_ranges
+from py_entitymatching.utils.record_helper import RecordAccessor
+from py_entitymatching.utils.validation_helper import validate_object_type
 
 logger = logging.getLogger(__name__)
 
@@ -389,7 +402,12 @@ class RuleBasedBlocker(Blocker):
                                                                l_output_attrs_1,
                                                                r_output_attrs_1)
         l_df, r_df = l_df[l_proj_attrs], r_df[r_proj_attrs]
-        
+
+        # # pick the filterable rule used to generate the candset and the
+        # # order in which the other rules are evaluated
+        plan = self.get_blocking_plan(l_df, r_df)
+        log_info(logger, str(plan), verbose)
+
         candset, rule_applied = self.block_tables_with_filters(l_df, r_df,
                                                                l_key, r_key,
                                                                l_output_attrs_1,
@@ -398,7 +416,7 @@ class RuleBasedBlocker(Blocker):
                                                                r_output_prefix,
                                                                verbose,
                                                                show_progress,
-                                                               n_jobs)
+                                                               n_jobs, plan)
 
         if candset is None:
             # no filterable rule was applied
@@ -408,7 +426,7 @@ class RuleBasedBlocker(Blocker):
                                                         l_output_prefix,
                                                         r_output_prefix,
                                                         verbose, show_progress,
-                                                        n_jobs)
+                                                        n_jobs, plan.rule_order)
         elif len(self.rules) > 1:
             # one filterable rule was applied but other rules are left
             # block candset by applying other rules and excluding the applied rule 
@@ -417,7 +435,9 @@ class RuleBasedBlocker(Blocker):
                                                         l_output_prefix + l_key,
                                                         r_output_prefix + r_key,
                                                         rule_applied,
-                                                        show_progress, n_jobs)
+                                                        show_progress, n_jobs,
+                                                        plan.rule_order,
+                                                        verbose)
 
         retain_cols = self.get_attrs_to_retain(l_key, r_key, l_output_attrs_1,
                                                r_output_attrs_1,
@@ -436,42 +456,172 @@ class RuleBasedBlocker(Blocker):
         # return candidate set
         return candset
 
+    def explain(self, ltable, rtable, sample_size=1000, verbose=False):
+        """
+        Estimates the plan used to block two tables with the sequence of
+        rules supplied by the user.
+
+        The rules are evaluated on a random sample of tuple pairs from the
+        cartesian product of the tables, to estimate for each rule the
+        fraction of tuple pairs that survive it and the time it takes to
+        evaluate it on a tuple pair. Based on these estimates, the plan
+        picks the strategy to generate the candidate set (a filter join
+        using one of the filterable rules, or the cartesian product of the
+        tables) and the order in which the other rules are evaluated. This
+        is the plan executed by block_tables.
+
+        Args:
+            ltable (DataFrame): The left input table.
+
+            rtable (DataFrame): The right input table.
+
+            sample_size (int): The number of tuple pairs to sample (defaults
+                to 1000).
+
+            verbose (boolean): A flag to indicate whether the debug
+                information  should be logged (defaults to False).
+
+        Returns:
+            A BlockingPlan object, with the chosen strategy, the rule
+            evaluation order, the estimates for each rule, the estimated
+            candidate set size and the estimated cost (printing it shows
+            a report).
+
+        Raises:
+            AssertionError: If `ltable` is not of type pandas
+                DataFrame.
+            AssertionError: If `rtable` is not of type pandas
+                DataFrame.
+            AssertionError: If `sample_size` is not of type int or is
+                not positive.
+            AssertionError: If there are no rules to apply.
+
+        Examples:
+                >>> import py_entitymatching as em
+                >>> rb = em.RuleBasedBlocker()
+                >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='id')
+                >>> B = em.read_csv_metadata('path_to_csv_dir/table_B.csv', key='id')
+                >>> block_f = em.get_features_for_blocking(A, B)
+                >>> rb.add_rule(['name_name_lev(ltuple, rtuple) > 3'], block_f)
+                >>> rb.add_rule(['zipcode_zipcode_exm(ltuple, rtuple) == 0'], block_f)
+                >>> print(rb.explain(A, B))
+
+        """
+        validate_object_type(ltable, pd.DataFrame,
+                             error_prefix='Input left table')
+        validate_object_type(rtable, pd.DataFrame,
+                             error_prefix='Input right table')
+        validate_object_type(sample_size, int, 'Parameter sample_size')
+        if sample_size <= 0:
+            logger.error('Parameter sample_size should be a positive integer')
+            raise AssertionError('Parameter sample_size should be a '
+                                 'positive integer')
+
+        # validate rules
+        assert len(self.rules.keys()) > 0, 'There are no rules to apply'
+
+        # get and validate metadata
+        log_info(logger, 'Required metadata: ltable key, rtable key', verbose)
+        l_key, r_key = cm.get_keys_for_ltable_rtable(ltable, rtable, logger,
+                                                     verbose)
+        cm._validate_metadata_for_table(ltable, l_key, 'ltable', logger,
+                                        verbose)
+        cm._validate_metadata_for_table(rtable, r_key, 'rtable', logger,
+                                        verbose)
+
+        l_proj_attrs, r_proj_attrs = self.get_attrs_to_project(l_key, r_key,
+                                                               [], [])
+        l_df = ltable.set_index(l_key, drop=False)[l_proj_attrs]
+        r_df = rtable.set_index(r_key, drop=False)[r_proj_attrs]
+        return self.get_blocking_plan(l_df, r_df, sample_size, True)
+
+    def optimize(self, ltable, rtable, sample_size=1000, verbose=False):
+        """
+        Reorders the rules of the rule-based blocker following the plan
+        estimated by explain.
+
+        The rule used to generate the candidate set (if any) comes first,
+        followed by the other rules in the order they should be evaluated.
+        The order of the rules does not change the output of the blocker,
+        but block_candset and block_tuples evaluate the rules in this order,
+        so the cheap rules dropping many tuple pairs are evaluated first.
+
+        Args:
+            ltable (DataFrame): The left input table.
+
+            rtable (DataFrame): The right input table.
+
+            sample_size (int): The number of tuple pairs to sample (defaults
+                to 1000).
+
+            verbose (boolean): A flag to indicate whether the debug
+                information  should be logged (defaults to False).
+
+        Returns:
+            The BlockingPlan object returned by explain.
+
+        Examples:
+                >>> import py_entitymatching as em
+                >>> rb = em.RuleBasedBlocker()
+                >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='id')
+                >>> B = em.read_csv_metadata('path_to_csv_dir/table_B.csv', key='id')
+                >>> block_f = em.get_features_for_blocking(A, B)
+                >>> rb.add_rule(['name_name_lev(ltuple, rtuple) > 3'], block_f)
+                >>> rb.add_rule(['zipcode_zipcode_exm(ltuple, rtuple) == 0'], block_f)
+                >>> plan = rb.optimize(A, B)
+                >>> C = rb.block_tables(A, B)
+
+        """
+        plan = self.explain(ltable, rtable, sample_size, verbose)
+        rule_order = list(plan.rule_order)
+        if plan.filter_rule is not None:
+            rule_order.insert(0, plan.filter_rule)
+        for rule_dict in [self.rules, self.rule_source, self.rule_str,
+                          self.rule_ft]:
+            items = [(name, rule_dict[name]) for name in rule_order]
+            rule_dict.clear()
+            rule_dict.update(items)
+        log_info(logger, 'Rules reordered as: ' + str(rule_order), verbose)
+        return plan
+
     def block_candset_excluding_rule(self, c_df, l_df, r_df, l_key, r_key,
                                      fk_ltable, fk_rtable, rule_to_exclude,
-                                     show_progress, n_jobs):
+                                     show_progress, n_jobs, rule_order=None,
+                                     verbose=False):
 
         # # determine number of processes to launch parallely
         n_procs = self.get_num_procs(n_jobs, len(c_df))
 
-        # # list to keep track of valid ids
-        valid = []
-
+        # # compile the rules (excluding the rule already applied) to evaluate
+        # # them over arrays of tuple pairs
+        rule_plan_pkl = cp.dumps(compile_rules(self.rule_str, self.rule_ft,
+                                               [rule_to_exclude], rule_order))
 
-        apply_rules_excluding_rule_pkl = cp.dumps(self.apply_rules_excluding_rule)
- 
         if n_procs <= 1:
             # single process
             valid = _block_candset_excluding_rule_split(c_df, l_df, r_df,
                                                         l_key, r_key,
                                                         fk_ltable, fk_rtable,
-                                                        rule_to_exclude,
-                                                        apply_rules_excluding_rule_pkl,
+                                                        rule_plan_pkl,
                                                         show_progress)
         else:
             # multiprocessing
-            c_splits = pd.np.array_split(c_df, n_procs)
-            valid_splits = Parallel(n_jobs=n_procs)(
-                delayed(_block_candset_excluding_rule_split)(c_splits[i],
-                                                             l_df, r_df,
-                                                             l_key, r_key,
-                                                             fk_ltable,
-                                                             fk_rtable,
-                                                             rule_to_exclude,
-                                                             apply_rules_excluding_rule_pkl,
-                                                             show_progress and i == len(
-                                                                 c_splits) - 1)
-                for i in range(len(c_splits)))
-            valid = sum(valid_splits, [])
+            # # split the candset into ranges with the same number of tuple
+            # # pairs
+            c_splits = [c_df.iloc[start:stop]
+                        for start, stop in split_ranges(
+                            len(c_df), get_num_tasks(n_procs, len(c_df)))]
+            # # share the tables with the workers through memory-mapped
+            # # files, each worker reads only the tuples in its split
+            with SharedTable(l_df) as l_shared, SharedTable(r_df) as r_shared:
+                tasks = [(c_split, l_shared, r_shared, l_key, r_key,
+                          fk_ltable, fk_rtable, rule_plan_pkl,
+                          show_progress and i == len(c_splits) - 1)
+                         for i, c_split in enumerate(c_splits)]
+                valid_splits = list(run_tasks(
+                    _block_candset_excluding_rule_split, tasks, n_procs,
+                    verbose=verbose))
+            valid = pd.np.concatenate(valid_splits)
 
         # construct output candset
         if len(c_df) > 0:
@@ -485,7 +635,8 @@ class RuleBasedBlocker(Blocker):
     def block_tables_without_filters(self, l_df, r_df, l_key, r_key,
                                      l_output_attrs, r_output_attrs,
                                      l_output_prefix, r_output_prefix,
-                                     verbose, show_progress, n_jobs):
+                                     verbose, show_progress, n_jobs,
+                                     rule_order=None):
 
         # do blocking
 
@@ -494,33 +645,45 @@ class RuleBasedBlocker(Blocker):
 
         candset = None
 
-        apply_rules_pkl = cp.dumps(self.apply_rules)
+        # compile the rules to evaluate them over arrays of tuple pairs
+        rule_plan_pkl = cp.dumps(compile_rules(self.rule_str, self.rule_ft,
+                                               rule_order=rule_order))
 
         if n_procs <= 1:
             # single process
-            candset = _block_tables_split(l_df, r_df, l_key, r_key,
-                                          l_output_attrs, r_output_attrs,
-                                          l_output_prefix, r_output_prefix,
-                                          apply_rules_pkl, show_progress)
+            l_pos, r_pos = _block_tables_split(l_df, r_df, 0, 0,
+                                               rule_plan_pkl, show_progress)
         else:
             # multiprocessing
-            m, n = self.get_split_params(n_procs, len(l_df), len(r_df))
-            l_splits = pd.np.array_split(l_df, m)
-            r_splits = pd.np.array_split(r_df, n)
-            c_splits = Parallel(n_jobs=m * n)(
-                delayed(_block_tables_split)(l_splits[i], r_splits[j],
-                                             l_key, r_key,
-                                             l_output_attrs, r_output_attrs,
-                                             l_output_prefix, r_output_prefix,
-                                             apply_rules_pkl,
-                                             show_progress and i == len(
-                                                 l_splits) - 1 and j == len(
-                                                 r_splits) - 1)
-                for i in range(len(l_splits)) for j in range(len(r_splits)))
-            candset = pd.concat(c_splits, ignore_index=True)
-
-        # return candidate set
-        return candset
+            # # split the cartesian product into tiles with the same number
+            # # of tuple pairs
+            tiles = split_cartesian_product(
+                len(l_df), len(r_df), get_num_tasks(n_procs,
+                                                    len(l_df) * len(r_df)))
+            costs = [(l_stop - l_start) * (r_stop - r_start)
+                     for (l_start, l_stop), (r_start, r_stop) in tiles]
+            # # share the tables with the workers through memory-mapped
+            # # files, each worker reads only its tiles of the tables and
+            # # returns the positions of the tuple pairs that survive
+            with SharedTable(l_df) as l_shared, SharedTable(r_df) as r_shared:
+                tasks = [(l_shared.slice(l_start, l_stop),
+                          r_shared.slice(r_start, r_stop), l_start, r_start,
+                          rule_plan_pkl, show_progress and i == len(tiles) - 1)
+                         for i, ((l_start, l_stop), (r_start, r_stop))
+                         in enumerate(tiles)]
+                pos_splits = list(run_tasks(_block_tables_split, tasks,
+                                            n_procs, costs, verbose))
+            l_pos = pd.np.concatenate([l for l, _ in pos_splits])
+            r_pos = pd.np.concatenate([r for _, r in pos_splits])
+            # # sort the tuple pairs the same way as in a single process
+            order = pd.np.lexsort((r_pos, l_pos))
+            l_pos, r_pos = l_pos[order], r_pos[order]
+
+        # construct the candidate set, gathering the output attributes of the
+        # surviving tuple pairs at once
+        return get_candset_for_pairs(l_df, r_df, l_key, r_key, l_pos, r_pos,
+                                     l_output_attrs, r_output_attrs,
+                                     l_output_prefix, r_output_prefix)
 
     def block_candset(self, candset, verbose=False, show_progress=True,
                       n_jobs=1):
@@ -618,7 +781,8 @@ class RuleBasedBlocker(Blocker):
         c_df = self.block_candset_excluding_rule(candset, l_df, r_df, l_key,
                                                  r_key,
                                                  fk_ltable, fk_rtable, None,
-                                                 show_progress, n_jobs)
+                                                 show_progress, n_jobs,
+                                                 verbose=verbose)
 
         # update catalog
         cm.set_candset_properties(c_df, key, fk_ltable, fk_rtable, ltable,
@@ -723,21 +887,44 @@ class RuleBasedBlocker(Blocker):
     def block_tables_with_filters(self, l_df, r_df, l_key, r_key,
                                   l_output_attrs, r_output_attrs,
                                   l_output_prefix, r_output_prefix, verbose,
-                                  show_progress, n_jobs):
-        for rule_name in self.rules.keys():
-            # first check if a rule is filterable
-            if self.is_rule_filterable(rule_name):
-                candset = self.apply_filterable_rule(rule_name, l_df, r_df,
-                                                     l_key, r_key,
-                                                     l_output_attrs,
-                                                     r_output_attrs,
-                                                     l_output_prefix,
-                                                     r_output_prefix, verbose,
-                                                     show_progress, n_jobs)
-                if candset is not None:
-                    # rule was filterable
-                    return candset, rule_name
-        return None, None
+                                  show_progress, n_jobs, plan=None):
+        if plan is None:
+            plan = self.get_blocking_plan(l_df, r_df)
+        if plan.filter_rule is None:
+            return None, None
+        # generate the candset using the filterable rule picked by the plan,
+        # the other rules are then applied only to the surviving pairs
+        candset = self.apply_filterable_rule(plan.filter_rule, l_df, r_df,
+                                             l_key, r_key,
+                                             l_output_attrs,
+                                             r_output_attrs,
+                                             l_output_prefix,
+                                             r_output_prefix, verbose,
+                                             show_progress, n_jobs)
+        if candset is None:
+            return None, None
+        return candset, plan.filter_rule
+
+    def get_blocking_plan(self, l_df, r_df, sample_size=None, estimate=None):
+        # get the plan to block the tables, the rules are evaluated on a
+        # sample of tuple pairs only if there is a choice to make (or if
+        # estimate is True)
+        filterable_rules = [rule_name for rule_name in self.rules.keys()
+                            if self.is_rule_filterable(rule_name)]
+        if estimate is None:
+            estimate = len(self.rules) > 1
+        if estimate:
+            return rp.get_blocking_plan(self.rule_str, self.rule_ft,
+                                        filterable_rules, l_df, r_df,
+                                        sample_size)
+        rule_names = list(self.rules.keys())
+        if filterable_rules:
+            return rp.BlockingPlan('filter_join', filterable_rules[0],
+                                   [n for n in rule_names
+                                    if n != filterable_rules[0]],
+                                   None, len(l_df) * len(r_df), None, None)
+        return rp.BlockingPlan('cross_product', None, rule_names, None,
+                               len(l_df) * len(r_df), None, None)
 
     def is_rule_filterable(self, rule_name):
         # a rule is filterable if all the conjuncts in the conjunct list
@@ -753,17 +940,30 @@ class RuleBasedBlocker(Blocker):
         # a conjunct is filterable if it uses
         # a filterable sim function (jaccard, cosine, dice, ...),
         # an allowed operator (<, <=),
+        # a threshold supported by the join and
+        # the same tokenizer (q-gram, delimiter, ...) for both attributes,
+        # or if it uses exact_match with an operator and a threshold that
+        # drop the pairs whose values do not match (e.g., == 0, < 1)
         is_auto_gen, sim_fn, l_attr, r_attr, l_tok, r_tok, op, th = self.parse_conjunct(
             conjunct, rule_name)
         if is_auto_gen != True:
             # conjunct not filterable as the feature is not auto generated
             return False
+        try:
+            th = float(th)
+        except ValueError:
+            # conjunct not filterable as the threshold is not a number
+            return False
         if sim_fn == 'lev_dist':
             if op == '>' or op == '>=':
                 return True
             else:
                 # conjunct not filterable due to unsupported operator
                 return False
+        if sim_fn == 'exact_match':
+            # the pair survives the conjunct only if the values match (i.e.,
+            # the conjunct holds for 0 but not for 1)
+            return _compare(0, op, th) and not _compare(1, op, th)
         if l_tok != r_tok:
             # conjunct not filterable because left and right tokenizers mismatch
             return False
@@ -773,9 +973,45 @@ class RuleBasedBlocker(Blocker):
         if op not in self.allowed_ops:
             # conjunct not filterable due to unsupported operator
             return False
+        if th <= 0 or th > 1:
+            # conjunct not filterable due to unsupported threshold
+            return False
+        if self.get_filter_tokenizer(conjunct, rule_name) is None:
+            # conjunct not filterable due to unknown tokenizer
+            return False
         # conjunct is filterable
         return True
 
+    def get_filter_tokenizer(self, conjunct, rule_name):
+        # get the tokenizer to be used by the join for the feature of the
+        # conjunct
+        feature = self.get_conjunct_feature(conjunct, rule_name)
+        tok_name = feature['left_attr_tokenizer']
+        if not isinstance(tok_name, six.string_types):
+            return None
+        qgram_match = re.match(r'^qgm_(\d+)$', tok_name)
+        if qgram_match is not None:
+            return QgramTokenizer(qval=int(qgram_match.group(1)),
+                                  return_set=True)
+        if tok_name == 'wspace':
+            return WhitespaceTokenizer(return_set=True)
+        if tok_name == 'alphabetic':
+            return AlphabeticTokenizer(return_set=True)
+        if tok_name == 'alphanumeric':
+            return AlphanumericTokenizer(return_set=True)
+        # other tokenizers (e.g., delimiter based) are used as they are
+        # referred by the feature
+        tok_fn = get_tokenizer_fn(feature, tok_name)
+        if tok_fn is None:
+            return None
+        return _FeatureTokenizer(tok_fn, return_set=True)
+
+    def get_conjunct_feature(self, conjunct, rule_name):
+        feature_table = self.rule_ft[rule_name]
+        feature_name = conjunct.split('(')[0].strip()
+        features = feature_table[feature_table.feature_name == feature_name]
+        return features.to_dict('records')[0]
+
     def apply_filterable_rule(self, rule_name, l_df, r_df, l_key, r_key,
                               l_output_attrs, r_output_attrs,
                               l_output_prefix, r_output_prefix,
@@ -786,10 +1022,21 @@ class RuleBasedBlocker(Blocker):
             is_auto_gen, sim_fn, l_attr, r_attr, l_tok, r_tok, op, th = self.parse_conjunct(
                 conjunct, rule_name)
 
-            if l_tok == 'dlm_dc0':
-                tokenizer = WhitespaceTokenizer(return_set=True)
-            elif l_tok == 'qgm_3':
-                tokenizer = QgramTokenizer(qval=3, return_set=True)
+            if sim_fn == 'exact_match':
+                # exact_match returns NaN for the pairs with a missing value,
+                # so they survive if the conjunct does not hold for NaN
+                keep_missing = not _compare(float('nan'), op, float(th))
+                c_df = _exact_match_join(l_df, r_df, l_key, r_key,
+                                         l_attr, r_attr, l_output_attrs,
+                                         r_output_attrs, l_output_prefix,
+                                         r_output_prefix, keep_missing)
+                candset = _union_candsets(candset, c_df,
+                                          l_output_prefix + l_key,
+                                          r_output_prefix + r_key)
+                continue
+
+            if sim_fn != 'lev_dist':
+                tokenizer = self.get_filter_tokenizer(conjunct, rule_name)
 
             if sim_fn == 'jaccard':
                 join_fn = ssj.jaccard_join
@@ -825,135 +1072,158 @@ class RuleBasedBlocker(Blocker):
                                l_output_attrs, r_output_attrs,
                                l_output_prefix,
                                r_output_prefix, False, n_jobs, show_progress)
-            if candset is not None:
-                # union the candset of this conjunct with the existing candset
-                candset = pd.concat([candset, c_df]).drop_duplicates(
-                    [l_output_prefix + l_key,
-                     r_output_prefix + r_key]).reset_index(drop=True)
-            else:
-                # candset from the first conjunct of the rule
-                candset = c_df
+            candset = _union_candsets(candset, c_df, l_output_prefix + l_key,
+                                      r_output_prefix + r_key)
         return candset
 
 
-def _block_tables_split(l_df, r_df, l_key, r_key,
-                        l_output_attrs, r_output_attrs,
-                        l_output_prefix, r_output_prefix, apply_rules_pkl,
-                        show_progress):
-    # initialize progress bar
-    if show_progress:
-        bar = pyprind.ProgBar(len(l_df) * len(r_df))
+class _FeatureTokenizer(Tokenizer):
+    """
+    Wraps the tokenizer function of a feature, so that it can be used by the
+    string similarity joins.
+    """
 
-    # create look up dictionaries for faster processing
-    l_dict = {}
-    for k, r in l_df.iterrows():
-        l_dict[k] = r
-    r_dict = {}
-    for k, r in r_df.iterrows():
-        r_dict[k] = r
+    def __init__(self, tok_fn, return_set=False):
+        super(_FeatureTokenizer, self).__init__(return_set)
+        self.tok_fn = tok_fn
 
-    # get the position of the ID attribute in the tables
-    l_id_pos = list(l_df.columns).index(l_key)
-    r_id_pos = list(r_df.columns).index(r_key)
+    def tokenize(self, input_string):
+        tokens = self.tok_fn(input_string)
+        if not isinstance(tokens, list):
+            # the tokenizers return NaN for missing values
+            return []
+        if self.return_set:
+            return list(OrderedDict.fromkeys(tokens))
+        return tokens
 
-    # create candset column names for the ID attributes of the tables
-    ltable_id = l_output_prefix + l_key
-    rtable_id = r_output_prefix + r_key
 
-    # list to keep the tuple pairs that survive blocking
-    valid = []
+def _compare(val, op, th):
+    return ((op == '<' and val < th) or (op == '<=' and val <= th) or
+            (op == '>' and val > th) or (op == '>=' and val >= th) or
+            (op == '==' and val == th) or (op == '!=' and val != th))
 
-    # unpickle the apply_rules function
-    apply_rules = pickle.loads(apply_rules_pkl)
 
-    # iterate through the two tables
-    for l_t in l_df.itertuples(index=False):
-        # # get ltuple from the look up table
-        ltuple = l_dict[l_t[l_id_pos]]
-        for r_t in r_df.itertuples(index=False):
-            # # update the progress bar
-            if show_progress:
-                bar.update()
+def _union_candsets(candset, c_df, ltable_id, rtable_id):
+    if candset is None:
+        # candset from the first conjunct of the rule
+        return c_df
+    # union the candset of this conjunct with the existing candset
+    return pd.concat([candset, c_df]).drop_duplicates(
+        [ltable_id, rtable_id]).reset_index(drop=True)
+
+
+def _exact_match_join(l_df, r_df, l_key, r_key, l_attr, r_attr,
+                      l_output_attrs, r_output_attrs, l_output_prefix,
+                      r_output_prefix, keep_missing=True):
+    # find the tuple pairs surviving a conjunct that drops the pairs whose
+    # values do not match exactly. The pairs with a missing value survive as
+    # well if keep_missing is True.
+    l_vals, r_vals = l_df[l_attr].values, r_df[r_attr].values
+    l_null, r_null = pd.isnull(l_vals), pd.isnull(r_vals)
+    codes, uniques = pd.factorize(pd.np.concatenate(
+        [pd.np.asarray(l_vals, dtype=object),
+         pd.np.asarray(r_vals, dtype=object)]))
+    l_codes, r_codes = codes[:len(l_vals)], codes[len(l_vals):]
+
+    # # hash join on the codes of the values
+    l_order = pd.np.argsort(l_codes[~l_null], kind='mergesort')
+    l_pos_not_null = pd.np.flatnonzero(~l_null)[l_order]
+    l_sorted = l_codes[l_pos_not_null]
+    r_pos_not_null = pd.np.flatnonzero(~r_null)
+    r_codes_not_null = r_codes[r_pos_not_null]
+    starts = pd.np.searchsorted(l_sorted, r_codes_not_null, side='left')
+    stops = pd.np.searchsorted(l_sorted, r_codes_not_null, side='right')
+    counts = stops - starts
+    r_pos = pd.np.repeat(r_pos_not_null, counts)
+    offsets = pd.np.arange(counts.sum()) - pd.np.repeat(
+        pd.np.cumsum(counts) - counts, counts)
+    l_pos = l_pos_not_null[pd.np.repeat(starts, counts) + offsets]
+
+    # # pairs with a missing value
+    if keep_missing:
+        l_null_pos = pd.np.flatnonzero(l_null)
+        r_null_pos = pd.np.flatnonzero(r_null)
+        l_pos = pd.np.concatenate([l_pos,
+                                   pd.np.repeat(l_null_pos, len(r_df)),
+                                   pd.np.tile(pd.np.flatnonzero(~l_null),
+                                              len(r_null_pos))])
+        r_pos = pd.np.concatenate([r_pos,
+                                   pd.np.tile(pd.np.arange(len(r_df)),
+                                              len(l_null_pos)),
+                                   pd.np.repeat(r_null_pos,
+                                                (~l_null).sum())])
+
+    order = pd.np.lexsort((r_pos, l_pos))
+    return get_candset_for_pairs(l_df, r_df, l_key, r_key,
+                                 l_pos[order], r_pos[order],
+                                 l_output_attrs, r_output_attrs,
+                                 l_output_prefix, r_output_prefix)
+
+
+def _block_tables_split(l_df, r_df, l_offset, r_offset, rule_plan_pkl,
+                        show_progress):
+    # get the tables (if they are shared by the parent process)
+    l_df, r_df = get_table(l_df), get_table(r_df)
 
-            # # get rtuple from the look up dictionary
-            rtuple = r_dict[r_t[r_id_pos]]
+    # initialize progress bar
+    if show_progress:
+        bar = pyprind.ProgBar(len(l_df) * len(r_df))
 
-            # # apply the rules to the tuple pair
-            res = apply_rules(ltuple, rtuple)
+    # unpickle the compiled rules
+    rule_plan = pickle.loads(rule_plan_pkl)
 
-            if res != True:
-                # # this tuple pair survives blocking
+    # the tokens of the attribute values are computed once and reused
+    # across the blocks of tuple pairs
+    token_cache = TokenCache()
 
-                # # an ordered dictionary to keep a surviving tuple pair
-                d = OrderedDict()
-                # # add ltable and rtable ids to an ordered dictionary
-                d[ltable_id] = ltuple[l_key]
-                d[rtable_id] = rtuple[r_key]
+    # lists to keep the positions of the tuple pairs that survive blocking
+    l_valid, r_valid = [], []
 
-                # # add l/r output attributes to the ordered dictionary
-                l_out = ltuple[l_output_attrs]
-                l_out.index = l_output_prefix + l_out.index
-                d.update(l_out)
+    # evaluate the rules over blocks of the cartesian product of the tables
+    for l_pos, r_pos in cartesian_blocks(len(l_df), len(r_df)):
+        drop = rule_plan.get_drop_mask(l_df, r_df, l_pos, r_pos, token_cache)
+        l_valid.append(l_pos[~drop])
+        r_valid.append(r_pos[~drop])
 
-                r_out = rtuple[r_output_attrs]
-                r_out.index = r_output_prefix + r_out.index
-                d.update(r_out)
+        # # update the progress bar
+        if show_progress:
+            bar.update(iterations=len(l_pos))
 
-                # # add the ordered dict to the list
-                valid.append(d)
+    l_valid = pd.np.concatenate(l_valid) if l_valid else pd.np.zeros(0, int)
+    r_valid = pd.np.concatenate(r_valid) if r_valid else pd.np.zeros(0, int)
 
-    # construct candidate set
-    candset = pd.DataFrame(valid)
-    return candset
+    # return the positions of the tuple pairs in the tables (not in the
+    # splits of the tables)
+    return l_valid + l_offset, r_valid + r_offset
 
 
 def _block_candset_excluding_rule_split(c_df, l_df, r_df, l_key, r_key,
                                         fk_ltable,
-                                        fk_rtable, rule_to_exclude,
-                                        apply_rules_excluding_rule_pkl,
+                                        fk_rtable, rule_plan_pkl,
                                         show_progress):
+    # get the tuples referred by the candset (if the tables are shared by
+    # the parent process)
+    l_df = get_table(l_df, c_df[fk_ltable].values)
+    r_df = get_table(r_df, c_df[fk_rtable].values)
+
     # do blocking
 
     # # initialize the progress bar
     if show_progress:
         bar = pyprind.ProgBar(len(c_df))
 
-    # # initialize lookup tables for faster processing
-    l_dict = {}
-    r_dict = {}
-
-    # # list to keep track of valid ids
-    valid = []
+    # # get the positions of the left and the right tuples of the candset
+    l_pos = RecordAccessor(l_df).get_positions(c_df[fk_ltable].values)
+    r_pos = RecordAccessor(r_df).get_positions(c_df[fk_rtable].values)
 
-    l_id_pos = list(c_df.columns).index(fk_ltable)
-    r_id_pos = list(c_df.columns).index(fk_rtable)
+    # # unpickle the compiled rules
+    rule_plan = pickle.loads(rule_plan_pkl)
 
-    # # unpickle the apply_rules_excluding_rule function
-    apply_rules_excluding_rule = pickle.loads(apply_rules_excluding_rule_pkl)
+    # # evaluate the rules on all the tuple pairs of the candset at once
+    drop = rule_plan.get_drop_mask(l_df, r_df, l_pos, r_pos)
 
-    # # iterate candidate set
-    for row in c_df.itertuples(index=False):
-        # # update progress bar
-        if show_progress:
-            bar.update()
-
-        # # get ltuple, try dictionary first, then dataframe
-        row_lid = row[l_id_pos]
-        if row_lid not in l_dict:
-            l_dict[row_lid] = l_df.ix[row_lid]
-        ltuple = l_dict[row_lid]
-
-        # # get rtuple, try dictionary first, then dataframe
-        row_rid = row[r_id_pos]
-        if row_rid not in r_dict:
-            r_dict[row_rid] = r_df.ix[row_rid]
-        rtuple = r_dict[row_rid]
-
-        res = apply_rules_excluding_rule(ltuple, rtuple, rule_to_exclude)
- 
-        if res != True:
-            valid.append(True)
-        else:
-            valid.append(False)
+    # # update progress bar
+    if show_progress:
+        bar.update(iterations=len(c_df))
 
-    return valid
+    return ~drop
@@ -0,0 +1,281 @@
+"""
+This module contains functions to compile the rules of a rule-based blocker
+into plans that are evaluated over whole arrays of tuple pairs.
+
+A conjunct of the form feature(ltuple, rtuple) op threshold (where op is one
+of <, <=, >, >=, == and != and threshold is a number) is compiled into a
+comparison between a feature column and the threshold. The feature column is
+computed in batch for the tuple pairs that need it (see
+py_entitymatching.feature.batchfeatures). Any other conjunct is evaluated by
+calling it on each of these tuple pairs.
+
+The evaluation is short-circuited: a conjunct is evaluated only on the tuple
+pairs for which all the previous conjuncts of the rule hold, and a rule is
+evaluated only on the tuple pairs that were not dropped by the previous
+rules.
+"""
+import logging
+import operator
+import re
+
+import numpy as np
+import six
+
+from py_entitymatching.feature.batchfeatures import TokenCache, \
+    get_feature_col_by_positions
+from py_entitymatching.utils.record_helper import RecordAccessor
+
+logger = logging.getLogger(__name__)
+
+_comparison_ops = {'<': operator.lt, '<=': operator.le, '>': operator.gt,
+                   '>=': operator.ge, '==': operator.eq, '!=': operator.ne}
+
+_conjunct_re = re.compile(r'^\s*([A-Za-z_]\w*)\s*\(\s*ltuple\s*,\s*rtuple\s*\)'
+                          r'\s*(<=|>=|==|!=|<|>)\s*(\S+)\s*$')
+
+# Number of tuple pairs evaluated together while blocking the cartesian
+# product of two tables. This bounds the size of the temporary arrays.
+pair_block_size = 100000
+
+
+class CompiledConjunct(object):
+    """
+    A conjunct of a rule, compiled for the evaluation over arrays of tuple
+    pairs.
+
+    If the conjunct compares a feature with a numeric threshold, then
+    feature, op and threshold are set and the conjunct is evaluated by
+    comparing the feature column with the threshold (is_vectorized is True).
+    Otherwise, fn is a function that evaluates the conjunct on one tuple pair.
+    """
+
+    def __init__(self, conjunct, feature=None, op=None, threshold=None,
+                 fn=None):
+        self.conjunct = conjunct
+        self.feature = feature
+        self.op = op
+        self.threshold = threshold
+        self.fn = fn
+
+    @property
+    def is_vectorized(self):
+        return self.feature is not None
+
+    @property
+    def feature_name(self):
+        if self.feature is None:
+            return None
+        return self.feature['feature_name']
+
+    def evaluate(self, context, idx, is_last):
+        """
+        Evaluates the conjunct on the tuple pairs at the given indices of the
+        context, and returns a boolean array.
+        """
+        if self.is_vectorized:
+            vals = context.get_feature_vals(self.feature, idx)
+            with np.errstate(invalid='ignore'):
+                # comparisons with NaN are False (except !=), the same as
+                # comparisons with float('nan') in Python
+                return _comparison_ops[self.op](vals, self.threshold)
+
+        l_records, r_records = context.get_record_accessors()
+        res = np.zeros(len(idx), dtype=bool)
+        for i, pair_idx in enumerate(idx):
+            val = self.fn(l_records.get_record_at(context.l_pos[pair_idx]),
+                          r_records.get_record_at(context.r_pos[pair_idx]))
+            # the rule returns conj_1 and ... and conj_n, and a tuple pair is
+            # dropped if the value returned by the rule is equal to True
+            res[i] = val == True if is_last else bool(val)
+        return res
+
+
+class CompiledRule(object):
+    """
+    A rule (a conjunction of conjuncts) compiled for the evaluation over
+    arrays of tuple pairs.
+    """
+
+    def __init__(self, name, conjuncts):
+        self.name = name
+        self.conjuncts = conjuncts
+
+    @property
+    def is_vectorized(self):
+        return all(c.is_vectorized for c in self.conjuncts)
+
+    def evaluate(self, context, idx):
+        """
+        Returns a boolean array indicating, for each of the tuple pairs at
+        the given indices of the context, whether the rule holds (i.e., the
+        tuple pair must be dropped).
+        """
+        holds = np.ones(len(idx), dtype=bool)
+        for i, conjunct in enumerate(self.conjuncts):
+            # evaluate the conjunct only on the tuple pairs for which all the
+            # previous conjuncts hold
+            undecided = np.flatnonzero(holds)
+            if len(undecided) == 0:
+                break
+            holds[undecided] = conjunct.evaluate(
+                context, idx[undecided], i == len(self.conjuncts) - 1)
+        return holds
+
+
+class RulePlan(object):
+    """
+    A sequence of compiled rules. A tuple pair is dropped if any of the rules
+    holds for it.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    @property
+    def is_vectorized(self):
+        return all(r.is_vectorized for r in self.rules)
+
+    def get_drop_mask(self, l_df, r_df, l_pos, r_pos, token_cache=None):
+        """
+        Evaluates the rules on a batch of tuple pairs.
+
+        Args:
+            l_df, r_df (DataFrame): The left and the right tables.
+            l_pos, r_pos (array): The positions of the left and the right
+                tuples of each tuple pair.
+            token_cache (TokenCache): The tokens of the attribute values of
+                l_df and r_df (defaults to None). The tokens are added to the
+                cache as they are needed, so the same cache can be passed
+                when evaluating several batches of tuple pairs over the same
+                tables.
+
+        Returns:
+            A boolean NumPy array indicating, for each tuple pair, whether it
+            must be dropped.
+        """
+        context = _EvalContext(l_df, r_df, l_pos, r_pos, token_cache)
+        drop = np.zeros(len(context.l_pos), dtype=bool)
+        for rule in self.rules:
+            # evaluate the rule only on the tuple pairs that survive the
+            # previous rules
+            remaining = np.flatnonzero(~drop)
+            if len(remaining) == 0:
+                break
+            drop[remaining] = rule.evaluate(context, remaining)
+        return drop
+
+
+class _EvalContext(object):
+    """
+    The tuple pairs on which a plan is evaluated, along with the feature
+    values computed so far (so that a feature used by several conjuncts is
+    computed at most once per tuple pair).
+    """
+
+    def __init__(self, l_df, r_df, l_pos, r_pos, token_cache):
+        self.l_df = l_df
+        self.r_df = r_df
+        self.l_pos = np.asarray(l_pos, dtype=np.int64)
+        self.r_pos = np.asarray(r_pos, dtype=np.int64)
+        self.token_cache = token_cache if token_cache is not None else \
+            TokenCache()
+        self.record_accessors = []
+        self._feature_vals = {}
+
+    def get_record_accessors(self):
+        if not self.record_accessors:
+            self.record_accessors.extend([RecordAccessor(self.l_df),
+                                          RecordAccessor(self.r_df)])
+        return self.record_accessors
+
+    def get_feature_vals(self, feature, idx):
+        name = feature['feature_name']
+        if name not in self._feature_vals:
+            self._feature_vals[name] = (
+                np.empty(len(self.l_pos), dtype=np.float64),
+                np.zeros(len(self.l_pos), dtype=bool))
+        vals, is_computed = self._feature_vals[name]
+        missing = idx[~is_computed[idx]]
+        if len(missing) > 0:
+            vals[missing] = get_feature_col_by_positions(
+                feature, self.l_df, self.r_df, self.l_pos[missing],
+                self.r_pos[missing], self.token_cache, self.record_accessors)
+            is_computed[missing] = True
+        return vals[idx]
+
+
+def compile_conjunct(conjunct, feature_table):
+    """
+    Compiles a conjunct of a rule using the feature table of the rule.
+    """
+    features = dict((f['feature_name'], f) for f in
+                    feature_table.to_dict('records'))
+    match = _conjunct_re.match(conjunct)
+    if match is not None and match.group(1) in features:
+        threshold = _parse_threshold(match.group(3))
+        if threshold is not None:
+            return CompiledConjunct(conjunct,
+                                    feature=features[match.group(1)],
+                                    op=match.group(2), threshold=threshold)
+
+    # evaluate the conjunct per tuple pair, the same way as the rule
+    # function created by the rule-based blocker
+    fn_str = 'def _conjunct(ltuple, rtuple):\n    return ' + conjunct
+    feat_dict = dict((name, f['function']) for name, f in
+                     six.iteritems(features))
+    six.exec_(fn_str, feat_dict)
+    return CompiledConjunct(conjunct, fn=feat_dict['_conjunct'])
+
+
+def compile_rules(rule_str, rule_ft, rules_to_exclude=None, rule_order=None):
+    """
+    Compiles the rules of a rule-based blocker into a RulePlan.
+
+    Args:
+        rule_str (OrderedDict): The conjunct lists of the rules (keyed by
+            rule name).
+        rule_ft (dict): The feature tables of the rules (keyed by rule name).
+        rules_to_exclude (list): The names of the rules that must not be
+            included in the plan (defaults to None).
+        rule_order (list): The order in which the rules must be evaluated
+            (defaults to None, i.e. the order of rule_str). The rules that
+            are not in rule_order are evaluated after the others.
+
+    Returns:
+        A RulePlan object.
+    """
+    if rules_to_exclude is None:
+        rules_to_exclude = []
+    rule_names = list(rule_str.keys())
+    if rule_order is not None:
+        rule_names = [n for n in rule_order if n in rule_str] + \
+                     [n for n in rule_names if n not in rule_order]
+    rules = []
+    for rule_name in rule_names:
+        if rule_name in rules_to_exclude:
+            continue
+        conjuncts = [compile_conjunct(c, rule_ft[rule_name])
+                     for c in rule_str[rule_name]]
+        rules.append(CompiledRule(rule_name, conjuncts))
+    return RulePlan(rules)
+
+
+def cartesian_blocks(num_l_rows, num_r_rows, block_size=None):
+    """
+    Splits the cartesian product of two tables into blocks of tuple pairs,
+    and yields the positions of the left and the right tuples of each block.
+    """
+    if block_size is None:
+        block_size = pair_block_size
+    num_pairs = num_l_rows * num_r_rows
+    for start in six.moves.range(0, num_pairs, block_size):
+        pairs = np.arange(start, min(start + block_size, num_pairs),
+                          dtype=np.int64)
+        yield pairs // num_r_rows, pairs % num_r_rows
+
+
+def _parse_threshold(threshold):
+    try:
+        return float(threshold)
+    except ValueError:
+        return None
@@ -0,0 +1,300 @@
+"""
+This module contains functions to plan the evaluation of the rules of a
+rule-based blocker.
+
+The planner evaluates each rule on a random sample of tuple pairs from the
+cartesian product of the input tables, and estimates the fraction of the
+tuple pairs that survive the rule (its survival rate) along with the time
+it takes to evaluate the rule on a tuple pair (its cost). These estimates
+are used to pick the rule that is used to generate the candidate set and the
+order in which the other rules are evaluated.
+
+The cost model assumes that the rules are independent: the expected cost of
+evaluating a sequence of rules on a tuple pair is c_1 + s_1 * c_2 + s_1 * s_2
+* c_3 + ..., where c_i and s_i are the cost and the survival rate of the
+i-th rule. This cost is minimized by evaluating the rules in increasing order
+of c_i / (1 - s_i).
+"""
+from collections import OrderedDict
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from py_entitymatching.blocker.rule_compiler import compile_rules
+from py_entitymatching.feature.batchfeatures import TokenCache
+
+logger = logging.getLogger(__name__)
+
+# Number of tuple pairs sampled to estimate the selectivity of the rules.
+sample_size = 1000
+
+
+class RuleEstimate(object):
+    """
+    The estimated survival rate and cost (in seconds per tuple pair) of a
+    rule.
+    """
+
+    def __init__(self, survival_rate, cost_per_pair):
+        self.survival_rate = survival_rate
+        self.cost_per_pair = cost_per_pair
+
+
+class BlockingPlan(object):
+    """
+    A plan to block two tables using the rules of a rule-based blocker.
+
+    Attributes:
+        strategy (string): 'filter_join' if the candidate set is generated by
+            a join using filter_rule, or 'cross_product' if all the rules are
+            evaluated on the cartesian product of the tables.
+        filter_rule (string): The name of the rule used to generate the
+            candidate set (None for the cross product strategy).
+        rule_order (list): The names of the rules evaluated on the tuple
+            pairs (excluding the filter rule), in evaluation order.
+        rule_estimates (DataFrame): The estimates for each rule (the
+            survival rate, the cost per tuple pair and whether it is
+            filterable).
+        num_pairs (int): The number of tuple pairs in the cartesian product.
+        est_candset_size (int): The estimated size of the output candidate
+            set.
+        est_cost (float): The estimated time (in seconds) to evaluate the
+            rules, not including the time to read and write the tables.
+    """
+
+    def __init__(self, strategy, filter_rule, rule_order, rule_estimates,
+                 num_pairs, est_candset_size, est_cost):
+        self.strategy = strategy
+        self.filter_rule = filter_rule
+        self.rule_order = rule_order
+        self.rule_estimates = rule_estimates
+        self.num_pairs = num_pairs
+        self.est_candset_size = est_candset_size
+        self.est_cost = est_cost
+
+    def __str__(self):
+        lines = ['Blocking plan (' + str(self.num_pairs) +
+                 ' tuple pairs in the cartesian product)']
+        step = 1
+        if self.strategy == 'filter_join':
+            lines.append('  %d. generate candidates by a filter join using '
+                         'rule %s' % (step, self.filter_rule))
+        else:
+            lines.append('  %d. enumerate the cartesian product of the '
+                         'tables' % step)
+        for rule_name in self.rule_order:
+            step += 1
+            lines.append('  %d. drop the tuple pairs satisfying rule %s' %
+                         (step, rule_name))
+        if self.est_candset_size is not None:
+            lines.append('Estimated candidate set size: ' +
+                         str(self.est_candset_size))
+        if self.est_cost is not None:
+            lines.append('Estimated cost: %.3f seconds' % self.est_cost)
+        if self.rule_estimates is not None and len(self.rule_estimates) > 0:
+            lines.append('Rule estimates:')
+            lines.append(self.rule_estimates.to_string(index=False))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def sample_pairs(num_l_rows, num_r_rows, num_samples=None, seed=0):
+    """
+    Samples tuple pairs (with replacement) from the cartesian product of two
+    tables and returns the positions of the left and the right tuples. If the
+    cartesian product is not larger than the sample size, all the tuple pairs
+    are returned.
+    """
+    if num_samples is None:
+        num_samples = sample_size
+    if num_l_rows * num_r_rows <= num_samples:
+        pairs = np.arange(num_l_rows * num_r_rows, dtype=np.int64)
+        return pairs // max(num_r_rows, 1), pairs % max(num_r_rows, 1)
+    rng = np.random.RandomState(seed)
+    return (rng.randint(0, num_l_rows, num_samples).astype(np.int64),
+            rng.randint(0, num_r_rows, num_samples).astype(np.int64))
+
+
+def estimate_rules(rule_str, rule_ft, rule_names, l_df, r_df,
+                   num_samples=None, seed=0):
+    """
+    Estimates the survival rate and the cost of each of the given rules on
+    the cartesian product of l_df and r_df.
+
+    Args:
+        rule_str (OrderedDict): The conjunct lists of the rules (keyed by
+            rule name).
+        rule_ft (dict): The feature tables of the rules (keyed by rule name).
+        rule_names (list): The names of the rules to be estimated.
+        l_df, r_df (DataFrame): The left and the right tables.
+        num_samples (int): The number of tuple pairs to sample (defaults to
+            None, i.e. sample_size).
+        seed (int): The seed of the random number generator (defaults to 0).
+
+    Returns:
+        An OrderedDict mapping each rule name to a RuleEstimate, and the
+        estimated survival rate of all the given rules together.
+    """
+    l_sample, r_sample, l_pos, r_pos = _sample_tables(l_df, r_df,
+                                                      num_samples, seed)
+    estimates = OrderedDict()
+    drop = np.zeros(len(l_pos), dtype=bool)
+    for rule_name in rule_names:
+        if len(l_pos) == 0:
+            estimates[rule_name] = RuleEstimate(0.0, 0.0)
+            continue
+        plan = compile_rules(OrderedDict([(rule_name, rule_str[rule_name])]),
+                             rule_ft)
+        # each rule tokenizes the attributes it needs, so that the cost of
+        # the tokenization is included in the cost of the rule
+        start = time.time()
+        rule_drop = plan.get_drop_mask(l_sample, r_sample, l_pos, r_pos,
+                                       TokenCache())
+        cost = time.time() - start
+        drop |= rule_drop
+        estimates[rule_name] = RuleEstimate(
+            1.0 - float(rule_drop.sum()) / len(rule_drop),
+            cost / len(rule_drop))
+    if len(l_pos) == 0:
+        return estimates, 0.0
+    return estimates, 1.0 - float(drop.sum()) / len(drop)
+
+
+def estimate_survival_rates(rule_str, rule_ft, rule_names, l_df, r_df,
+                            num_samples=None, seed=0):
+    """
+    Estimates the fraction of tuple pairs of the cartesian product of l_df
+    and r_df that survive each of the given rules (i.e., for which the rule
+    does not hold).
+
+    Returns:
+        An OrderedDict mapping each rule name to the estimated fraction of
+        surviving tuple pairs.
+    """
+    estimates, _ = estimate_rules(rule_str, rule_ft, rule_names, l_df, r_df,
+                                  num_samples, seed)
+    return OrderedDict((name, e.survival_rate) for name, e in
+                       estimates.items())
+
+
+def order_by_selectivity(rule_names, survival_rates):
+    """
+    Orders the rules from the most selective (i.e., with the smallest
+    fraction of surviving tuple pairs) to the least selective one. Ties are
+    broken by the original order of the rules.
+    """
+    positions = dict((name, i) for i, name in enumerate(rule_names))
+    return sorted(rule_names,
+                  key=lambda name: (survival_rates[name], positions[name]))
+
+
+def order_by_rank(rule_names, estimates):
+    """
+    Orders the rules to minimize the expected cost of evaluating them on a
+    tuple pair, i.e., in increasing order of cost / (1 - survival rate).
+    Ties are broken by the original order of the rules.
+    """
+    positions = dict((name, i) for i, name in enumerate(rule_names))
+
+    def rank(name):
+        e = estimates[name]
+        drop_rate = 1.0 - e.survival_rate
+        if drop_rate <= 0:
+            # rules that never drop a tuple pair are evaluated last
+            return (1, 0.0, positions[name])
+        return (0, e.cost_per_pair / drop_rate, positions[name])
+
+    return sorted(rule_names, key=rank)
+
+
+def get_sequence_cost(rule_order, estimates):
+    """
+    Returns the expected cost of evaluating a sequence of rules on a tuple
+    pair.
+    """
+    cost, survival_rate = 0.0, 1.0
+    for name in rule_order:
+        cost += survival_rate * estimates[name].cost_per_pair
+        survival_rate *= estimates[name].survival_rate
+    return cost
+
+
+def get_blocking_plan(rule_str, rule_ft, filterable_rules, l_df, r_df,
+                      num_samples=None, seed=0):
+    """
+    Picks the strategy to block l_df and r_df using a sequence of rules and
+    the order in which the rules are evaluated.
+
+    If some rules are filterable, the candidate set is generated by a join
+    using the filterable rule that minimizes the estimated cost (i.e., the
+    cost of verifying the rule on its output plus the cost of evaluating
+    the other rules on the surviving tuple pairs), so the cartesian product
+    is not enumerated. Otherwise all the rules are evaluated on the
+    cartesian product. In both cases the other rules are evaluated in the
+    order given by order_by_rank.
+
+    Args:
+        rule_str (OrderedDict): The conjunct lists of the rules (keyed by
+            rule name).
+        rule_ft (dict): The feature tables of the rules (keyed by rule name).
+        filterable_rules (list): The names of the filterable rules.
+        l_df, r_df (DataFrame): The left and the right tables.
+        num_samples (int): The number of tuple pairs to sample (defaults to
+            None, i.e. sample_size).
+        seed (int): The seed of the random number generator (defaults to 0).
+
+    Returns:
+        A BlockingPlan object.
+    """
+    rule_names = list(rule_str.keys())
+    num_pairs = len(l_df) * len(r_df)
+    estimates, survival_rate = estimate_rules(rule_str, rule_ft, rule_names,
+                                              l_df, r_df, num_samples, seed)
+
+    rule_estimates = pd.DataFrame(OrderedDict([
+        ('rule_name', rule_names),
+        ('is_filterable', [name in filterable_rules for name in rule_names]),
+        ('est_survival_rate', [estimates[n].survival_rate
+                               for n in rule_names]),
+        ('est_cost_per_pair', [estimates[n].cost_per_pair
+                               for n in rule_names])]))
+
+    best = None
+    for filter_rule in filterable_rules:
+        rule_order = order_by_rank([n for n in rule_names if n != filter_rule],
+                                   estimates)
+        e = estimates[filter_rule]
+        # the cost of the join is approximated by the cost of verifying the
+        # rule on the tuple pairs of its output
+        cost = num_pairs * e.survival_rate * (
+            e.cost_per_pair + get_sequence_cost(rule_order, estimates))
+        if best is None or cost < best[0]:
+            best = (cost, filter_rule, rule_order)
+
+    if best is not None:
+        cost, filter_rule, rule_order = best
+        strategy = 'filter_join'
+    else:
+        filter_rule = None
+        rule_order = order_by_rank(rule_names, estimates)
+        cost = num_pairs * get_sequence_cost(rule_order, estimates)
+        strategy = 'cross_product'
+
+    return BlockingPlan(strategy, filter_rule, rule_order, rule_estimates,
+                        num_pairs, int(round(num_pairs * survival_rate)),
+                        cost)
+
+
+def _sample_tables(l_df, r_df, num_samples, seed):
+    # sample tuple pairs and keep only the sampled tuples of the tables, so
+    # that the attributes of the whole tables are not tokenized
+    l_pos, r_pos = sample_pairs(len(l_df), len(r_df), num_samples, seed)
+    l_rows, l_pos = np.unique(l_pos, return_inverse=True)
+    r_rows, r_pos = np.unique(r_pos, return_inverse=True)
+    return (l_df.iloc[l_rows], r_df.iloc[r_rows],
+            l_pos.reshape(-1).astype(np.int64),
+            r_pos.reshape(-1).astype(np.int64))
@@ -0,0 +1,561 @@
+import logging
+
+import cloudpickle as cp
+import numpy as np
+import pandas as pd
+import pickle
+import six
+from joblib import Parallel, delayed
+
+import py_entitymatching.catalog.catalog_manager as cm
+from py_entitymatching.blocker.blocker import Blocker
+from py_entitymatching.blocker.blocking_key import get_missing_pairs
+from py_entitymatching.utils.catalog_helper import log_info, get_name_for_key, add_key_column
+from py_entitymatching.utils.generic_helper import get_candset_for_pairs
+from py_entitymatching.utils.record_helper import RecordAccessor
+
+logger = logging.getLogger(__name__)
+
+
+class SortedNeighborhoodBlocker(Blocker):
+    """
+    Blocks based on the sorted neighborhood method.
+
+    The tuples of both the tables are sorted together on a sort key, and a
+    tuple pair survives blocking if its left and right tuples are less than
+    `window_size` positions apart in the sorted order. Several sort keys can
+    be given, in which case the tuples are sorted once per key (one pass per
+    key), and a tuple pair survives if it survives any of the passes.
+
+    Unlike the other blockers, this is a global blocker: whether a tuple
+    pair survives depends on the other tuples of the tables.
+    """
+
+    def block_tables(self, ltable, rtable, l_sort_key, r_sort_key,
+                     window_size=3, l_output_attrs=None, r_output_attrs=None,
+                     l_output_prefix='ltable_', r_output_prefix='rtable_',
+                     allow_missing=False, verbose=False, n_jobs=1):
+        """Blocks two tables based on the sorted neighborhood method.
+
+        Conceptually, this will sort the union of the tuples of `ltable` and
+        `rtable` on their sort keys, slide a window of `window_size` tuples
+        over the sorted tuples, and output the pairs of a tuple from
+        `ltable` and a tuple from `rtable` that are in the same window. The
+        sort key of a tuple is the value of an attribute, or the value
+        returned by a function applied to the tuple (e.g., the first three
+        characters of the last name followed by the zipcode). If lists of
+        sort keys are given, the blocking is done once per sort key (a pass)
+        and the output contains the tuple pairs found by any of the passes.
+        The tuples are sorted in O(n log n) time and the windows are scanned
+        in O(n * window_size) time, where n is the total number of tuples.
+        The dataframe will include attributes '_id', key attribute from
+        ltable, key attributes from rtable, followed by lists `l_output_attrs` and
+        `r_output_attrs` if they are specified. Each of these output and key attributes will be
+        prefixed with given `l_output_prefix` and `r_output_prefix`.
+        Further, this will update the following metadata in the catalog for the output table:
+        (1) key, (2) ltable, (3) rtable, (4) fk_ltable, and (5) fk_rtable.
+
+        Args:
+            ltable (DataFrame): The left input table.
+
+            rtable (DataFrame): The right input table.
+
+            l_sort_key (string, function or list): The sort key of the left
+                table: an attribute name, a function that takes a tuple and
+                returns its sort key, or a list of them (one per pass).
+
+            r_sort_key (string, function or list): The sort key of the right
+                table: an attribute name, a function that takes a tuple and
+                returns its sort key, or a list of them (of the same length
+                as `l_sort_key`). The tuples of both the tables are sorted
+                together, so the i-th sort key of `l_sort_key` and the i-th
+                sort key of `r_sort_key` must return comparable values.
+
+            window_size (int): The number of consecutive tuples in a window
+                (defaults to 3). It must be at least 2.
+
+            l_output_attrs (list): A list of attribute names from the left
+                                   table to be included in the
+                                   output candidate set (defaults to None).
+
+            r_output_attrs (list): A list of attribute names from the right
+                                   table to be included in the
+                                   output candidate set (defaults to None).
+
+            l_output_prefix (string): The prefix to be used for the attribute names
+                                   coming from the left table in the output
+                                   candidate set (defaults to 'ltable\_').
+
+            r_output_prefix (string): The prefix to be used for the attribute names
+                                   coming from the right table in the output
+                                   candidate set (defaults to 'rtable\_').
+
+            allow_missing (boolean): A flag to indicate whether tuple pairs
+                                     with missing sort key in at least one of
+                                     the tuples should be included in the
+                                     output candidate set (defaults to
+                                     False). The tuples with a missing sort
+                                     key are not sorted. If this flag is set
+                                     to True, a tuple in ltable with missing
+                                     sort key will be matched with every
+                                     tuple in rtable and vice versa.
+
+            verbose (boolean): A flag to indicate whether the debug information
+                should be logged (defaults to False).
+
+            n_jobs (int): The number of parallel jobs to be used for computation
+                (defaults to 1). If -1 all CPUs are used. If 0 or 1,
+                no parallel computation is used at all, which is useful for
+                debugging. For n_jobs below -1, (n_cpus + 1 + n_jobs) are
+                used (where n_cpus is the total number of CPUs in the
+                machine). Thus, for n_jobs = -2, all CPUs but one are used.
+                If (n_cpus + 1 + n_jobs) is less than 1, then no parallel
+                computation is used (i.e., equivalent to the default).
+                The passes are run in parallel, so at most one process per
+                sort key is used.
+
+        Returns:
+            A candidate set of tuple pairs that survived blocking (DataFrame).
+
+        Raises:
+            AssertionError: If `ltable` is not of type pandas
+                DataFrame.
+            AssertionError: If `rtable` is not of type pandas
+                DataFrame.
+            AssertionError: If `l_sort_key` is not of type string, function
+                or list of them.
+            AssertionError: If `r_sort_key` is not of type string, function
+                or list of them.
+            AssertionError: If `l_sort_key` and `r_sort_key` do not have
+                the same number of sort keys.
+            AssertionError: If `window_size` is not an integer greater than
+                1.
+            AssertionError: If `l_output_attrs` is not of type of
+                list.
+            AssertionError: If `r_output_attrs` is not of type of
+                list.
+            AssertionError: If the values in `l_output_attrs` is not of type
+                string.
+            AssertionError: If the values in `r_output_attrs` is not of type
+                string.
+            AssertionError: If `l_output_prefix` is not of type
+                string.
+            AssertionError: If `r_output_prefix` is not of type
+                string.
+            AssertionError: If `verbose` is not of type
+                boolean.
+            AssertionError: If `allow_missing` is not of type boolean.
+            AssertionError: If `n_jobs` is not of type
+                int.
+            AssertionError: If the sort key attributes are not in the
+                tables.
+            AssertionError: If `l_out_attrs` are not in the ltable.
+            AssertionError: If `r_out_attrs` are not in the rtable.
+
+        Examples:
+            >>> import py_entitymatching as em
+            >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='ID')
+            >>> B = em.read_csv_metadata('path_to_csv_dir/table_B.csv', key='ID')
+            >>> sn = em.SortedNeighborhoodBlocker()
+            >>> C1 = sn.block_tables(A, B, 'name', 'name', window_size=3, l_output_attrs=['name'], r_output_attrs=['name'])
+            # Sort on the last names and the zipcodes
+            >>> def last_name_zip(t):
+                    return t['name'].split()[-1] + str(t['zipcode'])
+            >>> C2 = sn.block_tables(A, B, last_name_zip, last_name_zip, window_size=5)
+            # Two passes, merging the tuple pairs found by both of them
+            >>> C3 = sn.block_tables(A, B, ['name', last_name_zip], ['name', last_name_zip])
+
+        """
+
+        # validate data types of input parameters
+        self.validate_types_params_tables(ltable, rtable,
+                                          l_output_attrs, r_output_attrs,
+                                          l_output_prefix,
+                                          r_output_prefix, verbose, n_jobs)
+
+        # validate data types of the sort keys and the window size
+        self.validate_types_sort_keys(l_sort_key, r_sort_key)
+        self.validate_window_size(window_size)
+
+        # validate data type of allow_missing
+        self.validate_allow_missing(allow_missing)
+
+        # validate input parameters
+        self.validate_sort_keys(ltable, rtable, l_sort_key, r_sort_key)
+        self.validate_output_attrs(ltable, rtable, l_output_attrs,
+                                   r_output_attrs)
+
+        # get and validate required metadata
+        log_info(logger, 'Required metadata: ltable key, rtable key', verbose)
+
+        # # get metadata
+        l_key, r_key = cm.get_keys_for_ltable_rtable(ltable, rtable, logger,
+                                                     verbose)
+
+        # # validate metadata
+        cm._validate_metadata_for_table(ltable, l_key, 'ltable', logger,
+                                        verbose)
+        cm._validate_metadata_for_table(rtable, r_key, 'rtable', logger,
+                                        verbose)
+
+        # do blocking
+
+        # # find the tuple pairs of all the passes (sorted by the position of
+        # # the left tuple and then of the right tuple)
+        l_pos, r_pos = self._get_pairs(ltable, rtable, l_sort_key,
+                                       r_sort_key, window_size,
+                                       allow_missing, n_jobs)
+
+        # # gather the output attributes of the tuple pairs
+        candset = get_candset_for_pairs(ltable, rtable, l_key, r_key,
+                                        l_pos, r_pos,
+                                        l_output_attrs, r_output_attrs,
+                                        l_output_prefix, r_output_prefix)
+
+        # update catalog
+        key = get_name_for_key(candset.columns)
+        candset = add_key_column(candset, key)
+        cm.set_candset_properties(candset, key, l_output_prefix + l_key,
+                                  r_output_prefix + r_key, ltable, rtable)
+
+        # return candidate set
+        return candset
+
+    def block_candset(self, candset, l_sort_key, r_sort_key, window_size=3,
+                      allow_missing=False, verbose=False, show_progress=True,
+                      n_jobs=1):
+        """Blocks an input candidate set of tuple pairs based on the sorted
+        neighborhood method.
+
+        Finds the tuple pairs from an input candidate set of tuple pairs that
+        would survive `block_tables` on the base tables of the candidate set,
+        i.e., the tuple pairs whose tuples are in the same window after
+        sorting the union of the tuples of the base tables on their sort
+        keys (see `block_tables`).
+
+        Args:
+            candset (DataFrame): The input candidate set of tuple pairs.
+
+            l_sort_key (string, function or list): The sort key of the left
+                table: an attribute name, a function that takes a tuple and
+                returns its sort key, or a list of them (one per pass).
+
+            r_sort_key (string, function or list): The sort key of the right
+                table (of the same length as `l_sort_key` if it is a list).
+
+            window_size (int): The number of consecutive tuples in a window
+                (defaults to 3). It must be at least 2.
+
+            allow_missing (boolean): A flag to indicate whether tuple pairs
+                                     with missing sort key in at least one of
+                                     the tuples should be retained in the
+                                     output candidate set (defaults to
+                                     False).
+
+            verbose (boolean): A flag to indicate whether the debug
+                information should be logged (defaults to False).
+
+            show_progress (boolean): A flag to indicate whether progress should
+                                     be displayed to the user (defaults to
+                                     True). Note that the tuple pairs are
+                                     compared all at once, using arrays, so
+                                     this parameter is only validated.
+
+            n_jobs (int): The number of parallel jobs to be used for computation
+                (defaults to 1). See `block_tables` for more details.
+
+        Returns:
+            A candidate set of tuple pairs that survived blocking (DataFrame).
+
+        Raises:
+            AssertionError: If `candset` is not of type pandas
+                DataFrame.
+            AssertionError: If `l_sort_key` is not of type string, function
+                or list of them.
+            AssertionError: If `r_sort_key` is not of type string, function
+                or list of them.
+            AssertionError: If `l_sort_key` and `r_sort_key` do not have
+                the same number of sort keys.
+            AssertionError: If `window_size` is not an integer greater than
+                1.
+            AssertionError: If `verbose` is not of type
+                boolean.
+            AssertionError: If `show_progress` is not of type boolean.
+            AssertionError: If `allow_missing` is not of type boolean.
+            AssertionError: If `n_jobs` is not of type
+                int.
+            AssertionError: If the sort key attributes are not in the
+                tables.
+
+        Examples:
+            >>> import py_entitymatching as em
+            >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='ID')
+            >>> B = em.read_csv_metadata('path_to_csv_dir/table_B.csv', key='ID')
+            >>> ab = em.AttrEquivalenceBlocker()
+            >>> C = ab.block_tables(A, B, 'zipcode', 'zipcode', l_output_attrs=['name'], r_output_attrs=['name'])
+            >>> sn = em.SortedNeighborhoodBlocker()
+            >>> D = sn.block_candset(C, 'name', 'name', window_size=4)
+
+        """
+
+        # validate data types of input parameters
+        self.validate_types_params_candset(candset, verbose, show_progress,
+                                           n_jobs)
+
+        # validate data types of the sort keys and the window size
+        self.validate_types_sort_keys(l_sort_key, r_sort_key)
+        self.validate_window_size(window_size)
+
+        # validate data type of allow_missing
+        self.validate_allow_missing(allow_missing)
+
+        # get and validate metadata
+        log_info(logger, 'Required metadata: cand.set key, fk ltable, '
+                         'fk rtable, ltable, rtable, ltable key, rtable key',
+                 verbose)
+
+        # # get metadata
+        key, fk_ltable, fk_rtable, ltable, rtable, l_key, r_key = cm.get_metadata_for_candset(
+            candset, logger, verbose)
+
+        # # validate metadata
+        cm._validate_metadata_for_candset(candset, key, fk_ltable, fk_rtable,
+                                          ltable, rtable, l_key, r_key,
+                                          logger, verbose)
+
+        # validate input parameters
+        self.validate_sort_keys(ltable, rtable, l_sort_key, r_sort_key)
+
+        # do blocking
+
+        # # find the tuple pairs of the base tables that survive blocking
+        l_pos, r_pos = self._get_pairs(ltable, rtable, l_sort_key,
+                                       r_sort_key, window_size,
+                                       allow_missing, n_jobs)
+
+        # # keep the tuple pairs of the candset that are among them,
+        # # comparing the positions of their tuples in the base tables
+        c_l_pos = RecordAccessor(ltable[[l_key]], l_key).get_positions(
+            candset[fk_ltable].values)
+        c_r_pos = RecordAccessor(rtable[[r_key]], r_key).get_positions(
+            candset[fk_rtable].values)
+        valid = np.in1d(_encode_pairs(c_l_pos, c_r_pos, len(rtable)),
+                        _encode_pairs(l_pos, r_pos, len(rtable)))
+
+        # construct output table
+        if len(candset) > 0:
+            out_table = candset[valid]
+        else:
+            out_table = pd.DataFrame(columns=candset.columns)
+
+        # update the catalog
+        cm.set_candset_properties(out_table, key, fk_ltable, fk_rtable,
+                                  ltable, rtable)
+
+        # return the output table
+        return out_table
+
+    def block_tuples(self, ltuple, rtuple, l_sort_key, r_sort_key,
+                     allow_missing=False):
+        """Blocks a tuple pair based on the sorted neighborhood method.
+
+        As this is a global blocker, a tuple pair cannot be blocked in
+        isolation. Considered alone, the two tuples are always in the same
+        window, so the tuple pair is blocked only if one of its sort keys is
+        missing (and `allow_missing` is False).
+
+        Args:
+            ltuple (Series): The input left tuple.
+
+            rtuple (Series): The input right tuple.
+
+            l_sort_key (string, function or list): The sort key of the left
+                tuple, or a list of sort keys.
+
+            r_sort_key (string, function or list): The sort key of the right
+                tuple, or a list of sort keys.
+
+            allow_missing (boolean): A flag to indicate whether a tuple pair
+                                     with missing sort key in at least one of
+                                     the tuples should be kept (defaults to
+                                     False).
+
+        Returns:
+            A status indicating if the tuple pair is blocked (boolean).
+
+        Examples:
+            >>> import py_entitymatching as em
+            >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='ID')
+            >>> B = em.read_csv_metadata('path_to_csv_dir/table_B.csv', key='ID')
+            >>> sn = em.SortedNeighborhoodBlocker()
+            >>> status = sn.block_tuples(A.ix[0], B.ix[0], 'name', 'name')
+        """
+        if allow_missing:
+            return False
+        # the tuple pair survives if it survives any of the passes
+        for l_key, r_key in zip(_get_key_list(l_sort_key),
+                                _get_key_list(r_sort_key)):
+            if not pd.isnull(_get_tuple_sort_key(ltuple, l_key)) and \
+                    not pd.isnull(_get_tuple_sort_key(rtuple, r_key)):
+                return False
+        return True
+
+    # ------------------------------------------------------------
+    # utility functions specific to sorted neighborhood blocking
+
+    # validate the data types of the sort keys
+    def validate_types_sort_keys(self, l_sort_key, r_sort_key):
+        for sort_key, prefix in [(l_sort_key, 'Sort key of left table'),
+                                 (r_sort_key, 'Sort key of right table')]:
+            keys = _get_key_list(sort_key)
+            if len(keys) == 0 or not all(
+                    isinstance(k, six.string_types) or callable(k)
+                    for k in keys):
+                logger.error('%s is not of type string, function or list of '
+                             'them' % prefix)
+                raise AssertionError('%s is not of type string, function or '
+                                     'list of them' % prefix)
+        if len(_get_key_list(l_sort_key)) != len(_get_key_list(r_sort_key)):
+            logger.error('Left and right sort keys do not have the same '
+                         'number of sort keys')
+            raise AssertionError('Left and right sort keys do not have the '
+                                 'same number of sort keys')
+
+    # validate the window size
+    def validate_window_size(self, window_size):
+        if not isinstance(window_size, int) or \
+                isinstance(window_size, bool) or window_size < 2:
+            logger.error('Parameter window_size is not an integer greater '
+                         'than 1')
+            raise AssertionError('Parameter window_size is not an integer '
+                                 'greater than 1')
+
+    # validate the attributes used as sort keys
+    def validate_sort_keys(self, ltable, rtable, l_sort_key, r_sort_key):
+        for key in _get_key_list(l_sort_key):
+            if isinstance(key, six.string_types) and \
+                    key not in ltable.columns:
+                logger.error('Left sort key attribute is not in the left '
+                             'table')
+                raise AssertionError('Left sort key attribute is not in the '
+                                     'left table')
+
+        for key in _get_key_list(r_sort_key):
+            if isinstance(key, six.string_types) and \
+                    key not in rtable.columns:
+                logger.error('Right sort key attribute is not in the right '
+                             'table')
+                raise AssertionError('Right sort key attribute is not in the '
+                                     'right table')
+
+    def _get_pairs(self, ltable, rtable, l_sort_key, r_sort_key, window_size,
+                   allow_missing, n_jobs):
+        passes = list(zip(_get_key_list(l_sort_key),
+                          _get_key_list(r_sort_key)))
+
+        # # determine number of processes to launch parallely
+        n_procs = self.get_num_procs(n_jobs, len(passes))
+
+        if n_procs <= 1:
+            # single process
+            pair_codes = [_get_pass_pair_codes(ltable, rtable, l_key, r_key,
+                                               window_size, allow_missing)
+                          for l_key, r_key in passes]
+        else:
+            # multiprocessing
+            # # pickle the sort keys (that can be functions) before passing
+            # # them to the processes, each process runs one pass
+            pair_codes = Parallel(n_jobs=n_procs)(
+                delayed(_get_pass_pair_codes)(ltable, rtable,
+                                              cp.dumps(l_key),
+                                              cp.dumps(r_key), window_size,
+                                              allow_missing, True)
+                for l_key, r_key in passes)
+
+        # merge the tuple pairs of all the passes, removing the duplicates
+        codes = np.unique(np.concatenate(pair_codes))
+        return _decode_pairs(codes, len(rtable))
+
+
+def _get_pass_pair_codes(ltable, rtable, l_sort_key, r_sort_key, window_size,
+                         allow_missing, is_pickled=False):
+    # finds the tuple pairs of one pass, and returns their codes
+    if is_pickled:
+        l_sort_key = pickle.loads(l_sort_key)
+        r_sort_key = pickle.loads(r_sort_key)
+    l_keys = _get_table_sort_keys(ltable, l_sort_key)
+    r_keys = _get_table_sort_keys(rtable, r_sort_key)
+    l_pos, r_pos = _get_window_pairs(l_keys, r_keys, window_size)
+    if allow_missing:
+        l_missing, r_missing = get_missing_pairs(
+            np.where(pd.isnull(l_keys), -1, 0), np.where(pd.isnull(r_keys),
+                                                         -1, 0))
+        l_pos = np.concatenate([l_pos, l_missing])
+        r_pos = np.concatenate([r_pos, r_missing])
+    return _encode_pairs(l_pos, r_pos, len(rtable))
+
+
+def _get_window_pairs(l_keys, r_keys, window_size):
+    # sorts the tuples of both the tables (with a sort key) together, and
+    # returns the positions of the left and the right tuples of the pairs
+    # less than window_size positions apart
+    l_valid = np.flatnonzero(~pd.isnull(l_keys))
+    r_valid = np.flatnonzero(~pd.isnull(r_keys))
+    keys = np.concatenate([np.asarray(l_keys)[l_valid],
+                           np.asarray(r_keys)[r_valid]])
+    positions = np.concatenate([l_valid, r_valid]).astype(np.int64)
+    is_left = np.concatenate([np.ones(len(l_valid), dtype=bool),
+                              np.zeros(len(r_valid), dtype=bool)])
+
+    # # sort the tuples (the sort is stable, so the tuples with the same sort
+    # # key stay in the order of the tables, with the left tuples first)
+    try:
+        order = np.argsort(keys, kind='mergesort')
+    except TypeError:
+        # the sort keys are not comparable (e.g., strings and numbers), so
+        # compare their string representations
+        order = np.argsort(keys.astype(six.text_type), kind='mergesort')
+    positions, is_left = positions[order], is_left[order]
+
+    # # pair each tuple with the tuples of the other table that follow it
+    # # in the same window
+    l_pos, r_pos = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for d in six.moves.range(1, min(window_size, len(positions))):
+        first, second = positions[:-d], positions[d:]
+        first_is_left = is_left[:-d]
+        cross = first_is_left != is_left[d:]
+        l_pos.append(np.where(first_is_left, first, second)[cross])
+        r_pos.append(np.where(first_is_left, second, first)[cross])
+    return np.concatenate(l_pos), np.concatenate(r_pos)
+
+
+def _get_table_sort_keys(table, sort_key):
+    if isinstance(sort_key, six.string_types):
+        return table[sort_key].values
+    records = RecordAccessor(table)
+    keys = np.empty(len(table), dtype=object)
+    keys[:] = [sort_key(records.get_record_at(i)) for i in range(len(table))]
+    # convert the keys to a numeric array if they are all numbers
+    return pd.Series(keys).infer_objects().values
+
+
+def _get_tuple_sort_key(record, sort_key):
+    if isinstance(sort_key, six.string_types):
+        return record[sort_key]
+    return sort_key(record)
+
+
+def _encode_pairs(l_pos, r_pos, num_r_rows):
+    return np.asarray(l_pos, dtype=np.int64) * max(num_r_rows, 1) + \
+           np.asarray(r_pos, dtype=np.int64)
+
+
+def _decode_pairs(codes, num_r_rows):
+    num_r_rows = max(num_r_rows, 1)
+    return codes // num_r_rows, codes % num_r_rows
+
+
+def _get_key_list(sort_key):
+    if isinstance(sort_key, list):
+        return sort_key
+    return [sort_key]
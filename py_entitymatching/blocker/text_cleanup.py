@@ -0,0 +1,168 @@
+"""
+This module contains functions to clean up the values of the overlap
+attributes of the overlap blocker (i.e., convert them to lower case, remove
+punctuations, duplicate words and optionally stop words), along with a cache
+of the cleaned columns.
+
+The cleanup is done once per distinct value of a column using pandas string
+methods, and it is split across several processes for large columns. The
+cleaned columns are cached per table, attribute and cleanup options, so
+blocking the same tables several times (e.g., with different overlap sizes
+or q-gram sizes) cleans up each column only once. A cached column is used
+only if the values of the column have not changed since it was cleaned up.
+"""
+from collections import OrderedDict
+import logging
+import weakref
+
+import numpy as np
+import pandas as pd
+import six
+from py_entitymatching.utils.parallel_helper import get_num_tasks, \
+    get_value_costs, run_tasks, split_by_cost
+
+logger = logging.getLogger(__name__)
+
+# Minimum number of distinct values of a column for the cleanup to be split
+# across several processes.
+parallel_cleanup_threshold = 100000
+
+
+def clean_values(values, rem_stop_words, stop_words, regex_punctuation,
+                 n_procs=1):
+    """
+    Cleans up an array of strings: converts them to lower case, removes the
+    punctuations, the duplicate words and (if rem_stop_words is True) the
+    stop words. Missing values are kept as they are.
+
+    Args:
+        values (array): The values to be cleaned up.
+        rem_stop_words (boolean): A flag to indicate whether the stop words
+            should be removed.
+        stop_words (list): The stop words.
+        regex_punctuation (regex): The compiled regex matching a
+            punctuation.
+        n_procs (int): The number of processes to be used if the column has
+            at least parallel_cleanup_threshold distinct values (defaults to
+            1).
+
+    Returns:
+        The cleaned up values (a NumPy array of objects).
+    """
+    values = np.asarray(values, dtype=object)
+    codes, uniques = pd.factorize(values)
+    uniques = np.asarray(uniques, dtype=object)
+
+    # clean up each distinct value once
+    if n_procs > 1 and len(uniques) >= parallel_cleanup_threshold:
+        # split the values into chunks with about the same total length
+        ranges = split_by_cost(get_value_costs(uniques),
+                               get_num_tasks(n_procs, len(uniques)))
+        splits = run_tasks(_clean_uniques,
+                           [(uniques[start:stop], rem_stop_words, stop_words,
+                             regex_punctuation) for start, stop in ranges],
+                           n_procs)
+        cleaned_uniques = np.concatenate(list(splits))
+    else:
+        cleaned_uniques = _clean_uniques(uniques, rem_stop_words, stop_words,
+                                         regex_punctuation)
+
+    cleaned = values.copy()
+    is_present = codes >= 0
+    cleaned[is_present] = cleaned_uniques[codes[is_present]]
+    return cleaned
+
+
+def _clean_uniques(uniques, rem_stop_words, stop_words, regex_punctuation):
+    cleaned = np.empty(len(uniques), dtype=object)
+    if len(uniques) == 0:
+        return cleaned
+    vals = pd.Series(uniques, dtype=object)
+    vals = vals.map(_decode)
+    vals = vals.str.lower()
+    vals = vals.replace(regex_punctuation.pattern, '', regex=True)
+
+    # remove the duplicate words (keeping the first occurrence of each
+    # word) and the stop words
+    stop_words = frozenset(stop_words) if rem_stop_words else frozenset()
+    cleaned[:] = [' '.join(t for t in OrderedDict.fromkeys(tokens)
+                           if t not in stop_words)
+                  for tokens in vals.str.split()]
+    return cleaned
+
+
+def _decode(val):
+    if isinstance(val, bytes):
+        return val.decode('utf-8', 'ignore')
+    return val
+
+
+class CleanedColumnCache(object):
+    """
+    A cache of the cleaned up columns of the tables, keyed by table,
+    attribute and cleanup options.
+
+    The cache keeps a weak reference to each table (so it does not prevent
+    the tables from being garbage collected) and a copy of the original
+    values of each cached column, which is compared with the current values
+    of the column before the cached column is returned. At most max_size
+    columns are kept (the least recently used columns are evicted first).
+    """
+
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, table, attr, options):
+        """
+        Returns the cleaned up column of a table, or None if it is not
+        cached or the values of the column have changed.
+        """
+        key = (id(table), attr, options)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        table_ref, raw_values, cleaned = entry
+        if table_ref() is not table or not _same_values(raw_values,
+                                                        table[attr]):
+            del self._entries[key]
+            return None
+        # move the entry to the end, as it is the most recently used one
+        del self._entries[key]
+        self._entries[key] = entry
+        return cleaned
+
+    def put(self, table, attr, options, cleaned):
+        """
+        Adds the cleaned up column of a table to the cache.
+        """
+        key = (id(table), attr, options)
+        self._entries.pop(key, None)
+        self._entries[key] = (weakref.ref(table), table[attr].copy(), cleaned)
+        self._remove_stale_entries()
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all the columns from the cache.
+        """
+        self._entries.clear()
+
+    def _remove_stale_entries(self):
+        for key in [k for k, (table_ref, _, _) in six.iteritems(self._entries)
+                    if table_ref() is None]:
+            del self._entries[key]
+
+
+def _same_values(raw_values, column):
+    if len(raw_values) != len(column):
+        return False
+    return pd.Series(raw_values.values).equals(pd.Series(column.values))
+
+
+# The cache shared by the overlap blockers.
+cleaned_column_cache = CleanedColumnCache()
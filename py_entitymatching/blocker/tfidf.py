@@ -0,0 +1,163 @@
+"""
+This module contains functions to compute the TF-IDF vectors of the values of
+an attribute in two tables, and to find the k right tuples most similar
+(by cosine similarity) to each left tuple.
+
+The similarities are computed with a sparse matrix product, a chunk of left
+tuples at a time, so only the similarities of a chunk are kept in memory.
+The number of left tuples in a chunk is chosen so that a chunk has at most
+max_chunk_pairs tuple pairs, whatever the sparsity of the vectors.
+"""
+from collections import Counter
+import logging
+
+import numpy as np
+import pandas as pd
+import six
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from py_entitymatching.utils.generic_helper import convert_to_str_unicode
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of tuple pairs whose similarities are kept in memory at
+# once.
+max_chunk_pairs = 10000000
+
+
+def get_tfidf_vectors(l_values, r_values, tokenizer, lowercase=True):
+    """
+    Computes the L2-normalized TF-IDF vectors of the values of both the
+    tables, with a vocabulary and document frequencies shared by the
+    tables. Each distinct value is tokenized once.
+
+    Args:
+        l_values, r_values (array): The attribute values of the left and the
+            right tables.
+        tokenizer (function): The function that returns the list of tokens
+            of a value.
+        lowercase (boolean): A flag to indicate whether the values should be
+            converted to lower case before they are tokenized (defaults to
+            True).
+
+    Returns:
+        The vectors of the left and the right tuples (SciPy CSR matrices)
+        and two boolean NumPy arrays flagging the tuples whose value is
+        missing or has no tokens (their vectors are empty).
+    """
+    values = np.concatenate([np.asarray(l_values, dtype=object),
+                             np.asarray(r_values, dtype=object)])
+    codes, uniques = pd.factorize(values)
+
+    # # count the tokens of each distinct value
+    vocabulary = {}
+    indptr, indices, data = [0], [], []
+    for val in uniques:
+        if lowercase:
+            val = convert_to_str_unicode(val).lower()
+        tokens = tokenizer(val)
+        if not isinstance(tokens, list):
+            # the tokenizers return NaN for missing values
+            tokens = []
+        counts = Counter(vocabulary.setdefault(t, len(vocabulary))
+                         for t in tokens)
+        indices.extend(six.iterkeys(counts))
+        data.extend(six.itervalues(counts))
+        indptr.append(len(indices))
+    # the missing values are mapped to an extra empty row
+    indptr.append(len(indices))
+    counts = sparse.csr_matrix((np.asarray(data, dtype=np.float64),
+                                np.asarray(indices, dtype=np.int64),
+                                np.asarray(indptr, dtype=np.int64)),
+                               shape=(len(uniques) + 1, len(vocabulary)))
+    codes = np.where(codes < 0, len(uniques), codes)
+    tf = counts[codes]
+
+    # # weight the counts with the (smoothed) inverse document frequencies
+    num_docs = tf.shape[0]
+    doc_freqs = np.bincount(tf.indices, minlength=tf.shape[1])
+    idf = np.log((1.0 + num_docs) / (1.0 + doc_freqs)) + 1.0
+    vectors = normalize(tf.dot(sparse.diags(idf)).tocsr(), norm='l2')
+
+    is_missing = np.diff(vectors.indptr) == 0
+    num_l = len(l_values)
+    return (vectors[:num_l], vectors[num_l:], is_missing[:num_l],
+            is_missing[num_l:])
+
+
+def get_top_k_pairs(l_vectors, r_vectors, r_missing, k):
+    """
+    Finds, for each left tuple with a non-missing value, the k right tuples
+    (with a non-missing value) with the highest cosine similarity, breaking
+    the ties by position. If fewer than k right tuples share a token with a
+    left tuple, the remaining ones are the first right tuples (by position)
+    sharing no token with it.
+
+    Args:
+        l_vectors, r_vectors (sparse matrix): The TF-IDF vectors of the left
+            and the right tuples.
+        r_missing (array): The flags of the right tuples with a missing
+            value.
+        k (int): The number of right tuples per left tuple.
+
+    Returns:
+        The positions of the left and the right tuples of each pair, sorted
+        by the position of the left tuple and then by decreasing
+        similarity.
+    """
+    num_l, num_r = l_vectors.shape[0], r_vectors.shape[0]
+    r_present = np.flatnonzero(~np.asarray(r_missing, dtype=bool))
+    k = min(k, len(r_present))
+    l_present = np.diff(l_vectors.indptr) > 0
+    r_vectors_t = r_vectors.T.tocsc()
+
+    chunk_size = max(1, max_chunk_pairs // max(num_r, 1))
+    l_pos, r_pos = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for start in six.moves.range(0, num_l, chunk_size):
+        stop = min(start + chunk_size, num_l)
+        sims = l_vectors[start:stop].dot(r_vectors_t).tocoo()
+        rows = sims.row.astype(np.int64)
+        cols = sims.col.astype(np.int64)
+
+        # # rank the right tuples of each left tuple
+        order = np.lexsort((cols, -sims.data, rows))
+        rows, cols = rows[order], cols[order]
+        ranks = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        keep = ranks < k
+        chunk_l_pos, chunk_r_pos = [rows[keep] + start], [cols[keep]]
+
+        # # complete the left tuples with fewer than k similar right tuples
+        num_similar = np.bincount(rows, minlength=stop - start)
+        bounds = np.concatenate([[0], np.cumsum(num_similar)])
+        for row in np.flatnonzero((num_similar < k) &
+                                  l_present[start:stop]):
+            similar = set(cols[bounds[row]:bounds[row + 1]])
+            needed = k - num_similar[row]
+            others = [c for c in r_present[:needed + len(similar)]
+                      if c not in similar][:needed]
+            chunk_l_pos.append(np.full(len(others), row + start,
+                                       dtype=np.int64))
+            chunk_r_pos.append(np.asarray(others, dtype=np.int64))
+
+        chunk_l_pos = np.concatenate(chunk_l_pos)
+        chunk_r_pos = np.concatenate(chunk_r_pos)
+        # the stable sort keeps the ranks within each left tuple
+        order = np.argsort(chunk_l_pos, kind='mergesort')
+        l_pos.append(chunk_l_pos[order])
+        r_pos.append(chunk_r_pos[order])
+    return np.concatenate(l_pos), np.concatenate(r_pos)
+
+
+def get_pair_similarities(l_vectors, r_vectors, l_pos, r_pos):
+    """
+    Returns the cosine similarities of the vectors of the given tuple pairs.
+    """
+    sims = np.zeros(len(l_pos), dtype=np.float64)
+    chunk_size = max(1, max_chunk_pairs // 100)
+    for start in six.moves.range(0, len(l_pos), chunk_size):
+        stop = start + chunk_size
+        sims[start:stop] = np.asarray(
+            l_vectors[l_pos[start:stop]].multiply(
+                r_vectors[r_pos[start:stop]]).sum(axis=1)).ravel()
+    return sims
@@ -0,0 +1,490 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import six
+
+import py_entitymatching.catalog.catalog_manager as cm
+from py_entitymatching.blocker.blocker import Blocker
+from py_entitymatching.blocker.blocking_key import get_missing_pairs
+from py_entitymatching.blocker.tfidf import get_tfidf_vectors, \
+    get_top_k_pairs, get_pair_similarities
+from py_entitymatching.feature.tokenizers import tok_wspace
+from py_entitymatching.utils.catalog_helper import log_info, get_name_for_key, add_key_column
+from py_entitymatching.utils.generic_helper import get_candset_for_pairs
+from py_entitymatching.utils.parallel_helper import get_num_tasks, \
+    run_tasks, split_by_cost
+from py_entitymatching.utils.record_helper import RecordAccessor
+from py_entitymatching.utils.validation_helper import validate_object_type
+
+logger = logging.getLogger(__name__)
+
+
+class TfidfBlocker(Blocker):
+    """
+    Blocks based on the cosine similarity of the TF-IDF vectors of an
+    attribute, keeping the k most similar right tuples of each left tuple.
+
+    The vectors are computed over the tokens of the attribute values of both
+    the tables (with document frequencies computed over both the tables),
+    so frequent tokens weigh less than rare ones. This suits long textual
+    attributes (e.g., titles or descriptions), where blocking on shared
+    tokens returns too many tuple pairs.
+
+    Like the sorted neighborhood blocker, this is a global blocker: whether a
+    tuple pair survives depends on the other tuples of the tables.
+    """
+
+    def block_tables(self, ltable, rtable, l_block_attr, r_block_attr, k=10,
+                     tokenizer=None, lowercase=True,
+                     l_output_attrs=None, r_output_attrs=None,
+                     l_output_prefix='ltable_', r_output_prefix='rtable_',
+                     allow_missing=False, verbose=False, n_jobs=1):
+        """Blocks two tables, keeping the k right tuples most similar to each
+        left tuple.
+
+        Computes the TF-IDF vectors of the values of attribute
+        `l_block_attr` of the left table and of attribute `r_block_attr` of
+        the right table, and pairs each tuple from the left table with the
+        `k` tuples from the right table whose vectors have the highest cosine
+        similarity with its vector (the ties are broken by the position of
+        the right tuples). The output thus contains exactly k tuple pairs per
+        left tuple with a non-missing value (or as many as there are right
+        tuples with a non-missing value, if there are fewer). The
+        similarities are computed with a sparse matrix product, a chunk of
+        left tuples at a time, so the memory used is bounded.
+        The dataframe will include attributes '_id', key attribute from
+        ltable, key attributes from rtable, followed by lists `l_output_attrs` and
+        `r_output_attrs` if they are specified. Each of these output and key attributes will be
+        prefixed with given `l_output_prefix` and `r_output_prefix`.
+        Further, this will update the following metadata in the catalog for the output table:
+        (1) key, (2) ltable, (3) rtable, (4) fk_ltable, and (5) fk_rtable.
+
+        Args:
+            ltable (DataFrame): The left input table.
+
+            rtable (DataFrame): The right input table.
+
+            l_block_attr (string): The blocking attribute in left table.
+
+            r_block_attr (string): The blocking attribute in right table.
+
+            k (int): The number of right tuples kept per left tuple
+                (defaults to 10).
+
+            tokenizer (function): The function that returns the list of
+                tokens of a value, e.g., a tokenizer returned by
+                `get_tokenizers_for_blocking` (defaults to None, i.e.,
+                `tok_wspace`).
+
+            lowercase (boolean): A flag to indicate whether the values should
+                be converted to lower case before they are tokenized
+                (defaults to True).
+
+            l_output_attrs (list): A list of attribute names from the left
+                                   table to be included in the
+                                   output candidate set (defaults to None).
+
+            r_output_attrs (list): A list of attribute names from the right
+                                   table to be included in the
+                                   output candidate set (defaults to None).
+
+            l_output_prefix (string): The prefix to be used for the attribute names
+                                   coming from the left table in the output
+                                   candidate set (defaults to 'ltable\_').
+
+            r_output_prefix (string): The prefix to be used for the attribute names
+                                   coming from the right table in the output
+                                   candidate set (defaults to 'rtable\_').
+
+            allow_missing (boolean): A flag to indicate whether tuple pairs
+                                     with missing value (or no tokens) in at
+                                     least one of the tuples should be
+                                     included in the output candidate set
+                                     (defaults to False). If this flag is set
+                                     to True, a tuple in ltable with missing
+                                     value in the blocking attribute will be
+                                     matched with every tuple in rtable and
+                                     vice versa.
+
+            verbose (boolean): A flag to indicate whether the debug information
+                should be logged (defaults to False).
+
+            n_jobs (int): The number of parallel jobs to be used for computation
+                (defaults to 1). If -1 all CPUs are used. If 0 or 1,
+                no parallel computation is used at all, which is useful for
+                debugging. For n_jobs below -1, (n_cpus + 1 + n_jobs) are
+                used (where n_cpus is the total number of CPUs in the
+                machine). Thus, for n_jobs = -2, all CPUs but one are used.
+                If (n_cpus + 1 + n_jobs) is less than 1, then no parallel
+                computation is used (i.e., equivalent to the default).
+                The left table is split across the processes.
+
+        Returns:
+            A candidate set of tuple pairs that survived blocking (DataFrame).
+
+        Raises:
+            AssertionError: If `ltable` is not of type pandas
+                DataFrame.
+            AssertionError: If `rtable` is not of type pandas
+                DataFrame.
+            AssertionError: If `l_block_attr` is not of type string.
+            AssertionError: If `r_block_attr` is not of type string.
+            AssertionError: If `k` is not a positive integer.
+            AssertionError: If `tokenizer` is not a function.
+            AssertionError: If `lowercase` is not of type boolean.
+            AssertionError: If `l_output_attrs` is not of type of
+                list.
+            AssertionError: If `r_output_attrs` is not of type of
+                list.
+            AssertionError: If the values in `l_output_attrs` is not of type
+                string.
+            AssertionError: If the values in `r_output_attrs` is not of type
+                string.
+            AssertionError: If `l_output_prefix` is not of type
+                string.
+            AssertionError: If `r_output_prefix` is not of type
+                string.
+            AssertionError: If `verbose` is not of type
+                boolean.
+            AssertionError: If `allow_missing` is not of type boolean.
+            AssertionError: If `n_jobs` is not of type
+                int.
+            AssertionError: If `l_block_attr` is not in the ltable columns.
+            AssertionError: If `r_block_attr` is not in the rtable columns.
+            AssertionError: If `l_out_attrs` are not in the ltable.
+            AssertionError: If `r_out_attrs` are not in the rtable.
+
+        Examples:
+            >>> import py_entitymatching as em
+            >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='ID')
+            >>> B = em.read_csv_metadata('path_to_csv_dir/table_B.csv', key='ID')
+            >>> tb = em.TfidfBlocker()
+            >>> C1 = tb.block_tables(A, B, 'title', 'title', k=5, l_output_attrs=['title'], r_output_attrs=['title'])
+            # Use 3-grams
+            >>> block_t = em.get_tokenizers_for_blocking()
+            >>> C2 = tb.block_tables(A, B, 'title', 'title', k=5, tokenizer=block_t['qgm_3'])
+
+        """
+
+        # validate data types of input parameters
+        self.validate_types_params_tables(ltable, rtable,
+                                          l_output_attrs, r_output_attrs,
+                                          l_output_prefix,
+                                          r_output_prefix, verbose, n_jobs)
+
+        # validate data types of the parameters specific to tf-idf blocker
+        self.validate_types_block_attrs(l_block_attr, r_block_attr)
+        self.validate_tfidf_params(k, tokenizer, lowercase)
+
+        # validate data type of allow_missing
+        self.validate_allow_missing(allow_missing)
+
+        # validate input parameters
+        self.validate_block_attrs(ltable, rtable, l_block_attr, r_block_attr)
+        self.validate_output_attrs(ltable, rtable, l_output_attrs,
+                                   r_output_attrs)
+
+        # get and validate required metadata
+        log_info(logger, 'Required metadata: ltable key, rtable key', verbose)
+
+        # # get metadata
+        l_key, r_key = cm.get_keys_for_ltable_rtable(ltable, rtable, logger,
+                                                     verbose)
+
+        # # validate metadata
+        cm._validate_metadata_for_table(ltable, l_key, 'ltable', logger,
+                                        verbose)
+        cm._validate_metadata_for_table(rtable, r_key, 'rtable', logger,
+                                        verbose)
+
+        # do blocking
+
+        # # compute the vectors of both the tables
+        l_vectors, r_vectors, l_missing, r_missing = get_tfidf_vectors(
+            ltable[l_block_attr].values, rtable[r_block_attr].values,
+            tokenizer or tok_wspace, lowercase)
+        log_info(logger, 'Number of distinct tokens: %d'
+                 % l_vectors.shape[1], verbose)
+
+        # # find the k most similar right tuples of each left tuple
+        l_pos, r_pos = self._get_top_k_pairs(l_vectors, r_vectors, r_missing,
+                                             k, n_jobs, verbose)
+
+        if allow_missing:
+            l_miss_pos, r_miss_pos = get_missing_pairs(
+                np.where(l_missing, -1, 0), np.where(r_missing, -1, 0))
+            l_pos = np.concatenate([l_pos, l_miss_pos])
+            r_pos = np.concatenate([r_pos, r_miss_pos])
+
+        # # sort the tuple pairs like the other blockers do
+        order = np.lexsort((r_pos, l_pos))
+        l_pos, r_pos = l_pos[order], r_pos[order]
+
+        # # gather the output attributes of the tuple pairs
+        candset = get_candset_for_pairs(ltable, rtable, l_key, r_key,
+                                        l_pos, r_pos,
+                                        l_output_attrs, r_output_attrs,
+                                        l_output_prefix, r_output_prefix)
+
+        # update catalog
+        key = get_name_for_key(candset.columns)
+        candset = add_key_column(candset, key)
+        cm.set_candset_properties(candset, key, l_output_prefix + l_key,
+                                  r_output_prefix + r_key, ltable, rtable)
+
+        # return candidate set
+        return candset
+
+    def block_candset(self, candset, l_block_attr, r_block_attr, k=10,
+                      tokenizer=None, lowercase=True, allow_missing=False,
+                      verbose=False, show_progress=True, n_jobs=1):
+        """Blocks an input candidate set of tuple pairs, keeping the k right
+        tuples most similar to each left tuple among the tuple pairs of the
+        candidate set.
+
+        The TF-IDF vectors are computed over the base tables of the
+        candidate set (as in `block_tables`), and for each left tuple, the
+        `k` tuple pairs of the candidate set with the highest cosine
+        similarity are kept (the ties are broken by the position of the
+        right tuples in the right table).
+
+        Args:
+            candset (DataFrame): The input candidate set of tuple pairs.
+
+            l_block_attr (string): The blocking attribute in left table.
+
+            r_block_attr (string): The blocking attribute in right table.
+
+            k (int): The number of tuple pairs kept per left tuple (defaults
+                to 10).
+
+            tokenizer (function): The function that returns the list of
+                tokens of a value (defaults to None, i.e., `tok_wspace`).
+
+            lowercase (boolean): A flag to indicate whether the values should
+                be converted to lower case before they are tokenized
+                (defaults to True).
+
+            allow_missing (boolean): A flag to indicate whether tuple pairs
+                                     with missing value in at least one of
+                                     the tuples should be retained in the
+                                     output candidate set (defaults to
+                                     False).
+
+            verbose (boolean): A flag to indicate whether the debug
+                information should be logged (defaults to False).
+
+            show_progress (boolean): A flag to indicate whether progress should
+                                     be displayed to the user (defaults to
+                                     True). Note that the tuple pairs are
+                                     compared all at once, using sparse
+                                     matrices, so this parameter is only
+                                     validated.
+
+            n_jobs (int): The number of parallel jobs to be used for computation
+                (defaults to 1). Note that the tuple pairs are compared all
+                at once, so this parameter is only validated.
+
+        Returns:
+            A candidate set of tuple pairs that survived blocking (DataFrame).
+
+        Raises:
+            AssertionError: If `candset` is not of type pandas
+                DataFrame.
+            AssertionError: If `l_block_attr` is not of type string.
+            AssertionError: If `r_block_attr` is not of type string.
+            AssertionError: If `k` is not a positive integer.
+            AssertionError: If `tokenizer` is not a function.
+            AssertionError: If `lowercase` is not of type boolean.
+            AssertionError: If `verbose` is not of type
+                boolean.
+            AssertionError: If `show_progress` is not of type boolean.
+            AssertionError: If `allow_missing` is not of type boolean.
+            AssertionError: If `n_jobs` is not of type
+                int.
+            AssertionError: If `l_block_attr` is not in the ltable columns.
+            AssertionError: If `r_block_attr` is not in the rtable columns.
+
+        Examples:
+            >>> import py_entitymatching as em
+            >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='ID')
+            >>> B = em.read_csv_metadata('path_to_csv_dir/table_B.csv', key='ID')
+            >>> ab = em.AttrEquivalenceBlocker()
+            >>> C = ab.block_tables(A, B, 'year', 'year', l_output_attrs=['title'], r_output_attrs=['title'])
+            >>> tb = em.TfidfBlocker()
+            >>> D = tb.block_candset(C, 'title', 'title', k=3)
+
+        """
+
+        # validate data types of input parameters
+        self.validate_types_params_candset(candset, verbose, show_progress,
+                                           n_jobs)
+
+        # validate data types of the parameters specific to tf-idf blocker
+        self.validate_types_block_attrs(l_block_attr, r_block_attr)
+        self.validate_tfidf_params(k, tokenizer, lowercase)
+
+        # validate data type of allow_missing
+        self.validate_allow_missing(allow_missing)
+
+        # get and validate metadata
+        log_info(logger, 'Required metadata: cand.set key, fk ltable, '
+                         'fk rtable, ltable, rtable, ltable key, rtable key',
+                 verbose)
+
+        # # get metadata
+        key, fk_ltable, fk_rtable, ltable, rtable, l_key, r_key = cm.get_metadata_for_candset(
+            candset, logger, verbose)
+
+        # # validate metadata
+        cm._validate_metadata_for_candset(candset, key, fk_ltable, fk_rtable,
+                                          ltable, rtable, l_key, r_key,
+                                          logger, verbose)
+
+        # validate input parameters
+        self.validate_block_attrs(ltable, rtable, l_block_attr, r_block_attr)
+
+        # do blocking
+
+        # # compute the vectors of the base tables, and the similarities of
+        # # the tuple pairs of the candset
+        l_vectors, r_vectors, l_missing, r_missing = get_tfidf_vectors(
+            ltable[l_block_attr].values, rtable[r_block_attr].values,
+            tokenizer or tok_wspace, lowercase)
+        l_pos = RecordAccessor(ltable[[l_key]], l_key).get_positions(
+            candset[fk_ltable].values)
+        r_pos = RecordAccessor(rtable[[r_key]], r_key).get_positions(
+            candset[fk_rtable].values)
+        sims = get_pair_similarities(l_vectors, r_vectors, l_pos, r_pos)
+
+        # # rank the tuple pairs of each left tuple, and keep the k first
+        is_missing = l_missing[l_pos] | r_missing[r_pos]
+        order = np.lexsort((r_pos, -sims, is_missing, l_pos))
+        sorted_l_pos = l_pos[order]
+        ranks = np.arange(len(order)) - np.searchsorted(sorted_l_pos,
+                                                        sorted_l_pos)
+        valid = np.zeros(len(candset), dtype=bool)
+        valid[order] = ranks < k
+        valid &= ~is_missing
+        if allow_missing:
+            valid |= is_missing
+
+        # construct output table
+        if len(candset) > 0:
+            out_table = candset[valid]
+        else:
+            out_table = pd.DataFrame(columns=candset.columns)
+
+        # update the catalog
+        cm.set_candset_properties(out_table, key, fk_ltable, fk_rtable,
+                                  ltable, rtable)
+
+        # return the output table
+        return out_table
+
+    def block_tuples(self, ltuple, rtuple, l_block_attr, r_block_attr,
+                     tokenizer=None, lowercase=True, allow_missing=False):
+        """Blocks a tuple pair based on the TF-IDF vectors of an attribute.
+
+        As this is a global blocker, a tuple pair cannot be blocked in
+        isolation. Considered alone, the right tuple is always among the k
+        most similar right tuples of the left tuple, so the tuple pair is
+        blocked only if one of the values has no tokens (and
+        `allow_missing` is False).
+
+        Args:
+            ltuple (Series): The input left tuple.
+
+            rtuple (Series): The input right tuple.
+
+            l_block_attr (string): The blocking attribute in left tuple.
+
+            r_block_attr (string): The blocking attribute in right tuple.
+
+            tokenizer (function): The function that returns the list of
+                tokens of a value (defaults to None, i.e., `tok_wspace`).
+
+            lowercase (boolean): A flag to indicate whether the values should
+                be converted to lower case before they are tokenized
+                (defaults to True).
+
+            allow_missing (boolean): A flag to indicate whether a tuple pair
+                                     with missing value in at least one of
+                                     the tuples should be kept (defaults to
+                                     False).
+
+        Returns:
+            A status indicating if the tuple pair is blocked (boolean).
+
+        Examples:
+            >>> import py_entitymatching as em
+            >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='ID')
+            >>> B = em.read_csv_metadata('path_to_csv_dir/table_B.csv', key='ID')
+            >>> tb = em.TfidfBlocker()
+            >>> status = tb.block_tuples(A.ix[0], B.ix[0], 'title', 'title')
+        """
+        if allow_missing:
+            return False
+        _, _, l_missing, r_missing = get_tfidf_vectors(
+            [ltuple[l_block_attr]], [rtuple[r_block_attr]],
+            tokenizer or tok_wspace, lowercase)
+        return bool(l_missing[0] or r_missing[0])
+
+    # ------------------------------------------------------------
+    # utility functions specific to tf-idf blocking
+
+    # validate the data types of the blocking attributes
+    def validate_types_block_attrs(self, l_block_attr, r_block_attr):
+        validate_object_type(l_block_attr, six.string_types,
+                             error_prefix='Blocking attribute name of left table')
+        validate_object_type(r_block_attr, six.string_types,
+                             error_prefix='Blocking attribute name of right table')
+
+    # validate the blocking attributes
+    def validate_block_attrs(self, ltable, rtable, l_block_attr, r_block_attr):
+        if l_block_attr not in ltable.columns:
+            raise AssertionError(
+                'Left block attribute is not in the left table')
+
+        if r_block_attr not in rtable.columns:
+            raise AssertionError(
+                'Right block attribute is not in the right table')
+
+    # validate k, the tokenizer and lowercase
+    def validate_tfidf_params(self, k, tokenizer, lowercase):
+        if not isinstance(k, int) or isinstance(k, bool) or k < 1:
+            logger.error('Parameter k is not a positive integer')
+            raise AssertionError('Parameter k is not a positive integer')
+
+        if tokenizer is not None and not callable(tokenizer):
+            logger.error('Parameter tokenizer is not a function')
+            raise AssertionError('Parameter tokenizer is not a function')
+
+        validate_object_type(lowercase, bool, error_prefix='Parameter lowercase')
+
+    def _get_top_k_pairs(self, l_vectors, r_vectors, r_missing, k, n_jobs,
+                         verbose=False):
+        # # determine number of processes to launch parallely
+        n_procs = self.get_num_procs(n_jobs, l_vectors.shape[0])
+
+        if n_procs <= 1:
+            # single process
+            return get_top_k_pairs(l_vectors, r_vectors, r_missing, k)
+
+        # multiprocessing
+        # # split the left tuples into ranges with about the same number of
+        # # products of non-zero weights (i.e., the number of right tuples
+        # # containing each token of the left tuples)
+        r_token_counts = np.diff(r_vectors.tocsc().indptr)
+        costs = (l_vectors != 0).astype(np.int64).dot(r_token_counts) + 1
+        ranges = split_by_cost(costs, get_num_tasks(n_procs,
+                                                     l_vectors.shape[0]))
+        results = list(run_tasks(
+            get_top_k_pairs, [(l_vectors[start:stop], r_vectors, r_missing,
+                               k) for start, stop in ranges], n_procs,
+            [costs[start:stop].sum() for start, stop in ranges], verbose))
+        l_pos = np.concatenate([l + start for (l, _), (start, _)
+                                in zip(results, ranges)])
+        r_pos = np.concatenate([r for _, r in results])
+        return l_pos, r_pos
@@ -2,12 +2,14 @@
 """
 This module contains functions for combining outputs from multiple blockers.
 """
+from collections import OrderedDict
 import logging
 
 import pandas as pd
 import six
 
 import py_entitymatching.catalog.catalog_manager as cm
+from py_entitymatching.blocker.pair_set import PairSet
 import py_entitymatching.utils.catalog_helper as ch
 import py_entitymatching.utils.generic_helper as gh
 import py_entitymatching.utils.validation_helper
@@ -151,21 +153,26 @@ def combine_blocker_outputs_via_union(
             '%s)', r_prefix)
 
     # Initialize lists
-    # # keep track of projected tuple pair ids
-    tuple_pair_ids = []
+    # # keep track of the tuple pairs, as a set of tuple positions
+    tuple_pairs = PairSet(ltable, rtable)
     # # keep track of output attributes from the left table
     l_output_attrs = []
     # # keep track of output attributes from the right table
     r_output_attrs = []
 
-    # for each DataFrame in the given list, project out tuple pair ids, get the
-    #  attributes from the ltable and rtable
+    ch.log_info(logger, 'Taking the union of the tuple pair ids across '
+                        'given blockers ...', verbose)
+
+    # for each DataFrame in the given list, add its tuple pairs to the set,
+    # get the attributes from the ltable and rtable
     for data_frame in blocker_output_list:
-        # Project out the tuple pair ids. A tuple pair id is a fk_ltable,
-        # fk_rtable pair
-        projected_tuple_pair_ids = data_frame[[fk_ltable, fk_rtable]]
-        # Update the list that tracks tuple pair ids
-        tuple_pair_ids.append(projected_tuple_pair_ids)
+        # Add the tuple pairs of the DataFrame to the set. A tuple pair is
+        # identified by the positions of the tuples referred by its
+        # fk_ltable and fk_rtable, so the union merges sorted integer codes
+        # instead of deduplicating the ids.
+        tuple_pairs = tuple_pairs | PairSet.from_ids(
+            ltable, rtable, data_frame[fk_ltable].values,
+            data_frame[fk_rtable].values)
 
         # Get the columns, which should be segregated into the attributes
         # from the ltable and table
@@ -181,47 +188,28 @@ def combine_blocker_outputs_via_union(
         # the reason we use extend because l_attrs a list
         r_output_attrs.extend(r_attrs)
 
-    ch.log_info(logger, 'Concatenating the tuple pair ids across given '
-                        'blockers ...', verbose)
-
-    # concatenate the tuple pair ids from the list of input DataFrames
-    concatenated_tuple_pair_ids = pd.concat(tuple_pair_ids)
-
-    ch.log_info(logger, 'Concatenating the tuple pair ids ... DONE', verbose)
-    ch.log_info(logger, 'Deduplicating the tuple pair ids ...', verbose)
-
-    # Deduplicate the DataFrame. Now the returned DataFrame will contain
-    # unique tuple pair ids.
-
-    # noinspection PyUnresolvedReferences
-    deduplicated_tuple_pair_ids = concatenated_tuple_pair_ids.drop_duplicates()
-
-    ch.log_info(logger, 'Deduplicating the tuple pair ids ... DONE', verbose)
+    ch.log_info(logger, 'Taking the union of the tuple pair ids ... DONE',
+                verbose)
 
     # Construct output table
     # # Get unique list of attributes across different tables
     l_output_attrs = gh.list_drop_duplicates(l_output_attrs)
     r_output_attrs = gh.list_drop_duplicates(r_output_attrs)
 
-    # Reset the index that might have lingered from concatenation.
-    deduplicated_tuple_pair_ids.reset_index(inplace=True, drop=True)
-
-    # Add the output attribtues from the ltable and rtable.
-    # NOTE: This approach may be inefficient as it probes the ltable, rtable
-    # to get the attribute values. A better way would be to fill the
-    # attribute values from the input list of DataFrames. This attribute values
-    # could be harvested (at the expense of some space) while we iterate the
-    # input blocker output list for the first time.
-
-    # noinspection PyProtectedMember
-    consolidated_data_frame = gh._add_output_attributes(
-        deduplicated_tuple_pair_ids, fk_ltable,
-        fk_rtable,
-        ltable, rtable, l_key, r_key,
-        l_output_attrs, r_output_attrs,
-        l_prefix,
-        r_prefix,
-        validate=False)
+    # Add the output attributes from the ltable and rtable, gathering the
+    # values of all the tuple pairs at once using the positions of their
+    # tuples.
+    l_pos, r_pos = tuple_pairs.l_pos, tuple_pairs.r_pos
+    columns = OrderedDict()
+    columns[fk_ltable] = ltable[l_key].values[l_pos]
+    columns[fk_rtable] = rtable[r_key].values[r_pos]
+    for attr in l_output_attrs:
+        columns[l_prefix + attr] = ltable[attr].values[l_pos]
+    for attr in r_output_attrs:
+        columns[r_prefix + attr] = rtable[attr].values[r_pos]
+    consolidated_data_frame = pd.DataFrame(columns,
+                                           columns=list(columns.keys()))
+
     # Sort the DataFrame ordered by fk_ltable and fk_rtable.
     # The function "sort" will be depreciated in the newer versions of
     # pandas DataFrame, and it will replaced by 'sort_values' function. So we
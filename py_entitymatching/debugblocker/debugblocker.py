@@ -4,6 +4,10 @@ import logging
 import numpy
 from operator import attrgetter
 import pandas as pd
+from py_entitymatching.utils.catalog_helper import log_info
+from py_entitymatching.utils.parallel_helper import SharedObject, \
+    SharedValue, get_object, get_num_procs, get_num_tasks, run_tasks, \
+    split_by_cost, split_ranges
 from py_entitymatching.utils.validation_helper import validate_object_type
 
 import py_entitymatching as em
@@ -11,9 +15,16 @@ import py_entitymatching.catalog.catalog_manager as cm
 
 logger = logging.getLogger(__name__)
 
+# Number of tuple pairs of the candidate set that are encoded at a time.
+candset_chunk_size = 1000000
+
+# Number of prefix events after which a worker of the parallel topk join
+# reads (and raises) the k-th similarity shared by the workers.
+threshold_sync_interval = 100
+
 
 def debug_blocker(candset, ltable, rtable, output_size=200,
-                  attr_corres=None, verbose=False):
+                  attr_corres=None, verbose=False, n_jobs=1):
     """
     This function debugs the blocker output and reports a list of potential
     matches that are discarded by a blocker (or a blocker sequence).
@@ -44,6 +55,19 @@ def debug_blocker(candset, ltable, rtable, output_size=200,
             identical (defaults to None).
         verbose (boolean):  A flag to indicate whether the debug information
          should be logged (defaults to False).
+        n_jobs (int): The number of parallel jobs to be used for computation
+            (defaults to 1). If -1 all CPUs are used. If 0 or 1,
+            no parallel computation is used at all, which is useful for
+            debugging. For n_jobs below -1, (n_cpus + 1 + n_jobs) are
+            used (where n_cpus is the total number of CPUs in the
+            machine). Thus, for n_jobs = -2, all CPUs but one are used.
+            If (n_cpus + 1 + n_jobs) is less than 1, then no parallel
+            computation is used (i.e., equivalent to the default).
+            The tables are tokenized in parallel, and the left table is
+            partitioned across the workers, which probe an index of the
+            right table (built once and shared by the workers) with the
+            tuples of their partition, and share the k-th best similarity
+            found so far to prune the tuple pairs.
 
     Returns:
         A pandas DataFrame with 'output_size' number of rows. Each row in the
@@ -64,6 +88,7 @@ def debug_blocker(candset, ltable, rtable, output_size=200,
             not in the correct format (a list of tuples).
         AssertionError: If the attribute correspondence (`attr_corres`)
             cannot be built correctly.
+        AssertionError: If `n_jobs` is not of type int.
 
     Examples:
         >>> import py_entitymatching as em
@@ -81,6 +106,7 @@ def debug_blocker(candset, ltable, rtable, output_size=200,
     # Check input types.
     _validate_types(ltable, rtable, candset, output_size,
                     attr_corres, verbose)
+    validate_object_type(n_jobs, int, 'Parameter n_jobs')
 
     # Check table size.
     if len(ltable) == 0:
@@ -94,81 +120,198 @@ def debug_blocker(candset, ltable, rtable, output_size=200,
                              ' is less than or equal to 0. Nothing needs'
                              ' to be done!')
 
-    # Get table metadata.
-    l_key, r_key = cm.get_keys_for_ltable_rtable(ltable, rtable, logger, verbose)
-
-    # Validate metadata
-    cm._validate_metadata_for_table(ltable, l_key, 'ltable', logger, verbose)
-    cm._validate_metadata_for_table(rtable, r_key, 'rtable', logger, verbose)
+    # Preprocess the tables, then debug the candidate set.
+    debugger = BlockerDebugger(ltable, rtable, attr_corres, verbose, n_jobs)
+    return debugger.debug(candset, output_size, verbose)
 
-    # Check the user input field correst list (if exists) and get the raw
-    # version of our internal correst list.
-    _check_input_field_correspondence_list(ltable, rtable, attr_corres)
-    corres_list = _get_field_correspondence_list(ltable, rtable,
-                                                 l_key, r_key, attr_corres)
 
-    # Build the (col_name: col_index) dict to speed up locating a field in
-    # the schema.
-    ltable_col_dict = _build_col_name_index_dict(ltable)
-    rtable_col_dict = _build_col_name_index_dict(rtable)
-
-    # Filter correspondence list to remove numeric types. We only consider
-    # string types for document concatenation.
-    _filter_corres_list(ltable, rtable, l_key, r_key,
-                        ltable_col_dict, rtable_col_dict, corres_list)
+class BlockerDebugger(object):
+    """
+    A session for debugging the outputs of blockers (or blocker sequences)
+    on the same two input tables.
 
-    # Get field filtered new table.
-    ltable_filtered, rtable_filtered = _get_filtered_table(
-        ltable, rtable, l_key, r_key, corres_list)
+    Creating the session does the work of `debug_blocker` that only
+    depends on the tables: it selects the attributes to compare, tokenizes
+    the tuples and encodes their tokens by the global token order. Each
+    call to `debug` then only indexes the candidate set and runs the topk
+    similarity join, so that the blocker can be tuned and debugged again
+    without preprocessing the tables each time. The tables must not be
+    modified while the session is used.
 
-    # Select a subset of fields with high scores.
-    feature_list = _select_features(ltable_filtered, rtable_filtered, l_key)
+    Args:
+        ltable,rtable (DataFrame): The input DataFrames that are used to
+            generate the blocker outputs.
+        attr_corres (list): A list of attribute correspondence tuples (see
+            `debug_blocker`, defaults to None).
+        verbose (boolean): A flag to indicate whether the debug information
+            should be logged (defaults to False).
+        n_jobs (int): The number of parallel jobs to be used for computation
+            (see `debug_blocker`, defaults to 1).
 
-    # Map the record key value to its index in the table.
-    lrecord_id_to_index_map = _get_record_id_to_index_map(ltable_filtered, l_key)
-    rrecord_id_to_index_map = _get_record_id_to_index_map(rtable_filtered, r_key)
+    Raises:
+        AssertionError: If `ltable` or `rtable` is not of type pandas
+            DataFrame, or is empty.
+        AssertionError: If the attribute correspondence (`attr_corres`) list
+            is not in the correct format (a list of tuples), or cannot be
+            built correctly.
+        AssertionError: If `n_jobs` is not of type int.
 
-    # Build the tokenized record list delimited by a white space on the
-    # selected fields.
-    lrecord_list = _get_tokenized_table(ltable_filtered, l_key, feature_list)
-    rrecord_list = _get_tokenized_table(rtable_filtered, r_key, feature_list)
+    Examples:
+        >>> import py_entitymatching as em
+        >>> debugger = em.BlockerDebugger(A, B, attr_corres=corres)
+        >>> ob = em.OverlapBlocker()
+        >>> C = ob.block_tables(A, B, 'name', 'name', overlap_size=3)
+        >>> D = debugger.debug(C)
+        >>> C = ob.block_tables(A, B, 'name', 'name', overlap_size=2)
+        >>> D = debugger.debug(C, output_size=100)
+    """
 
-    # Reformat the candidate set from a dataframe to a list of record index
-    # tuple pair.
-    new_formatted_candidate_set = _index_candidate_set(
-        candset, lrecord_id_to_index_map, rrecord_id_to_index_map, verbose)
+    def __init__(self, ltable, rtable, attr_corres=None, verbose=False,
+                 n_jobs=1):
+        # Check input types.
+        _validate_table_types(ltable, rtable, attr_corres, verbose)
+        validate_object_type(n_jobs, int, 'Parameter n_jobs')
+
+        # Check table size.
+        if len(ltable) == 0:
+            raise AssertionError('Error: ltable is empty!')
+        if len(rtable) == 0:
+            raise AssertionError('Error: rtable is empty!')
+
+        # Get table metadata.
+        l_key, r_key = cm.get_keys_for_ltable_rtable(ltable, rtable, logger,
+                                                     verbose)
+
+        # Validate metadata
+        cm._validate_metadata_for_table(ltable, l_key, 'ltable', logger,
+                                        verbose)
+        cm._validate_metadata_for_table(rtable, r_key, 'rtable', logger,
+                                        verbose)
+
+        # Check the user input field correst list (if exists) and get the raw
+        # version of our internal correst list.
+        _check_input_field_correspondence_list(ltable, rtable, attr_corres)
+        corres_list = _get_field_correspondence_list(ltable, rtable,
+                                                     l_key, r_key, attr_corres)
+
+        # Build the (col_name: col_index) dict to speed up locating a field
+        # in the schema.
+        ltable_col_dict = _build_col_name_index_dict(ltable)
+        rtable_col_dict = _build_col_name_index_dict(rtable)
+
+        # Filter correspondence list to remove numeric types. We only
+        # consider string types for document concatenation.
+        _filter_corres_list(ltable, rtable, l_key, r_key,
+                            ltable_col_dict, rtable_col_dict, corres_list)
+
+        # Get field filtered new table.
+        ltable_filtered, rtable_filtered = _get_filtered_table(
+            ltable, rtable, l_key, r_key, corres_list)
+
+        # Select a subset of fields with high scores.
+        feature_list = _select_features(ltable_filtered, rtable_filtered,
+                                        l_key)
+
+        # Map the record key value to its index in the table.
+        lrecord_id_to_index_map = _get_record_id_to_index_map(
+            ltable_filtered, l_key)
+        rrecord_id_to_index_map = _get_record_id_to_index_map(
+            rtable_filtered, r_key)
+
+        # Build the tokenized record list delimited by a white space on the
+        # selected fields.
+        n_procs = get_num_procs(n_jobs, len(ltable))
+        lrecord_list = _get_tokenized_table(ltable_filtered, l_key,
+                                            feature_list, n_procs, verbose)
+        rrecord_list = _get_tokenized_table(rtable_filtered, r_key,
+                                            feature_list, n_procs, verbose)
+
+        # Build the token order according to token's frequency. To run a
+        # prefix filtering based similarity join algorithm, we first need
+        # the global token order.
+        order_dict = {}
+        _build_global_token_order(lrecord_list, order_dict)
+        _build_global_token_order(rrecord_list, order_dict)
+
+        # Encode the records as sorted arrays of token ids by the global
+        # order.
+        token_id_dict = _get_token_id_dict(order_dict)
+        self.lrecord_list = _encode_record_list(lrecord_list, token_id_dict)
+        self.rrecord_list = _encode_record_list(rrecord_list, token_id_dict)
+
+        self.ltable = ltable_filtered
+        self.rtable = rtable_filtered
+        self.lrecord_id_to_index_map = lrecord_id_to_index_map
+        self.rrecord_id_to_index_map = rrecord_id_to_index_map
+        self.n_procs = n_procs
+
+    def debug(self, candset, output_size=200, verbose=False):
+        """
+        Reports a list of potential matches that are discarded by a blocker
+        (see `debug_blocker`).
+
+        Args:
+            candset (DataFrame): The candidate set generated by applying the
+                blocker on the ltable and rtable of the session.
+            output_size (int): The number of tuple pairs that will be
+                returned (defaults to 200).
+            verbose (boolean): A flag to indicate whether the debug
+                information should be logged (defaults to False).
+
+        Returns:
+            A pandas DataFrame with 'output_size' number of rows, like the
+            one returned by `debug_blocker`.
+
+        Raises:
+            AssertionError: If `candset` is not of type pandas DataFrame.
+            AssertionError: If the output `size` parameter is not of type
+                int, or is less than or equal to 0.
+            AssertionError: If `verbose` is not of type bool.
+        """
+        validate_object_type(candset, pd.DataFrame, 'Input candidate set')
+        validate_object_type(output_size, int, 'Output size')
+        if not isinstance(verbose, bool):
+            logger.error('Parameter verbose is not of type bool')
+            raise AssertionError('Parameter verbose is not of type bool')
+
+        # Check the value of output size.
+        if output_size <= 0:
+            raise AssertionError('The input parameter: \'output_size\''
+                                 ' is less than or equal to 0. Nothing needs'
+                                 ' to be done!')
+
+        # Reformat the candidate set from a dataframe to a sorted array of
+        # the encoded record index pairs.
+        new_formatted_candidate_set = _index_candidate_set(
+            candset, self.lrecord_id_to_index_map,
+            self.rrecord_id_to_index_map, verbose)
+
+        # Run the topk similarity join.
+        topk_heap = _topk_sim_join_encoded(
+            self.lrecord_list, self.rrecord_list, new_formatted_candidate_set,
+            output_size, self.n_procs, verbose)
+
+        # Assemble the topk record list to a dataframe.
+        return _assemble_topk_table(topk_heap, self.ltable, self.rtable)
 
-    # Build the token order according to token's frequency. To run a
-    # prefix filtering based similarity join algorithm, we first need
-    # the global token order.
-    order_dict = {}
-    _build_global_token_order(lrecord_list, order_dict)
-    _build_global_token_order(rrecord_list, order_dict)
 
-    # Sort the tokens in each record by the global order.
-    _sort_record_tokens_by_global_order(lrecord_list, order_dict)
-    _sort_record_tokens_by_global_order(rrecord_list, order_dict)
+# Validate the types of input parameters.
+def _validate_types(ltable, rtable, candidate_set, output_size,
+                    attr_corres, verbose):
+    validate_object_type(candidate_set, pd.DataFrame, 'Input candidate set')
 
-    # Run the topk similarity join.
-    topk_heap = _topk_sim_join(
-        lrecord_list, rrecord_list, new_formatted_candidate_set, output_size)
+    validate_object_type(output_size, int, 'Output size')
 
-    # Assemble the topk record list to a dataframe.
-    ret_dataframe = _assemble_topk_table(topk_heap, ltable_filtered, rtable_filtered)
-    return ret_dataframe
+    _validate_table_types(ltable, rtable, attr_corres, verbose)
 
 
-# Validate the types of input parameters.
-def _validate_types(ltable, rtable, candidate_set, output_size,
-                    attr_corres, verbose):
+# Validate the types of the input tables and of the parameters used to
+# preprocess them.
+def _validate_table_types(ltable, rtable, attr_corres, verbose):
     validate_object_type(ltable, pd.DataFrame, 'Input left table')
 
     validate_object_type(rtable, pd.DataFrame, 'Input right table')
 
-    validate_object_type(candidate_set, pd.DataFrame, 'Input candidate set')
-
-    validate_object_type(output_size, int, 'Output size')
-
     if attr_corres is not None:
         if not isinstance(attr_corres, list):
             logging.error('Input attribute correspondence is not of'
@@ -248,7 +391,34 @@ def _assemble_topk_table(topk_heap, ltable, rtable, ret_key='_id',
 
 
 # Topk similarity join wrapper.
-def _topk_sim_join(lrecord_list, rrecord_list, cand_set, output_size):
+def _topk_sim_join(lrecord_list, rrecord_list, cand_set, output_size,
+                   order_dict=None, n_procs=1, verbose=False):
+    # Encode the tokens as integer ids by the global token order (built from
+    # the two tables if it is not given), so that each record is a sorted
+    # array of token ids.
+    if order_dict is None:
+        order_dict = {}
+        _build_global_token_order(lrecord_list, order_dict)
+        _build_global_token_order(rrecord_list, order_dict)
+    token_id_dict = _get_token_id_dict(order_dict)
+    lrecord_list = _encode_record_list(lrecord_list, token_id_dict)
+    rrecord_list = _encode_record_list(rrecord_list, token_id_dict)
+    # The candidate set can also be given as a collection of record index
+    # pairs.
+    if not isinstance(cand_set, numpy.ndarray):
+        cand_set = _encode_record_index_pairs(cand_set, len(rrecord_list))
+    return _topk_sim_join_encoded(lrecord_list, rrecord_list, cand_set,
+                                  output_size, n_procs, verbose)
+
+
+# Run the topk similarity join on the encoded records and candidate set.
+def _topk_sim_join_encoded(lrecord_list, rrecord_list, cand_set, output_size,
+                           n_procs=1, verbose=False):
+    if n_procs > 1 and len(lrecord_list) > 1:
+        return _topk_sim_join_in_parallel(lrecord_list, rrecord_list,
+                                          cand_set, output_size, n_procs,
+                                          verbose)
+
     # Build prefix events.
     prefix_events = _generate_prefix_events(lrecord_list, rrecord_list)
     topk_heap = _topk_sim_join_impl(lrecord_list, rrecord_list,
@@ -257,80 +427,321 @@ def _topk_sim_join(lrecord_list, rrecord_list, cand_set, output_size):
     return topk_heap
 
 
+# Run the topk similarity join with the left records partitioned across the
+# workers. The right records are indexed once (the index is shared with the
+# workers through a memory-mapped file), and each worker probes the index
+# with the prefix events of its left records only, and returns its own topk
+# heap. The heaps are merged into the global topk heap.
+def _topk_sim_join_in_parallel(lrecord_list, rrecord_list, cand_set,
+                               output_size, n_procs, verbose):
+    # Split the left records into partitions with about the same number of
+    # tokens.
+    ranges = split_by_cost([len(record) for record in lrecord_list],
+                           n_procs)
+
+    records = {'cand_set': cand_set}
+    records['l_tokens'], records['l_offsets'] = _pack_record_list(
+        lrecord_list)
+    records['r_tokens'], records['r_offsets'] = _pack_record_list(
+        rrecord_list)
+    num_tokens = 1 + max([-1] + [int(records[tokens].max())
+                                 for tokens in ['l_tokens', 'r_tokens']
+                                 if len(records[tokens]) > 0])
+    records['index_offsets'], records['index_records'], \
+        records['index_positions'] = _build_record_index(
+            records['r_tokens'], records['r_offsets'], num_tokens)
+    costs = [records['l_offsets'][stop] - records['l_offsets'][start]
+             for start, stop in ranges]
+    topk_heap = []
+    with SharedObject(records) as shared_records, \
+            SharedValue(0.0) as shared_threshold:
+        tasks = [(shared_records, start, stop, output_size, shared_threshold)
+                 for start, stop in ranges]
+        for part_topk_heap in run_tasks(_topk_sim_join_part, tasks, n_procs,
+                                        costs, verbose):
+            for entry in part_topk_heap:
+                if len(topk_heap) == output_size:
+                    hq.heappushpop(topk_heap, entry)
+                else:
+                    hq.heappush(topk_heap, entry)
+        log_info(logger, 'The k-th similarity shared by the workers is %f'
+                 % shared_threshold.get(), verbose)
+
+    return topk_heap
+
+
+# Join the left records from position start to stop (excluded) with all the
+# right records, in a worker of the parallel topk join.
+def _topk_sim_join_part(shared_records, start, stop, output_size,
+                        shared_threshold):
+    records = get_object(shared_records)
+    lrecord_list = _unpack_record_list(records['l_tokens'],
+                                       records['l_offsets'][start:stop + 1])
+    # The pairs of the candidate set with a left record in the partition
+    # (the codes are sorted by left record index).
+    num_r = len(records['r_offsets']) - 1
+    cand_set = records['cand_set']
+    lo, hi = numpy.searchsorted(cand_set, [start * num_r, stop * num_r])
+    cand_set = cand_set[lo:hi] - start * num_r
+    prefix_events = []
+    _generate_prefix_events_impl(lrecord_list, prefix_events, 0)
+    topk_heap = _topk_sim_join_probe(lrecord_list, records, prefix_events,
+                                     cand_set, output_size, shared_threshold)
+    return [(sim, l_idx + start, r_idx) for sim, l_idx, r_idx in topk_heap]
+
+
+# Build the inverted index of packed records: the postings (record index and
+# token position) of the token id i are stored from offsets[i] to
+# offsets[i + 1] (excluded), sorted by record index.
+def _build_record_index(tokens, offsets, num_tokens):
+    lengths = numpy.diff(offsets)
+    rec_idx = numpy.repeat(numpy.arange(len(lengths), dtype=numpy.int64),
+                           lengths)
+    tok_idx = numpy.arange(len(tokens), dtype=numpy.int64) - \
+        numpy.repeat(offsets[:-1], lengths)
+    order = numpy.argsort(tokens, kind='mergesort')
+    index_offsets = numpy.zeros(num_tokens + 1, dtype=numpy.int64)
+    index_offsets[1:] = numpy.cumsum(numpy.bincount(tokens,
+                                                    minlength=num_tokens))
+    return index_offsets, rec_idx[order], tok_idx[order]
+
+
+# Implement the topk similarity join of the parallel workers, where only the
+# prefix events of the left records are processed, and each of them probes
+# the postings of its token in the index of all the right records (see
+# _build_record_index). A pair is verified at the first common token of the
+# records, where its similarity is at most the threshold of the token in the
+# left record, so the join can stop at the same prefix event as
+# _topk_sim_join_impl.
+def _topk_sim_join_probe(lrecord_list, records, prefix_events, cand_set,
+                         output_size, shared_threshold):
+    r_tokens = records['r_tokens']
+    r_offsets = records['r_offsets']
+    index_offsets = records['index_offsets']
+    index_records = records['index_records']
+    index_positions = records['index_positions']
+    num_events = 0
+    shared_min_sim = 0.0
+    lrecord_set_list = [None] * len(lrecord_list)
+    rrecord_set_dict = {}
+    num_r = len(r_offsets) - 1
+    topk_heap = []
+
+    while len(prefix_events) > 0:
+        if num_events % threshold_sync_interval == 0:
+            if len(topk_heap) == output_size and \
+                    topk_heap[0][0] > shared_threshold.get():
+                shared_threshold.set(topk_heap[0][0])
+            shared_min_sim = shared_threshold.get()
+        num_events += 1
+        min_sim = shared_min_sim
+        if len(topk_heap) == output_size:
+            min_sim = max(min_sim, topk_heap[0][0])
+        if min_sim > 0 and min_sim >= prefix_events[0][0] * -1:
+            break
+        event = hq.heappop(prefix_events)
+        l_idx = event[2]
+        tok_idx = event[3]
+        record = lrecord_list[l_idx]
+        token = int(record[tok_idx])
+        length = len(record)
+        lo, hi = index_offsets[token], index_offsets[token + 1]
+        r_idx_array = index_records[lo:hi]
+        r_tok_idx_array = index_positions[lo:hi]
+        r_length_array = r_offsets[r_idx_array + 1] - r_offsets[r_idx_array]
+        if min_sim > 0:
+            # Keep the pairs that can beat the k-th similarity: by the
+            # length filter, and by the position filter (all the common
+            # tokens are at or after the current positions).
+            max_overlap = 1 + numpy.minimum(length - tok_idx - 1,
+                                            r_length_array -
+                                            r_tok_idx_array - 1)
+            keep = (numpy.minimum(length, r_length_array) * 1.0 >=
+                    min_sim * numpy.maximum(length, r_length_array)) & \
+                (max_overlap * 1.0 / (length + r_length_array - max_overlap)
+                 >= min_sim)
+            r_idx_array = r_idx_array[keep]
+            r_tok_idx_array = r_tok_idx_array[keep]
+        # Skip the pairs in the candidate set (looked up all at once).
+        if len(r_idx_array) > 0 and len(cand_set) > 0:
+            keep = ~_is_in_candidate_set(cand_set,
+                                         l_idx * num_r + r_idx_array)
+            r_idx_array = r_idx_array[keep]
+            r_tok_idx_array = r_tok_idx_array[keep]
+
+        for r_idx, r_tok_idx in zip(r_idx_array.tolist(),
+                                    r_tok_idx_array.tolist()):
+            rrecord = r_tokens[r_offsets[r_idx]:r_offsets[r_idx + 1]]
+            if r_idx not in rrecord_set_dict:
+                rrecord_set_dict[r_idx] = frozenset(rrecord.tolist())
+            rrecord_set = rrecord_set_dict[r_idx]
+            # Skip if the token is not the first common token of the
+            # records (the pair is verified at another prefix event).
+            if tok_idx <= r_tok_idx:
+                if not rrecord_set.isdisjoint(record[:tok_idx].tolist()):
+                    continue
+            elif not _get_record_set(lrecord_list, lrecord_set_list,
+                                     l_idx).isdisjoint(
+                    rrecord[:r_tok_idx].tolist()):
+                continue
+            sim = _jaccard_sim(
+                _get_record_set(lrecord_list, lrecord_set_list, l_idx),
+                rrecord_set)
+            if len(topk_heap) == output_size:
+                hq.heappushpop(topk_heap, (sim, l_idx, r_idx))
+            else:
+                hq.heappush(topk_heap, (sim, l_idx, r_idx))
+
+    return topk_heap
+
+
+# Pack the encoded records into a single array of token ids along with the
+# offsets of the records in the array.
+def _pack_record_list(record_list):
+    lengths = [len(record) for record in record_list]
+    offsets = numpy.zeros(len(record_list) + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum(lengths)
+    if len(record_list) == 0:
+        return numpy.zeros(0, dtype=numpy.int64), offsets
+    return numpy.concatenate(record_list).astype(numpy.int64), offsets
+
+
+# Get the records (views of the array of token ids) from packed records.
+def _unpack_record_list(tokens, offsets):
+    return [tokens[offsets[i]:offsets[i + 1]]
+            for i in range(len(offsets) - 1)]
+
+
 # Implement topk similarity join. Refer to "top-k set similarity join"
-# by Xiao et al. for details.
+# by Xiao et al. for details. The records must be sorted arrays of distinct
+# token ids, and the candidate set a sorted array of encoded record index
+# pairs (see _encode_record_index_pairs). If a shared threshold is given (by the parallel join), the
+# k-th similarity is shared with the other workers: the pairs below the
+# best k-th similarity of all the workers cannot be in the global topk.
 def _topk_sim_join_impl(lrecord_list, rrecord_list, prefix_events,
-                        cand_set, output_size):
+                        cand_set, output_size, shared_threshold=None):
     total_compared_pairs = 0
-    compared_set = set()
+    num_events = 0
+    shared_min_sim = 0.0
+    # The token sets of the records, to verify the pairs (built when a
+    # record is first verified).
+    lrecord_set_list = [None] * len(lrecord_list)
+    rrecord_set_list = [None] * len(rrecord_list)
+    # The inverted indexes map a token id to the (record index, token
+    # position) of the prefixes seen so far.
     l_inverted_index = {}
     r_inverted_index = {}
+    num_r = len(rrecord_list)
     topk_heap = []
 
     while len(prefix_events) > 0:
-        if len(topk_heap) == output_size and\
-                        topk_heap[0][0] >= prefix_events[0][0] * -1:
+        if shared_threshold is not None and \
+                num_events % threshold_sync_interval == 0:
+            if len(topk_heap) == output_size and \
+                    topk_heap[0][0] > shared_threshold.get():
+                shared_threshold.set(topk_heap[0][0])
+            shared_min_sim = shared_threshold.get()
+        num_events += 1
+        min_sim = shared_min_sim
+        if len(topk_heap) == output_size:
+            min_sim = max(min_sim, topk_heap[0][0])
+        if min_sim > 0 and min_sim >= prefix_events[0][0] * -1:
             break
         event = hq.heappop(prefix_events)
         table_indicator = event[1]
         rec_idx = event[2]
         tok_idx = event[3]
         if table_indicator == 0:
-            token = lrecord_list[rec_idx][tok_idx]
-            if token in r_inverted_index:
-                r_records = r_inverted_index[token]
-                for r_rec_idx in r_records:
-                    pair = (rec_idx, r_rec_idx)
-                    # Skip if the pair is in the candidate set.
-                    if pair in cand_set:
-                        continue
-                    # Skip if the pair has been compared.
-                    if pair in compared_set:
-                        continue
-                    sim = _jaccard_sim(
-                        set(lrecord_list[rec_idx]), set(rrecord_list[r_rec_idx]))
-                    if len(topk_heap) == output_size:
-                        hq.heappushpop(topk_heap, (sim, rec_idx, r_rec_idx))
-                    else:
-                        hq.heappush(topk_heap, (sim, rec_idx, r_rec_idx))
-
-                    total_compared_pairs += 1
-                    compared_set.add(pair)
-
-            # Update the inverted index.
-            if token not in l_inverted_index:
-                l_inverted_index[token] = set()
-            l_inverted_index[token].add(rec_idx)
+            record_list, other_record_list = lrecord_list, rrecord_list
+            set_list, other_set_list = lrecord_set_list, rrecord_set_list
+            inverted_index, other_inverted_index = (l_inverted_index,
+                                                    r_inverted_index)
         else:
-            token = rrecord_list[rec_idx][tok_idx]
-            if token in l_inverted_index:
-                l_records = l_inverted_index[token]
-                for l_rec_idx in l_records:
-                    pair = (l_rec_idx, rec_idx)
-                    # Skip if the pair is in the candidate set.
-                    if pair in cand_set:
-                        continue
-                    # Skip if the pair has been compared.
-                    if pair in compared_set:
-                        continue
-                    sim = _jaccard_sim(
-                        set(lrecord_list[l_rec_idx]), set(rrecord_list[rec_idx]))
-                    if len(topk_heap) == output_size:
-                        hq.heappushpop(topk_heap, (sim, l_rec_idx, rec_idx))
-                    else:
-                        hq.heappush(topk_heap, (sim, l_rec_idx, rec_idx))
+            record_list, other_record_list = rrecord_list, lrecord_list
+            set_list, other_set_list = rrecord_set_list, lrecord_set_list
+            inverted_index, other_inverted_index = (r_inverted_index,
+                                                    l_inverted_index)
+        record = record_list[rec_idx]
+        token = int(record[tok_idx])
+        length = len(record)
+        min_sim = shared_min_sim
+        if len(topk_heap) == output_size:
+            min_sim = max(min_sim, topk_heap[0][0])
+        pair_list = []
+        for other_rec_idx, other_tok_idx in other_inverted_index.get(token, []):
+            other_record = other_record_list[other_rec_idx]
+            other_length = len(other_record)
+            if min_sim > 0:
+                # Skip if the pair cannot beat the k-th similarity: by the
+                # length filter, and by the position filter (all the common
+                # tokens are at or after the current positions).
+                if min(length, other_length) * 1.0 < \
+                        min_sim * max(length, other_length):
+                    continue
+                max_overlap = 1 + min(length - tok_idx - 1,
+                                      other_length - other_tok_idx - 1)
+                if max_overlap * 1.0 / (length + other_length - max_overlap) \
+                        < min_sim:
+                    continue
+            # Skip if the pair has been compared, i.e., if the token is not
+            # the first common token of the records. As the records are
+            # sorted, a common token before it is in the prefixes before
+            # the current positions.
+            if tok_idx <= other_tok_idx:
+                if not _get_record_set(other_record_list, other_set_list,
+                                       other_rec_idx).isdisjoint(
+                        record[:tok_idx].tolist()):
+                    continue
+            elif not _get_record_set(record_list, set_list, rec_idx).isdisjoint(
+                    other_record[:other_tok_idx].tolist()):
+                continue
+            if table_indicator == 0:
+                pair_list.append((rec_idx, other_rec_idx))
+            else:
+                pair_list.append((other_rec_idx, rec_idx))
+
+        # Skip the pairs in the candidate set (looked up all at once).
+        if len(pair_list) > 0 and len(cand_set) > 0:
+            in_cand_set = _is_in_candidate_set(
+                cand_set, [l_idx * num_r + r_idx for l_idx, r_idx in pair_list])
+            pair_list = [pair for pair, is_in in zip(pair_list, in_cand_set)
+                         if not is_in]
+
+        for l_idx, r_idx in pair_list:
+            sim = _jaccard_sim(
+                _get_record_set(lrecord_list, lrecord_set_list, l_idx),
+                _get_record_set(rrecord_list, rrecord_set_list, r_idx))
+            if len(topk_heap) == output_size:
+                hq.heappushpop(topk_heap, (sim, l_idx, r_idx))
+            else:
+                hq.heappush(topk_heap, (sim, l_idx, r_idx))
 
-                    total_compared_pairs += 1
-                    compared_set.add(pair)
+            total_compared_pairs += 1
 
-            # Update the inverted index.
-            if token not in r_inverted_index:
-                r_inverted_index[token] = set()
-            r_inverted_index[token].add(rec_idx)
+        # Update the inverted index.
+        if token not in inverted_index:
+            inverted_index[token] = []
+        inverted_index[token].append((rec_idx, tok_idx))
 
     return topk_heap
 
 
+# Flag the encoded pairs that are in the candidate set (a sorted array of
+# encoded pairs), by binary search.
+def _is_in_candidate_set(cand_set, codes):
+    codes = numpy.asarray(codes, dtype=numpy.int64)
+    idx = numpy.minimum(numpy.searchsorted(cand_set, codes),
+                        len(cand_set) - 1)
+    return cand_set[idx] == codes
+
+
+# Get the token set of a record, building it at the first call.
+def _get_record_set(record_list, set_list, rec_idx):
+    if set_list[rec_idx] is None:
+        set_list[rec_idx] = frozenset(record_list[rec_idx].tolist())
+    return set_list[rec_idx]
+
+
 # Calculate the token-based Jaccard similarity of two string sets.
 def _jaccard_sim(l_token_set, r_token_set):
     l_len = len(l_token_set)
@@ -517,7 +928,26 @@ def _get_record_id_to_index_map(table, table_key):
 # then concatenate the column of each record. The reason for tokenizing
 # columns first is that it's more efficient than iterate each dataframe
 # tuple.
-def _get_tokenized_table(table, table_key, feature_list):
+def _get_tokenized_table(table, table_key, feature_list, n_procs=1,
+                         verbose=False):
+    if n_procs > 1 and len(table) > 1:
+        # Tokenize ranges of records in parallel (the tokens of a record
+        # only depend on the record).
+        columns = [table.columns[i] for i in feature_list]
+        sub_table = table[[table_key] + [col for col in columns
+                                         if col != table_key]]
+        sub_feature_list = [list(sub_table.columns).index(col)
+                            for col in columns]
+        ranges = split_ranges(len(table),
+                              get_num_tasks(n_procs, len(table)))
+        tasks = [(sub_table.iloc[start:stop], table_key, sub_feature_list)
+                 for start, stop in ranges]
+        record_list = []
+        for part_record_list in run_tasks(_get_tokenized_table, tasks,
+                                          n_procs, verbose=verbose):
+            record_list.extend(part_record_list)
+        return record_list
+
     record_list = []
     columns = table.columns[feature_list]
     tmp_table = []
@@ -574,9 +1004,9 @@ def _replace_nan_to_empty(field):
 # set or not. We will use the reformatted candidate set in the topk
 # similarity join.
 def _index_candidate_set(candidate_set, lrecord_id_to_index_map, rrecord_id_to_index_map, verbose):
-    new_formatted_candidate_set = set()
+    num_r = len(rrecord_id_to_index_map)
     if len(candidate_set) == 0:
-        return new_formatted_candidate_set
+        return numpy.zeros(0, dtype=numpy.int64)
 
     # Get metadata
     key, fk_ltable, fk_rtable, ltable, rtable, l_key, r_key =\
@@ -587,14 +1017,49 @@ def _index_candidate_set(candidate_set, lrecord_id_to_index_map, rrecord_id_to_i
                                      ltable, rtable, l_key, r_key,
                                      logger, verbose)
 
-    ltable_key_data = list(candidate_set[fk_ltable])
-    rtable_key_data = list(candidate_set[fk_rtable])
-
-    for i in range(len(ltable_key_data)):
-        new_formatted_candidate_set.add((lrecord_id_to_index_map[ltable_key_data[i]],
-                                         rrecord_id_to_index_map[rtable_key_data[i]]))
-
-    return new_formatted_candidate_set
+    # Encode the pairs chunk by chunk from the key columns, so that only a
+    # chunk of the (possibly memory-mapped) columns is in memory at a time.
+    ltable_key_data = candidate_set[fk_ltable].values
+    rtable_key_data = candidate_set[fk_rtable].values
+    l_id_index, l_idx = _get_record_id_index(lrecord_id_to_index_map)
+    r_id_index, r_idx = _get_record_id_index(rrecord_id_to_index_map)
+    code_list = []
+    for start in range(0, len(candidate_set), candset_chunk_size):
+        stop = start + candset_chunk_size
+        l_pos = l_id_index.get_indexer(ltable_key_data[start:stop])
+        r_pos = r_id_index.get_indexer(rtable_key_data[start:stop])
+        if (l_pos < 0).any() or (r_pos < 0).any():
+            logger.error('Some key values of the candidate set are not in '
+                         'the input tables')
+            raise AssertionError('Some key values of the candidate set are '
+                                 'not in the input tables')
+        code_list.append(l_idx[l_pos] * num_r + r_idx[r_pos])
+
+    codes = numpy.unique(numpy.concatenate(code_list))
+    log_info(logger, 'Indexed %d tuple pairs of the candidate set in %d '
+             'bytes' % (len(codes), codes.nbytes), verbose)
+    return codes
+
+
+# Get an index of the record ids along with the record indexes of the ids,
+# to look up the indexes of many ids at once.
+def _get_record_id_index(record_id_to_index_map):
+    record_ids = list(record_id_to_index_map.keys())
+    record_indexes = numpy.array(
+        [record_id_to_index_map[rec_id] for rec_id in record_ids],
+        dtype=numpy.int64)
+    return pd.Index(record_ids), record_indexes
+
+
+# Encode record index pairs (l_idx, r_idx) as the sorted array of the
+# distinct codes l_idx * num_r + r_idx, where num_r is the number of right
+# records.
+def _encode_record_index_pairs(pairs, num_r):
+    pairs = list(pairs)
+    if len(pairs) == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    pairs = numpy.asarray(pairs, dtype=numpy.int64)
+    return numpy.unique(pairs[:, 0] * num_r + pairs[:, 1])
 
 
 # Build the global order of tokens in the table by frequency.
@@ -617,6 +1082,26 @@ def _sort_record_tokens_by_global_order(record_list, order_dict):
         record_list[i] = sorted(tmp_record, key=lambda x: (order_dict[x], x))
 
 
+# Map each token to its integer id, i.e., its rank in the global token order
+# (by frequency, then by token).
+def _get_token_id_dict(order_dict):
+    tokens = sorted(order_dict, key=lambda x: (order_dict[x], x))
+    return dict(zip(tokens, range(len(tokens))))
+
+
+# Encode each tokenized record as a sorted array of the distinct ids of its
+# tokens (the tokens that are not in the global order are dropped), so that
+# the tokens of the records are in the global order.
+def _encode_record_list(record_list, token_id_dict):
+    encoded_record_list = []
+    for record in record_list:
+        token_ids = set(token_id_dict[token] for token in record
+                        if token in token_id_dict)
+        encoded_record_list.append(
+            numpy.array(sorted(token_ids), dtype=numpy.int64))
+    return encoded_record_list
+
+
 # Generate the prefix events of two tables for topk similarity joins.
 # Refer to "top-k set similarity join" by Xiao et al. for details.
 def _generate_prefix_events(lrecord_list, rrecord_list):
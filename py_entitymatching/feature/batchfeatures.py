@@ -0,0 +1,506 @@
+"""
+This module contains functions to compute feature values for a batch of
+tuple pairs at once.
+
+Auto-generated features (i.e., features with is_auto_generated set to True
+whose tokenizers and similarity function are known) are computed
+column-wise: each referenced attribute is tokenized once per table and the
+similarity function is evaluated over whole arrays of tuple pairs. All the
+other features fall back to calling the feature function for each tuple pair.
+The values of a feature are floats, unless its function returns non-numeric
+values (e.g., strings), in which case they are kept as they are returned.
+
+The tokens are kept in a TokenCache, where each distinct attribute value of
+a table is tokenized exactly once for each tokenizer that refers to it and the
+tokens are interned into integer ids.
+"""
+import logging
+import numbers
+
+import numpy as np
+import pandas as pd
+import pyprind
+import six
+
+import py_entitymatching.feature.simfunctions as sim
+import py_entitymatching.feature.tokenizers as tok
+from py_entitymatching.utils.record_helper import RecordAccessor
+
+logger = logging.getLogger(__name__)
+
+# Similarity functions on token sets that can be computed from the size of
+# the intersection and the sizes of the two token sets.
+_set_sim_fns = {'jaccard', 'cosine', 'dice', 'overlap_coeff'}
+
+# Similarity functions on numbers that can be computed using array arithmetic.
+_numeric_sim_fns = {'rel_diff', 'abs_norm'}
+
+# Number of tuple pairs processed together while computing intersection
+# sizes. This bounds the size of the temporary arrays.
+_pair_chunk_size = 100000
+
+
+def get_feature_vals_by_positions(feature_table, l_df, r_df, l_pos, r_pos,
+                                  show_progress=False, token_cache=None):
+    """
+    Computes the feature values for a batch of tuple pairs.
+
+    The tuple pairs are given as two aligned arrays of positions, i.e., the
+    i-th tuple pair is made of the row at position l_pos[i] in l_df and the
+    row at position r_pos[i] in r_df.
+
+    Args:
+        feature_table (DataFrame): The features that must be computed.
+        l_df, r_df (DataFrame): The left and the right tables.
+        l_pos, r_pos (array): The positions of the left and the right tuples
+            of each tuple pair.
+        show_progress (boolean): A flag to indicate whether the progress
+            must be displayed (defaults to False).
+        token_cache (TokenCache): The tokens of the attribute values of l_df
+            and r_df (defaults to None). If it is not given, a token cache is
+            built using build_token_cache.
+
+    Returns:
+        A NumPy array with one row per tuple pair and one column per feature
+        (in the feature table order). The array is of type float64, unless a
+        feature function returns non-numeric values, in which case it is of
+        type object.
+    """
+    l_pos = np.asarray(l_pos, dtype=np.int64)
+    r_pos = np.asarray(r_pos, dtype=np.int64)
+
+    features = feature_table.to_dict('records')
+    feat_vals = np.empty((len(l_pos), len(features)), dtype=np.float64)
+
+    if show_progress:
+        prog_bar = pyprind.ProgBar(len(features))
+
+    if token_cache is None:
+        token_cache = build_token_cache(feature_table, l_df, r_df)
+    # Record accessors shared across the features computed per tuple pair.
+    record_accessors = []
+
+    for i, feature in enumerate(features):
+        if show_progress:
+            prog_bar.update()
+        col = _get_feature_col(feature, l_df, r_df, l_pos, r_pos,
+                               token_cache, record_accessors)
+        if col.dtype == object and feat_vals.dtype != object:
+            feat_vals = feat_vals.astype(object)
+        feat_vals[:, i] = col
+    return feat_vals
+
+
+def get_feature_col_by_positions(feature, l_df, r_df, l_pos, r_pos,
+                                 token_cache, record_accessors=None):
+    """
+    Computes the values of a single feature (a row of the feature table given
+    as a dictionary) for a batch of tuple pairs.
+
+    The tokens needed by the feature are added to token_cache if they are
+    not already there. If record_accessors is given, it must be a list that
+    is used to keep the record accessors of l_df and r_df across calls.
+
+    Returns:
+        A NumPy array with one value per tuple pair (of type float64, unless
+        the feature function returns non-numeric values).
+    """
+    if record_accessors is None:
+        record_accessors = []
+    return _get_feature_col(feature, l_df, r_df,
+                            np.asarray(l_pos, dtype=np.int64),
+                            np.asarray(r_pos, dtype=np.int64),
+                            token_cache, record_accessors)
+
+
+def is_batch_feature(feature):
+    """
+    Checks if a feature (a row of the feature table given as a dictionary)
+    can be computed in a column-wise fashion.
+    """
+    if feature.get('is_auto_generated') != True:
+        return False
+    sim_name = feature.get('simfunction')
+    if _resolve_fn(feature, sim_name, sim.get_sim_funs()) is None:
+        return False
+    l_tok, r_tok = _get_tok_names(feature)
+    if (l_tok is None) != (r_tok is None):
+        return False
+    if l_tok is not None:
+        default_toks = tok._get_single_arg_tokenizers()
+        if _resolve_fn(feature, l_tok, default_toks) is None or \
+                _resolve_fn(feature, r_tok, default_toks) is None:
+            return False
+    return True
+
+
+def build_token_cache(feature_table, l_df, r_df):
+    """
+    Builds a TokenCache with the tokens of all the (attribute, tokenizer)
+    combinations used by the auto-generated features of a feature table.
+
+    Args:
+        feature_table (DataFrame): The feature table.
+        l_df, r_df (DataFrame): The left and the right tables.
+
+    Returns:
+        A TokenCache object.
+    """
+    token_cache = TokenCache()
+    for feature in feature_table.to_dict('records'):
+        if is_batch_feature(feature):
+            _add_feature_tokens(token_cache, feature, l_df, r_df)
+    return token_cache
+
+
+def _add_feature_tokens(token_cache, feature, l_df, r_df):
+    l_tok, r_tok = _get_tok_names(feature)
+    if l_tok is None:
+        return
+    default_toks = tok._get_single_arg_tokenizers()
+    token_cache.add(0, l_df, feature['left_attribute'], l_tok,
+                    _resolve_fn(feature, l_tok, default_toks))
+    token_cache.add(1, r_df, feature['right_attribute'], r_tok,
+                    _resolve_fn(feature, r_tok, default_toks))
+
+
+def _get_feature_col(feature, l_df, r_df, l_pos, r_pos, token_cache,
+                     record_accessors):
+    if not is_batch_feature(feature):
+        return _apply_feat_fn_per_pair(feature['function'], l_df, r_df,
+                                       l_pos, r_pos, record_accessors)
+
+    sim_name = feature['simfunction']
+    sim_fn = _resolve_fn(feature, sim_name, sim.get_sim_funs())
+    l_attr, r_attr = feature['left_attribute'], feature['right_attribute']
+    l_tok, r_tok = _get_tok_names(feature)
+
+    if l_tok is not None:
+        # no-op if the tokens are already in the cache
+        _add_feature_tokens(token_cache, feature, l_df, r_df)
+        l_rows = token_cache.get_rows(0, l_attr, l_tok, l_pos)
+        r_rows = token_cache.get_rows(1, r_attr, r_tok, r_pos)
+        if sim_name in _set_sim_fns:
+            return _set_sim(sim_name,
+                            token_cache.get_token_sets(0, l_attr, l_tok),
+                            l_rows,
+                            token_cache.get_token_sets(1, r_attr, r_tok),
+                            r_rows)
+        # other token based measures (e.g., monge_elkan) are applied on the
+        # distinct pairs of attribute values
+        fn = lambda l_row, r_row: sim_fn(
+            token_cache.get_token_list(0, l_attr, l_tok, l_row),
+            token_cache.get_token_list(1, r_attr, r_tok, r_row))
+        return _apply_on_distinct_code_pairs(fn, l_rows, r_rows)
+
+    l_vals = l_df[l_attr].values[l_pos]
+    r_vals = r_df[r_attr].values[r_pos]
+
+    if sim_name == 'exact_match':
+        return _exact_match(l_vals, r_vals)
+    if sim_name in _numeric_sim_fns and _is_numeric(l_df[l_attr]) and \
+            _is_numeric(r_df[r_attr]):
+        return _numeric_sim(sim_name, l_vals.astype(np.float64),
+                            r_vals.astype(np.float64))
+    return _apply_on_distinct_value_pairs(sim_fn, l_vals, r_vals)
+
+
+def get_tokenizer_fn(feature, tok_name):
+    """
+    Returns the tokenizer function referred by a feature (a row of the
+    feature table given as a dictionary) under the given name, or None if it
+    cannot be found.
+    """
+    return _resolve_fn(feature, tok_name, tok._get_single_arg_tokenizers())
+
+
+def _get_tok_names(feature):
+    l_tok = feature.get('left_attr_tokenizer')
+    r_tok = feature.get('right_attr_tokenizer')
+    if not isinstance(l_tok, six.string_types):
+        l_tok = None
+    if not isinstance(r_tok, six.string_types):
+        r_tok = None
+    return l_tok, r_tok
+
+
+def _resolve_fn(feature, name, defaults):
+    # The functions of auto-generated features are compiled in a namespace
+    # containing the tokenizers and similarity functions they refer to, so
+    # look up the name there first.
+    if not isinstance(name, six.string_types):
+        return None
+    fn = feature.get('function')
+    namespace = getattr(fn, '__globals__', {})
+    if callable(namespace.get(name)):
+        return namespace[name]
+    return defaults.get(name)
+
+
+def _is_numeric(column):
+    return np.issubdtype(column.dtype, np.number) and \
+           not np.issubdtype(column.dtype, np.bool_)
+
+
+class _TokenArrays(object):
+    """
+    Token ids of a list of attribute values, stored in the compressed sparse
+    row format: the token ids of the i-th value are
+    indices[indptr[i]:indptr[i + 1]].
+    """
+
+    def __init__(self, indptr, indices, is_null):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.is_null = np.asarray(is_null, dtype=bool)
+        self.sizes = np.diff(self.indptr)
+
+
+class _TokenCacheEntry(object):
+    """
+    Tokens of one (table, attribute, tokenizer) combination.
+
+    value_rows maps the position of each record in the table to the row of
+    its attribute value in bags and sets. bags keeps the tokens of each
+    distinct value in the order returned by the tokenizer, while sets keeps
+    the sorted distinct token ids. The last row stands for missing values.
+    """
+
+    def __init__(self, value_rows, bags, sets):
+        self.value_rows = value_rows
+        self.bags = bags
+        self.sets = sets
+
+
+class TokenCache(object):
+    """
+    Stores the tokens of the attribute values of the left and the right
+    tables.
+
+    Each distinct value of a (table, attribute, tokenizer) combination is
+    tokenized exactly once. The tokens are interned into integer ids shared
+    by all the combinations, so the token sets of the left and the right
+    tables can be compared directly. The entries are looked up by the
+    position of the records in the (key indexed) tables.
+    """
+
+    def __init__(self):
+        self.vocab = {}
+        self.tokens = []
+        self._entries = {}
+
+    def contains(self, side, attr, tok_name):
+        return (side, attr, tok_name) in self._entries
+
+    def add(self, side, df, attr, tok_name, tok_fn):
+        """
+        Tokenizes the distinct values of an attribute of a table (side is 0
+        for the left table and 1 for the right table).
+        """
+        if self.contains(side, attr, tok_name):
+            return
+        codes, uniques = pd.factorize(df[attr].values)
+        # missing values are coded as -1, move them to the last row
+        value_rows = np.where(codes < 0, len(uniques), codes).astype(np.int64)
+
+        bag_indptr, bag_indices = [0], []
+        set_indptr, set_indices = [0], []
+        is_null = []
+        for val in uniques:
+            tokens = tok_fn(val)
+            if not isinstance(tokens, (list, set, tuple)):
+                # the tokenizers return NaN for missing values
+                is_null.append(True)
+            else:
+                ids = [self._intern(t) for t in tokens]
+                bag_indices.extend(ids)
+                set_indices.extend(sorted(set(ids)))
+                is_null.append(False)
+            bag_indptr.append(len(bag_indices))
+            set_indptr.append(len(set_indices))
+        is_null.append(True)
+        bag_indptr.append(len(bag_indices))
+        set_indptr.append(len(set_indices))
+
+        self._entries[(side, attr, tok_name)] = _TokenCacheEntry(
+            value_rows, _TokenArrays(bag_indptr, bag_indices, is_null),
+            _TokenArrays(set_indptr, set_indices, is_null))
+
+    def take(self, l_pos, r_pos):
+        """
+        Returns a TokenCache for the records at the given positions of the
+        left and the right tables (i.e., the i-th record of the returned
+        cache is the record at position l_pos[i] or r_pos[i]). The token
+        arrays are shared with this cache.
+        """
+        token_cache = TokenCache()
+        token_cache.vocab = self.vocab
+        token_cache.tokens = self.tokens
+        for entry_key, entry in six.iteritems(self._entries):
+            pos = l_pos if entry_key[0] == 0 else r_pos
+            token_cache._entries[entry_key] = _TokenCacheEntry(
+                entry.value_rows[pos], entry.bags, entry.sets)
+        return token_cache
+
+    def get_rows(self, side, attr, tok_name, pos):
+        """
+        Returns the rows of the token arrays for the given record positions.
+        """
+        return self._entries[(side, attr, tok_name)].value_rows[pos]
+
+    def get_token_sets(self, side, attr, tok_name):
+        return self._entries[(side, attr, tok_name)].sets
+
+    def get_token_list(self, side, attr, tok_name, row):
+        """
+        Returns the tokens of a row (in the tokenizer order), or NaN if the
+        value is missing.
+        """
+        bags = self._entries[(side, attr, tok_name)].bags
+        if bags.is_null[row]:
+            return np.NaN
+        ids = bags.indices[bags.indptr[row]:bags.indptr[row + 1]]
+        return [self.tokens[i] for i in ids]
+
+    def _intern(self, token):
+        token_id = self.vocab.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self.vocab[token] = token_id
+            self.tokens.append(token)
+        return token_id
+
+
+def _gather_tokens(token_sets, rows):
+    # Flatten the token ids of the given rows, returning for each token the
+    # index of the row (in rows) it belongs to.
+    starts = token_sets.indptr[rows]
+    lens = token_sets.sizes[rows]
+    pair_idx = np.repeat(np.arange(len(rows), dtype=np.int64), lens)
+    offsets = np.arange(lens.sum(), dtype=np.int64) - \
+              np.repeat(np.cumsum(lens) - lens, lens)
+    return pair_idx, token_sets.indices[np.repeat(starts, lens) + offsets]
+
+
+def intersection_sizes(l_sets, l_rows, r_sets, r_rows):
+    """
+    Computes the sizes of the intersections of the token sets
+    l_sets[l_rows[i]] and r_sets[r_rows[i]] for all i.
+    """
+    inter = np.zeros(len(l_rows), dtype=np.int64)
+    n_vocab = 1
+    if len(l_sets.indices) > 0:
+        n_vocab = max(n_vocab, int(l_sets.indices.max()) + 1)
+    if len(r_sets.indices) > 0:
+        n_vocab = max(n_vocab, int(r_sets.indices.max()) + 1)
+
+    for start in six.moves.range(0, len(l_rows), _pair_chunk_size):
+        end = min(start + _pair_chunk_size, len(l_rows))
+        l_pair, l_tok = _gather_tokens(l_sets, l_rows[start:end])
+        r_pair, r_tok = _gather_tokens(r_sets, r_rows[start:end])
+        # encode (pair, token) as a single integer; as the token ids of a set
+        # are unique, the common codes are exactly the common tokens
+        common = np.intersect1d(l_pair * n_vocab + l_tok,
+                                r_pair * n_vocab + r_tok, assume_unique=True)
+        inter[start:end] = np.bincount(common // n_vocab,
+                                       minlength=end - start)
+    return inter
+
+
+def _set_sim(sim_name, l_sets, l_rows, r_sets, r_rows):
+    inter = intersection_sizes(l_sets, l_rows, r_sets, r_rows).astype(
+        np.float64)
+    l_len = l_sets.sizes[l_rows].astype(np.float64)
+    r_len = r_sets.sizes[r_rows].astype(np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if sim_name == 'jaccard':
+            vals = inter / (l_len + r_len - inter)
+        elif sim_name == 'cosine':
+            vals = inter / (np.sqrt(l_len) * np.sqrt(r_len))
+        elif sim_name == 'dice':
+            vals = 2.0 * inter / (l_len + r_len)
+        else:
+            vals = inter / np.minimum(l_len, r_len)
+
+    # same conventions as py_stringmatching: two empty sets are identical,
+    # and an empty set has no similarity with a non-empty set
+    vals[(l_len == 0) | (r_len == 0)] = 0.0
+    vals[(l_len == 0) & (r_len == 0)] = 1.0
+    vals[l_sets.is_null[l_rows] | r_sets.is_null[r_rows]] = np.NaN
+    return vals
+
+
+def _exact_match(l_vals, r_vals):
+    is_null = pd.isnull(l_vals) | pd.isnull(r_vals)
+    vals = np.asarray(l_vals == r_vals, dtype=np.float64)
+    vals[is_null] = np.NaN
+    return vals
+
+
+def _numeric_sim(sim_name, l_vals, r_vals):
+    both_zero = (l_vals == 0.0) & (r_vals == 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if sim_name == 'rel_diff':
+            vals = (2 * np.abs(l_vals - r_vals)) / (l_vals + r_vals)
+        else:
+            vals = np.abs(l_vals - r_vals) / np.maximum(l_vals, r_vals)
+            vals[vals <= 10e-5] = 0
+            vals = 1.0 - vals
+    vals[both_zero] = 0
+    vals[np.isnan(l_vals) | np.isnan(r_vals)] = np.NaN
+    return vals
+
+
+def _apply_on_distinct_value_pairs(fn, l_vals, r_vals):
+    # Apply the function once for each distinct pair of values and scatter
+    # the results back to the tuple pairs.
+    l_codes, l_uniq = pd.factorize(l_vals)
+    r_codes, r_uniq = pd.factorize(r_vals)
+    # missing values are coded as -1 by factorize
+    l_uniq = list(l_uniq) + [np.NaN]
+    r_uniq = list(r_uniq) + [np.NaN]
+    return _apply_on_distinct_code_pairs(
+        lambda l_code, r_code: fn(l_uniq[l_code], r_uniq[r_code]),
+        l_codes, r_codes)
+
+
+def _apply_on_distinct_code_pairs(fn, l_codes, r_codes):
+    # Apply the function once for each distinct pair of codes (non-negative
+    # integers, or -1 which stands for the last code) and scatter the
+    # results back to the tuple pairs.
+    l_codes = np.asarray(l_codes, dtype=np.int64)
+    r_codes = np.asarray(r_codes, dtype=np.int64)
+    n_r = int(r_codes.max()) + 2 if len(r_codes) > 0 else 1
+    codes = (l_codes + 1) * n_r + (r_codes + 1)
+    uniq_codes, inverse = np.unique(codes, return_inverse=True)
+
+    res = []
+    for code in uniq_codes:
+        l_code, r_code = divmod(int(code), n_r)
+        res.append(fn(l_code - 1, r_code - 1))
+    return _to_feature_col(res)[inverse.reshape(-1)]
+
+
+def _apply_feat_fn_per_pair(fn, l_df, r_df, l_pos, r_pos, record_accessors):
+    if not record_accessors:
+        record_accessors.extend([RecordAccessor(l_df), RecordAccessor(r_df)])
+    l_records, r_records = record_accessors
+    vals = [fn(l_records.get_record_at(l_pos[i]),
+               r_records.get_record_at(r_pos[i]))
+            for i in six.moves.range(len(l_pos))]
+    return _to_feature_col(vals)
+
+
+def _to_feature_col(vals):
+    # Convert the values returned by a feature function to a float64 array
+    # (with NaN for None) if they are all numbers, and to an object array
+    # holding the values as they are otherwise.
+    if all(val is None or isinstance(val, (numbers.Number, np.bool_))
+           for val in vals):
+        return np.array([np.NaN if val is None else float(val)
+                         for val in vals], dtype=np.float64)
+    col = np.empty(len(vals), dtype=object)
+    for i, val in enumerate(vals):
+        col[i] = val
+    return col
@@ -2,22 +2,27 @@
 This module contains functions to extract features using a feature table.
 """
 import logging
-
-import multiprocessing
+import numbers
 import os
 
 import pandas as pd
 import pyprind
+import six
 import tempfile
 
 from cloudpickle import cloudpickle
 from joblib import Parallel
 from joblib import delayed
+from numpy.lib.format import open_memmap
 
 import py_entitymatching.catalog.catalog_manager as cm
 import py_entitymatching.utils.catalog_helper as ch
 import py_entitymatching.utils.generic_helper as gh
+from py_entitymatching.feature.batchfeatures import \
+    get_feature_vals_by_positions, build_token_cache
 from py_entitymatching.io.pickles import save_object, load_object
+from py_entitymatching.utils.parallel_helper import SharedTable, \
+    SharedObject, get_object, get_num_procs
 from py_entitymatching.utils.validation_helper import validate_object_type
 
 logger = logging.getLogger(__name__)
@@ -34,6 +39,15 @@ def extract_feature_vecs(candset, attrs_before=None, feature_table=None,
     table, ltable and rtable (that is present in the `candset`'s
     metadata) to extract feature vectors.
 
+    The auto-generated features in the feature table are computed in a
+    column-wise fashion: each distinct attribute value is tokenized once per
+    tokenizer (the tokens are shared by all the features) and the similarity
+    measure is applied over all the tuple pairs at once. The
+    other features are computed by calling the feature function for each
+    tuple pair. The feature values are returned as floats, unless a feature
+    function returns non-numeric values (e.g., strings), in which case the
+    values of that feature are kept as they are returned.
+
     Args:
         candset (DataFrame): The input candidate set for which the features
             vectors should be extracted.
@@ -83,6 +97,269 @@ def extract_feature_vecs(candset, attrs_before=None, feature_table=None,
 
 
     """
+    # Validate input parameters and metadata
+    key, fk_ltable, fk_rtable, ltable, rtable, l_key, r_key = \
+        _validate_and_get_metadata(candset, attrs_before, feature_table,
+                                   attrs_after, verbose)
+
+    # Extract features
+
+    # # Set index for convenience
+    l_df = ltable.set_index(l_key, drop=False)
+    r_df = rtable.set_index(r_key, drop=False)
+
+    # # Get the positions of the tuples of each pair in ltable and rtable
+    l_pos, r_pos = _get_tuple_positions(candset, fk_ltable, fk_rtable,
+                                        l_df, r_df)
+
+    # # Tokenize the attribute values used by the features once, and share
+    # the tokens across all the features and splits
+    token_cache = build_token_cache(feature_table, l_df, r_df)
+
+    pickled_obj = cloudpickle.dumps(feature_table)
+
+    # # Apply feature functions
+    ch.log_info(logger, 'Applying feature functions', verbose)
+    n_procs = get_num_procs(n_jobs, len(candset))
+
+    with _SharedInputs(n_procs, l_df, r_df, token_cache) as shared, \
+            Parallel(n_jobs=n_procs) as parallel:
+        feat_vals = _get_feature_vals(parallel, n_procs, pickled_obj,
+                                      shared.l_df, shared.r_df,
+                                      shared.token_cache, l_pos, r_pos,
+                                      show_progress)
+
+    # Construct output table
+    ch.log_info(logger, 'Constructing output table', verbose)
+    feature_vectors = _construct_feature_vectors(candset, feat_vals,
+                                                 feature_table, key,
+                                                 fk_ltable, fk_rtable,
+                                                 attrs_before, attrs_after)
+
+    # Reset the index
+    # feature_vectors.reset_index(inplace=True, drop=True)
+
+    # # Update the catalog
+    cm.init_properties(feature_vectors)
+    cm.copy_properties(candset, feature_vectors)
+
+    # Finally, return the feature vectors
+    return feature_vectors
+
+
+def extract_feature_vecs_by_chunks(candset, attrs_before=None,
+                                   feature_table=None, attrs_after=None,
+                                   chunk_size=10000, verbose=False,
+                                   show_progress=True, n_jobs=1):
+    """
+    This function extracts feature vectors from a DataFrame (typically a
+    labeled candidate set) one chunk of tuple pairs at a time.
+
+    It returns a generator that yields the feature vectors of `chunk_size`
+    consecutive tuple pairs of the `candset` at a time, so that only one
+    chunk of feature vectors is held in memory at any point (in addition to
+    the ltable and the rtable). The feature vectors of a chunk are laid out
+    exactly as in the output of `extract_feature_vecs`.
+
+    Args:
+        candset (DataFrame): The input candidate set for which the features
+            vectors should be extracted.
+        attrs_before (list): The list of attributes from the input candset,
+            that should be added before the feature vectors (defaults to None).
+        feature_table (DataFrame): A DataFrame containing a list of
+            features that should be used to compute the feature vectors (
+            defaults to None).
+        attrs_after (list): The list of attributes from the input candset
+            that should be added after the feature vectors (defaults to None).
+        chunk_size (int): The number of tuple pairs in each chunk (defaults
+            to 10000).
+        verbose (boolean): A flag to indicate whether the debug information
+            should be displayed (defaults to False).
+        show_progress (boolean): A flag to indicate whether the progress of
+            extracting feature vectors must be displayed (defaults to True).
+        n_jobs (int): The number of parallel jobs to be used for computing
+            the feature vectors of a chunk (defaults to 1).
+
+    Returns:
+        A generator of pandas DataFrames containing feature vectors. Unlike
+        the output of `extract_feature_vecs`, the chunks are not registered
+        in the catalog.
+
+    Raises:
+        AssertionError: If `candset` is not of type pandas
+            DataFrame.
+        AssertionError: If `attrs_before` has attributes that
+            are not present in the input candset.
+        AssertionError: If `attrs_after` has attribtues that
+            are not present in the input candset.
+        AssertionError: If `feature_table` is set to None.
+        AssertionError: If `chunk_size` is not a positive integer.
+
+    Examples:
+        >>> import py_entitymatching as em
+        >>> match_f = em.get_features_for_matching(A, B)
+        >>> for H in em.extract_feature_vecs_by_chunks(G, feature_table=match_f, attrs_after=['gold_labels'], chunk_size=100000):
+        ...     H.to_csv('feature_vecs.csv', mode='a', header=False)
+
+    """
+    # Validate input parameters and metadata (before returning the
+    # generator, so that the errors are raised immediately)
+    metadata = _validate_and_get_metadata(candset, attrs_before,
+                                          feature_table, attrs_after, verbose)
+    _validate_chunk_size(chunk_size)
+
+    key, fk_ltable, fk_rtable = metadata[0], metadata[1], metadata[2]
+
+    def feature_vectors_by_chunks():
+        for start, end, feat_vals in _iter_feature_vals(candset, feature_table,
+                                                        metadata, chunk_size,
+                                                        verbose, show_progress,
+                                                        n_jobs):
+            yield _construct_feature_vectors(candset.iloc[start:end],
+                                             feat_vals, feature_table, key,
+                                             fk_ltable, fk_rtable,
+                                             attrs_before, attrs_after)
+
+    return feature_vectors_by_chunks()
+
+
+def extract_feature_vecs_to_file(candset, file_path, feature_table=None,
+                                 chunk_size=10000, verbose=False,
+                                 show_progress=True, n_jobs=1):
+    """
+    This function extracts feature vectors from a DataFrame (typically a
+    labeled candidate set) and writes them to a NumPy (.npy) file, one chunk
+    of tuple pairs at a time.
+
+    The file holds a float64 array with one row per tuple pair (in the
+    `candset` order) and one column per feature (in the `feature_table`
+    order). The array is stored in the column-major order, so each feature
+    is contiguous on disk. As the feature vectors are written chunk by
+    chunk, the memory used is bounded by one chunk of feature vectors (in
+    addition to the ltable and the rtable).
+
+    Args:
+        candset (DataFrame): The input candidate set for which the features
+            vectors should be extracted.
+        file_path (string): The path of the file where the feature vectors
+            should be written.
+        feature_table (DataFrame): A DataFrame containing a list of
+            features that should be used to compute the feature vectors (
+            defaults to None).
+        chunk_size (int): The number of tuple pairs in each chunk (defaults
+            to 10000).
+        verbose (boolean): A flag to indicate whether the debug information
+            should be displayed (defaults to False).
+        show_progress (boolean): A flag to indicate whether the progress of
+            extracting feature vectors must be displayed (defaults to True).
+        n_jobs (int): The number of parallel jobs to be used for computing
+            the feature vectors of a chunk (defaults to 1).
+
+    Returns:
+        A read-only NumPy memory map of the written feature vectors.
+
+    Raises:
+        AssertionError: If `candset` is not of type pandas
+            DataFrame.
+        AssertionError: If `file_path` is not of type string.
+        AssertionError: If `feature_table` is set to None.
+        AssertionError: If `chunk_size` is not a positive integer.
+        AssertionError: If a feature function returns non-numeric values.
+
+    Examples:
+        >>> import py_entitymatching as em
+        >>> match_f = em.get_features_for_matching(A, B)
+        >>> H = em.extract_feature_vecs_to_file(C, 'feature_vecs.npy', feature_table=match_f)
+        >>> # read the feature vectors back
+        >>> H = pd.np.load('feature_vecs.npy', mmap_mode='r')
+
+    """
+    # Validate input parameters and metadata
+    metadata = _validate_and_get_metadata(candset, None, feature_table, None,
+                                          verbose)
+    validate_object_type(file_path, six.string_types,
+                         error_prefix='Input file path')
+    _validate_chunk_size(chunk_size)
+
+    # # Allocate the output file
+    feat_vals_file = open_memmap(file_path, mode='w+', dtype=pd.np.float64,
+                                 shape=(len(candset), len(feature_table)),
+                                 fortran_order=True)
+
+    # # Write the feature vectors chunk by chunk
+    for start, end, feat_vals in _iter_feature_vals(candset, feature_table,
+                                                    metadata, chunk_size,
+                                                    verbose, show_progress,
+                                                    n_jobs):
+        if feat_vals.dtype == object:
+            _check_numeric_feature_vals(feat_vals, feature_table)
+        feat_vals_file[start:end, :] = feat_vals
+        feat_vals_file.flush()
+    del feat_vals_file
+
+    return pd.np.load(file_path, mmap_mode='r')
+
+
+def _check_numeric_feature_vals(feat_vals, feature_table):
+    # Raise an error naming the first feature with non-numeric values
+    feature_names = list(feature_table['feature_name'])
+    for i, name in enumerate(feature_names):
+        if not all(val is None or isinstance(val, (numbers.Number,
+                                                   pd.np.bool_))
+                   for val in feat_vals[:, i]):
+            logger.error('Feature %s returns non-numeric values, which '
+                         'cannot be written to a NumPy file' % name)
+            raise AssertionError('Feature %s returns non-numeric values, '
+                                 'which cannot be written to a NumPy '
+                                 'file' % name)
+
+
+def _validate_chunk_size(chunk_size):
+    if not isinstance(chunk_size, int) or isinstance(chunk_size, bool) or \
+            chunk_size <= 0:
+        logger.error('Chunk size is not a positive integer')
+        raise AssertionError('Chunk size is not a positive integer')
+
+
+def _iter_feature_vals(candset, feature_table, metadata, chunk_size, verbose,
+                       show_progress, n_jobs):
+    # Yields the positions (start, end) of each chunk of tuple pairs in the
+    # candset along with the feature values of the chunk
+    key, fk_ltable, fk_rtable, ltable, rtable, l_key, r_key = metadata
+
+    # # Set index for convenience
+    l_df = ltable.set_index(l_key, drop=False)
+    r_df = rtable.set_index(r_key, drop=False)
+
+    l_pos, r_pos = _get_tuple_positions(candset, fk_ltable, fk_rtable,
+                                        l_df, r_df)
+
+    token_cache = build_token_cache(feature_table, l_df, r_df)
+    pickled_obj = cloudpickle.dumps(feature_table)
+
+    ch.log_info(logger, 'Applying feature functions', verbose)
+    chunk_starts = list(range(0, len(candset), chunk_size))
+    if show_progress:
+        prog_bar = pyprind.ProgBar(len(chunk_starts))
+
+    n_procs = get_num_procs(n_jobs, min(chunk_size, len(candset)))
+    # Reuse the shared tables and the pool of workers across the chunks
+    with _SharedInputs(n_procs, l_df, r_df, token_cache) as shared, \
+            Parallel(n_jobs=max(n_procs, 1)) as parallel:
+        for start in chunk_starts:
+            end = min(start + chunk_size, len(candset))
+            feat_vals = _get_feature_vals(parallel, min(n_procs, end - start),
+                                          pickled_obj, shared.l_df,
+                                          shared.r_df, shared.token_cache,
+                                          l_pos[start:end], r_pos[start:end],
+                                          False)
+            if show_progress:
+                prog_bar.update()
+            yield start, end, feat_vals
+
+
+def _validate_and_get_metadata(candset, attrs_before, feature_table,
+                               attrs_after, verbose):
     # Validate input parameters
 
     # # We expect the input candset to be of type pandas DataFrame.
@@ -134,49 +411,86 @@ def extract_feature_vecs(candset, attrs_before=None, feature_table=None,
                                       ltable, rtable, l_key, r_key,
                                       logger, verbose)
 
-    # Extract features
-
-
-
-    # id_list = [(row[fk_ltable], row[fk_rtable]) for i, row in
-    #            candset.iterrows()]
-    # id_list = [tuple(tup) for tup in candset[[fk_ltable, fk_rtable]].values]
-
-    # # Set index for convenience
-    l_df = ltable.set_index(l_key, drop=False)
-    r_df = rtable.set_index(r_key, drop=False)
-
-    # # Apply feature functions
-    ch.log_info(logger, 'Applying feature functions', verbose)
-    col_names = list(candset.columns)
-    fk_ltable_idx = col_names.index(fk_ltable)
-    fk_rtable_idx = col_names.index(fk_rtable)
-
-    n_procs = get_num_procs(n_jobs, len(candset))
-
-    c_splits = pd.np.array_split(candset, n_procs)
-
-    pickled_obj = cloudpickle.dumps(feature_table)
-
-    feat_vals_by_splits = Parallel(n_jobs=n_procs)(delayed(get_feature_vals_by_cand_split)(pickled_obj,
-                                                                                           fk_ltable_idx,
-                                                                                           fk_rtable_idx,
-                                                                                           l_df, r_df,
-                                                                                           c_splits[i],
-                                                                                           show_progress and i == len(
-                                                                                               c_splits) - 1)
-                                                   for i in range(len(c_splits)))
-
-    feat_vals = sum(feat_vals_by_splits, [])
-
-    # Construct output table
-    feature_vectors = pd.DataFrame(feat_vals, index=candset.index.values)
-    # # Rearrange the feature names in the input feature table order
+    return key, fk_ltable, fk_rtable, ltable, rtable, l_key, r_key
+
+
+def _get_tuple_positions(candset, fk_ltable, fk_rtable, l_df, r_df):
+    # Get the positions of the tuples referred by the foreign keys of the
+    # candidate set in the key indexed ltable and rtable
+    l_pos = l_df.index.get_indexer(candset[fk_ltable].values)
+    r_pos = r_df.index.get_indexer(candset[fk_rtable].values)
+    if (l_pos < 0).any() or (r_pos < 0).any():
+        logger.error('The foreign key values in the candidate set are not '
+                     'present in ltable/rtable')
+        raise AssertionError('The foreign key values in the candidate set are '
+                             'not present in ltable/rtable')
+    return l_pos, r_pos
+
+
+class _SharedInputs(object):
+    # Places the tables and the token cache in memory-mapped files when
+    # more than one worker is used, so that the workers do not get a copy
+    # of them each
+
+    def __init__(self, n_procs, l_df, r_df, token_cache):
+        self._shared = []
+        if n_procs > 1:
+            l_df = self._share(SharedTable, l_df)
+            r_df = self._share(SharedTable, r_df)
+            token_cache = self._share(SharedObject, token_cache)
+        self.l_df, self.r_df, self.token_cache = l_df, r_df, token_cache
+
+    def _share(self, shared_type, obj):
+        try:
+            shared_obj = shared_type(obj)
+        except:
+            self.close()
+            raise
+        self._shared.append(shared_obj)
+        return shared_obj
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for shared_obj in self._shared:
+            shared_obj.close()
+        self._shared = []
+
+
+def _get_feature_vals(parallel, n_procs, pickled_obj, l_df, r_df, token_cache,
+                      l_pos, r_pos, show_progress):
+    # Split the tuple pairs, compute the feature values of the splits in
+    # parallel and stack them
+    l_pos_splits = pd.np.array_split(l_pos, n_procs)
+    r_pos_splits = pd.np.array_split(r_pos, n_procs)
+
+    feat_vals_by_splits = parallel(delayed(get_feature_vals_by_cand_split)(pickled_obj,
+                                                                           l_df, r_df,
+                                                                           token_cache,
+                                                                           l_pos_splits[i],
+                                                                           r_pos_splits[i],
+                                                                           show_progress and i == len(
+                                                                               l_pos_splits) - 1)
+                                   for i in range(len(l_pos_splits)))
+
+    return pd.np.vstack(feat_vals_by_splits)
+
+
+def _construct_feature_vectors(candset, feat_vals, feature_table, key,
+                               fk_ltable, fk_rtable, attrs_before,
+                               attrs_after):
+    # # The feature values are in the input feature table order
     feature_names = list(feature_table['feature_name'])
-    feature_vectors = feature_vectors[feature_names]
+    feature_vectors = pd.DataFrame(feat_vals, index=candset.index.values,
+                                   columns=feature_names)
+    if feat_vals.dtype == object:
+        # # Keep the numeric features as floats
+        feature_vectors = feature_vectors.infer_objects()
 
-    ch.log_info(logger, 'Constructing output table', verbose)
-    # print(feature_vectors)
     # # Insert attrs_before
     if attrs_before:
         if not isinstance(attrs_before, list):
@@ -202,45 +516,38 @@ def extract_feature_vecs(candset, attrs_before=None, feature_table=None,
             feature_vectors.insert(col_pos, a, candset[a])
             col_pos += 1
 
-    # Reset the index
-    # feature_vectors.reset_index(inplace=True, drop=True)
-
-    # # Update the catalog
-    cm.init_properties(feature_vectors)
-    cm.copy_properties(candset, feature_vectors)
-
-    # Finally, return the feature vectors
     return feature_vectors
 
 
-def get_feature_vals_by_cand_split(pickled_obj, fk_ltable_idx, fk_rtable_idx, l_df, r_df, candsplit, show_progress):
-    feature_table = cloudpickle.loads(pickled_obj)
-    if show_progress:
-        prog_bar = pyprind.ProgBar(len(candsplit))
-
-    l_dict = {}
-    r_dict = {}
-
-    feat_vals = []
-    for row in candsplit.itertuples(index=False):
-        if show_progress:
-            prog_bar.update()
-
-        fk_ltable_val = row[fk_ltable_idx]
-        fk_rtable_val = row[fk_rtable_idx]
+def get_feature_vals_by_cand_split(pickled_obj, l_df, r_df, token_cache, l_pos, r_pos, show_progress):
+    """
+    Computes the feature values for a split of the candidate set, given as
+    the positions of the left and the right tuples in l_df and r_df.
 
-        if fk_ltable_val not in l_dict:
-            l_dict[fk_ltable_val] = l_df.ix[fk_ltable_val]
-        l_tuple = l_dict[fk_ltable_val]
+    The tables and the token cache can be shared with the workers (see
+    py_entitymatching.utils.parallel_helper), in which case only the
+    tuples referred by the split are read.
 
-        if fk_rtable_val not in r_dict:
-            r_dict[fk_rtable_val] = r_df.ix[fk_rtable_val]
-        r_tuple = r_dict[fk_rtable_val]
+    The feature values are returned as a float64 NumPy array with one row
+    per tuple pair in the split and one column per feature.
+    """
+    feature_table = cloudpickle.loads(pickled_obj)
+    token_cache = get_object(token_cache)
 
-        f = apply_feat_fns(l_tuple, r_tuple, feature_table)
-        feat_vals.append(f)
+    if isinstance(l_df, SharedTable) or isinstance(r_df, SharedTable):
+        # # Read only the tuples referred by the split and renumber them
+        l_uniq, l_pos = pd.np.unique(l_pos, return_inverse=True)
+        r_uniq, r_pos = pd.np.unique(r_pos, return_inverse=True)
+        l_df = l_df.take(l_uniq) if isinstance(l_df, SharedTable) else \
+            l_df.iloc[l_uniq]
+        r_df = r_df.take(r_uniq) if isinstance(r_df, SharedTable) else \
+            r_df.iloc[r_uniq]
+        if token_cache is not None:
+            token_cache = token_cache.take(l_uniq, r_uniq)
 
-    return feat_vals
+    return get_feature_vals_by_positions(feature_table, l_df, r_df,
+                                         l_pos, r_pos, show_progress,
+                                         token_cache)
 
 
 def apply_feat_fns(tuple1, tuple2, feat_dict):
@@ -257,13 +564,3 @@ def apply_feat_fns(tuple1, tuple2, feat_dict):
     # Return a dictionary where the keys are the feature names and the values
     #  are the feature values.
     return dict(zip(feat_names, feat_vals))
-
-
-def get_num_procs(n_jobs, min_procs):
-    # determine number of processes to launch parallely
-    n_cpus = multiprocessing.cpu_count()
-    n_procs = n_jobs
-    if n_jobs < 0:
-        n_procs = n_cpus + 1 + n_jobs
-    # cannot launch less than min_procs to safeguard against small tables
-    return min(n_procs, min_procs)
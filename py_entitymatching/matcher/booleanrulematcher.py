@@ -8,6 +8,7 @@ import logging
 import py_entitymatching.catalog.catalog_manager as cm
 from py_entitymatching.matcher.rulematcher import RuleMatcher
 from py_entitymatching.matcher.matcherutils import get_ts
+from py_entitymatching.utils.record_helper import RecordAccessor
 import six
 
 logger = logging.getLogger(__name__)
@@ -39,19 +40,12 @@ class BooleanRuleMatcher(RuleMatcher):
         # # keep track of predictions
         predictions = []
 
-        # # set index for convenience
-        l_df = ltable.set_index(l_key, drop=False)
-        r_df = rtable.set_index(r_key, drop=False)
-
-        # # get the index of fk_ltable and fk_rtable from the cand. set
-        col_names = list(candset.columns)
-        lid_idx = col_names.index(fk_ltable)
-        rid_idx = col_names.index(fk_rtable)
+        # # get the left and the right tuples of the cand. set
+        l_rows = RecordAccessor(ltable, l_key).get_records(candset[fk_ltable].values)
+        r_rows = RecordAccessor(rtable, r_key).get_records(candset[fk_rtable].values)
 
         # # iterate through the cand. set
-        for row in candset.itertuples(index=False):
-            l_row = l_df.ix[row[lid_idx]]
-            r_row = r_df.ix[row[rid_idx]]
+        for l_row, r_row in zip(l_rows, r_rows):
             res = self.apply_rules(l_row, r_row)
             if res is True:
                 predictions.append(1)
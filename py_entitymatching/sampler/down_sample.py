@@ -6,19 +6,25 @@ from __future__ import division
 import logging
 import math
 import os
-import random
 from py_entitymatching.utils.catalog_helper import log_info
 
 
+import numpy as np
 import pandas as pd
 import pyprind
 from numpy.random import RandomState
 
 import py_entitymatching.catalog.catalog_manager as cm
 from py_entitymatching.utils.generic_helper import get_install_path
+from py_entitymatching.utils.parallel_helper import SharedObject, \
+    get_num_procs, get_object, run_tasks
 
 logger = logging.getLogger(__name__)
 
+# Number of tuples of B' that are probed into the inverted index as a task
+# (with a seed of its own).
+probe_chunk_size = 1000
+
 
 def _get_stop_words():
     stop_words_set = set()
@@ -47,6 +53,61 @@ def _get_str_cols_list(table):
     return col_list
 
 
+class _InvertedIndex(object):
+    """
+    An inverted index from the tokens of a table to the positions of the
+    tuples that contain them, stored in CSR form: the tokens are mapped to
+    integer ids, and the positions of the tuples with the token of id i are
+    positions[offsets[i]:offsets[i + 1]] (sorted).
+    """
+
+    def __init__(self, vocabulary, offsets, positions):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def __contains__(self, token):
+        return token in self.vocabulary
+
+    def get(self, token, default=None):
+        """
+        Returns the positions of the tuples that contain the token.
+        """
+        token_id = self.vocabulary.get(token, None)
+        if token_id is None:
+            return default
+        return self.positions[self.offsets[token_id]:
+                              self.offsets[token_id + 1]]
+
+    def get_token_ids(self, tokens):
+        """
+        Returns the ids of the tokens that are in the index, as a NumPy
+        array.
+        """
+        token_ids = [self.vocabulary[token] for token in tokens
+                     if token in self.vocabulary]
+        return np.array(token_ids, dtype=np.int64)
+
+
+# tokenize the concatenated string values of each tuple
+def _get_tokenized_table(table, str_cols_ix):
+    """
+
+    This function concatenates the string columns of the table column by
+    column, and tokenizes the concatenated values by white spaces
+
+    """
+    if len(str_cols_ix) == 0:
+        return [[] for _ in range(len(table))]
+    values = table.iloc[:, str_cols_ix[0]].map(str).str.lower()
+    for list_item in str_cols_ix[1:]:
+        values = values + ' ' + table.iloc[:, list_item].map(str).str.lower()
+    return list(values.str.split())
+
+
 # create inverted index from token to position
 def _inv_index(table):
     """
@@ -55,41 +116,30 @@ def _inv_index(table):
 
     """
 
-    # Get the stop words listed by user in the file specified by dataset path
-    stop_words = _get_stop_words()
-
     # Extract indices of all string columns (if any) from the input DataFrame
     str_cols_ix = _get_str_cols_list(table)
 
-    inv_index = dict()
-    pos = 0
-
-    # For each row in the DataFrame of the input table, we will fetch all string values from string column indices
-    # and will concatenate them. Next step would be to tokenize them using set and remove all the stop words
-    # from the list of tokens. Once we have the list of tokens, we will iterate through the list of tokens
-    # to identify its position and will create an inverted index.
-    for row in table.itertuples(index=False):
-        str_val = ''
-        for list_item in str_cols_ix:
-            str_val += str(row[list_item]).lower() + ' '
-        str_val = str_val.rstrip()
+    # Tokenize the concatenated string values of all the tuples, and map the
+    # tokens to integer ids.
+    token_lists = _get_tokenized_table(table, str_cols_ix)
+    lengths = np.array([len(tokens) for tokens in token_lists], dtype=np.int64)
+    tokens = [token for token_list in token_lists for token in token_list]
+    token_ids, vocabulary = pd.factorize(pd.Series(tokens, dtype=object))
+    num_rows = len(table)
 
-        # tokenize them
-        str_val = set(str_val.split())
-        #str_val = str_val.difference(stop_words)
+    # Sort the distinct (token id, position) pairs by token id and then by
+    # position, and build the offsets of the positions of each token.
+    rows = np.repeat(np.arange(num_rows, dtype=np.int64), lengths)
+    codes = np.unique(token_ids.astype(np.int64) * num_rows + rows)
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(codes // num_rows,
+                                        minlength=len(vocabulary)))
+    vocabulary = dict(zip(vocabulary, range(len(vocabulary))))
+    return _InvertedIndex(vocabulary, offsets, codes % num_rows)
 
-        # building inverted index I from set of tokens
-        for token in str_val:
-            lst = inv_index.get(token, None)
-            if lst is None:
-                inv_index[token] = [pos]
-            else:
-                lst.append(pos)
-        pos += 1
-    return inv_index
 
-
-def _probe_index(table_b, y_param, s_tbl_sz, s_inv_index, show_progress=True, seed=None):
+def _probe_index(table_b, y_param, s_tbl_sz, s_inv_index, show_progress=True,
+                 seed=None, n_procs=1):
 
     """
     This is probe index function that probes the second table into inverted index to get
@@ -97,81 +147,102 @@ def _probe_index(table_b, y_param, s_tbl_sz, s_inv_index, show_progress=True, se
 
     """
 
-    y_pos = math.ceil(y_param / 2.0)
-    h_table = set()
+    y_pos = int(math.ceil(y_param / 2.0))
     stop_words = _get_stop_words()
     str_cols_ix = _get_str_cols_list(table_b)
 
-    # Progress Bar
-    if show_progress:
-        bar = pyprind.ProgBar(len(table_b))
-
     # For each tuple x ∈ B', we will probe inverted index I built in the previous step to find all tuples in A
     # (inverted index) that share tokens with x. We will rank these tuples in decreasing order of shared tokens, then
     # take (up to) the top k/2 tuples to be the set P.
 
-    for row in table_b.itertuples(index=False):
-        if show_progress:
-            bar.update()
-        str_val = ''
-
-        # For all string column in the table, fetch all string values and concatenate them
-        for list_ix in str_cols_ix:
-            str_val += str(row[list_ix]).lower() + ' '
-        str_val = str_val.rstrip()
-
-        # Tokenizing the string value and removing stop words before we start probing into inverted index I
-        str_val = set(str_val.split())
-        str_val = str_val.difference(stop_words)
-
-        # For each token in the set, we will probe the token into inverted index I to get set of y/2 positive matches
-        ids_dict = {}
-        match = set()
-        for token in str_val:
-            ids = s_inv_index.get(token, None)
-            if ids is not None:
-                for id in ids:
-                    if id not in ids_dict:
-                        ids_dict[id] = 1
-                    else:
-                        ids_dict[id] = ids_dict[id] + 1
-
-                        # match.update(ids)
-
-        # Pick y/2 elements from match
-        m = min(y_pos, len(ids_dict))
-        # match = list(match)
-        smpl_pos_neg = set()
-
-        num_pos = 0
-        sorted_key_values = [(k, v) for v, k in sorted(
-            [(v, k) for k, v in ids_dict.items()], reverse=True
-        )]
-        for t in sorted_key_values:
-            if num_pos >= m:
-                break
-            smpl_pos_neg.add(t[0])
-            num_pos += 1
-
-        # while len(smpl_pos_neg) < k:
-        #     num = random.choice(match)
-        #     smpl_pos_neg.add(num)
+    # Tokenizing the string values and removing stop words before we start
+    # probing into inverted index I, and mapping the tokens to their ids
+    token_id_lists = [
+        s_inv_index.get_token_ids(set(tokens).difference(stop_words))
+        for tokens in _get_tokenized_table(table_b, str_cols_ix)]
+
+    # The tuples are probed by chunks of a fixed size (handed out to the
+    # workers), each with its own seed drawn from the given seed, so that
+    # the sample does not depend on the number of workers.
+    ranges = [(start, min(start + probe_chunk_size, len(token_id_lists)))
+              for start in range(0, len(token_id_lists), probe_chunk_size)]
+    if seed is not None:
+        chunk_seeds = RandomState(seed).randint(0, 2 ** 31 - 1,
+                                                size=len(ranges))
+    else:
+        chunk_seeds = [None] * len(ranges)
+
+    # Progress Bar
+    if show_progress:
+        bar = pyprind.ProgBar(len(ranges))
+
+    h_table = set()
+    index = {'offsets': s_inv_index.offsets,
+             'positions': s_inv_index.positions}
+    shared_index = SharedObject(index) if n_procs > 1 else index
+    try:
+        tasks = [(token_id_lists[start:stop], y_pos, y_param, s_tbl_sz,
+                  shared_index, chunk_seeds[i])
+                 for i, (start, stop) in enumerate(ranges)]
+        for chunk_positions in run_tasks(_probe_index_part, tasks, n_procs):
+            if show_progress:
+                bar.update()
+            h_table.update(chunk_positions.tolist())
+    finally:
+        if n_procs > 1:
+            shared_index.close()
+
+    return h_table
+
+
+def _probe_index_part(token_id_lists, y_pos, y_param, s_tbl_sz, shared_index,
+                      seed):
+    """
+    This function probes a chunk of tuples (given by the ids of their tokens)
+    into the inverted index, and returns the positions of the sampled tuples
+
+    """
+    index = get_object(shared_index)
+    offsets, positions = index['offsets'], index['positions']
+    rand = RandomState(seed)
+    sample_size = min(y_param, s_tbl_sz)
+    chunk_positions = []
+    for token_ids in token_id_lists:
+        # Gather the positions of the tuples that share tokens with the tuple,
+        # and count the shared tokens of each tuple
+        starts = offsets[token_ids]
+        lengths = offsets[token_ids + 1] - starts
+        num_positions = lengths.sum()
+        if num_positions > 0:
+            shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            ids, counts = np.unique(
+                positions[shifts + np.arange(num_positions)],
+                return_counts=True)
+        else:
+            ids = np.zeros(0, dtype=np.int64)
+            counts = ids
+
+        # Pick the y/2 tuples sharing the most tokens (ties broken by the
+        # larger position), selecting them with a partial sort
+        m = min(y_pos, len(ids))
+        if m < len(ids):
+            keys = counts * s_tbl_sz + ids
+            ids = ids[np.argpartition(-keys, m - 1)[:m]]
+        smpl_pos_neg = set(ids.tolist())
 
         # Remaining y_param/2 items are selected here randomly. This is to get better coverage from both the input
         # tables
-        if seed is not None:
-            random.seed(seed)
-        while len(smpl_pos_neg) < y_param:
-            rand_item_num = random.randint(0, s_tbl_sz - 1)
-            smpl_pos_neg.add(rand_item_num)
-        h_table.update(smpl_pos_neg)
+        while len(smpl_pos_neg) < sample_size:
+            smpl_pos_neg.update(rand.randint(
+                0, s_tbl_sz, size=sample_size - len(smpl_pos_neg)).tolist())
+        chunk_positions.extend(smpl_pos_neg)
 
-    return h_table
+    return np.unique(np.array(chunk_positions, dtype=np.int64))
 
 
 # down sample of two tables : based on sanjib's index based solution
 def down_sample(table_a, table_b, size, y_param, show_progress=True,
-                verbose=False, seed=None):
+                verbose=False, seed=None, n_jobs=1):
     """
     This function down samples two tables A and B into smaller tables A' and
     B' respectively.
@@ -196,6 +267,14 @@ def down_sample(table_a, table_b, size, y_param, show_progress=True,
          should be displayed (defaults to False).
         seed (int): The seed for the pseudo random number generator to select
             the tuples from A and B (defaults to None).
+        n_jobs (int): The number of parallel jobs to be used for probing the
+            inverted index (defaults to 1). If -1 all CPUs are used. If 0 or
+            1, no parallel computation is used at all, which is useful for
+            debugging. For n_jobs below -1, (n_cpus + 1 + n_jobs) are used
+            (where n_cpus is the total number of CPUs in the machine). The
+            tuples of B' are probed by chunks of a fixed size, each with a
+            seed drawn from `seed`, so the sample given a seed does not
+            depend on n_jobs.
 
     Returns:
         Down sampled tables A and B as pandas DataFrames.
@@ -207,6 +286,7 @@ def down_sample(table_a, table_b, size, y_param, show_progress=True,
             valid integer value.
         AssertionError: If `seed` is not a valid integer
             value.
+        AssertionError: If `n_jobs` is not a valid integer value.
 
     Examples:
         >>> A = em.read_csv_metadata('path_to_csv_dir/table_A.csv', key='ID')
@@ -244,6 +324,10 @@ def down_sample(table_a, table_b, size, y_param, show_progress=True,
         logger.error('Seed is not of type integer')
         raise AssertionError('Seed is not of type integer')
 
+    if not isinstance(n_jobs, int):
+        logger.error('Parameter n_jobs is not of type integer')
+        raise AssertionError('Parameter n_jobs is not of type integer')
+
     if len(table_b) < size:
         logger.warning(
             'Size of table B is less than b_size parameter - using entire table B')
@@ -275,9 +359,11 @@ def down_sample(table_a, table_b, size, y_param, show_progress=True,
     b_tbl_indices = list(rand.choice(len(table_b), int(b_sample_size), replace=False))
 
     # Probe inverted index to find all tuples in A that share tokens with tuples in B'.
-    s_tbl_indices = _probe_index(table_b.ix[b_tbl_indices], y_param,
-                                 len(table_a), s_inv_index, show_progress, seed=seed)
-    s_tbl_indices = list(s_tbl_indices)
+    n_procs = get_num_procs(n_jobs, int(b_sample_size))
+    s_tbl_indices = _probe_index(table_b.iloc[b_tbl_indices], y_param,
+                                 len(table_a), s_inv_index, show_progress,
+                                 seed=seed, n_procs=n_procs)
+    s_tbl_indices = sorted(s_tbl_indices)
     l_sampled = table_a.iloc[list(s_tbl_indices)]
     r_sampled = table_b.iloc[list(b_tbl_indices)]
 
@@ -287,4 +373,4 @@ def down_sample(table_a, table_b, size, y_param, show_progress=True,
     if cm.is_dfinfo_present(table_b):
         cm.copy_properties(table_b, r_sampled)
 
-    return l_sampled, r_sampled
\ No newline at end of file
+    return l_sampled, r_sampled
@@ -523,6 +523,47 @@ class AttrEquivBlockerTestCases(unittest.TestCase):
         validate_data(D, [('a5','b5')])
 
 
+    def test_ab_block_candset_same_as_block_tuples(self):
+        path_a = os.sep.join([p, 'tests', 'test_datasets', 'blocker',
+                              'table_A_wi_missing_vals.csv'])
+        path_b = os.sep.join([p, 'tests', 'test_datasets', 'blocker',
+                              'table_B_wi_missing_vals.csv'])
+        A = em.read_csv_metadata(path_a, key='ID')
+        B = em.read_csv_metadata(path_b, key='ID')
+        # the candset is the cartesian product of the tables
+        C = pd.DataFrame([(i, l, r) for i, (l, r) in enumerate(
+            [(l, r) for l in A.ID for r in B.ID])],
+            columns=['_id', 'ltable_ID', 'rtable_ID'])
+        em.set_key(C, '_id')
+        em.set_fk_ltable(C, 'ltable_ID')
+        em.set_fk_rtable(C, 'rtable_ID')
+        em.set_ltable(C, A)
+        em.set_rtable(C, B)
+        A_idx, B_idx = A.set_index('ID', drop=False), B.set_index('ID', drop=False)
+        for allow_missing in [True, False]:
+            D = self.ab.block_candset(C, l_block_attr_2, r_block_attr_2,
+                                      allow_missing=allow_missing,
+                                      show_progress=False)
+            expected_ids = [(l, r) for l, r in zip(C.ltable_ID, C.rtable_ID)
+                            if not self.ab.block_tuples(A_idx.loc[l],
+                                                        B_idx.loc[r],
+                                                        l_block_attr_2,
+                                                        r_block_attr_2,
+                                                        allow_missing)]
+            validate_metadata_two_candsets(C, D)
+            assert_equal(list(zip(D.ltable_ID, D.rtable_ID)), expected_ids)
+
+    def test_ab_block_candset_diff_attr_types(self):
+        C = self.ab.block_tables(self.A, self.B,
+                                 l_block_attr_1, r_block_attr_1)
+        B = self.B.copy()
+        B['birth_year'] = B['birth_year'].astype(float)
+        em.set_key(B, 'ID')
+        em.set_property(C, 'rtable', B)
+        D = self.ab.block_candset(C, l_block_attr_2, r_block_attr_2,
+                                  show_progress=False)
+        validate_data(D, expected_ids_2)
+
     def test_ab_block_tuples(self):
         assert_equal(self.ab.block_tuples(self.A.ix[1], self.B.ix[2],
                                           l_block_attr_1, r_block_attr_1),
@@ -577,6 +618,119 @@ class AttrEquivBlockerTestCases(unittest.TestCase):
                                           r_block_attr_1), True)
 
 
+    def test_ab_block_tables_composite_key(self):
+        C = self.ab.block_tables(self.A, self.B,
+                                 [l_block_attr_1, l_block_attr_2],
+                                 [r_block_attr_1, r_block_attr_2],
+                                 l_output_attrs, r_output_attrs,
+                                 l_output_prefix, r_output_prefix)
+        validate_metadata(C, l_output_attrs, r_output_attrs,
+                          l_output_prefix, r_output_prefix)
+        validate_data(C, expected_ids_2)
+
+    def test_ab_block_tables_composite_key_wi_missing_values(self):
+        path_a = os.sep.join([p, 'tests', 'test_datasets', 'blocker',
+                              'table_A_wi_missing_vals.csv'])
+        path_b = os.sep.join([p, 'tests', 'test_datasets', 'blocker',
+                              'table_B_wi_missing_vals.csv'])
+        A = em.read_csv_metadata(path_a, key='ID')
+        B = em.read_csv_metadata(path_b, key='ID')
+        l_attrs = [l_block_attr_1, l_block_attr_2]
+        r_attrs = [r_block_attr_1, r_block_attr_2]
+        for allow_missing in [True, False]:
+            C = self.ab.block_tables(A, B, l_attrs, r_attrs,
+                                     allow_missing=allow_missing)
+            expected_ids = [(A.ID[i], B.ID[j]) for i in range(len(A))
+                            for j in range(len(B))
+                            if not self.ab.block_tuples(A.iloc[i], B.iloc[j],
+                                                        l_attrs, r_attrs,
+                                                        allow_missing)]
+            validate_metadata(C)
+            validate_data(C, expected_ids)
+
+    def test_ab_block_tables_wi_normalizer(self):
+        A = self.A.copy()
+        A['name'] = ['  ' + n.upper() for n in A['name']]
+        em.set_key(A, 'ID')
+        B = self.B.copy()
+        B.loc[B.ID == 'b3', 'name'] = 'Michael Franklin'
+        em.set_key(B, 'ID')
+        C = self.ab.block_tables(A, B, l_block_attr_3, r_block_attr_3)
+        validate_data(C)
+        C = self.ab.block_tables(A, B, l_block_attr_3, r_block_attr_3,
+                                 normalizer=['strip', 'lowercase'])
+        validate_data(C, [('a2', 'b3')])
+        C = self.ab.block_tables(A, B, l_block_attr_3, r_block_attr_3,
+                                 normalizer=[str.strip, 'first_4',
+                                             'lowercase'])
+        validate_data(C, [('a2', 'b3'), ('a2', 'b6')])
+
+    def test_ab_block_tables_wi_soundex(self):
+        A = self.A.copy()
+        A['last_name'] = [n.split()[-1] for n in A['name']]
+        em.set_key(A, 'ID')
+        B = self.B.copy()
+        B['last_name'] = [n.split()[-1] for n in B['name']]
+        em.set_key(B, 'ID')
+        C = self.ab.block_tables(A, B, 'last_name', 'last_name',
+                                 normalizer='soundex')
+        validate_data(C, [('a2', 'b3'), ('a3', 'b2'), ('a5', 'b5')])
+
+    @raises(AssertionError)
+    def test_ab_block_tables_invalid_normalizer_1(self):
+        self.ab.block_tables(self.A, self.B, l_block_attr_1, r_block_attr_1,
+                             normalizer='bogus')
+
+    @raises(AssertionError)
+    def test_ab_block_tables_invalid_normalizer_2(self):
+        self.ab.block_tables(self.A, self.B, l_block_attr_1, r_block_attr_1,
+                             normalizer=10)
+
+    @raises(AssertionError)
+    def test_ab_block_tables_empty_block_attrs(self):
+        self.ab.block_tables(self.A, self.B, [], [])
+
+    @raises(AssertionError)
+    def test_ab_block_tables_bogus_composite_block_attr(self):
+        self.ab.block_tables(self.A, self.B, [l_block_attr_1, 'bogus_attr'],
+                             [r_block_attr_1, r_block_attr_2])
+
+    def test_ab_block_candset_composite_key(self):
+        C = self.ab.block_tables(self.A, self.B,
+                                 l_block_attr_1, r_block_attr_1)
+        D = self.ab.block_candset(C, [l_block_attr_1, l_block_attr_2],
+                                  [r_block_attr_1, r_block_attr_2])
+        validate_metadata_two_candsets(C, D)
+        validate_data(D, expected_ids_2)
+
+    def test_ab_block_candset_wi_normalizer(self):
+        C = self.ab.block_tables(self.A, self.B,
+                                 l_block_attr_1, r_block_attr_1)
+        D = self.ab.block_candset(C, l_block_attr_3, r_block_attr_3,
+                                  normalizer='first_2')
+        validate_metadata_two_candsets(C, D)
+        validate_data(D, [('a2', 'b3'), ('a5', 'b5')])
+
+    def test_ab_block_tuples_composite_key(self):
+        assert_equal(self.ab.block_tuples(self.A.ix[1], self.B.ix[2],
+                                          [l_block_attr_1, l_block_attr_2],
+                                          [r_block_attr_1, r_block_attr_2]),
+                     False)
+        assert_equal(self.ab.block_tuples(self.A.ix[1], self.B.ix[3],
+                                          [l_block_attr_1, l_block_attr_2],
+                                          [r_block_attr_1, r_block_attr_2]),
+                     True)
+
+    def test_ab_block_tuples_wi_normalizer(self):
+        assert_equal(self.ab.block_tuples(self.A.ix[1], self.B.ix[5],
+                                          l_block_attr_3, r_block_attr_3),
+                     True)
+        assert_equal(self.ab.block_tuples(self.A.ix[1], self.B.ix[5],
+                                          l_block_attr_3, r_block_attr_3,
+                                          normalizer='first_7'),
+                     False)
+
+
 class AttrEquivBlockerMulticoreTestCases(unittest.TestCase):
 
     def setUp(self):
@@ -741,6 +895,34 @@ class AttrEquivBlockerMulticoreTestCases(unittest.TestCase):
         validate_data(D)
 
 
+    def test_ab_block_tables_composite_key_njobs_2(self):
+        C = self.ab.block_tables(self.A, self.B,
+                                 [l_block_attr_1, l_block_attr_2],
+                                 [r_block_attr_1, r_block_attr_2],
+                                 l_output_attrs, r_output_attrs,
+                                 l_output_prefix, r_output_prefix, n_jobs=2)
+        validate_metadata(C, l_output_attrs, r_output_attrs,
+                          l_output_prefix, r_output_prefix)
+        validate_data(C, expected_ids_2)
+
+    def test_ab_block_tables_same_as_single_process(self):
+        path_a = os.sep.join([p, 'tests', 'test_datasets', 'blocker',
+                              'table_A_wi_missing_vals.csv'])
+        path_b = os.sep.join([p, 'tests', 'test_datasets', 'blocker',
+                              'table_B_wi_missing_vals.csv'])
+        A = em.read_csv_metadata(path_a, key='ID')
+        B = em.read_csv_metadata(path_b, key='ID')
+        C = self.ab.block_tables(A, B, l_block_attr_1, r_block_attr_1,
+                                 ['name'], ['name'], allow_missing=True)
+        D = self.ab.block_tables(A, B, l_block_attr_1, r_block_attr_1,
+                                 ['name'], ['name'], allow_missing=True,
+                                 n_jobs=-1)
+        assert_equal(list(C.columns), list(D.columns))
+        assert_equal(list(C['ltable_ID']), list(D['ltable_ID']))
+        assert_equal(list(C['rtable_ID']), list(D['rtable_ID']))
+        assert_equal(list(C['ltable_name'].fillna('')),
+                     list(D['ltable_name'].fillna('')))
+
 
 # helper functions for validating the output
     
@@ -38,6 +38,15 @@ expected_ids_2 = [('a2', 'b3'), ('a3', 'b2'), ('a3', 'b6'), ('a5', 'b5')]
 def _evil_block_fn(x, y):
     return True
 
+# the batch version of _block_fn
+def _batch_block_fn(ltuples, rtuples):
+    return [sim.monge_elkan(l, r) < 0.6
+            for l, r in zip(ltuples['name'], rtuples['name'])]
+
+# returns a mask of the wrong length
+def _bad_batch_block_fn(ltuples, rtuples):
+    return [True]
+
 class BlackBoxBlockerTestCases(unittest.TestCase):
 
     def setUp(self):
@@ -283,6 +292,93 @@ class BlackBoxBlockerTestCases(unittest.TestCase):
         assert_equal(self.bb.block_tuples(self.A.ix[2], self.B.ix[2]),
                      True)
 
+    @raises(AssertionError)
+    def test_bb_block_tables_wi_no_black_box_fn(self):
+        self.bb.block_tables(self.A, self.B)
+
+    @raises(AssertionError)
+    def test_bb_set_batch_black_box_fn_invalid_fn(self):
+        self.bb.set_batch_black_box_function(None)
+
+    @raises(AssertionError)
+    def test_bb_set_batch_black_box_fn_invalid_batch_size(self):
+        self.bb.set_batch_black_box_function(_batch_block_fn, batch_size=0)
+
+    @raises(AssertionError)
+    def test_bb_set_batch_black_box_fn_invalid_l_attrs(self):
+        self.bb.set_batch_black_box_function(_batch_block_fn, l_attrs='name')
+
+    @raises(AssertionError)
+    def test_bb_block_tables_wi_batch_fn_bogus_l_attrs(self):
+        self.bb.set_batch_black_box_function(_batch_block_fn,
+                                             l_attrs=['bogus'])
+        self.bb.block_tables(self.A, self.B)
+
+    @raises(AssertionError)
+    def test_bb_block_tables_wi_batch_fn_invalid_mask(self):
+        self.bb.set_batch_black_box_function(_bad_batch_block_fn)
+        self.bb.block_tables(self.A, self.B, show_progress=False)
+
+    def test_bb_block_tables_wi_batch_fn(self):
+        self.bb.set_batch_black_box_function(_batch_block_fn)
+        C = self.bb.block_tables(self.A, self.B, l_output_attrs=l_output_attrs,
+                                 r_output_attrs=r_output_attrs,
+                                 l_output_prefix=l_output_prefix,
+                                 r_output_prefix=r_output_prefix)
+        validate_metadata(C, l_output_attrs, r_output_attrs,
+                          l_output_prefix, r_output_prefix)
+        validate_data(C, expected_ids_1)
+
+    def test_bb_block_tables_wi_batch_fn_small_batches(self):
+        self.bb.set_batch_black_box_function(_batch_block_fn, batch_size=4,
+                                             l_attrs=['name'],
+                                             r_attrs=['name'])
+        C = self.bb.block_tables(self.A, self.B, l_output_attrs=l_output_attrs,
+                                 r_output_attrs=r_output_attrs,
+                                 show_progress=False)
+        validate_metadata(C, l_output_attrs, r_output_attrs)
+        validate_data(C, expected_ids_1)
+        assert_equal(list(C['ltable_name']),
+                     list(self.A.set_index('ID').loc[C['ltable_ID'], 'name']))
+
+    def test_bb_block_tables_wi_vectorized_batch_fn(self):
+        def block_fn(ltuples, rtuples):
+            return (ltuples['zipcode'] != rtuples['zipcode']).values
+        self.bb.set_batch_black_box_function(block_fn, batch_size=7)
+        C = self.bb.block_tables(self.A, self.B, show_progress=False)
+        validate_metadata(C)
+        validate_data(C, expected_ids_zip)
+
+    def test_bb_block_tables_wi_batch_fn_empty_output(self):
+        self.bb.set_batch_black_box_function(
+            lambda ltuples, rtuples: [True] * len(ltuples))
+        C = self.bb.block_tables(self.A, self.B, l_output_attrs=l_output_attrs)
+        validate_metadata(C, l_output_attrs)
+        validate_data(C)
+
+    def test_bb_block_candset_wi_batch_fn(self):
+        ab = em.AttrEquivalenceBlocker()
+        C = ab.block_tables(self.A, self.B, 'zipcode', 'zipcode',
+                            l_output_attrs, r_output_attrs,
+                            l_output_prefix, r_output_prefix)
+        self.bb.set_batch_black_box_function(_batch_block_fn, batch_size=2)
+        D = self.bb.block_candset(C, show_progress=False)
+        validate_metadata_two_candsets(C, D)
+        validate_data(D, expected_ids_2)
+
+    def test_bb_block_tuples_wi_batch_fn(self):
+        self.bb.set_batch_black_box_function(_batch_block_fn)
+        assert_equal(self.bb.block_tuples(self.A.ix[1], self.B.ix[2]),
+                     False)
+        assert_equal(self.bb.block_tuples(self.A.ix[2], self.B.ix[2]),
+                     True)
+
+    def test_bb_set_black_box_fn_replaces_batch_fn(self):
+        self.bb.set_batch_black_box_function(_bad_batch_block_fn)
+        self.bb.set_black_box_function(_block_fn)
+        C = self.bb.block_tables(self.A, self.B)
+        validate_data(C, expected_ids_1)
+
 
 class BlackBoxBlockerMulticoreTestCases(unittest.TestCase):
 
@@ -375,6 +471,28 @@ class BlackBoxBlockerMulticoreTestCases(unittest.TestCase):
         validate_metadata_two_candsets(C, D)
         validate_data(D, expected_ids_2)
 
+    def test_bb_block_tables_wi_batch_fn_njobs_2(self):
+        self.bb.set_batch_black_box_function(_batch_block_fn, batch_size=3)
+        C = self.bb.block_tables(self.A, self.B, l_output_attrs=l_output_attrs,
+                                 r_output_attrs=r_output_attrs,
+                                 l_output_prefix=l_output_prefix,
+                                 r_output_prefix=r_output_prefix, n_jobs=2)
+        validate_metadata(C, l_output_attrs, r_output_attrs,
+                          l_output_prefix, r_output_prefix)
+        validate_data(C, expected_ids_1)
+
+    def test_bb_block_candset_wi_batch_fn_njobs_2(self):
+        ab = em.AttrEquivalenceBlocker()
+        C = ab.block_tables(self.A, self.B, 'zipcode', 'zipcode',
+                            l_output_attrs, r_output_attrs,
+                            l_output_prefix, r_output_prefix)
+        self.bb.set_batch_black_box_function(_batch_block_fn, batch_size=2,
+                                             l_attrs=['name'],
+                                             r_attrs=['name'])
+        D = self.bb.block_candset(C, n_jobs=2)
+        validate_metadata_two_candsets(C, D)
+        validate_data(D, expected_ids_2)
+
 
 
 # helper functions for validating the output
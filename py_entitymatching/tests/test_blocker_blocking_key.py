@@ -0,0 +1,85 @@
+from nose.tools import *
+import unittest
+import pandas as pd
+
+from py_entitymatching.blocker.blocking_key import soundex, first_k, \
+    get_normalizer, encode_keys, join_codes, get_missing_pairs, \
+    get_join_tasks
+
+
+class BlockingKeyTestCases(unittest.TestCase):
+
+    def test_soundex(self):
+        assert_equal(soundex('Robert'), 'R163')
+        assert_equal(soundex('Rupert'), 'R163')
+        assert_equal(soundex('Ashcraft'), 'A261')
+        assert_equal(soundex('Tymczak'), 'T522')
+        assert_equal(soundex('Pfister'), 'P236')
+        assert_equal(soundex('lee'), 'L000')
+        assert_equal(soundex('123'), None)
+
+    def test_first_k(self):
+        assert_equal(first_k(3)('94107'), '941')
+        assert_equal(first_k(3)(94107), '941')
+        assert_equal(first_k(10)('abc'), 'abc')
+
+    @raises(AssertionError)
+    def test_first_k_invalid_k(self):
+        first_k(0)
+
+    def test_get_normalizer_list(self):
+        fn = get_normalizer(['strip', 'lowercase', 'first_2'])
+        assert_equal(fn('  ABC '), 'ab')
+        assert_equal(get_normalizer(None), None)
+
+    @raises(AssertionError)
+    def test_get_normalizer_invalid_name(self):
+        get_normalizer('first_k')
+
+    def test_encode_keys(self):
+        l_df = pd.DataFrame({'a': ['x', 'X', None, 'y'], 'b': [1, 1, 1, 2]})
+        r_df = pd.DataFrame({'c': ['x', 'y', 'x'], 'd': [1, 2, None]})
+        l_codes, r_codes = encode_keys(l_df, r_df, ['a', 'b'], ['c', 'd'])
+        assert_equal(l_codes[0], r_codes[0])
+        assert_equal(l_codes[3], r_codes[1])
+        assert_not_equal(l_codes[0], l_codes[1])
+        assert_equal(list(l_codes[[2]]) + list(r_codes[[2]]), [-1, -1])
+        l_codes, r_codes = encode_keys(l_df, r_df, ['a'], ['c'], 'lowercase')
+        assert_equal(l_codes[0], l_codes[1])
+
+    def test_join_codes(self):
+        l_codes = [2, 0, -1, 2, 1]
+        r_codes = [2, 1, 2, -1, 3]
+        l_pos, r_pos = join_codes(l_codes, r_codes)
+        expected = sorted((i, j) for i, l in enumerate(l_codes)
+                          for j, r in enumerate(r_codes) if l == r and l >= 0)
+        assert_equal(list(zip(l_pos, r_pos)), expected)
+
+    def test_get_missing_pairs(self):
+        l_pos, r_pos = get_missing_pairs([0, -1], [-1, 0, 1])
+        assert_equal(sorted(zip(l_pos, r_pos)),
+                     [(0, 0), (1, 0), (1, 1), (1, 2)])
+
+    def test_join_tasks_same_as_join(self):
+        # the key code 3 is frequent, so its left tuples are spread over
+        # several tasks
+        l_codes = [3, 0, -1, 3, 1, 3, 4, 3, 3]
+        r_codes = [3, 1, 3, -1, 3, 0, 3]
+        tasks, costs = get_join_tasks(l_codes, r_codes, 4)
+        assert_true(len(tasks) > 1)
+        assert_equal(len(costs), len(tasks))
+        assert_equal(sorted(i for l, _ in tasks for i in l),
+                     [0, 1, 3, 4, 5, 6, 7, 8])
+        pairs = []
+        for l, r in tasks:
+            l_pos, r_pos = join_codes([l_codes[i] for i in l],
+                                      [r_codes[i] for i in r], l, r)
+            pairs.extend(zip(l_pos, r_pos))
+        l_pos, r_pos = join_codes(l_codes, r_codes)
+        assert_equal(sorted(pairs), list(zip(l_pos, r_pos)))
+        assert_equal(sum(costs), len(pairs))
+
+    def test_join_tasks_all_missing(self):
+        tasks, costs = get_join_tasks([-1, -1], [0, 1], 4)
+        assert_equal(len(tasks), 1)
+        assert_equal(len(tasks[0][0]), 0)
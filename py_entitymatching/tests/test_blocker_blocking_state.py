@@ -0,0 +1,239 @@
+import os
+from nose.tools import *
+import pandas as pd
+import unittest
+
+import py_entitymatching as em
+
+p = em.get_install_path()
+path_a = os.sep.join([p, 'tests', 'test_datasets', 'A.csv'])
+path_b = os.sep.join([p, 'tests', 'test_datasets', 'B.csv'])
+l_output_attrs = ['name', 'address']
+r_output_attrs = ['name', 'address']
+l_output_prefix = 'l_'
+r_output_prefix = 'r_'
+
+
+class BlockingStateTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.A = em.read_csv_metadata(path_a)
+        em.set_key(self.A, 'ID')
+        self.B = em.read_csv_metadata(path_b)
+        em.set_key(self.B, 'ID')
+        # the old tuples and the tuples appended later
+        self.A_old = self.A.iloc[:3].copy()
+        em.set_key(self.A_old, 'ID')
+        self.B_old = self.B.iloc[:4].copy()
+        em.set_key(self.B_old, 'ID')
+        self.A_new = self.A.iloc[3:].copy()
+        self.B_new = self.B.iloc[4:].copy()
+        self.path = os.sep.join([p, 'tests', 'test_datasets',
+                                 'blocking_state.pkl'])
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        del self.A
+        del self.B
+
+    @raises(AssertionError)
+    def test_attr_equiv_state_invalid_ltable(self):
+        em.AttrEquivalenceBlockingState(None, self.B, 'zipcode', 'zipcode')
+
+    @raises(AssertionError)
+    def test_attr_equiv_state_bogus_block_attr(self):
+        em.AttrEquivalenceBlockingState(self.A, self.B, 'bogus', 'zipcode')
+
+    @raises(AssertionError)
+    def test_attr_equiv_state_invalid_normalizer(self):
+        em.AttrEquivalenceBlockingState(self.A, self.B, 'name', 'name',
+                                        normalizer='bogus')
+
+    @raises(AssertionError)
+    def test_overlap_state_invalid_overlap_size(self):
+        em.OverlapBlockingState(self.A, self.B, 'address', 'address',
+                                overlap_size=1.0)
+
+    @raises(SyntaxError)
+    def test_overlap_state_invalid_word_level_qval(self):
+        em.OverlapBlockingState(self.A, self.B, 'address', 'address',
+                                q_val=3)
+
+    def test_attr_equiv_state_get_candset(self):
+        state = em.AttrEquivalenceBlockingState(
+            self.A, self.B, 'zipcode', 'zipcode', l_output_attrs=l_output_attrs,
+            r_output_attrs=r_output_attrs, l_output_prefix=l_output_prefix,
+            r_output_prefix=r_output_prefix)
+        C = state.get_candset()
+        D = em.AttrEquivalenceBlocker().block_tables(
+            self.A, self.B, 'zipcode', 'zipcode', l_output_attrs,
+            r_output_attrs, l_output_prefix, r_output_prefix)
+        assert_equal(list(C.columns), list(D.columns))
+        assert_equal(C.values.tolist(), D.values.tolist())
+        assert_equal(em.get_key(C), '_id')
+        assert_equal(em.get_property(C, 'fk_ltable'), 'l_ID')
+        assert_equal(em.get_property(C, 'fk_rtable'), 'r_ID')
+        assert_true(em.get_property(C, 'ltable') is self.A)
+
+    def test_attr_equiv_state_update(self):
+        state = em.AttrEquivalenceBlockingState(self.A_old, self.B_old,
+                                                'zipcode', 'zipcode',
+                                                l_output_attrs=['name'])
+        C = state.get_candset()
+        D = state.update(self.A_new, self.B_new)
+        E = em.AttrEquivalenceBlocker().block_tables(
+            self.A, self.B, 'zipcode', 'zipcode', l_output_attrs=['name'])
+        validate_update(C, D, E)
+        assert_equal(list(state.ltable.ID), list(self.A.ID))
+        assert_equal(em.get_key(state.ltable), 'ID')
+        assert_true(em.get_property(D, 'ltable') is state.ltable)
+        assert_true(em.get_property(D, 'rtable') is state.rtable)
+        assert_equal(len(self.A_old), 3)
+
+    def test_attr_equiv_state_several_updates(self):
+        state = em.AttrEquivalenceBlockingState(self.A_old, self.B_old,
+                                                'zipcode', 'zipcode')
+        C = state.get_candset()
+        D_1 = state.update(delta_rtable=self.B_new)
+        D_2 = state.update(delta_ltable=self.A_new.iloc[:1])
+        D_3 = state.update(delta_ltable=self.A_new.iloc[1:])
+        D_4 = state.update()
+        assert_equal(len(D_4), 0)
+        E = em.AttrEquivalenceBlocker().block_tables(self.A, self.B,
+                                                     'zipcode', 'zipcode')
+        validate_update(C, pd.concat([D_1, D_2, D_3]), E)
+        assert_equal(state.get_candset().values.tolist(),
+                     E.values.tolist())
+
+    def test_attr_equiv_state_update_wi_normalizer(self):
+        A, B = self.A.copy(), self.B.copy()
+        A['name'] = A['name'].str.lower()
+        state = em.AttrEquivalenceBlockingState(
+            get_head(A, 3), get_head(B, 4), ['name', 'zipcode'],
+            ['name', 'zipcode'],
+            normalizer=['lowercase', lambda s: str(s).split()[0]])
+        C = state.get_candset()
+        D = state.update(A.iloc[3:], B.iloc[4:])
+        em.set_key(A, 'ID')
+        em.set_key(B, 'ID')
+        E = em.AttrEquivalenceBlocker().block_tables(
+            A, B, ['name', 'zipcode'], ['name', 'zipcode'],
+            normalizer=['lowercase', lambda s: str(s).split()[0]])
+        validate_update(C, D, E)
+
+    def test_attr_equiv_state_update_wi_missing_values(self):
+        A, B = self.A.copy(), self.B.copy()
+        A.loc[[1, 4], 'zipcode'] = None
+        B.loc[[0, 5], 'zipcode'] = None
+        em.set_key(A, 'ID')
+        em.set_key(B, 'ID')
+        state = em.AttrEquivalenceBlockingState(get_head(A, 3),
+                                                get_head(B, 4), 'zipcode',
+                                                'zipcode', allow_missing=True)
+        C = state.get_candset()
+        D = state.update(A.iloc[3:], B.iloc[4:])
+        E = em.AttrEquivalenceBlocker().block_tables(A, B, 'zipcode',
+                                                     'zipcode',
+                                                     allow_missing=True)
+        validate_update(C, D, E)
+
+    @raises(AssertionError)
+    def test_attr_equiv_state_update_duplicate_key(self):
+        state = em.AttrEquivalenceBlockingState(self.A_old, self.B_old,
+                                                'zipcode', 'zipcode')
+        state.update(delta_ltable=self.A.iloc[2:])
+
+    @raises(AssertionError)
+    def test_attr_equiv_state_update_different_attrs(self):
+        state = em.AttrEquivalenceBlockingState(self.A_old, self.B_old,
+                                                'zipcode', 'zipcode')
+        state.update(delta_rtable=self.B_new[['ID', 'zipcode']])
+
+    @raises(AssertionError)
+    def test_attr_equiv_state_update_invalid_delta(self):
+        state = em.AttrEquivalenceBlockingState(self.A_old, self.B_old,
+                                                'zipcode', 'zipcode')
+        state.update(delta_ltable=['a6'])
+
+    def test_overlap_state_update(self):
+        state = em.OverlapBlockingState(self.A_old, self.B_old, 'address',
+                                        'address', overlap_size=2,
+                                        r_output_attrs=['address'])
+        C = state.get_candset()
+        D = state.update(self.A_new, self.B_new)
+        E = em.OverlapIndex(self.A, 'address').block_tables(
+            self.B, 'address', overlap_size=2, r_output_attrs=['address'])
+        validate_update(C, D, E)
+
+    def test_overlap_state_update_wi_qgrams(self):
+        state = em.OverlapBlockingState(self.A_old, self.B_old, 'name',
+                                        'name', word_level=False, q_val=3,
+                                        overlap_size=3, rem_stop_words=True)
+        C = state.get_candset()
+        D = state.update(self.A_new, self.B_new)
+        E = em.OverlapIndex(self.A, 'name', word_level=False, q_val=3,
+                            rem_stop_words=True).block_tables(
+            self.B, 'name', overlap_size=3)
+        validate_update(C, D, E)
+
+    def test_overlap_state_update_wi_missing_values(self):
+        A, B = self.A.copy(), self.B.copy()
+        A.loc[4, 'address'] = None
+        B.loc[0, 'address'] = None
+        em.set_key(A, 'ID')
+        em.set_key(B, 'ID')
+        state = em.OverlapBlockingState(get_head(A, 3), get_head(B, 4),
+                                        'address', 'address',
+                                        allow_missing=True)
+        C = state.get_candset()
+        D = state.update(A.iloc[3:], B.iloc[4:])
+        E = em.OverlapIndex(A, 'address').block_tables(B, 'address',
+                                                       allow_missing=True)
+        validate_update(C, D, E)
+
+    def test_blocking_state_save_load(self):
+        state = em.AttrEquivalenceBlockingState(
+            self.A_old, self.B_old, 'name', 'name',
+            normalizer=lambda s: s.split()[-1].lower())
+        C = state.get_candset()
+        state.save(self.path)
+        state = em.AttrEquivalenceBlockingState.load(self.path, self.A_old,
+                                                     self.B_old)
+        D = state.update(self.A_new, self.B_new)
+        E = em.AttrEquivalenceBlocker().block_tables(
+            self.A, self.B, 'name', 'name',
+            normalizer=lambda s: s.split()[-1].lower())
+        validate_update(C, D, E)
+
+    @raises(AssertionError)
+    def test_blocking_state_load_different_tables(self):
+        state = em.OverlapBlockingState(self.A_old, self.B_old, 'address',
+                                        'address')
+        state.save(self.path)
+        em.OverlapBlockingState.load(self.path, self.A, self.B_old)
+
+
+# helper functions for validating the output
+
+def get_head(table, n):
+    head = table.iloc[:n].copy()
+    em.set_key(head, 'ID')
+    return head
+
+
+def validate_update(C, D, E):
+    # the pairs of the initial candset and of the updates must be the pairs
+    # of a full rerun, without duplicates
+    lid = em.get_property(E, 'fk_ltable')
+    rid = em.get_property(E, 'fk_rtable')
+    C_ids = list(zip(C[lid], C[rid]))
+    D_ids = list(zip(D[lid], D[rid]))
+    assert_equal(len(set(C_ids) & set(D_ids)), 0)
+    assert_equal(sorted(C_ids + D_ids), sorted(zip(E[lid], E[rid])))
+    assert_equal(sorted(C.columns), sorted(E.columns))
+    assert_equal(sorted(D.columns), sorted(E.columns))
+    E_rows = set(tuple(r) for r in E.drop('_id', axis=1).astype(str).values)
+    D_rows = set(tuple(r) for r in D[[c for c in E.columns if c != '_id']]
+                 .astype(str).values)
+    assert_true(D_rows.issubset(E_rows))
@@ -0,0 +1,183 @@
+import os
+from nose.tools import *
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+
+import py_entitymatching as em
+import py_entitymatching.blocker.overlap_index as oi
+
+p = em.get_install_path()
+path_a = os.sep.join([p, 'tests', 'test_datasets', 'A.csv'])
+path_b = os.sep.join([p, 'tests', 'test_datasets', 'B.csv'])
+path_a_missing = os.sep.join([p, 'tests', 'test_datasets', 'blocker',
+                              'table_A_wi_missing_vals.csv'])
+path_b_missing = os.sep.join([p, 'tests', 'test_datasets', 'blocker',
+                              'table_B_wi_missing_vals.csv'])
+
+# overlap on name with overlap_size=1
+expected_ids_1 = [('a2', 'b3'), ('a2', 'b6'), ('a3', 'b2'), ('a5', 'b5')]
+
+# overlap on address with overlap_size=4 (removing stop words)
+expected_ids_2 = [('a2', 'b3'), ('a3', 'b2')]
+
+# overlap on birth_year with q_val=3, overlap_size=6
+expected_ids_3 = [('a2', 'b3'), ('a3', 'b2'), ('a4', 'b1'), ('a4', 'b6'),
+                  ('a5', 'b5')]
+
+# overlap on name, overlap_size=1 on tables with missing values
+expected_ids_4 = [('a1', 'b4'), ('a2', 'b3'), ('a2', 'b4'), ('a2', 'b6'),
+                  ('a3', 'b2'), ('a3', 'b4'), ('a4', 'b1'), ('a4', 'b2'),
+                  ('a4', 'b3'), ('a4', 'b4'), ('a4', 'b5'), ('a4', 'b6'),
+                  ('a5', 'b4'), ('a5', 'b5')]
+
+
+class OverlapIndexTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.A = em.read_csv_metadata(path_a, key='ID')
+        self.B = em.read_csv_metadata(path_b, key='ID')
+        self.ob = em.OverlapBlocker()
+
+    def tearDown(self):
+        del self.A
+        del self.B
+        del self.ob
+
+    def test_block_tables_word_level(self):
+        index = em.OverlapIndex(self.A, 'name')
+        C = index.block_tables(self.B, 'name', l_output_attrs=['name'],
+                               r_output_attrs=['name', 'address'])
+        validate_data(C, expected_ids_1)
+        assert_equal(list(C.columns), ['_id', 'ltable_ID', 'rtable_ID',
+                                       'ltable_name', 'rtable_name',
+                                       'rtable_address'])
+        assert_equal(em.get_key(C), '_id')
+        assert_equal(em.get_property(C, 'fk_ltable'), 'ltable_ID')
+        assert_equal(em.get_property(C, 'fk_rtable'), 'rtable_ID')
+        assert_equal(em.get_ltable(C) is self.A, True)
+        assert_equal(em.get_rtable(C) is self.B, True)
+
+    def test_block_tables_several_overlap_sizes(self):
+        index = em.OverlapIndex(self.A, 'address', rem_stop_words=True)
+        for overlap_size in range(1, 6):
+            C = index.block_tables(self.B, 'address',
+                                   overlap_size=overlap_size)
+            D = self.ob.block_tables(self.A, self.B, 'address', 'address',
+                                     rem_stop_words=True,
+                                     overlap_size=overlap_size,
+                                     show_progress=False)
+            validate_data(C, get_ids(D))
+        C = index.block_tables(self.B, 'address', overlap_size=4)
+        validate_data(C, expected_ids_2)
+
+    def test_block_tables_qgram(self):
+        index = em.OverlapIndex(self.A, 'birth_year', word_level=False,
+                                q_val=3)
+        C = index.block_tables(self.B, 'birth_year', overlap_size=6)
+        validate_data(C, expected_ids_3)
+
+    def test_block_tables_wi_missing_values(self):
+        A = em.read_csv_metadata(path_a_missing, key='ID')
+        B = em.read_csv_metadata(path_b_missing, key='ID')
+        index = em.OverlapIndex(A, 'name')
+        C = index.block_tables(B, 'name', allow_missing=True)
+        validate_data(C, expected_ids_4)
+        C = index.block_tables(B, 'name')
+        validate_data(C, expected_ids_1)
+
+    def test_get_candset_sizes(self):
+        A = em.read_csv_metadata(path_a_missing, key='ID')
+        B = em.read_csv_metadata(path_b_missing, key='ID')
+        index = em.OverlapIndex(A, 'address')
+        for allow_missing in [True, False]:
+            sizes = index.get_candset_sizes(B, 'address',
+                                            allow_missing=allow_missing)
+            assert_equal(list(sizes.index), list(range(1, len(sizes) + 1)))
+            for overlap_size in range(1, len(sizes) + 2):
+                C = index.block_tables(B, 'address',
+                                       overlap_size=overlap_size,
+                                       allow_missing=allow_missing)
+                expected = sizes.get(overlap_size, len(C) if allow_missing
+                                     else 0)
+                assert_equal(len(C), expected)
+
+    def test_get_overlaps_in_chunks(self):
+        index = em.OverlapIndex(self.A, 'address')
+        l_pos, r_pos, overlap = index.get_overlaps(self.B, 'address')
+        max_hits = oi.max_hits_per_chunk
+        oi.max_hits_per_chunk = 3
+        try:
+            l_pos_2, r_pos_2, overlap_2 = index.get_overlaps(self.B,
+                                                             'address')
+        finally:
+            oi.max_hits_per_chunk = max_hits
+        assert_equal(list(l_pos), list(l_pos_2))
+        assert_equal(list(r_pos), list(r_pos_2))
+        assert_equal(list(overlap), list(overlap_2))
+
+    def test_get_token_frequencies(self):
+        index = em.OverlapIndex(self.A, 'address')
+        freqs = index.get_token_frequencies()
+        assert_equal(freqs['francisco'], len(self.A))
+        assert_equal(freqs.sum(), len(index.postings))
+
+    def test_save_and_load(self):
+        index = em.OverlapIndex(self.A, 'address', rem_stop_words=True)
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.sep.join([temp_dir, 'index.pkl'])
+            index.save(path)
+            loaded = em.OverlapIndex.load(path, self.A)
+        finally:
+            shutil.rmtree(temp_dir)
+        assert_equal(index.table is self.A, True)
+        assert_equal(loaded.table is self.A, True)
+        C = loaded.block_tables(self.B, 'address', overlap_size=4)
+        validate_data(C, expected_ids_2)
+
+    @raises(AssertionError)
+    def test_load_wi_other_table(self):
+        index = em.OverlapIndex(self.A, 'address')
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.sep.join([temp_dir, 'index.pkl'])
+            index.save(path)
+            em.OverlapIndex.load(path, self.B)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    @raises(AssertionError)
+    def test_invalid_table(self):
+        em.OverlapIndex(None, 'address')
+
+    @raises(AssertionError)
+    def test_bogus_overlap_attr(self):
+        em.OverlapIndex(self.A, 'bogus_attr')
+
+    @raises(SyntaxError)
+    def test_invalid_word_level_qval(self):
+        em.OverlapIndex(self.A, 'address', q_val=3)
+
+    @raises(AssertionError)
+    def test_block_tables_bogus_r_overlap_attr(self):
+        index = em.OverlapIndex(self.A, 'address')
+        index.block_tables(self.B, 'bogus_attr')
+
+    @raises(AssertionError)
+    def test_block_tables_invalid_overlap_size(self):
+        index = em.OverlapIndex(self.A, 'address')
+        index.block_tables(self.B, 'address', overlap_size=1.5)
+
+
+def get_ids(C):
+    return sorted(zip(C[em.get_property(C, 'fk_ltable')],
+                      C[em.get_property(C, 'fk_rtable')]))
+
+
+def validate_data(C, expected_ids=None):
+    if expected_ids:
+        assert_equal(expected_ids, get_ids(C))
+    else:
+        assert_equal(len(C), 0)
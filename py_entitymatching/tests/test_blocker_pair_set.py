@@ -0,0 +1,142 @@
+import os
+from nose.tools import *
+import pandas as pd
+import unittest
+
+import py_entitymatching as em
+from py_entitymatching.blocker.pair_set import PairSet
+
+p = em.get_install_path()
+path_a = os.sep.join([p, 'tests', 'test_datasets', 'A.csv'])
+path_b = os.sep.join([p, 'tests', 'test_datasets', 'B.csv'])
+
+
+class PairSetTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.A = em.read_csv_metadata(path_a)
+        em.set_key(self.A, 'ID')
+        self.B = em.read_csv_metadata(path_b)
+        em.set_key(self.B, 'ID')
+        self.ab = em.AttrEquivalenceBlocker()
+        # pairs with the same zipcode and pairs with the same birth year
+        self.C = self.ab.block_tables(self.A, self.B, 'zipcode', 'zipcode')
+        self.D = self.ab.block_tables(self.A, self.B, 'birth_year',
+                                      'birth_year')
+
+    def tearDown(self):
+        del self.A
+        del self.B
+        del self.ab
+        del self.C
+        del self.D
+
+    def test_pair_set_from_candset(self):
+        pairs = PairSet.from_candset(self.C)
+        assert_equal(len(pairs), len(self.C))
+        assert_equal(sorted(pairs), sorted(zip(self.C.ltable_ID,
+                                               self.C.rtable_ID)))
+        assert_true(pairs.ltable is self.A)
+        assert_true(pairs.rtable is self.B)
+
+    def test_pair_set_from_ids_removes_duplicates(self):
+        pairs = PairSet.from_ids(self.A, self.B, ['a2', 'a1', 'a2'],
+                                 ['b3', 'b1', 'b3'])
+        assert_equal(list(pairs), [('a1', 'b1'), ('a2', 'b3')])
+        assert_equal(list(pairs.l_pos), [0, 1])
+        assert_equal(list(pairs.r_pos), [0, 2])
+
+    @raises(KeyError)
+    def test_pair_set_from_ids_bogus_id(self):
+        PairSet.from_ids(self.A, self.B, ['a1'], ['bogus'])
+
+    @raises(AssertionError)
+    def test_pair_set_invalid_ltable(self):
+        PairSet(None, self.B)
+
+    @raises(AssertionError)
+    def test_pair_set_positions_of_different_lengths(self):
+        PairSet(self.A, self.B, [0, 1], [0])
+
+    @raises(AssertionError)
+    def test_pair_set_positions_out_of_range(self):
+        PairSet(self.A, self.B, [0], [len(self.B)])
+
+    def test_pair_set_empty(self):
+        pairs = PairSet(self.A, self.B)
+        assert_equal(len(pairs), 0)
+        assert_equal(len(pairs | PairSet.from_candset(self.C)),
+                     len(self.C))
+        assert_equal(len(pairs & PairSet.from_candset(self.C)), 0)
+        assert_false(('a1', 'b1') in pairs)
+
+    def test_pair_set_union(self):
+        pairs = PairSet.from_candset(self.C) | PairSet.from_candset(self.D)
+        expected = set(zip(self.C.ltable_ID, self.C.rtable_ID)) | \
+            set(zip(self.D.ltable_ID, self.D.rtable_ID))
+        assert_equal(list(pairs), sorted(expected))
+
+    def test_pair_set_intersection(self):
+        pairs = PairSet.from_candset(self.C) & PairSet.from_candset(self.D)
+        expected = set(zip(self.C.ltable_ID, self.C.rtable_ID)) & \
+            set(zip(self.D.ltable_ID, self.D.rtable_ID))
+        assert_equal(list(pairs), sorted(expected))
+
+    def test_pair_set_difference(self):
+        pairs = PairSet.from_candset(self.C) - PairSet.from_candset(self.D)
+        expected = set(zip(self.C.ltable_ID, self.C.rtable_ID)) - \
+            set(zip(self.D.ltable_ID, self.D.rtable_ID))
+        assert_equal(list(pairs), sorted(expected))
+        pairs = PairSet.from_candset(self.D) - PairSet.from_candset(self.C)
+        expected = set(zip(self.D.ltable_ID, self.D.rtable_ID)) - \
+            set(zip(self.C.ltable_ID, self.C.rtable_ID))
+        assert_equal(list(pairs), sorted(expected))
+
+    def test_pair_set_equality(self):
+        pairs = PairSet.from_candset(self.C)
+        assert_true(pairs == PairSet.from_candset(self.C))
+        assert_true(pairs != PairSet.from_candset(self.D))
+        assert_true((pairs - pairs) == PairSet(self.A, self.B))
+
+    @raises(AssertionError)
+    def test_pair_set_union_different_tables(self):
+        A = self.A.copy()
+        em.set_key(A, 'ID')
+        PairSet(A, self.B) | PairSet.from_candset(self.C)
+
+    def test_pair_set_contains(self):
+        pairs = PairSet.from_candset(self.C)
+        for l_id, r_id in zip(self.C.ltable_ID, self.C.rtable_ID):
+            assert_true((l_id, r_id) in pairs)
+        assert_false(('a1', 'bogus') in pairs)
+        l_ids = [l for l in self.A.ID for _ in self.B.ID]
+        r_ids = [r for _ in self.A.ID for r in self.B.ID]
+        expected = [(l, r) in set(zip(self.C.ltable_ID, self.C.rtable_ID))
+                    for l, r in zip(l_ids, r_ids)]
+        assert_equal(list(pairs.contains(l_ids, r_ids)), expected)
+        assert_equal(list(pairs.contains_positions(pairs.l_pos,
+                                                   pairs.r_pos)),
+                     [True] * len(pairs))
+
+    def test_pair_set_to_candset(self):
+        pairs = PairSet.from_candset(self.C) | PairSet.from_candset(self.D)
+        E = pairs.to_candset(l_output_attrs=['name'],
+                             r_output_attrs=['name', 'zipcode'],
+                             l_output_prefix='l_', r_output_prefix='r_')
+        assert_equal(list(E.columns), ['_id', 'l_ID', 'r_ID', 'l_name',
+                                       'r_name', 'r_zipcode'])
+        assert_equal(em.get_key(E), '_id')
+        assert_equal(em.get_property(E, 'fk_ltable'), 'l_ID')
+        assert_equal(em.get_property(E, 'fk_rtable'), 'r_ID')
+        assert_true(em.get_property(E, 'ltable') is self.A)
+        assert_true(em.get_property(E, 'rtable') is self.B)
+        assert_equal(list(zip(E.l_ID, E.r_ID)), list(pairs))
+        assert_equal(list(E.l_name),
+                     list(self.A.set_index('ID').loc[E.l_ID, 'name']))
+        assert_true(PairSet.from_candset(E) == pairs)
+
+    def test_pair_set_to_candset_empty(self):
+        E = PairSet(self.A, self.B).to_candset(l_output_attrs=['name'])
+        assert_equal(len(E), 0)
+        assert_equal(list(E.columns), ['_id', 'ltable_ID', 'rtable_ID',
+                                       'ltable_name'])
@@ -0,0 +1,140 @@
+import os
+from nose.tools import *
+import unittest
+import pandas as pd
+
+import py_entitymatching as em
+from py_entitymatching.blocker.rule_compiler import compile_rules, \
+    compile_conjunct, cartesian_blocks
+from py_entitymatching.feature.simfunctions import get_sim_funs_for_blocking
+from py_entitymatching.feature.tokenizers import get_tokenizers_for_blocking
+from py_entitymatching.feature.addfeatures import add_feature, \
+    get_feature_fn, add_blackbox_feature
+from py_entitymatching.utils.record_helper import RecordAccessor
+
+p = em.get_install_path()
+path_for_A = os.sep.join([p, 'tests', 'test_datasets', 'A.csv'])
+path_for_B = os.sep.join([p, 'tests', 'test_datasets', 'B.csv'])
+
+
+class RuleCompilerTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.A = em.read_csv_metadata(path_for_A)
+        em.set_key(self.A, 'ID')
+        self.B = em.read_csv_metadata(path_for_B)
+        em.set_key(self.B, 'ID')
+        self.feature_table = em.get_features_for_blocking(
+            self.A, self.B, validate_inferred_attr_types=False)
+        self.rb = em.RuleBasedBlocker()
+
+    def tearDown(self):
+        del self.A
+        del self.B
+        del self.rb
+
+    def get_all_pairs(self):
+        l_pos, r_pos = [], []
+        for l, r in cartesian_blocks(len(self.A), len(self.B)):
+            l_pos.extend(l)
+            r_pos.extend(r)
+        return l_pos, r_pos
+
+    def get_expected_drop_mask(self, l_pos, r_pos):
+        l_records = RecordAccessor(self.A)
+        r_records = RecordAccessor(self.B)
+        return [self.rb.apply_rules(l_records.get_record_at(l),
+                                    r_records.get_record_at(r)) == True
+                for l, r in zip(l_pos, r_pos)]
+
+    def test_compile_conjunct_vectorized(self):
+        conjunct = compile_conjunct(
+            'name_name_jac_qgm_3_qgm_3(ltuple,rtuple) < 0.3',
+            self.feature_table)
+        self.assertEqual(conjunct.is_vectorized, True)
+        self.assertEqual(conjunct.feature_name, 'name_name_jac_qgm_3_qgm_3')
+        self.assertEqual(conjunct.op, '<')
+        self.assertEqual(conjunct.threshold, 0.3)
+
+    def test_compile_conjunct_not_vectorized(self):
+        conjunct = compile_conjunct(
+            'name_name_lev_dist(ltuple, rtuple) + 1 > 3', self.feature_table)
+        self.assertEqual(conjunct.is_vectorized, False)
+        self.assertEqual(conjunct.feature_name, None)
+
+    def test_cartesian_blocks(self):
+        blocks = list(cartesian_blocks(3, 4, 5))
+        self.assertEqual([len(l) for l, r in blocks], [5, 5, 2])
+        pairs = [(l, r) for l_pos, r_pos in blocks
+                 for l, r in zip(l_pos, r_pos)]
+        self.assertEqual(pairs, [(l, r) for l in range(3) for r in range(4)])
+
+    def test_get_drop_mask_same_as_apply_rules(self):
+        self.rb.add_rule(['name_name_jac_qgm_3_qgm_3(ltuple,rtuple) < 0.3',
+                          'name_name_mel(ltuple,rtuple) < 0.6'],
+                         self.feature_table)
+        self.rb.add_rule(['zipcode_zipcode_exm(ltuple, rtuple) == 0'],
+                         self.feature_table)
+        self.rb.add_rule(['birth_year_birth_year_lev_dist(ltuple, rtuple) '
+                          '+ 1 > 1'], self.feature_table)
+        plan = compile_rules(self.rb.rule_str, self.rb.rule_ft)
+        self.assertEqual(plan.is_vectorized, False)
+        l_pos, r_pos = self.get_all_pairs()
+        drop = plan.get_drop_mask(self.A, self.B, l_pos, r_pos)
+        self.assertEqual(list(drop), self.get_expected_drop_mask(l_pos, r_pos))
+
+    def test_get_drop_mask_wi_user_feature(self):
+        feature_string = "jaccard(qgm_3(ltuple['name']), qgm_3(rtuple['name']))"
+        f_dict = get_feature_fn(feature_string, get_tokenizers_for_blocking(),
+                                get_sim_funs_for_blocking())
+        add_feature(self.feature_table, 'test', f_dict)
+        self.rb.add_rule(['test(ltuple, rtuple) < 0.3'], self.feature_table)
+        plan = compile_rules(self.rb.rule_str, self.rb.rule_ft)
+        self.assertEqual(plan.is_vectorized, True)
+        l_pos, r_pos = self.get_all_pairs()
+        drop = plan.get_drop_mask(self.A, self.B, l_pos, r_pos)
+        self.assertEqual(list(drop), self.get_expected_drop_mask(l_pos, r_pos))
+
+    def test_get_drop_mask_short_circuit(self):
+        calls = []
+
+        def count_calls(ltuple, rtuple):
+            calls.append((ltuple['ID'], rtuple['ID']))
+            return 1
+
+        add_blackbox_feature(self.feature_table, 'count_calls', count_calls)
+        self.rb.add_rule(['zipcode_zipcode_exm(ltuple, rtuple) == 0',
+                          'count_calls(ltuple, rtuple) > 0'],
+                         self.feature_table)
+        self.rb.add_rule(['count_calls(ltuple, rtuple) > 0'],
+                         self.feature_table)
+        plan = compile_rules(self.rb.rule_str, self.rb.rule_ft)
+        l_pos, r_pos = self.get_all_pairs()
+        drop = plan.get_drop_mask(self.A, self.B, l_pos, r_pos)
+        self.assertEqual(list(drop), [True] * len(l_pos))
+        # the feature is computed once per tuple pair, although it is used
+        # by both the rules
+        self.assertEqual(len(calls), len(l_pos))
+        self.assertEqual(len(set(calls)), len(l_pos))
+
+    def test_compile_rules_excluding_rule(self):
+        self.rb.add_rule(['zipcode_zipcode_exm(ltuple, rtuple) == 0'],
+                         self.feature_table, rule_name='rule_1')
+        self.rb.add_rule(['name_name_mel(ltuple,rtuple) < 0.6'],
+                         self.feature_table, rule_name='rule_2')
+        plan = compile_rules(self.rb.rule_str, self.rb.rule_ft, ['rule_1'])
+        self.assertEqual([r.name for r in plan.rules], ['rule_2'])
+
+    def test_block_tables_compiled_rules_small_blocks(self):
+        import py_entitymatching.blocker.rule_compiler as rc
+        self.rb.add_rule(['name_name_mel(ltuple,rtuple) < 0.6'],
+                         self.feature_table)
+        C = self.rb.block_tables(self.A, self.B, show_progress=False)
+        block_size = rc.pair_block_size
+        rc.pair_block_size = 4
+        try:
+            D = self.rb.block_tables(self.A, self.B, show_progress=False)
+        finally:
+            rc.pair_block_size = block_size
+        assert_equal(list(C['ltable_ID']), list(D['ltable_ID']))
+        assert_equal(list(C['rtable_ID']), list(D['rtable_ID']))
@@ -0,0 +1,108 @@
+import os
+from collections import OrderedDict
+from nose.tools import *
+import unittest
+
+import py_entitymatching as em
+from py_entitymatching.blocker.rule_planner import sample_pairs, \
+    estimate_survival_rates, order_by_selectivity, order_by_rank, \
+    get_sequence_cost, get_blocking_plan, RuleEstimate
+
+p = em.get_install_path()
+path_for_A = os.sep.join([p, 'tests', 'test_datasets', 'A.csv'])
+path_for_B = os.sep.join([p, 'tests', 'test_datasets', 'B.csv'])
+
+
+class RulePlannerTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.A = em.read_csv_metadata(path_for_A)
+        em.set_key(self.A, 'ID')
+        self.B = em.read_csv_metadata(path_for_B)
+        em.set_key(self.B, 'ID')
+        self.feature_table = em.get_features_for_blocking(
+            self.A, self.B, validate_inferred_attr_types=False)
+        self.rb = em.RuleBasedBlocker()
+
+    def tearDown(self):
+        del self.A
+        del self.B
+        del self.rb
+
+    def test_sample_pairs_all_pairs(self):
+        l_pos, r_pos = sample_pairs(2, 3, 10)
+        assert_equal(list(zip(l_pos, r_pos)),
+                     [(l, r) for l in range(2) for r in range(3)])
+
+    def test_sample_pairs_sampled(self):
+        l_pos, r_pos = sample_pairs(100, 200, 10)
+        assert_equal(len(l_pos), 10)
+        assert_equal(len(r_pos), 10)
+        assert_equal(all(0 <= l < 100 for l in l_pos), True)
+        assert_equal(all(0 <= r < 200 for r in r_pos), True)
+        l_pos_1, r_pos_1 = sample_pairs(100, 200, 10)
+        assert_equal(list(l_pos), list(l_pos_1))
+        assert_equal(list(r_pos), list(r_pos_1))
+
+    def test_sample_pairs_empty_table(self):
+        l_pos, r_pos = sample_pairs(0, 3, 10)
+        assert_equal(len(l_pos), 0)
+
+    def test_estimate_survival_rates(self):
+        self.rb.add_rule(['zipcode_zipcode_exm(ltuple, rtuple) == 0'],
+                         self.feature_table, rule_name='zipcode')
+        self.rb.add_rule(['name_name_jac_qgm_3_qgm_3(ltuple,rtuple) < 0.3'],
+                         self.feature_table, rule_name='name')
+        rates = estimate_survival_rates(self.rb.rule_str, self.rb.rule_ft,
+                                        ['zipcode', 'name'], self.A, self.B)
+        # all the 30 tuple pairs are used as the sample
+        assert_almost_equal(rates['zipcode'], 15.0 / 30)
+        assert_almost_equal(rates['name'], 4.0 / 30)
+        assert_equal(order_by_selectivity(['zipcode', 'name'], rates),
+                     ['name', 'zipcode'])
+
+    def test_order_by_selectivity_ties(self):
+        rates = OrderedDict([('r1', 0.5), ('r2', 0.1), ('r3', 0.5)])
+        assert_equal(order_by_selectivity(['r1', 'r2', 'r3'], rates),
+                     ['r2', 'r1', 'r3'])
+
+    def test_order_by_rank(self):
+        estimates = {'r1': RuleEstimate(0.5, 1.0), 'r2': RuleEstimate(0.5, 0.1),
+                     'r3': RuleEstimate(1.0, 0.01), 'r4': RuleEstimate(0.1, 1.0)}
+        # ranks: r1 = 2.0, r2 = 0.2, r4 = 1.11, r3 never drops a pair
+        assert_equal(order_by_rank(['r1', 'r2', 'r3', 'r4'], estimates),
+                     ['r2', 'r4', 'r1', 'r3'])
+
+    def test_get_sequence_cost(self):
+        estimates = {'r1': RuleEstimate(0.5, 1.0), 'r2': RuleEstimate(0.1, 2.0)}
+        assert_almost_equal(get_sequence_cost(['r1', 'r2'], estimates), 2.0)
+        assert_almost_equal(get_sequence_cost(['r2', 'r1'], estimates), 2.1)
+        assert_almost_equal(get_sequence_cost([], estimates), 0.0)
+
+    def test_get_blocking_plan_filter_join(self):
+        self.rb.add_rule(['name_name_mel(ltuple,rtuple) < 0.6'],
+                         self.feature_table, rule_name='mel')
+        self.rb.add_rule(['zipcode_zipcode_exm(ltuple, rtuple) == 0'],
+                         self.feature_table, rule_name='zipcode')
+        plan = get_blocking_plan(self.rb.rule_str, self.rb.rule_ft,
+                                 ['zipcode'], self.A, self.B)
+        assert_equal(plan.strategy, 'filter_join')
+        assert_equal(plan.filter_rule, 'zipcode')
+        assert_equal(plan.rule_order, ['mel'])
+        assert_equal(plan.num_pairs, 30)
+        # 4 tuple pairs survive both the rules
+        assert_equal(plan.est_candset_size, 4)
+        assert_equal(list(plan.rule_estimates.rule_name), ['mel', 'zipcode'])
+        assert_equal(list(plan.rule_estimates.is_filterable), [False, True])
+        assert_equal('filter join using rule zipcode' in str(plan), True)
+
+    def test_get_blocking_plan_cross_product(self):
+        self.rb.add_rule(['name_name_mel(ltuple,rtuple) < 0.6'],
+                         self.feature_table, rule_name='mel')
+        plan = get_blocking_plan(self.rb.rule_str, self.rb.rule_ft, [],
+                                 self.A, self.B)
+        assert_equal(plan.strategy, 'cross_product')
+        assert_equal(plan.filter_rule, None)
+        assert_equal(plan.rule_order, ['mel'])
+        assert_equal(plan.est_candset_size, 7)
+        assert_equal(plan.est_cost >= 0, True)
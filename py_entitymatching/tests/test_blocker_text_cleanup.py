@@ -0,0 +1,83 @@
+import os
+from nose.tools import *
+import unittest
+import pandas as pd
+
+import py_entitymatching as em
+import py_entitymatching.blocker.text_cleanup as tc
+from py_entitymatching.blocker.text_cleanup import CleanedColumnCache
+
+p = em.get_install_path()
+path_a = os.sep.join([p, 'tests', 'test_datasets', 'A.csv'])
+
+
+class TextCleanupTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.ob = em.OverlapBlocker()
+        self.A = em.read_csv_metadata(path_a, key='ID')
+
+    def tearDown(self):
+        del self.ob
+        del self.A
+
+    def test_cleanup_column_same_as_process_string(self):
+        values = ['The Big, BIG house!', 'a-b c  c', '', None,
+                  b'Caf\xc3\xa9 at the corner', 'the Big, BIG house!']
+        for rem_stop_words in [True, False]:
+            cleaned = self.ob.cleanup_column(values, rem_stop_words)
+            expected = [self.ob.cleanup_tuple_val(v, rem_stop_words)
+                        for v in values]
+            assert_equal(list(cleaned), expected)
+
+    def test_cleanup_column_keeps_word_order(self):
+        cleaned = self.ob.cleanup_column(['b a b c a'], False)
+        assert_equal(list(cleaned), ['b a c'])
+
+    def test_cleanup_table(self):
+        A = self.A[['ID', 'address']].copy()
+        self.ob.cleanup_table(A, 'address', True)
+        assert_equal(A['address'].iloc[0], '607 st san francisco')
+
+    def test_cleanup_column_parallel(self):
+        threshold = tc.parallel_cleanup_threshold
+        tc.parallel_cleanup_threshold = 2
+        try:
+            values = list(self.A['address']) + [None]
+            cleaned = self.ob.cleanup_column(values, True, n_jobs=2)
+        finally:
+            tc.parallel_cleanup_threshold = threshold
+        assert_equal(list(cleaned), list(self.ob.cleanup_column(values, True)))
+
+    def test_cache_get_put(self):
+        cache = CleanedColumnCache()
+        assert_equal(cache.get(self.A, 'name', (True,)), None)
+        cache.put(self.A, 'name', (True,), ['x'] * len(self.A))
+        assert_equal(cache.get(self.A, 'name', (True,)), ['x'] * len(self.A))
+        assert_equal(cache.get(self.A, 'name', (False,)), None)
+        assert_equal(cache.get(self.A.copy(), 'name', (True,)), None)
+
+    def test_cache_invalidated_on_change(self):
+        cache = CleanedColumnCache()
+        cache.put(self.A, 'name', (True,), ['x'] * len(self.A))
+        self.A.loc[0, 'name'] = 'Kevin Smyth'
+        assert_equal(cache.get(self.A, 'name', (True,)), None)
+        assert_equal(len(cache), 0)
+
+    def test_cache_max_size(self):
+        cache = CleanedColumnCache(max_size=2)
+        cache.put(self.A, 'name', (1,), 'a')
+        cache.put(self.A, 'name', (2,), 'b')
+        cache.get(self.A, 'name', (1,))
+        cache.put(self.A, 'name', (3,), 'c')
+        assert_equal(len(cache), 2)
+        assert_equal(cache.get(self.A, 'name', (2,)), None)
+        assert_equal(cache.get(self.A, 'name', (1,)), 'a')
+
+    def test_cache_drops_garbage_collected_tables(self):
+        cache = CleanedColumnCache()
+        B = self.A.copy()
+        cache.put(B, 'name', (True,), 'b')
+        del B
+        cache.put(self.A, 'name', (True,), 'a')
+        assert_equal(len(cache), 1)
@@ -230,7 +230,8 @@ class DebugblockerTestCases(unittest.TestCase):
                              (2, 1), (4, 3), (4, 2), (2, 5), (3, 4)}
         actual_cand_set = db._index_candidate_set(C,
                 lrecord_id_to_index_map, rrecord_id_to_index_map, False)
-        self.assertEqual(expected_cand_set, actual_cand_set)
+        self.assertEqual(list(db._encode_record_index_pairs(expected_cand_set, len(B))),
+                         list(actual_cand_set))
 
     @raises(AssertionError)
     def test_index_candidate_set_2(self):
@@ -281,7 +282,8 @@ class DebugblockerTestCases(unittest.TestCase):
         expected_cand_set = {(0, 1), (1, 0)}
         actuacl_cand_set = db._index_candidate_set(C,
                 lrecord_id_to_index_map, rrecord_id_to_index_map, False)
-        self.assertEqual(expected_cand_set, actuacl_cand_set)
+        self.assertEqual(list(db._encode_record_index_pairs(expected_cand_set, len(B))),
+                         list(actuacl_cand_set))
 
     @raises(AssertionError)
     def test_index_candidate_set_5(self):
@@ -317,7 +319,32 @@ class DebugblockerTestCases(unittest.TestCase):
         rrecord_id_to_index_map = db._get_record_id_to_index_map(B, 'ID')
         new_C = db._index_candidate_set(C,
                 lrecord_id_to_index_map, rrecord_id_to_index_map, False)
-        self.assertEqual(new_C, set())
+        self.assertEqual(len(new_C), 0)
+
+    def test_index_candidate_set_in_chunks(self):
+        A = read_csv_metadata(path_a, key='ID')
+        B = read_csv_metadata(path_b, key='ID')
+        C = read_csv_metadata(path_c, ltable=A, rtable=B)
+        lrecord_id_to_index_map = db._get_record_id_to_index_map(A, 'ID')
+        rrecord_id_to_index_map = db._get_record_id_to_index_map(B, 'ID')
+        expected_cand_set = db._index_candidate_set(C,
+                lrecord_id_to_index_map, rrecord_id_to_index_map, False)
+        chunk_size = db.candset_chunk_size
+        db.candset_chunk_size = 4
+        try:
+            actual_cand_set = db._index_candidate_set(C,
+                    lrecord_id_to_index_map, rrecord_id_to_index_map, False)
+        finally:
+            db.candset_chunk_size = chunk_size
+        self.assertEqual(list(actual_cand_set), list(expected_cand_set))
+        self.assertEqual(actual_cand_set.dtype, pd.np.int64)
+
+    def test_encode_record_index_pairs(self):
+        codes = db._encode_record_index_pairs({(1, 2), (0, 1), (1, 0)}, 3)
+        self.assertEqual(list(codes), [1, 3, 5])
+        self.assertEqual(list(db._is_in_candidate_set(codes, [0, 1, 5, 8])),
+                         [False, True, True, False])
+        self.assertEqual(len(db._encode_record_index_pairs([], 3)), 0)
 
     def test_generate_prefix_events_impl_1(self):
         record_list = []
@@ -511,6 +538,15 @@ class DebugblockerTestCases(unittest.TestCase):
                                 ['cc', 'dd', 'cc_1', 'unknown', '246', 'west', 'def', 'st']]
         self.assertEqual(actual_record_list, expected_record_list)
 
+    def test_get_tokenized_table_in_parallel(self):
+        A = read_csv_metadata(path_a, key='ID')
+        A_key = em.get_key(A)
+        feature_list = [0, 1, 4]
+        expected_record_list = db._get_tokenized_table(A, A_key, feature_list)
+        actual_record_list = db._get_tokenized_table(A, A_key, feature_list,
+                                                     n_procs=2)
+        self.assertEqual(actual_record_list, expected_record_list)
+
     @raises(AssertionError)
     def test_get_feature_weight_1(self):
         A = []
@@ -636,7 +672,7 @@ class DebugblockerTestCases(unittest.TestCase):
                               (0.2222222222222222, 3, 0),(0.15789473684210525, 4, 5),
                               (0.2222222222222222, 3, 5),(0.14285714285714285, 2, 4),
                               (0.15789473684210525, 1, 0),(0.1, 4, 1)]
-        self.assertEqual(actual_topk_heap, expected_topk_heap)
+        self.assertEqual(sorted(actual_topk_heap), sorted(expected_topk_heap))
 
     def test_topk_sim_join_2(self):
         lrecord_list = [['asdf', 'fdsa']]
@@ -646,6 +682,76 @@ class DebugblockerTestCases(unittest.TestCase):
         expected_topk_heap = []
         self.assertEqual(actual_topk_heap, expected_topk_heap)
 
+    def test_topk_sim_join_3(self):
+        # the pruned join must return the top-k pairs of a brute force join
+        ltable_path = os.sep.join([debugblocker_datasets_path, 'test_topk_sim_join_1_A.txt'])
+        lrecord_list = read_record_list(ltable_path)
+        rtable_path = os.sep.join([debugblocker_datasets_path, 'test_topk_sim_join_1_B.txt'])
+        rrecord_list = read_record_list(rtable_path)
+        cand_set = {(0, 0), (3, 2)}
+        all_pairs = []
+        for i in range(len(lrecord_list)):
+            for j in range(len(rrecord_list)):
+                sim = db._jaccard_sim(set(lrecord_list[i]), set(rrecord_list[j]))
+                if (i, j) not in cand_set and sim > 0:
+                    all_pairs.append(sim)
+        all_pairs.sort(reverse=True)
+        for output_size in [1, 3, 5, 10, 100]:
+            actual_topk_heap = db._topk_sim_join(lrecord_list, rrecord_list,
+                                                 cand_set, output_size)
+            self.assertEqual(sorted([p[0] for p in actual_topk_heap], reverse=True),
+                             all_pairs[:output_size])
+            self.assertEqual(len(set((p[1], p[2]) for p in actual_topk_heap)),
+                             len(actual_topk_heap))
+
+    def test_topk_sim_join_4(self):
+        lrecord_list = [['a', 'b', 'c', 'd'], ['b', 'x']]
+        rrecord_list = [['a', 'b', 'c', 'd'], ['d', 'c'], ['b', 'x', 'y']]
+        actual_topk_heap = db._topk_sim_join(lrecord_list, rrecord_list, set(), 2)
+        self.assertEqual(sorted(actual_topk_heap),
+                         [(0.6666666666666666, 1, 2), (1.0, 0, 0)])
+
+    def test_topk_sim_join_in_parallel(self):
+        ltable_path = os.sep.join([debugblocker_datasets_path, 'test_topk_sim_join_1_A.txt'])
+        lrecord_list = read_record_list(ltable_path)
+        rtable_path = os.sep.join([debugblocker_datasets_path, 'test_topk_sim_join_1_B.txt'])
+        rrecord_list = read_record_list(rtable_path)
+        cand_path = os.sep.join([debugblocker_datasets_path, 'test_topk_sim_join_1_C.txt'])
+        cand_set = read_formatted_cand_set(cand_path)
+        for output_size in [1, 4, 100]:
+            expected_topk_heap = db._topk_sim_join(lrecord_list, rrecord_list,
+                                                   cand_set, output_size)
+            actual_topk_heap = db._topk_sim_join(lrecord_list, rrecord_list,
+                                                 cand_set, output_size,
+                                                 n_procs=2)
+            self.assertEqual(sorted([p[0] for p in actual_topk_heap]),
+                             sorted([p[0] for p in expected_topk_heap]))
+            for sim, l_idx, r_idx in actual_topk_heap:
+                self.assertEqual((l_idx, r_idx) in cand_set, False)
+                self.assertEqual(sim, db._jaccard_sim(set(lrecord_list[l_idx]),
+                                                      set(rrecord_list[r_idx])))
+
+    def test_build_record_index(self):
+        record_list = [pd.np.array([0, 2]),
+                       pd.np.array([], dtype=pd.np.int64),
+                       pd.np.array([1, 2, 3])]
+        tokens, offsets = db._pack_record_list(record_list)
+        index_offsets, index_records, index_positions = \
+            db._build_record_index(tokens, offsets, 5)
+        self.assertEqual(index_offsets.tolist(), [0, 1, 2, 4, 5, 5])
+        self.assertEqual(index_records.tolist(), [0, 2, 0, 2, 2])
+        self.assertEqual(index_positions.tolist(), [0, 0, 1, 1, 2])
+
+    def test_encode_record_list(self):
+        record_list = [['c', 'b', 'a'], [], ['c', 'b', 'c'], ['d']]
+        order_dict = {}
+        db._build_global_token_order(record_list[:3], order_dict)
+        token_id_dict = db._get_token_id_dict(order_dict)
+        self.assertEqual(token_id_dict, {'a': 0, 'b': 1, 'c': 2})
+        encoded_record_list = db._encode_record_list(record_list, token_id_dict)
+        self.assertEqual([list(record) for record in encoded_record_list],
+                         [[0, 1, 2], [], [1, 2], []])
+
     @raises(AssertionError)
     def test_debugblocker_1(self):
         A = []
@@ -811,6 +917,77 @@ class DebugblockerTestCases(unittest.TestCase):
         self.assertEqual(expected_record[2], ret_record[2])
         self.assertEqual(expected_record[3], ret_record[3])
 
+    def test_debugblocker_in_parallel(self):
+        A = read_csv_metadata(path_a, key='ID')
+        B = read_csv_metadata(path_b, key='ID')
+        C = read_csv_metadata(path_c, ltable=A, rtable=B,
+                              fk_ltable='ltable_ID', fk_rtable='rtable_ID',
+                              key='_id')
+        expected_ret_table = db.debug_blocker(C, A, B, 3)
+        actual_ret_table = db.debug_blocker(C, A, B, 3, n_jobs=2)
+        self.assertEqual(list(actual_ret_table.columns),
+                         list(expected_ret_table.columns))
+        self.assertEqual(list(actual_ret_table['similarity']),
+                         list(expected_ret_table['similarity']))
+
+    def test_blocker_debugger(self):
+        A = read_csv_metadata(path_a, key='ID')
+        B = read_csv_metadata(path_b, key='ID')
+        C = read_csv_metadata(path_c, ltable=A, rtable=B,
+                              fk_ltable='ltable_ID', fk_rtable='rtable_ID',
+                              key='_id')
+        debugger = em.BlockerDebugger(A, B)
+        for output_size in [200, 3]:
+            expected_ret_table = db.debug_blocker(C, A, B, output_size)
+            actual_ret_table = debugger.debug(C, output_size)
+            self.assertEqual(list(actual_ret_table.columns),
+                             list(expected_ret_table.columns))
+            self.assertEqual(actual_ret_table.values.tolist(),
+                             expected_ret_table.values.tolist())
+
+    def test_blocker_debugger_several_candsets(self):
+        A = read_csv_metadata(path_a, key='ID')
+        B = read_csv_metadata(path_b, key='ID')
+        C = read_csv_metadata(path_c, ltable=A, rtable=B,
+                              fk_ltable='ltable_ID', fk_rtable='rtable_ID',
+                              key='_id')
+        debugger = em.BlockerDebugger(A, B)
+        for D in [C.iloc[:5], C.iloc[5:], C]:
+            cm.copy_properties(C, D)
+            expected_ret_table = db.debug_blocker(D, A, B, 10)
+            actual_ret_table = debugger.debug(D, 10)
+            self.assertEqual(list(actual_ret_table['similarity']),
+                             list(expected_ret_table['similarity']))
+
+    @raises(AssertionError)
+    def test_blocker_debugger_invalid_ltable(self):
+        B = read_csv_metadata(path_b, key='ID')
+        em.BlockerDebugger(None, B)
+
+    @raises(AssertionError)
+    def test_blocker_debugger_invalid_candset(self):
+        A = read_csv_metadata(path_a, key='ID')
+        B = read_csv_metadata(path_b, key='ID')
+        em.BlockerDebugger(A, B).debug(None)
+
+    @raises(AssertionError)
+    def test_blocker_debugger_invalid_output_size(self):
+        A = read_csv_metadata(path_a, key='ID')
+        B = read_csv_metadata(path_b, key='ID')
+        C = read_csv_metadata(path_c, ltable=A, rtable=B,
+                              fk_ltable='ltable_ID', fk_rtable='rtable_ID',
+                              key='_id')
+        em.BlockerDebugger(A, B).debug(C, 0)
+
+    @raises(AssertionError)
+    def test_debugblocker_invalid_n_jobs(self):
+        A = read_csv_metadata(path_a, key='ID')
+        B = read_csv_metadata(path_b, key='ID')
+        C = read_csv_metadata(path_c, ltable=A, rtable=B,
+                              fk_ltable='ltable_ID', fk_rtable='rtable_ID',
+                              key='_id')
+        db.debug_blocker(C, A, B, 200, n_jobs='2')
+
     @raises(AssertionError)
     def test_debugblocker_15(self):
         A = read_csv_metadata(path_a, key='ID')
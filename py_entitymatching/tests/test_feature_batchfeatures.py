@@ -0,0 +1,145 @@
+import os
+from nose.tools import *
+import unittest
+import pandas as pd
+
+from py_entitymatching.utils.generic_helper import get_install_path
+from py_entitymatching.io.parsers import read_csv_metadata
+
+from py_entitymatching.feature.autofeaturegen import get_features_for_matching
+from py_entitymatching.feature.addfeatures import add_blackbox_feature
+from py_entitymatching.feature.batchfeatures import \
+    get_feature_vals_by_positions, is_batch_feature, build_token_cache, \
+    TokenCache
+from py_entitymatching.feature.extractfeatures import apply_feat_fns
+
+datasets_path = os.sep.join([get_install_path(), 'tests', 'test_datasets'])
+path_a = os.sep.join([datasets_path, 'A.csv'])
+path_b = os.sep.join([datasets_path, 'B.csv'])
+
+
+def _get_expected_vals(A, B, feature_table, l_pos, r_pos):
+    feat_names = list(feature_table['feature_name'])
+    vals = []
+    for i, j in zip(l_pos, r_pos):
+        f = apply_feat_fns(A.iloc[i], B.iloc[j], feature_table)
+        vals.append([f[n] for n in feat_names])
+    return pd.np.array(vals, dtype=pd.np.float64)
+
+
+def _get_all_pairs(A, B):
+    l_pos = pd.np.repeat(pd.np.arange(len(A)), len(B))
+    r_pos = pd.np.tile(pd.np.arange(len(B)), len(A))
+    return l_pos, r_pos
+
+
+class BatchFeaturesTestCases(unittest.TestCase):
+    def test_get_feature_vals_by_positions_valid_1(self):
+        A = read_csv_metadata(path_a)
+        B = read_csv_metadata(path_b, key='ID')
+        feature_table = get_features_for_matching(A, B, validate_inferred_attr_types=False)
+        l_pos, r_pos = _get_all_pairs(A, B)
+        feat_vals = get_feature_vals_by_positions(feature_table, A, B, l_pos, r_pos)
+        self.assertEqual(feat_vals.dtype, pd.np.float64)
+        self.assertEqual(feat_vals.shape, (len(l_pos), len(feature_table)))
+        expected = _get_expected_vals(A, B, feature_table, l_pos, r_pos)
+        self.assertEqual(pd.np.allclose(feat_vals, expected, equal_nan=True), True)
+
+    def test_get_feature_vals_by_positions_with_missing_values(self):
+        A = read_csv_metadata(path_a)
+        B = read_csv_metadata(path_b, key='ID')
+        A.loc[0, 'name'] = pd.np.NaN
+        A.loc[1, 'zipcode'] = pd.np.NaN
+        B.loc[2, 'address'] = pd.np.NaN
+        feature_table = get_features_for_matching(A, B, validate_inferred_attr_types=False)
+        l_pos, r_pos = _get_all_pairs(A, B)
+        feat_vals = get_feature_vals_by_positions(feature_table, A, B, l_pos, r_pos)
+        expected = _get_expected_vals(A, B, feature_table, l_pos, r_pos)
+        self.assertEqual(pd.np.allclose(feat_vals, expected, equal_nan=True), True)
+
+    def test_get_feature_vals_by_positions_with_user_defined_feature(self):
+        A = read_csv_metadata(path_a)
+        B = read_csv_metadata(path_b, key='ID')
+        feature_table = get_features_for_matching(A, B, validate_inferred_attr_types=False)
+        def name_len_diff(ltuple, rtuple):
+            return abs(len(ltuple['name']) - len(rtuple['name']))
+        add_blackbox_feature(feature_table, 'name_len_diff', name_len_diff)
+        self.assertEqual(is_batch_feature(feature_table.to_dict('records')[-1]), False)
+        l_pos, r_pos = _get_all_pairs(A, B)
+        feat_vals = get_feature_vals_by_positions(feature_table, A, B, l_pos, r_pos)
+        expected = _get_expected_vals(A, B, feature_table, l_pos, r_pos)
+        self.assertEqual(pd.np.allclose(feat_vals, expected, equal_nan=True), True)
+
+    def test_get_feature_vals_by_positions_with_non_numeric_feature(self):
+        A = read_csv_metadata(path_a)
+        B = read_csv_metadata(path_b, key='ID')
+        feature_table = get_features_for_matching(A, B, validate_inferred_attr_types=False)
+        def first_name(ltuple, rtuple):
+            return ltuple['name'].split()[0]
+        add_blackbox_feature(feature_table, 'first_name', first_name)
+        l_pos, r_pos = _get_all_pairs(A, B)
+        feat_vals = get_feature_vals_by_positions(feature_table, A, B, l_pos, r_pos)
+        self.assertEqual(feat_vals.dtype, object)
+        self.assertEqual(list(feat_vals[:, -1]),
+                         [A['name'][i].split()[0] for i in l_pos])
+        expected = _get_expected_vals(A, B, feature_table[:-1], l_pos, r_pos)
+        self.assertEqual(pd.np.allclose(feat_vals[:, :-1].astype(pd.np.float64),
+                                        expected, equal_nan=True), True)
+
+    def test_get_feature_vals_by_positions_empty_pairs(self):
+        A = read_csv_metadata(path_a)
+        B = read_csv_metadata(path_b, key='ID')
+        feature_table = get_features_for_matching(A, B, validate_inferred_attr_types=False)
+        feat_vals = get_feature_vals_by_positions(feature_table, A, B, [], [])
+        self.assertEqual(feat_vals.shape, (0, len(feature_table)))
+
+    def test_is_batch_feature_auto_generated(self):
+        A = read_csv_metadata(path_a)
+        B = read_csv_metadata(path_b, key='ID')
+        feature_table = get_features_for_matching(A, B, validate_inferred_attr_types=False)
+        for feature in feature_table.to_dict('records'):
+            self.assertEqual(is_batch_feature(feature), True)
+
+
+class TokenCacheTestCases(unittest.TestCase):
+    def test_token_cache_tokenizes_distinct_values_once(self):
+        A = pd.DataFrame({'ID': [1, 2, 3, 4], 'name': ['a b', 'b c', 'a b', pd.np.NaN]})
+        calls = []
+
+        def tok_fn(s):
+            calls.append(s)
+            if pd.isnull(s):
+                return pd.np.NaN
+            return s.split()
+        token_cache = TokenCache()
+        token_cache.add(0, A, 'name', 'dlm_dc0', tok_fn)
+        token_cache.add(0, A, 'name', 'dlm_dc0', tok_fn)
+        self.assertEqual(sorted(calls), ['a b', 'b c'])
+        rows = token_cache.get_rows(0, 'name', 'dlm_dc0', [0, 1, 2, 3])
+        self.assertEqual(rows[0], rows[2])
+        self.assertEqual(token_cache.get_token_list(0, 'name', 'dlm_dc0', rows[1]), ['b', 'c'])
+        self.assertEqual(pd.isnull(token_cache.get_token_list(0, 'name', 'dlm_dc0', rows[3])), True)
+
+    def test_token_cache_shares_token_ids(self):
+        A = pd.DataFrame({'ID': [1], 'name': ['a b']})
+        B = pd.DataFrame({'ID': [1], 'title': ['b a']})
+        token_cache = TokenCache()
+        token_cache.add(0, A, 'name', 'dlm_dc0', lambda s: s.split())
+        token_cache.add(1, B, 'title', 'dlm_dc0', lambda s: s.split())
+        l_sets = token_cache.get_token_sets(0, 'name', 'dlm_dc0')
+        r_sets = token_cache.get_token_sets(1, 'title', 'dlm_dc0')
+        self.assertEqual(list(l_sets.indices), list(r_sets.indices))
+
+    def test_build_token_cache_valid(self):
+        A = read_csv_metadata(path_a)
+        B = read_csv_metadata(path_b, key='ID')
+        feature_table = get_features_for_matching(A, B, validate_inferred_attr_types=False)
+        token_cache = build_token_cache(feature_table, A, B)
+        self.assertEqual(token_cache.contains(0, 'name', 'qgm_3'), True)
+        self.assertEqual(token_cache.contains(1, 'name', 'qgm_3'), True)
+        self.assertEqual(token_cache.contains(0, 'zipcode', 'qgm_3'), False)
+        l_pos, r_pos = _get_all_pairs(A, B)
+        feat_vals = get_feature_vals_by_positions(feature_table, A, B, l_pos, r_pos,
+                                                  token_cache=token_cache)
+        expected = _get_expected_vals(A, B, feature_table, l_pos, r_pos)
+        self.assertEqual(pd.np.allclose(feat_vals, expected, equal_nan=True), True)
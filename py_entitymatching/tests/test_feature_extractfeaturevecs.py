@@ -6,8 +6,13 @@ import pandas as pd
 from py_entitymatching.utils.generic_helper import get_install_path
 from py_entitymatching.io.parsers import read_csv_metadata
 
-from py_entitymatching.feature.extractfeatures import extract_feature_vecs
+import shutil
+import tempfile
+
+from py_entitymatching.feature.extractfeatures import extract_feature_vecs, \
+    extract_feature_vecs_by_chunks, extract_feature_vecs_to_file
 from py_entitymatching.feature.autofeaturegen import get_features_for_matching
+from py_entitymatching.feature.addfeatures import add_blackbox_feature
 import py_entitymatching.catalog.catalog_manager as cm
 
 datasets_path = os.sep.join([get_install_path(), 'tests', 'test_datasets'])
@@ -213,6 +218,19 @@ class ExtractFeaturesTestCases(unittest.TestCase):
         self.assertEqual(F.columns[len(F.columns) - 1] == 'label', True)
         self.assertEqual(cm.get_all_properties(C) == cm.get_all_properties(F), True)
 
+    def test_extract_feature_vecs_with_non_numeric_feature(self):
+        A = read_csv_metadata(path_a)
+        B = read_csv_metadata(path_b, key='ID')
+        C = read_csv_metadata(path_c, ltable=A, rtable=B)
+        feature_table = get_features_for_matching(A, B, validate_inferred_attr_types=False)
+        add_blackbox_feature(feature_table, 'first_name',
+                             lambda ltuple, rtuple: ltuple['name'].split()[0])
+        F = extract_feature_vecs(C, feature_table=feature_table, show_progress=False)
+        self.assertEqual(list(F['first_name']),
+                         [n.split()[0] for n in C['ltable_name']])
+        feature_names = list(feature_table['feature_name'])[:-1]
+        self.assertEqual(all(F[n].dtype == pd.np.float64 for n in feature_names), True)
+
     @raises(AssertionError)
     def test_extract_feature_vecs_invalid_df(self):
         F = extract_feature_vecs(None, attrs_before='ltable_name',
@@ -254,3 +272,72 @@ class ExtractFeaturesTestCases(unittest.TestCase):
         F = extract_feature_vecs(C, attrs_before='ltable_name',
                                  feature_table=None,
                                  attrs_after=['label', '_id'])
+
+
+class ExtractFeaturesByChunksTestCases(unittest.TestCase):
+    def setUp(self):
+        self.A = read_csv_metadata(path_a)
+        self.B = read_csv_metadata(path_b, key='ID')
+        self.C = read_csv_metadata(path_c, ltable=self.A, rtable=self.B)
+        self.C['label'] = [0] * len(self.C)
+        self.feature_table = get_features_for_matching(self.A, self.B,
+                                                       validate_inferred_attr_types=False)
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_extract_feature_vecs_by_chunks_valid_1(self):
+        F = extract_feature_vecs(self.C, attrs_before=['ltable_name'], feature_table=self.feature_table,
+                                 attrs_after='label', show_progress=False)
+        chunks = list(extract_feature_vecs_by_chunks(self.C, attrs_before=['ltable_name'],
+                                                     feature_table=self.feature_table,
+                                                     attrs_after='label', chunk_size=4,
+                                                     show_progress=False))
+        self.assertEqual(len(chunks), int(pd.np.ceil(len(self.C) / 4.0)))
+        self.assertEqual(max(len(H) for H in chunks), 4)
+        H = pd.concat(chunks)
+        self.assertEqual(list(H.columns), list(F.columns))
+        self.assertEqual(list(H.index), list(F.index))
+        feature_names = list(self.feature_table['feature_name'])
+        self.assertEqual(pd.np.allclose(H[feature_names].values, F[feature_names].values,
+                                        equal_nan=True), True)
+
+    def test_extract_feature_vecs_by_chunks_chunk_size_more_than_candset(self):
+        chunks = list(extract_feature_vecs_by_chunks(self.C, feature_table=self.feature_table,
+                                                     chunk_size=len(self.C) + 10,
+                                                     show_progress=False))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(len(chunks[0]), len(self.C))
+
+    @raises(AssertionError)
+    def test_extract_feature_vecs_by_chunks_invalid_chunk_size(self):
+        extract_feature_vecs_by_chunks(self.C, feature_table=self.feature_table, chunk_size=0)
+
+    @raises(AssertionError)
+    def test_extract_feature_vecs_by_chunks_invalid_feature_table(self):
+        extract_feature_vecs_by_chunks(self.C, feature_table=None)
+
+    def test_extract_feature_vecs_to_file_valid_1(self):
+        F = extract_feature_vecs(self.C, feature_table=self.feature_table, show_progress=False)
+        file_path = os.sep.join([self.temp_dir, 'feature_vecs.npy'])
+        H = extract_feature_vecs_to_file(self.C, file_path, feature_table=self.feature_table,
+                                         chunk_size=7, show_progress=False)
+        self.assertEqual(H.shape, (len(self.C), len(self.feature_table)))
+        self.assertEqual(H.dtype, pd.np.float64)
+        feature_names = list(self.feature_table['feature_name'])
+        self.assertEqual(pd.np.allclose(H, F[feature_names].values, equal_nan=True), True)
+        H = pd.np.load(file_path)
+        self.assertEqual(pd.np.allclose(H, F[feature_names].values, equal_nan=True), True)
+
+    @raises(AssertionError)
+    def test_extract_feature_vecs_to_file_non_numeric_feature(self):
+        add_blackbox_feature(self.feature_table, 'first_name',
+                             lambda ltuple, rtuple: ltuple['name'].split()[0])
+        file_path = os.sep.join([self.temp_dir, 'feature_vecs.npy'])
+        extract_feature_vecs_to_file(self.C, file_path, feature_table=self.feature_table,
+                                     show_progress=False)
+
+    @raises(AssertionError)
+    def test_extract_feature_vecs_to_file_invalid_file_path(self):
+        extract_feature_vecs_to_file(self.C, None, feature_table=self.feature_table)
@@ -0,0 +1,275 @@
+import os
+from nose.tools import *
+import pandas as pd
+import unittest
+
+import py_entitymatching as em
+from py_entitymatching.blocker.minhash import get_hash_params, \
+    compute_signatures, estimate_jaccard, get_expected_recall
+
+p = em.get_install_path()
+path_a = os.sep.join([p, 'tests', 'test_datasets', 'A.csv'])
+path_b = os.sep.join([p, 'tests', 'test_datasets', 'B.csv'])
+l_output_attrs = ['name', 'address']
+r_output_attrs = ['name', 'address']
+l_output_prefix = 'l_'
+r_output_prefix = 'r_'
+
+# identical addresses
+expected_ids_1 = [('a2', 'b3'), ('a3', 'b2')]
+
+
+class LSHBlockerTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.A = em.read_csv_metadata(path_a)
+        em.set_key(self.A, 'ID')
+        self.B = em.read_csv_metadata(path_b)
+        em.set_key(self.B, 'ID')
+        self.lb = em.LSHBlocker()
+
+    def tearDown(self):
+        del self.A
+        del self.B
+        del self.lb
+
+    @raises(AssertionError)
+    def test_lsh_block_tables_invalid_ltable(self):
+        self.lb.block_tables(None, self.B, 'address', 'address')
+
+    @raises(AssertionError)
+    def test_lsh_block_tables_invalid_l_block_attr(self):
+        self.lb.block_tables(self.A, self.B, 1, 'address')
+
+    @raises(AssertionError)
+    def test_lsh_block_tables_bogus_r_block_attr(self):
+        self.lb.block_tables(self.A, self.B, 'address', 'bogus')
+
+    @raises(AssertionError)
+    def test_lsh_block_tables_invalid_threshold_1(self):
+        self.lb.block_tables(self.A, self.B, 'address', 'address',
+                             threshold=1.5)
+
+    @raises(AssertionError)
+    def test_lsh_block_tables_invalid_threshold_2(self):
+        self.lb.block_tables(self.A, self.B, 'address', 'address',
+                             threshold='0.5')
+
+    @raises(AssertionError)
+    def test_lsh_block_tables_invalid_tokenizer(self):
+        self.lb.block_tables(self.A, self.B, 'address', 'address',
+                             tokenizer='wspace')
+
+    @raises(AssertionError)
+    def test_lsh_block_tables_invalid_num_perm(self):
+        self.lb.block_tables(self.A, self.B, 'address', 'address',
+                             num_perm=0)
+
+    @raises(AssertionError)
+    def test_lsh_block_tables_num_bands_without_rows_per_band(self):
+        self.lb.block_tables(self.A, self.B, 'address', 'address',
+                             num_bands=10)
+
+    @raises(AssertionError)
+    def test_lsh_block_tables_invalid_rows_per_band(self):
+        self.lb.block_tables(self.A, self.B, 'address', 'address',
+                             num_bands=10, rows_per_band=-1)
+
+    @raises(AssertionError)
+    def test_lsh_block_tables_invalid_seed(self):
+        self.lb.block_tables(self.A, self.B, 'address', 'address',
+                             seed=None)
+
+    @raises(AssertionError)
+    def test_lsh_block_tables_invalid_allow_missing(self):
+        self.lb.block_tables(self.A, self.B, 'address', 'address',
+                             allow_missing=None)
+
+    def test_lsh_block_tables(self):
+        C = self.lb.block_tables(self.A, self.B, 'address', 'address',
+                                 threshold=1.0,
+                                 l_output_attrs=l_output_attrs,
+                                 r_output_attrs=r_output_attrs,
+                                 l_output_prefix=l_output_prefix,
+                                 r_output_prefix=r_output_prefix)
+        validate_metadata(C, l_output_attrs, r_output_attrs,
+                          l_output_prefix, r_output_prefix)
+        validate_data(C, expected_ids_1)
+        assert_equal(list(C['l_address']), list(C['r_address']))
+
+    def test_lsh_block_tables_zero_threshold(self):
+        # every tuple pair sharing a token collides in a band of one row
+        C = self.lb.block_tables(self.A, self.B, 'address', 'address',
+                                 threshold=0.0, num_bands=128,
+                                 rows_per_band=1)
+        validate_metadata(C)
+        assert_equal(len(C), len(self.A) * len(self.B))
+
+    def test_lsh_block_tables_estimates_above_threshold(self):
+        tok = em.get_tokenizers_for_blocking()['qgm_3']
+        C = self.lb.block_tables(self.A, self.B, 'name', 'name',
+                                 threshold=0.3, tokenizer=tok,
+                                 num_bands=32, rows_per_band=4,
+                                 l_output_attrs=['name'],
+                                 r_output_attrs=['name'])
+        validate_metadata(C, ['name'], ['name'])
+        a, b = get_hash_params(128)
+        l_sigs, _ = compute_signatures(C['ltable_name'].values, tok, a, b)
+        r_sigs, _ = compute_signatures(C['rtable_name'].values, tok, a, b)
+        pos = pd.np.arange(len(C))
+        estimates = estimate_jaccard(l_sigs, r_sigs, pos, pos)
+        assert_true(all(estimates >= 0.3))
+        # the pairs of similar names are found
+        ids = set(zip(C['ltable_ID'], C['rtable_ID']))
+        assert_true(('a2', 'b3') in ids)
+        assert_true(('a5', 'b5') in ids)
+
+    def test_lsh_block_tables_wi_missing_values(self):
+        A = self.A.copy()
+        A.loc[1, 'address'] = None
+        em.set_key(A, 'ID')
+        C = self.lb.block_tables(A, self.B, 'address', 'address',
+                                 threshold=1.0)
+        validate_data(C, [('a3', 'b2')])
+        C = self.lb.block_tables(A, self.B, 'address', 'address',
+                                 threshold=1.0, allow_missing=True)
+        assert_equal(len(C), 1 + len(self.B))
+        assert_equal(sorted(C[C.ltable_ID == 'a2'].rtable_ID),
+                     sorted(self.B.ID))
+
+    def test_lsh_block_tables_empty_ltable(self):
+        empty_A = pd.DataFrame(columns=self.A.columns)
+        em.set_key(empty_A, 'ID')
+        C = self.lb.block_tables(empty_A, self.B, 'address', 'address')
+        validate_metadata(C)
+        validate_data(C)
+
+    def test_lsh_block_candset(self):
+        ab = em.AttrEquivalenceBlocker()
+        C = ab.block_tables(self.A, self.B, 'zipcode', 'zipcode',
+                            l_output_attrs, r_output_attrs,
+                            l_output_prefix, r_output_prefix)
+        D = self.lb.block_candset(C, 'address', 'address', threshold=1.0)
+        validate_metadata_two_candsets(C, D)
+        validate_data(D, expected_ids_1)
+
+    def test_lsh_block_candset_same_as_block_tables(self):
+        C = self.lb.block_tables(self.A, self.B, 'address', 'address',
+                                 threshold=0.0, num_bands=128,
+                                 rows_per_band=1)
+        D = self.lb.block_candset(C, 'address', 'address', threshold=0.3)
+        E = self.lb.block_tables(self.A, self.B, 'address', 'address',
+                                 threshold=0.3)
+        assert_equal(list(D['ltable_ID']), list(E['ltable_ID']))
+        assert_equal(list(D['rtable_ID']), list(E['rtable_ID']))
+
+    def test_lsh_block_candset_empty_input(self):
+        empty_A = pd.DataFrame(columns=self.A.columns)
+        em.set_key(empty_A, 'ID')
+        C = self.lb.block_tables(empty_A, self.B, 'address', 'address')
+        D = self.lb.block_candset(C, 'address', 'address')
+        validate_metadata_two_candsets(C, D)
+        validate_data(D)
+
+    def test_lsh_block_tuples(self):
+        assert_equal(self.lb.block_tuples(self.A.ix[1], self.B.ix[2],
+                                          'address', 'address'), False)
+        assert_equal(self.lb.block_tuples(self.A.ix[0], self.B.ix[0],
+                                          'address', 'address',
+                                          threshold=0.9), True)
+        ltuple = self.A.ix[1].copy()
+        ltuple['address'] = None
+        assert_equal(self.lb.block_tuples(ltuple, self.B.ix[2], 'address',
+                                          'address'), True)
+        assert_equal(self.lb.block_tuples(ltuple, self.B.ix[2], 'address',
+                                          'address', allow_missing=True),
+                     False)
+
+    def test_lsh_get_lsh_params(self):
+        num_bands, rows_per_band, recall = self.lb.get_lsh_params(0.5)
+        assert_true(num_bands * rows_per_band <= 128)
+        assert_almost_equal(recall, get_expected_recall(0.5, num_bands,
+                                                        rows_per_band))
+        # a higher threshold uses more rows per band
+        assert_true(self.lb.get_lsh_params(0.8)[1] > rows_per_band)
+        assert_equal(self.lb.get_lsh_params(0.5, num_bands=20,
+                                            rows_per_band=5)[:2], (20, 5))
+
+    def test_lsh_get_expected_recall(self):
+        assert_almost_equal(get_expected_recall(0.5, 20, 5),
+                            1 - (1 - 0.5 ** 5) ** 20)
+        assert_equal(get_expected_recall(1.0, 1, 10), 1.0)
+        assert_equal(get_expected_recall(0.0, 10, 1), 0.0)
+
+    @raises(AssertionError)
+    def test_lsh_get_lsh_params_invalid_threshold(self):
+        self.lb.get_lsh_params(-0.1)
+
+
+class LSHBlockerMulticoreTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.A = em.read_csv_metadata(path_a)
+        em.set_key(self.A, 'ID')
+        self.B = em.read_csv_metadata(path_b)
+        em.set_key(self.B, 'ID')
+        self.lb = em.LSHBlocker()
+
+    def tearDown(self):
+        del self.A
+        del self.B
+        del self.lb
+
+    def test_lsh_block_tables_njobs_2(self):
+        tok = em.get_tokenizers_for_blocking()['qgm_3']
+        C = self.lb.block_tables(self.A, self.B, 'name', 'name',
+                                 threshold=0.3, tokenizer=tok, n_jobs=2)
+        D = self.lb.block_tables(self.A, self.B, 'name', 'name',
+                                 threshold=0.3, tokenizer=tok)
+        validate_metadata(C)
+        assert_equal(list(C['ltable_ID']), list(D['ltable_ID']))
+        assert_equal(list(C['rtable_ID']), list(D['rtable_ID']))
+
+    def test_lsh_block_candset_njobs_2(self):
+        C = self.lb.block_tables(self.A, self.B, 'address', 'address',
+                                 threshold=0.0, num_bands=128,
+                                 rows_per_band=1)
+        D = self.lb.block_candset(C, 'address', 'address', threshold=0.3,
+                                  n_jobs=2)
+        E = self.lb.block_candset(C, 'address', 'address', threshold=0.3)
+        assert_equal(list(D['_id']), list(E['_id']))
+
+
+# helper functions for validating the output
+
+def validate_metadata(C, l_output_attrs=None, r_output_attrs=None,
+                      l_output_prefix='ltable_', r_output_prefix='rtable_',
+                      l_key='ID', r_key='ID'):
+    s1 = ['_id', l_output_prefix + l_key, r_output_prefix + r_key]
+    if l_output_attrs:
+        s1 += [l_output_prefix + x for x in l_output_attrs if x != l_key]
+    if r_output_attrs:
+        s1 += [r_output_prefix + x for x in r_output_attrs if x != r_key]
+    s1 = sorted(s1)
+    assert_equal(s1, sorted(C.columns))
+    assert_equal(em.get_key(C), '_id')
+    assert_equal(em.get_property(C, 'fk_ltable'), l_output_prefix + l_key)
+    assert_equal(em.get_property(C, 'fk_rtable'), r_output_prefix + r_key)
+
+
+def validate_data(C, expected_ids=None):
+    if expected_ids:
+        lid = em.get_property(C, 'fk_ltable')
+        rid = em.get_property(C, 'fk_rtable')
+        C_ids = C[[lid, rid]].set_index([lid, rid])
+        actual_ids = sorted(C_ids.index.values.tolist())
+        assert_equal(expected_ids, actual_ids)
+    else:
+        assert_equal(len(C), 0)
+
+
+def validate_metadata_two_candsets(C, D):
+    assert_equal(sorted(C.columns), sorted(D.columns))
+    assert_equal(em.get_key(D), em.get_key(C))
+    assert_equal(em.get_property(D, 'fk_ltable'), em.get_property(C, 'fk_ltable'))
+    assert_equal(em.get_property(D, 'fk_rtable'), em.get_property(C, 'fk_rtable'))
@@ -643,6 +643,31 @@ class OverlapBlockerTestCases(unittest.TestCase):
 
 
 
+    def test_ob_block_tables_reuses_cleaned_columns(self):
+        from py_entitymatching.blocker.text_cleanup import cleaned_column_cache
+        cleaned_column_cache.clear()
+        C = self.ob.block_tables(self.A, self.B,
+                                 l_overlap_attr_2, r_overlap_attr_2,
+                                 rem_stop_words=True, overlap_size=4)
+        validate_data(C, expected_ids_2)
+        assert_equal(len(cleaned_column_cache), 2)
+        # blocking again with other settings reuses the cleaned columns
+        C = self.ob.block_tables(self.A, self.B,
+                                 l_overlap_attr_2, r_overlap_attr_2,
+                                 rem_stop_words=True, overlap_size=1)
+        assert_equal(len(cleaned_column_cache), 2)
+        D = self.ob.block_candset(C, l_overlap_attr_2, r_overlap_attr_2,
+                                  rem_stop_words=True, overlap_size=4)
+        validate_data(D, expected_ids_2)
+        assert_equal(len(cleaned_column_cache), 2)
+        # the cleaned columns are not reused after the table changes
+        self.A.loc[self.A.ID == 'a3', l_overlap_attr_2] = 'unknown'
+        C = self.ob.block_tables(self.A, self.B,
+                                 l_overlap_attr_2, r_overlap_attr_2,
+                                 rem_stop_words=True, overlap_size=4)
+        validate_data(C, [('a2', 'b3')])
+
+
 class OverlapBlockerMulticoreTestCases(unittest.TestCase):
 
     def setUp(self):
@@ -60,6 +60,15 @@ expected_ids_7 = [('a2', 'b1'), ('a2', 'b3'), ('a2', 'b6'), ('a3', 'b2'),
 expected_ids_6_and_7 = [('a2', 'b1'), ('a2', 'b3'), ('a2', 'b6'), ('a3', 'b2'),
                        ('a3', 'b6'), ('a4', 'b2'), ('a5', 'b5')]
 
+# filterable rule using exact match
+expected_ids_exm = [('a1', 'b1'), ('a1', 'b2'), ('a1', 'b6'), ('a2', 'b3'),
+                    ('a2', 'b4'), ('a2', 'b5'), ('a3', 'b1'), ('a3', 'b2'),
+                    ('a3', 'b6'), ('a4', 'b3'), ('a4', 'b4'), ('a4', 'b5'),
+                    ('a5', 'b3'), ('a5', 'b4'), ('a5', 'b5')]
+
+expected_ids_6_and_exm = [('a2', 'b3'), ('a3', 'b2'), ('a3', 'b6'),
+                          ('a5', 'b5')]
+
 # rule with supported sim_fn but unsupported op for filters (returns empty set)
 rule_8 = ['name_name_jac_dlm_dc0_dlm_dc0(ltuple,rtuple) >= 0']
 
@@ -407,6 +416,125 @@ class RuleBasedBlockerTestCases(unittest.TestCase):
         validate_metadata(C)
         validate_data(C)
 
+    def test_rb_block_tables_exact_match_rule(self):
+        test_rule = ['zipcode_zipcode_exm(ltuple, rtuple) == 0']
+        rule_name = self.rb.add_rule(test_rule, self.feature_table)
+        assert_equal(self.rb.is_rule_filterable(rule_name), True)
+        C = self.rb.block_tables(self.A, self.B, l_output_attrs,
+                                 r_output_attrs, l_output_prefix,
+                                 r_output_prefix, show_progress=False)
+        validate_metadata(C, l_output_attrs, r_output_attrs,
+                          l_output_prefix, r_output_prefix)
+        validate_data(C, expected_ids_exm)
+
+    def test_rb_block_tables_exact_match_rule_wi_missing_values(self):
+        A = self.A.copy()
+        A.loc[0, 'zipcode'] = None
+        em.set_key(A, 'ID')
+        test_rule = ['zipcode_zipcode_exm(ltuple, rtuple) < 1']
+        self.rb.add_rule(test_rule, self.feature_table)
+        C = self.rb.block_tables(A, self.B, show_progress=False)
+        validate_metadata(C)
+        expected_ids = sorted(set(expected_ids_exm) |
+                              set(('a1', b) for b in self.B.ID))
+        validate_data(C, expected_ids)
+
+    def test_rb_block_tables_exact_match_rule_wi_missing_values_ops(self):
+        # the pairs with a missing value survive the conjuncts that do not
+        # hold for NaN only (i.e., not != 1)
+        A = self.A.copy()
+        A.loc[0, 'zipcode'] = None
+        B = self.B.copy()
+        B.loc[1, 'zipcode'] = None
+        em.set_key(A, 'ID')
+        em.set_key(B, 'ID')
+        for test_rule in [['zipcode_zipcode_exm(ltuple, rtuple) != 1'],
+                          ['zipcode_zipcode_exm(ltuple, rtuple) == 0'],
+                          ['zipcode_zipcode_exm(ltuple, rtuple) < 1']]:
+            rb = em.RuleBasedBlocker()
+            rule_name = rb.add_rule(test_rule, self.feature_table)
+            assert_equal(rb.is_rule_filterable(rule_name), True)
+            C = rb.block_tables(A, B, show_progress=False)
+            validate_metadata(C)
+            expected_ids = [(A.ID[i], B.ID[j]) for i in range(len(A))
+                            for j in range(len(B))
+                            if not rb.block_tuples(A.loc[i], B.loc[j])]
+            validate_data(C, expected_ids)
+            if '!=' in test_rule[0]:
+                validate_data(C, [(l, r) for l, r in expected_ids_exm
+                                  if l != 'a1' and r != 'b2'])
+
+    def test_rb_block_tables_exact_match_rule_and_non_filterable_rule(self):
+        self.rb.add_rule(rule_6, self.feature_table)
+        self.rb.add_rule(['zipcode_zipcode_exm(ltuple, rtuple) == 0'],
+                         self.feature_table)
+        C = self.rb.block_tables(self.A, self.B, show_progress=False)
+        validate_metadata(C)
+        validate_data(C, expected_ids_6_and_exm)
+
+    def test_rb_is_conjunct_filterable_unsupported_threshold(self):
+        rule_name = self.rb.add_rule(['name_name_jac_qgm_3_qgm_3(ltuple, rtuple) < 0'],
+                                     self.feature_table)
+        assert_equal(self.rb.is_rule_filterable(rule_name), False)
+
+    def test_rb_is_conjunct_filterable_exact_match_unsupported_op(self):
+        rule_name = self.rb.add_rule(['zipcode_zipcode_exm(ltuple, rtuple) == 1'],
+                                     self.feature_table)
+        assert_equal(self.rb.is_rule_filterable(rule_name), False)
+
+    def test_rb_get_filter_tokenizer_qgram(self):
+        feature_string = "jaccard(qgm_2(ltuple['name']), qgm_2(rtuple['name']))"
+        f_dict = get_feature_fn(feature_string, get_tokenizers_for_blocking(),
+                                get_sim_funs_for_blocking())
+        f_dict['is_auto_generated'] = True
+        add_feature(self.feature_table, 'test', f_dict)
+        conjunct = 'test(ltuple, rtuple) < 0.3'
+        rule_name = self.rb.add_rule([conjunct], self.feature_table)
+        assert_equal(self.rb.is_rule_filterable(rule_name), True)
+        tokenizer = self.rb.get_filter_tokenizer(conjunct, rule_name)
+        assert_equal(tokenizer.qval, 2)
+        assert_equal(tokenizer.get_return_set(), True)
+
+    def test_rb_get_filter_tokenizer_delimiter(self):
+        conjunct = 'name_name_jac_dlm_dc0_dlm_dc0(ltuple, rtuple) < 0.3'
+        rule_name = self.rb.add_rule([conjunct], self.feature_table)
+        tokenizer = self.rb.get_filter_tokenizer(conjunct, rule_name)
+        assert_equal(tokenizer.tokenize('data data science'),
+                     ['data', 'science'])
+
+    def test_rb_explain(self):
+        self.rb.add_rule(rule_6, self.feature_table, rule_name='mel')
+        self.rb.add_rule(['zipcode_zipcode_exm(ltuple, rtuple) == 0'],
+                         self.feature_table, rule_name='zipcode')
+        plan = self.rb.explain(self.A, self.B)
+        assert_equal(plan.strategy, 'filter_join')
+        assert_equal(plan.filter_rule, 'zipcode')
+        assert_equal(plan.rule_order, ['mel'])
+        assert_equal(plan.est_candset_size, len(expected_ids_6_and_exm))
+        # explain does not change the rules
+        assert_equal(list(self.rb.get_rule_names()), ['mel', 'zipcode'])
+
+    @raises(AssertionError)
+    def test_rb_explain_invalid_sample_size(self):
+        self.rb.add_rule(rule_6, self.feature_table)
+        self.rb.explain(self.A, self.B, sample_size=0)
+
+    @raises(AssertionError)
+    def test_rb_explain_no_rules(self):
+        self.rb.explain(self.A, self.B)
+
+    def test_rb_optimize(self):
+        self.rb.add_rule(rule_6, self.feature_table, rule_name='mel')
+        self.rb.add_rule(['zipcode_zipcode_exm(ltuple, rtuple) == 0'],
+                         self.feature_table, rule_name='zipcode')
+        plan = self.rb.optimize(self.A, self.B)
+        assert_equal(list(self.rb.get_rule_names()), ['zipcode', 'mel'])
+        assert_equal(list(self.rb.rule_str.keys()), ['zipcode', 'mel'])
+        assert_equal(list(self.rb.rule_ft.keys()), ['zipcode', 'mel'])
+        C = self.rb.block_tables(self.A, self.B, show_progress=False)
+        validate_metadata(C)
+        validate_data(C, expected_ids_6_and_exm)
+
     @raises(AssertionError)
     def test_rb_block_candset_invalid_candset_1(self):
         self.rb.block_candset(None)
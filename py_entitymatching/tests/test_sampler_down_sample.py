@@ -8,7 +8,8 @@ import pandas as pd
 import six
 
 from py_entitymatching.utils.generic_helper import get_install_path
-from py_entitymatching.sampler.down_sample import _inv_index, _probe_index, down_sample, _get_str_cols_list
+from py_entitymatching.sampler.down_sample import _inv_index, _probe_index, down_sample, _get_str_cols_list, \
+    _probe_index_part
 import py_entitymatching.catalog.catalog_manager as cm
 from py_entitymatching.io.parsers import read_csv_metadata
 
@@ -80,6 +81,22 @@ class DownSampleTestCases(unittest.TestCase):
         self.assertEqual(D.equals(F), True)
         self.assertEqual(C.equals(E), True)
 
+    def test_down_sample_seed_n_jobs(self):
+        C, D = down_sample(self.A, self.B, 100, 10, seed=0, show_progress=False)
+        E, F = down_sample(self.A, self.B, 100, 10, seed=0, show_progress=False,
+                           n_jobs=2)
+        self.assertEqual(D.equals(F), True)
+        self.assertEqual(C.equals(E), True)
+
+    def test_down_sample_large_y_param(self):
+        A = self.A.iloc[:5]
+        C, D = down_sample(A, self.B, 10, 20, show_progress=False)
+        self.assertEqual(len(C), 5)
+
+    @raises(AssertionError)
+    def test_down_sample_invalid_n_jobs(self):
+        C, D = down_sample(self.A, self.B, 100, 10, n_jobs='2')
+
 
 class InvertedIndexTestCases(unittest.TestCase):
     def test_down_sample_inv_index_valid_1(self):
@@ -98,6 +115,18 @@ class InvertedIndexTestCases(unittest.TestCase):
         self.assertNotEqual(len(inv_index.get('beach')), 0)
 
 
+    def test_down_sample_inv_index_positions(self):
+        A = pd.DataFrame({'name': ['Kevin Smith', 'kevin', None],
+                          'zip': [1, 2, 3]})
+        inv_index = _inv_index(A)
+        self.assertEqual(sorted(inv_index.vocabulary), ['kevin', 'none', 'smith'])
+        self.assertEqual(list(inv_index.get('kevin')), [0, 1])
+        self.assertEqual(list(inv_index.get('smith')), [0])
+        self.assertEqual(inv_index.get('bogus'), None)
+        self.assertEqual(list(inv_index.get_token_ids(['smith', 'bogus'])),
+                         [inv_index.vocabulary['smith']])
+
+
 class StrColTestCases(unittest.TestCase):
     @raises(AssertionError)
     def test_down_sample_get_str_cols_list_valid1(self):
@@ -124,3 +153,19 @@ class ProbeIndexTestCases(unittest.TestCase):
         in_index = _inv_index(A)
         s_tbl_indices = _probe_index(B, 5, len(A), in_index)
         self.assertNotEqual(len(s_tbl_indices), 0)
+
+    def test_down_sample_probe_index_part_top_matches(self):
+        A = pd.DataFrame({'name': ['a b c', 'a b', 'a', 'd', 'b c']})
+        inv_index = _inv_index(A)
+        index = {'offsets': inv_index.offsets,
+                 'positions': inv_index.positions}
+        token_ids = inv_index.get_token_ids(['a', 'b', 'c'])
+        # the tuples sharing the most tokens, ties broken by larger position
+        positions = _probe_index_part([token_ids], 2, 2, len(A), index, 0)
+        self.assertEqual(list(positions), [0, 4])
+        positions = _probe_index_part([token_ids], 3, 3, len(A), index, 0)
+        self.assertEqual(list(positions), [0, 1, 4])
+        # the remaining tuples are selected randomly
+        positions = _probe_index_part([token_ids], 2, 4, len(A), index, 0)
+        self.assertEqual(len(positions), 4)
+        self.assertEqual(set([0, 4]).issubset(positions), True)
@@ -0,0 +1,246 @@
+import os
+from nose.tools import *
+import pandas as pd
+import unittest
+
+import py_entitymatching as em
+
+p = em.get_install_path()
+path_a = os.sep.join([p, 'tests', 'test_datasets', 'A.csv'])
+path_b = os.sep.join([p, 'tests', 'test_datasets', 'B.csv'])
+l_output_attrs = ['name', 'zipcode']
+r_output_attrs = ['name', 'zipcode']
+l_output_prefix = 'l_'
+r_output_prefix = 'r_'
+
+
+def _last_name(t):
+    return t['name'].split()[-1]
+
+# sorted neighborhood on 'name', window size 2
+expected_ids_1 = [('a1', 'b1'), ('a1', 'b4'), ('a2', 'b3'), ('a2', 'b6'),
+                  ('a3', 'b3'), ('a4', 'b2'), ('a4', 'b4'), ('a5', 'b2'),
+                  ('a5', 'b5')]
+
+# sorted neighborhood on 'name', window size 3
+expected_ids_2 = sorted(expected_ids_1 + [('a1', 'b6'), ('a2', 'b1')])
+
+# sorted neighborhood on the last names, window size 2
+expected_ids_3 = [('a1', 'b1'), ('a2', 'b3'), ('a2', 'b6'), ('a3', 'b2'),
+                  ('a4', 'b3'), ('a5', 'b5')]
+
+# union of the passes on 'name' and 'zipcode', window size 2
+expected_ids_4 = sorted(expected_ids_1 + [('a3', 'b1'), ('a5', 'b3')])
+
+# attribute equivalence on 'zipcode', then sorted neighborhood on 'name',
+# window size 2
+expected_ids_5 = [('a1', 'b1'), ('a2', 'b3'), ('a4', 'b4'), ('a5', 'b5')]
+
+
+class SortedNeighborhoodBlockerTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.A = em.read_csv_metadata(path_a)
+        em.set_key(self.A, 'ID')
+        self.B = em.read_csv_metadata(path_b)
+        em.set_key(self.B, 'ID')
+        self.sn = em.SortedNeighborhoodBlocker()
+
+    def tearDown(self):
+        del self.A
+        del self.B
+        del self.sn
+
+    @raises(AssertionError)
+    def test_sn_block_tables_invalid_ltable(self):
+        self.sn.block_tables(None, self.B, 'name', 'name')
+
+    @raises(AssertionError)
+    def test_sn_block_tables_invalid_l_sort_key(self):
+        self.sn.block_tables(self.A, self.B, 1, 'name')
+
+    @raises(AssertionError)
+    def test_sn_block_tables_invalid_r_sort_key(self):
+        self.sn.block_tables(self.A, self.B, 'name', [])
+
+    @raises(AssertionError)
+    def test_sn_block_tables_bogus_l_sort_key(self):
+        self.sn.block_tables(self.A, self.B, 'bogus', 'name')
+
+    @raises(AssertionError)
+    def test_sn_block_tables_bogus_r_sort_key(self):
+        self.sn.block_tables(self.A, self.B, 'name', ['name', 'bogus'])
+
+    @raises(AssertionError)
+    def test_sn_block_tables_sort_keys_of_different_lengths(self):
+        self.sn.block_tables(self.A, self.B, ['name', 'zipcode'], 'name')
+
+    @raises(AssertionError)
+    def test_sn_block_tables_invalid_window_size_1(self):
+        self.sn.block_tables(self.A, self.B, 'name', 'name', window_size=1)
+
+    @raises(AssertionError)
+    def test_sn_block_tables_invalid_window_size_2(self):
+        self.sn.block_tables(self.A, self.B, 'name', 'name', window_size='2')
+
+    @raises(AssertionError)
+    def test_sn_block_tables_invalid_allow_missing(self):
+        self.sn.block_tables(self.A, self.B, 'name', 'name',
+                             allow_missing=None)
+
+    @raises(AssertionError)
+    def test_sn_block_tables_bogus_l_output_attrs(self):
+        self.sn.block_tables(self.A, self.B, 'name', 'name',
+                             l_output_attrs=['bogus'])
+
+    def test_sn_block_tables(self):
+        C = self.sn.block_tables(self.A, self.B, 'name', 'name',
+                                 window_size=2, l_output_attrs=l_output_attrs,
+                                 r_output_attrs=r_output_attrs,
+                                 l_output_prefix=l_output_prefix,
+                                 r_output_prefix=r_output_prefix)
+        validate_metadata(C, l_output_attrs, r_output_attrs,
+                          l_output_prefix, r_output_prefix)
+        validate_data(C, expected_ids_1)
+        assert_equal(list(C['l_name']),
+                     list(self.A.set_index('ID').loc[C['l_ID'], 'name']))
+        assert_equal(list(C['r_zipcode']),
+                     list(self.B.set_index('ID').loc[C['r_ID'], 'zipcode']))
+
+    def test_sn_block_tables_wi_larger_window(self):
+        C = self.sn.block_tables(self.A, self.B, 'name', 'name')
+        validate_metadata(C)
+        validate_data(C, expected_ids_2)
+
+    def test_sn_block_tables_wi_window_larger_than_tables(self):
+        C = self.sn.block_tables(self.A, self.B, 'name', 'name',
+                                 window_size=100)
+        assert_equal(len(C), len(self.A) * len(self.B))
+
+    def test_sn_block_tables_wi_function_sort_key(self):
+        C = self.sn.block_tables(self.A, self.B, _last_name, _last_name,
+                                 window_size=2)
+        validate_metadata(C)
+        validate_data(C, expected_ids_3)
+
+    def test_sn_block_tables_multiple_passes(self):
+        C = self.sn.block_tables(self.A, self.B, ['name', 'zipcode'],
+                                 ['name', 'zipcode'], window_size=2)
+        validate_metadata(C)
+        validate_data(C, expected_ids_4)
+
+    def test_sn_block_tables_wi_missing_values(self):
+        A = self.A.copy()
+        A.loc[0, 'name'] = None
+        em.set_key(A, 'ID')
+        C = self.sn.block_tables(A, self.B, 'name', 'name', window_size=2)
+        validate_data(C, [('a2', 'b3'), ('a2', 'b6'), ('a3', 'b3'),
+                          ('a4', 'b2'), ('a4', 'b4'), ('a5', 'b2'),
+                          ('a5', 'b5')])
+        C = self.sn.block_tables(A, self.B, 'name', 'name', window_size=2,
+                                 allow_missing=True)
+        assert_equal(len(C), 7 + len(self.B))
+        assert_equal(sorted(C[C.ltable_ID == 'a1'].rtable_ID),
+                     sorted(self.B.ID))
+
+    def test_sn_block_tables_empty_ltable(self):
+        empty_A = pd.DataFrame(columns=self.A.columns)
+        em.set_key(empty_A, 'ID')
+        C = self.sn.block_tables(empty_A, self.B, 'name', 'name')
+        validate_metadata(C)
+        validate_data(C)
+
+    def test_sn_block_candset(self):
+        ab = em.AttrEquivalenceBlocker()
+        C = ab.block_tables(self.A, self.B, 'zipcode', 'zipcode',
+                            l_output_attrs, r_output_attrs,
+                            l_output_prefix, r_output_prefix)
+        D = self.sn.block_candset(C, 'name', 'name', window_size=2)
+        validate_metadata_two_candsets(C, D)
+        validate_data(D, expected_ids_5)
+
+    def test_sn_block_candset_empty_input(self):
+        empty_A = pd.DataFrame(columns=self.A.columns)
+        em.set_key(empty_A, 'ID')
+        C = self.sn.block_tables(empty_A, self.B, 'name', 'name')
+        D = self.sn.block_candset(C, 'name', 'name')
+        validate_metadata_two_candsets(C, D)
+        validate_data(D)
+
+    @raises(AssertionError)
+    def test_sn_block_candset_invalid_window_size(self):
+        C = self.sn.block_tables(self.A, self.B, 'name', 'name')
+        self.sn.block_candset(C, 'name', 'name', window_size=0)
+
+    def test_sn_block_tuples(self):
+        assert_equal(self.sn.block_tuples(self.A.ix[0], self.B.ix[0],
+                                          'name', 'name'), False)
+        ltuple = self.A.ix[0].copy()
+        ltuple['name'] = None
+        assert_equal(self.sn.block_tuples(ltuple, self.B.ix[0],
+                                          'name', 'name'), True)
+        assert_equal(self.sn.block_tuples(ltuple, self.B.ix[0],
+                                          ['name', 'zipcode'],
+                                          ['name', 'zipcode']), False)
+        assert_equal(self.sn.block_tuples(ltuple, self.B.ix[0], 'name',
+                                          'name', allow_missing=True), False)
+
+
+class SortedNeighborhoodBlockerMulticoreTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.A = em.read_csv_metadata(path_a)
+        em.set_key(self.A, 'ID')
+        self.B = em.read_csv_metadata(path_b)
+        em.set_key(self.B, 'ID')
+        self.sn = em.SortedNeighborhoodBlocker()
+
+    def tearDown(self):
+        del self.A
+        del self.B
+        del self.sn
+
+    def test_sn_block_tables_multiple_passes_njobs_2(self):
+        C = self.sn.block_tables(self.A, self.B, [_last_name, 'zipcode'],
+                                 [_last_name, 'zipcode'], window_size=2,
+                                 n_jobs=2)
+        D = self.sn.block_tables(self.A, self.B, [_last_name, 'zipcode'],
+                                 [_last_name, 'zipcode'], window_size=2)
+        validate_metadata(C)
+        assert_equal(list(C['ltable_ID']), list(D['ltable_ID']))
+        assert_equal(list(C['rtable_ID']), list(D['rtable_ID']))
+
+
+# helper functions for validating the output
+
+def validate_metadata(C, l_output_attrs=None, r_output_attrs=None,
+                      l_output_prefix='ltable_', r_output_prefix='rtable_',
+                      l_key='ID', r_key='ID'):
+    s1 = ['_id', l_output_prefix + l_key, r_output_prefix + r_key]
+    if l_output_attrs:
+        s1 += [l_output_prefix + x for x in l_output_attrs if x != l_key]
+    if r_output_attrs:
+        s1 += [r_output_prefix + x for x in r_output_attrs if x != r_key]
+    s1 = sorted(s1)
+    assert_equal(s1, sorted(C.columns))
+    assert_equal(em.get_key(C), '_id')
+    assert_equal(em.get_property(C, 'fk_ltable'), l_output_prefix + l_key)
+    assert_equal(em.get_property(C, 'fk_rtable'), r_output_prefix + r_key)
+
+
+def validate_data(C, expected_ids=None):
+    if expected_ids:
+        lid = em.get_property(C, 'fk_ltable')
+        rid = em.get_property(C, 'fk_rtable')
+        C_ids = C[[lid, rid]].set_index([lid, rid])
+        actual_ids = sorted(C_ids.index.values.tolist())
+        assert_equal(expected_ids, actual_ids)
+    else:
+        assert_equal(len(C), 0)
+
+
+def validate_metadata_two_candsets(C, D):
+    assert_equal(sorted(C.columns), sorted(D.columns))
+    assert_equal(em.get_key(D), em.get_key(C))
+    assert_equal(em.get_property(D, 'fk_ltable'), em.get_property(C, 'fk_ltable'))
+    assert_equal(em.get_property(D, 'fk_rtable'), em.get_property(C, 'fk_rtable'))
@@ -0,0 +1,260 @@
+import os
+from nose.tools import *
+import pandas as pd
+import unittest
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import py_entitymatching as em
+import py_entitymatching.blocker.tfidf as tfidf
+
+p = em.get_install_path()
+path_a = os.sep.join([p, 'tests', 'test_datasets', 'A.csv'])
+path_b = os.sep.join([p, 'tests', 'test_datasets', 'B.csv'])
+l_output_attrs = ['name', 'address']
+r_output_attrs = ['name', 'address']
+l_output_prefix = 'l_'
+r_output_prefix = 'r_'
+
+# top-1 on 'address'
+expected_ids_1 = [('a1', 'b1'), ('a2', 'b3'), ('a3', 'b2'), ('a4', 'b1'),
+                  ('a5', 'b6')]
+
+# top-2 on 'address'
+expected_ids_2 = [('a1', 'b1'), ('a1', 'b2'), ('a2', 'b1'), ('a2', 'b3'),
+                  ('a3', 'b1'), ('a3', 'b2'), ('a4', 'b1'), ('a4', 'b2'),
+                  ('a5', 'b5'), ('a5', 'b6')]
+
+
+class TfidfBlockerTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.A = em.read_csv_metadata(path_a)
+        em.set_key(self.A, 'ID')
+        self.B = em.read_csv_metadata(path_b)
+        em.set_key(self.B, 'ID')
+        self.tb = em.TfidfBlocker()
+
+    def tearDown(self):
+        del self.A
+        del self.B
+        del self.tb
+
+    @raises(AssertionError)
+    def test_tfidf_block_tables_invalid_ltable(self):
+        self.tb.block_tables(None, self.B, 'address', 'address')
+
+    @raises(AssertionError)
+    def test_tfidf_block_tables_invalid_l_block_attr(self):
+        self.tb.block_tables(self.A, self.B, None, 'address')
+
+    @raises(AssertionError)
+    def test_tfidf_block_tables_bogus_l_block_attr(self):
+        self.tb.block_tables(self.A, self.B, 'bogus', 'address')
+
+    @raises(AssertionError)
+    def test_tfidf_block_tables_invalid_k_1(self):
+        self.tb.block_tables(self.A, self.B, 'address', 'address', k=0)
+
+    @raises(AssertionError)
+    def test_tfidf_block_tables_invalid_k_2(self):
+        self.tb.block_tables(self.A, self.B, 'address', 'address', k=2.0)
+
+    @raises(AssertionError)
+    def test_tfidf_block_tables_invalid_tokenizer(self):
+        self.tb.block_tables(self.A, self.B, 'address', 'address',
+                             tokenizer='wspace')
+
+    @raises(AssertionError)
+    def test_tfidf_block_tables_invalid_lowercase(self):
+        self.tb.block_tables(self.A, self.B, 'address', 'address',
+                             lowercase=None)
+
+    @raises(AssertionError)
+    def test_tfidf_block_tables_invalid_allow_missing(self):
+        self.tb.block_tables(self.A, self.B, 'address', 'address',
+                             allow_missing=None)
+
+    def test_tfidf_block_tables(self):
+        C = self.tb.block_tables(self.A, self.B, 'address', 'address', k=1,
+                                 l_output_attrs=l_output_attrs,
+                                 r_output_attrs=r_output_attrs,
+                                 l_output_prefix=l_output_prefix,
+                                 r_output_prefix=r_output_prefix)
+        validate_metadata(C, l_output_attrs, r_output_attrs,
+                          l_output_prefix, r_output_prefix)
+        validate_data(C, expected_ids_1)
+        assert_equal(list(C['r_address']),
+                     list(self.B.set_index('ID').loc[C['r_ID'], 'address']))
+
+    def test_tfidf_block_tables_k_2(self):
+        C = self.tb.block_tables(self.A, self.B, 'address', 'address', k=2)
+        validate_metadata(C)
+        validate_data(C, expected_ids_2)
+
+    def test_tfidf_block_tables_k_larger_than_rtable(self):
+        C = self.tb.block_tables(self.A, self.B, 'address', 'address', k=10)
+        assert_equal(len(C), len(self.A) * len(self.B))
+
+    def test_tfidf_block_tables_top_k(self):
+        # few names share a token, so most left tuples are completed with
+        # right tuples of zero similarity
+        for k in [1, 3, 5]:
+            C = self.tb.block_tables(self.A, self.B, 'name', 'name', k=k)
+            assert_equal(len(C), len(self.A) * k)
+            validate_top_k(C, self.A, self.B, 'name', 'name', k)
+
+    def test_tfidf_block_tables_small_chunks(self):
+        max_chunk_pairs = tfidf.max_chunk_pairs
+        tfidf.max_chunk_pairs = 1
+        try:
+            C = self.tb.block_tables(self.A, self.B, 'address', 'address',
+                                     k=2)
+        finally:
+            tfidf.max_chunk_pairs = max_chunk_pairs
+        validate_data(C, expected_ids_2)
+
+    def test_tfidf_block_tables_wi_qgram_tokenizer(self):
+        tok = em.get_tokenizers_for_blocking()['qgm_3']
+        C = self.tb.block_tables(self.A, self.B, 'name', 'name', k=2,
+                                 tokenizer=tok)
+        assert_equal(len(C), 2 * len(self.A))
+        validate_top_k(C, self.A, self.B, 'name', 'name', 2, tok)
+        ids = set(zip(C['ltable_ID'], C['rtable_ID']))
+        assert_true(('a2', 'b3') in ids)
+        assert_true(('a5', 'b5') in ids)
+
+    def test_tfidf_block_tables_wi_missing_values(self):
+        A = self.A.copy()
+        A.loc[1, 'address'] = None
+        em.set_key(A, 'ID')
+        B = self.B.copy()
+        B.loc[0, 'address'] = None
+        em.set_key(B, 'ID')
+        C = self.tb.block_tables(A, B, 'address', 'address', k=2)
+        assert_equal(len(C), 2 * (len(A) - 1))
+        assert_true('a2' not in set(C.ltable_ID))
+        assert_true('b1' not in set(C.rtable_ID))
+        C = self.tb.block_tables(A, B, 'address', 'address', k=2,
+                                 allow_missing=True)
+        assert_equal(len(C), 2 * (len(A) - 1) + len(B) + len(A) - 1)
+        assert_equal(sorted(C[C.ltable_ID == 'a2'].rtable_ID),
+                     sorted(B.ID))
+
+    def test_tfidf_block_tables_empty_ltable(self):
+        empty_A = pd.DataFrame(columns=self.A.columns)
+        em.set_key(empty_A, 'ID')
+        C = self.tb.block_tables(empty_A, self.B, 'address', 'address')
+        validate_metadata(C)
+        validate_data(C)
+
+    def test_tfidf_block_candset(self):
+        C = self.tb.block_tables(self.A, self.B, 'address', 'address', k=6)
+        D = self.tb.block_candset(C, 'address', 'address', k=2)
+        validate_metadata_two_candsets(C, D)
+        validate_data(D, expected_ids_2)
+
+    def test_tfidf_block_candset_wi_fewer_pairs(self):
+        ab = em.AttrEquivalenceBlocker()
+        C = ab.block_tables(self.A, self.B, 'zipcode', 'zipcode',
+                            l_output_attrs, r_output_attrs,
+                            l_output_prefix, r_output_prefix)
+        D = self.tb.block_candset(C, 'address', 'address', k=1)
+        validate_metadata_two_candsets(C, D)
+        assert_equal(sorted(D.l_ID), sorted(set(C.l_ID)))
+        assert_true(set(D._id).issubset(set(C._id)))
+
+    def test_tfidf_block_candset_empty_input(self):
+        empty_A = pd.DataFrame(columns=self.A.columns)
+        em.set_key(empty_A, 'ID')
+        C = self.tb.block_tables(empty_A, self.B, 'address', 'address')
+        D = self.tb.block_candset(C, 'address', 'address')
+        validate_metadata_two_candsets(C, D)
+        validate_data(D)
+
+    def test_tfidf_block_tuples(self):
+        assert_equal(self.tb.block_tuples(self.A.ix[0], self.B.ix[0],
+                                          'address', 'address'), False)
+        ltuple = self.A.ix[0].copy()
+        ltuple['address'] = None
+        assert_equal(self.tb.block_tuples(ltuple, self.B.ix[0], 'address',
+                                          'address'), True)
+        assert_equal(self.tb.block_tuples(ltuple, self.B.ix[0], 'address',
+                                          'address', allow_missing=True),
+                     False)
+
+
+class TfidfBlockerMulticoreTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.A = em.read_csv_metadata(path_a)
+        em.set_key(self.A, 'ID')
+        self.B = em.read_csv_metadata(path_b)
+        em.set_key(self.B, 'ID')
+        self.tb = em.TfidfBlocker()
+
+    def tearDown(self):
+        del self.A
+        del self.B
+        del self.tb
+
+    def test_tfidf_block_tables_njobs_2(self):
+        C = self.tb.block_tables(self.A, self.B, 'name', 'name', k=3,
+                                 n_jobs=2)
+        D = self.tb.block_tables(self.A, self.B, 'name', 'name', k=3)
+        validate_metadata(C)
+        assert_equal(list(C['ltable_ID']), list(D['ltable_ID']))
+        assert_equal(list(C['rtable_ID']), list(D['rtable_ID']))
+
+
+# helper functions for validating the output
+
+def validate_top_k(C, A, B, l_attr, r_attr, k, tokenizer=em.tok_wspace):
+    # compare with the similarities computed by scikit-learn
+    vectorizer = TfidfVectorizer(analyzer=lambda s: tokenizer(s.lower()))
+    vectorizer.fit(list(A[l_attr]) + list(B[r_attr]))
+    sims = (vectorizer.transform(A[l_attr]) *
+            vectorizer.transform(B[r_attr]).T).toarray()
+    l_ids, r_ids = list(A['ID']), list(B['ID'])
+    for i, l_id in enumerate(l_ids):
+        selected = set(C[C.ltable_ID == l_id].rtable_ID)
+        assert_equal(len(selected), min(k, len(r_ids)))
+        kept = [sims[i, j] for j, r_id in enumerate(r_ids)
+                if r_id in selected]
+        dropped = [sims[i, j] for j, r_id in enumerate(r_ids)
+                   if r_id not in selected]
+        if dropped:
+            assert_true(min(kept) >= max(dropped) - 1e-9)
+
+
+def validate_metadata(C, l_output_attrs=None, r_output_attrs=None,
+                      l_output_prefix='ltable_', r_output_prefix='rtable_',
+                      l_key='ID', r_key='ID'):
+    s1 = ['_id', l_output_prefix + l_key, r_output_prefix + r_key]
+    if l_output_attrs:
+        s1 += [l_output_prefix + x for x in l_output_attrs if x != l_key]
+    if r_output_attrs:
+        s1 += [r_output_prefix + x for x in r_output_attrs if x != r_key]
+    s1 = sorted(s1)
+    assert_equal(s1, sorted(C.columns))
+    assert_equal(em.get_key(C), '_id')
+    assert_equal(em.get_property(C, 'fk_ltable'), l_output_prefix + l_key)
+    assert_equal(em.get_property(C, 'fk_rtable'), r_output_prefix + r_key)
+
+
+def validate_data(C, expected_ids=None):
+    if expected_ids:
+        lid = em.get_property(C, 'fk_ltable')
+        rid = em.get_property(C, 'fk_rtable')
+        C_ids = C[[lid, rid]].set_index([lid, rid])
+        actual_ids = sorted(C_ids.index.values.tolist())
+        assert_equal(expected_ids, actual_ids)
+    else:
+        assert_equal(len(C), 0)
+
+
+def validate_metadata_two_candsets(C, D):
+    assert_equal(sorted(C.columns), sorted(D.columns))
+    assert_equal(em.get_key(D), em.get_key(C))
+    assert_equal(em.get_property(D, 'fk_ltable'), em.get_property(C, 'fk_ltable'))
+    assert_equal(em.get_property(D, 'fk_rtable'), em.get_property(C, 'fk_rtable'))
@@ -0,0 +1,156 @@
+import multiprocessing
+import os
+import pickle
+from nose.tools import *
+import unittest
+import pandas as pd
+
+from py_entitymatching.utils.generic_helper import get_install_path
+from py_entitymatching.io.parsers import read_csv_metadata
+from py_entitymatching.utils.parallel_helper import SharedTable, SharedObject, \
+    SharedValue, get_table, get_object, split_ranges, split_by_cost, \
+    split_cartesian_product, get_num_procs, get_num_tasks, get_value_costs, \
+    run_tasks
+
+datasets_path = os.sep.join([get_install_path(), 'tests', 'test_datasets'])
+path_a = os.sep.join([datasets_path, 'A.csv'])
+
+
+class SharedTableTestCases(unittest.TestCase):
+    def setUp(self):
+        self.A = read_csv_metadata(path_a).set_index('ID', drop=False)
+        self.A.loc['a2', 'name'] = pd.np.NaN
+
+    def test_shared_table_take_valid(self):
+        with SharedTable(self.A) as shared:
+            self.assertEqual(len(shared), len(self.A))
+            B = shared.take([3, 0, 1])
+            self.assertEqual(list(B.columns), list(self.A.columns))
+            self.assertEqual(list(B.index), list(self.A.index[[3, 0, 1]]))
+            self.assertEqual(B.index.name, 'ID')
+            self.assertEqual(list(B['zipcode']), list(self.A['zipcode'].iloc[[3, 0, 1]]))
+            self.assertEqual(list(B['name'].iloc[[0, 1]]), list(self.A['name'].iloc[[3, 0]]))
+            self.assertEqual(pd.isnull(B['name'].iloc[2]), True)
+
+    def test_shared_table_pickle_does_not_copy_data(self):
+        with SharedTable(self.A) as shared:
+            pickled = pickle.dumps(shared)
+            self.assertEqual(len(pickled) < len(pickle.dumps(self.A)), True)
+            shared_1 = pickle.loads(pickled)
+            B = get_table(shared_1)
+            self.assertEqual(list(B['ID']), list(self.A['ID']))
+            # only the creator removes the files
+            shared_1.close()
+            self.assertEqual(os.path.isdir(shared.path), True)
+        self.assertEqual(os.path.isdir(shared.path), False)
+
+    def test_get_table_with_index_values(self):
+        with SharedTable(self.A) as shared:
+            B = get_table(shared, ['a4', 'a1', 'a4'])
+            self.assertEqual(list(B.index), ['a1', 'a4'])
+
+    def test_get_table_slice(self):
+        with SharedTable(self.A) as shared:
+            B = get_table(shared.slice(1, 3))
+            self.assertEqual(list(B['ID']), list(self.A['ID'].iloc[1:3]))
+
+    def test_get_table_dataframe(self):
+        self.assertEqual(get_table(self.A) is self.A, True)
+
+    def test_shared_table_mixed_types(self):
+        A = pd.DataFrame({'id': [1, 2, 3], 'val': ['a', 2, None]})
+        with SharedTable(A) as shared:
+            B = shared.take([0, 1, 2])
+            self.assertEqual(list(B['val'].iloc[[0, 1]]), ['a', 2])
+            self.assertEqual(pd.isnull(B['val'].iloc[2]), True)
+
+    @raises(AssertionError)
+    def test_shared_table_invalid_table(self):
+        SharedTable(None)
+
+
+class SharedObjectTestCases(unittest.TestCase):
+    def test_shared_object_valid(self):
+        obj = {'a': pd.np.arange(10), 'b': ['x', 'y']}
+        with SharedObject(obj) as shared:
+            shared_1 = pickle.loads(pickle.dumps(shared))
+            obj_1 = get_object(shared_1)
+            self.assertEqual(list(obj_1['a']), list(obj['a']))
+            self.assertEqual(obj_1['b'], obj['b'])
+        self.assertEqual(get_object(obj) is obj, True)
+
+
+class SharedValueTestCases(unittest.TestCase):
+    def test_shared_value_valid(self):
+        with SharedValue(0.5) as shared:
+            shared_1 = pickle.loads(pickle.dumps(shared))
+            self.assertEqual(shared_1.get(), 0.5)
+            shared_1.set(0.75)
+            self.assertEqual(shared.get(), 0.75)
+            shared_1.close()
+            self.assertEqual(os.path.isdir(shared.path), True)
+        self.assertEqual(os.path.isdir(shared.path), False)
+
+
+class SplitRangesTestCases(unittest.TestCase):
+    def test_split_ranges_valid(self):
+        self.assertEqual(split_ranges(10, 3), [(0, 4), (4, 7), (7, 10)])
+        self.assertEqual(split_ranges(2, 3), [(0, 1), (1, 2), (2, 2)])
+
+
+def _add(x, y):
+    return x + y
+
+
+class TaskSchedulingTestCases(unittest.TestCase):
+    def test_get_num_procs(self):
+        self.assertEqual(get_num_procs(4, 1000), 4)
+        self.assertEqual(get_num_procs(4, 2), 2)
+        self.assertEqual(get_num_procs(-1, 1000),
+                         multiprocessing.cpu_count())
+
+    def test_get_num_tasks(self):
+        self.assertEqual(get_num_tasks(4, 1000), 32)
+        self.assertEqual(get_num_tasks(4, 10), 10)
+        self.assertEqual(get_num_tasks(4, 0), 1)
+
+    def test_split_by_cost_uniform(self):
+        self.assertEqual(split_by_cost([1] * 10, 5),
+                         [(0, 2), (2, 4), (4, 6), (6, 8), (8, 10)])
+
+    def test_split_by_cost_skewed(self):
+        # the expensive item gets a range of its own
+        ranges = split_by_cost([1, 1, 100, 1, 1, 1, 1], 4)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], 7)
+        for (_, stop), (start, _) in zip(ranges[:-1], ranges[1:]):
+            self.assertEqual(stop, start)
+        self.assertEqual((2, 3) in ranges, True)
+
+    def test_split_by_cost_empty(self):
+        self.assertEqual(split_by_cost([], 4), [])
+        self.assertEqual(split_by_cost([0, 0, 0], 2), [(0, 2), (2, 3)])
+
+    def test_split_cartesian_product(self):
+        tiles = split_cartesian_product(100, 10, 8)
+        pairs = set()
+        for (l_start, l_stop), (r_start, r_stop) in tiles:
+            pairs.update((l, r) for l in range(l_start, l_stop)
+                         for r in range(r_start, r_stop))
+        self.assertEqual(len(pairs), 1000)
+        self.assertEqual(sum((l[1] - l[0]) * (r[1] - r[0])
+                             for l, r in tiles), 1000)
+        self.assertEqual(len(tiles) >= 8, True)
+
+    def test_get_value_costs(self):
+        self.assertEqual(list(get_value_costs(['ab', None, pd.np.NaN, 12])),
+                         [3, 1, 1, 3])
+
+    def test_run_tasks_single_process(self):
+        self.assertEqual(list(run_tasks(_add, [(1, 2), (3, 4)], 1,
+                                        verbose=True)), [3, 7])
+
+    def test_run_tasks_in_order(self):
+        tasks = [(i, i) for i in range(20)]
+        self.assertEqual(list(run_tasks(_add, tasks, 2, costs=[1] * 20)),
+                         [2 * i for i in range(20)])
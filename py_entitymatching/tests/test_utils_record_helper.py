@@ -0,0 +1,79 @@
+import os
+from nose.tools import *
+import unittest
+import pandas as pd
+
+from py_entitymatching.utils.generic_helper import get_install_path
+from py_entitymatching.io.parsers import read_csv_metadata
+from py_entitymatching.utils.record_helper import RecordAccessor, RecordView
+
+datasets_path = os.sep.join([get_install_path(), 'tests', 'test_datasets'])
+path_a = os.sep.join([datasets_path, 'A.csv'])
+
+
+class RecordAccessorTestCases(unittest.TestCase):
+    def setUp(self):
+        self.A = read_csv_metadata(path_a)
+        self.A_idx = self.A.set_index('ID', drop=False)
+
+    def test_get_record_valid(self):
+        accessor = RecordAccessor(self.A, 'ID')
+        record = accessor.get_record('a3')
+        series = self.A_idx.loc['a3']
+        for attr in self.A.columns:
+            self.assertEqual(record[attr], series[attr])
+        self.assertEqual(record.name, 'a3')
+        self.assertEqual(list(record.index), list(self.A.columns))
+
+    def test_get_record_with_index_as_key(self):
+        accessor = RecordAccessor(self.A_idx)
+        self.assertEqual(accessor.get_record('a2')['name'], self.A_idx.loc['a2', 'name'])
+
+    def test_get_records_valid(self):
+        accessor = RecordAccessor(self.A, 'ID')
+        records = accessor.get_records(['a1', 'a4', 'a1'])
+        self.assertEqual([r['ID'] for r in records], ['a1', 'a4', 'a1'])
+        self.assertEqual(records[0] is records[2], True)
+
+    def test_get_values_valid(self):
+        accessor = RecordAccessor(self.A, 'ID')
+        positions = accessor.get_positions(['a5', 'a1'])
+        self.assertEqual(list(accessor.get_values('zipcode', positions)),
+                         list(self.A_idx.loc[['a5', 'a1'], 'zipcode']))
+
+    def test_record_view_list_of_attrs(self):
+        accessor = RecordAccessor(self.A, 'ID')
+        record = accessor.get_record('a1')
+        out = record[['name', 'zipcode']]
+        self.assertEqual(isinstance(out, pd.Series), True)
+        self.assertEqual(list(out.index), ['name', 'zipcode'])
+        self.assertEqual(list(out), [record['name'], record['zipcode']])
+
+    def test_record_view_to_series(self):
+        accessor = RecordAccessor(self.A, 'ID')
+        series = accessor.get_record('a1').to_series()
+        self.assertEqual(list(series.index), list(self.A.columns))
+        self.assertEqual(series.name, 'a1')
+        self.assertEqual(series['ID'], 'a1')
+
+    def test_record_view_get(self):
+        record = RecordAccessor(self.A, 'ID').get_record('a1')
+        self.assertEqual(record.get('ID'), 'a1')
+        self.assertEqual(record.get('bogus', 1), 1)
+        self.assertEqual('ID' in record, True)
+
+    @raises(KeyError)
+    def test_record_view_invalid_attr(self):
+        RecordAccessor(self.A, 'ID').get_record('a1')['bogus']
+
+    @raises(KeyError)
+    def test_get_record_invalid_key(self):
+        RecordAccessor(self.A, 'ID').get_record('bogus')
+
+    @raises(AssertionError)
+    def test_record_accessor_invalid_table(self):
+        RecordAccessor(None, 'ID')
+
+    @raises(AssertionError)
+    def test_record_accessor_invalid_key(self):
+        RecordAccessor(self.A, 'bogus')
@@ -3,6 +3,7 @@ from collections import OrderedDict
 import logging
 
 import py_entitymatching.catalog.catalog_manager as cm
+from py_entitymatching.utils.record_helper import RecordAccessor
 import six
 
 logger = logging.getLogger(__name__)
@@ -64,33 +65,18 @@ class MatchTrigger(object):
 
 
 
-        # set the index and store it in l_tbl/r_tbl
-        l_tbl = ltable.set_index(l_key, drop=False)
-        r_tbl = rtable.set_index(r_key, drop=False)
-
-        # keep track of valid ids
-        y = []
-
-
-
+        # get the left and the right tuples of the input table
+        l_rows = RecordAccessor(ltable, l_key).get_records(input_table[fk_ltable].values)
+        r_rows = RecordAccessor(rtable, r_key).get_records(input_table[fk_rtable].values)
 
         column_names = list(input_table.columns)
-        lid_idx = column_names.index(l_key)
-        rid_idx = column_names.index(r_key)
-        id_idx = column_names.index(key)
-
         label_idx = column_names.index(label_column)
-        test_idx = 0
-        idx = 0
-        for row in input_table.itertuples(index=False):
-
-            if row[label_idx] != self.value_to_set:
-                l_row = l_tbl.ix[row[lid_idx]]
-                r_row = r_tbl.ix[row[rid_idx]]
-                res = self.apply_rules(l_row, r_row)
+        labels = input_table[label_column].values
+        for idx in range(len(input_table)):
+            if labels[idx] != self.value_to_set:
+                res = self.apply_rules(l_rows[idx], r_rows[idx])
                 if res == self.cond_status:
                     table.iat[idx, label_idx] = self.value_to_set
-            idx += 1
         return table
 
 
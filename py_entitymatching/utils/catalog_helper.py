@@ -161,7 +161,7 @@ def check_fk_constraint(df_foreign, attr_foreign, df_base, attr_base):
         logger.error('Input attr (attr_foreign) is not in df_foreign')
         return False
 
-    if any(pd.isnull(df_foreign[attr_foreign])):
+    if pd.isnull(df_foreign[attr_foreign]).any():
         logger.warning('The attribute %s in foreign table contains null values' %attr_foreign)
         return False
 
@@ -1,4 +1,5 @@
 # coding=utf-8
+from collections import OrderedDict
 import logging
 import os
 
@@ -183,6 +184,26 @@ def create_proj_dataframe(df, key, key_vals, attrs, col_names):
     return df
 
 
+def get_candset_for_pairs(ltable, rtable, l_key, r_key, l_pos, r_pos,
+                          l_output_attrs=None, r_output_attrs=None,
+                          l_output_prefix='ltable_', r_output_prefix='rtable_'):
+    """
+    Builds a candidate set (without the key column) from the positions of
+    the left and the right tuples of each tuple pair, gathering the key and
+    the output attributes of all the tuple pairs at once.
+    """
+    candset = OrderedDict()
+    candset[l_output_prefix + l_key] = ltable[l_key].values[l_pos]
+    candset[r_output_prefix + r_key] = rtable[r_key].values[r_pos]
+    for attr in l_output_attrs or []:
+        if l_output_prefix + attr not in candset:
+            candset[l_output_prefix + attr] = ltable[attr].values[l_pos]
+    for attr in r_output_attrs or []:
+        if r_output_prefix + attr not in candset:
+            candset[r_output_prefix + attr] = rtable[attr].values[r_pos]
+    return pd.DataFrame(candset, columns=list(candset.keys()))
+
+
 def del_files_in_dir(dir):
     if os.path.isdir(dir):
         filelist = [ f for f in os.listdir(dir)  ]
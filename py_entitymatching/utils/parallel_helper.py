@@ -0,0 +1,501 @@
+"""
+This module contains helper functions to share data with the parallel
+workers (launched using joblib) without copying it to each of them, and to
+schedule the work of the parallel workers.
+
+The base tables are placed in memory-mapped files once, and only the paths
+to these files are pickled and sent to the workers. The workers then attach
+to the files and read just the rows that they need.
+
+The work is split into many small tasks of about the same estimated cost
+(more tasks than workers), which are handed out to the workers as they
+become free, so that an expensive part of the data (e.g., a frequent
+blocking key) does not keep the other workers idle.
+"""
+from collections import OrderedDict
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import joblib
+from joblib import Parallel, delayed
+import pandas as pd
+import six
+
+from py_entitymatching.utils.catalog_helper import log_info
+
+logger = logging.getLogger(__name__)
+
+# Number of tasks per worker the work is split into, so that the workers
+# that get cheap tasks can take over the remaining tasks.
+tasks_per_proc = 8
+
+
+class SharedTable(object):
+    """
+    A read-only copy of a DataFrame whose columns are stored in
+    memory-mapped files.
+
+    Numeric, boolean and datetime columns are stored as NumPy arrays. Other
+    columns are stored as a single buffer of UTF-8 encoded strings (or
+    pickled values, if the column does not contain only strings) along with
+    the offsets of the values in the buffer. The index of the DataFrame is
+    stored in the same way.
+
+    Pickling a SharedTable only pickles the path to the files, so passing it
+    to the parallel workers does not copy the table. The process that
+    created the SharedTable owns the files and must call close (or use the
+    SharedTable as a context manager) to remove them.
+
+    Args:
+        table (DataFrame): The table to be shared.
+        temp_dir (string): The directory where the files should be created
+            (defaults to None, i.e. the default temporary directory).
+    """
+
+    def __init__(self, table, temp_dir=None):
+        if not isinstance(table, pd.DataFrame):
+            logger.error('Input table is not of type pandas dataframe')
+            raise AssertionError('Input table is not of type pandas dataframe')
+
+        self.path = tempfile.mkdtemp(prefix='py_em_shared_', dir=temp_dir)
+        self.columns = list(table.columns)
+        self.index_name = table.index.name
+        self.num_rows = len(table)
+        self._owner = True
+        self._arrays = {}
+        self._index_positions = None
+
+        self._columns_meta = []
+        try:
+            for i, attr in enumerate(self.columns):
+                self._columns_meta.append(
+                    _save_column(self.path, 'col_%d' % i, table.iloc[:, i]))
+            self._index_meta = _save_column(self.path, 'index', table.index)
+        except:
+            self.close()
+            raise
+
+    def __len__(self):
+        return self.num_rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_owner'] = False
+        state['_arrays'] = {}
+        state['_index_positions'] = None
+        return state
+
+    def close(self):
+        """
+        Removes the files of the shared table (only in the process that
+        created it).
+        """
+        self._arrays = {}
+        if self._owner and os.path.isdir(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def take(self, positions):
+        """
+        Returns the rows at the given positions as a DataFrame (with the same
+        columns and index as the original table).
+        """
+        positions = pd.np.asarray(positions, dtype=pd.np.int64)
+        data = OrderedDict()
+        for i, meta in enumerate(self._columns_meta):
+            data[i] = self._take_column(meta, positions)
+        index = pd.Index(self._take_column(self._index_meta, positions),
+                         name=self.index_name)
+        table = pd.DataFrame(data, index=index)
+        table.columns = self.columns
+        return table
+
+    def slice(self, start, stop):
+        """
+        Returns a lazy reference to the rows from position start to stop
+        (excluded), that can be materialized by the workers using
+        get_table.
+        """
+        return _SharedTableSlice(self, start, stop)
+
+    def get_positions(self, index_values):
+        """
+        Returns the positions of the rows with the given index values (-1 for
+        the values not in the index).
+        """
+        if self._index_positions is None:
+            positions = pd.np.arange(self.num_rows, dtype=pd.np.int64)
+            self._index_positions = pd.Index(
+                self._take_column(self._index_meta, positions))
+        return self._index_positions.get_indexer(index_values)
+
+    def _load(self, file_name):
+        if file_name not in self._arrays:
+            self._arrays[file_name] = _load_array(self.path, file_name)
+        return self._arrays[file_name]
+
+    def _take_column(self, meta, positions):
+        kind, name = meta
+        if kind == 'array':
+            return pd.np.asarray(self._load(name)[positions])
+
+        buf = self._load(name + '_buf')
+        offsets = self._load(name + '_offsets')
+        is_null = self._load(name + '_null')
+        values = pd.np.empty(len(positions), dtype=object)
+        for i, pos in enumerate(positions):
+            if is_null[pos]:
+                values[i] = pd.np.NaN
+                continue
+            raw = buf[offsets[pos]:offsets[pos + 1]].tobytes()
+            if kind == 'str':
+                values[i] = raw.decode('utf-8')
+            else:
+                values[i] = pickle.loads(raw)
+        return values
+
+
+class _SharedTableSlice(object):
+    """
+    A reference to a range of rows of a SharedTable.
+    """
+
+    def __init__(self, shared_table, start, stop):
+        self.shared_table = shared_table
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def to_dataframe(self):
+        return self.shared_table.take(pd.np.arange(self.start, self.stop))
+
+
+class SharedObject(object):
+    """
+    A read-only copy of a Python object (typically holding large NumPy
+    arrays) stored in a file using joblib.
+
+    Pickling a SharedObject only pickles the path to the file. The workers
+    load the object with the NumPy arrays memory-mapped, so the arrays are
+    not copied. The process that created the SharedObject must call close
+    to remove the file.
+
+    Args:
+        obj (object): The object to be shared.
+        temp_dir (string): The directory where the file should be created
+            (defaults to None, i.e. the default temporary directory).
+    """
+
+    def __init__(self, obj, temp_dir=None):
+        self.path = tempfile.mkdtemp(prefix='py_em_shared_', dir=temp_dir)
+        self._owner = True
+        self._obj = None
+        joblib.dump(obj, os.path.join(self.path, 'object.pkl'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_owner'] = False
+        state['_obj'] = None
+        return state
+
+    def get(self):
+        """
+        Returns the shared object.
+        """
+        if self._obj is None:
+            self._obj = joblib.load(os.path.join(self.path, 'object.pkl'),
+                                    mmap_mode='r')
+        return self._obj
+
+    def close(self):
+        """
+        Removes the file of the shared object (only in the process that
+        created it).
+        """
+        self._obj = None
+        if self._owner and os.path.isdir(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+class SharedValue(object):
+    """
+    A float shared by the process that created it and the parallel workers
+    (e.g., a threshold that the workers raise as they find better results),
+    stored in a memory-mapped file.
+
+    Pickling a SharedValue only pickles the path to the file, and the value
+    set by a process is seen by the other processes. The reads and writes
+    are not synchronized, so the value should only be used as a hint that
+    stays valid whichever process wrote it last. The process that created
+    the SharedValue must call close to remove the file.
+
+    Args:
+        value (float): The initial value (defaults to 0.0).
+        temp_dir (string): The directory where the file should be created
+            (defaults to None, i.e. the default temporary directory).
+    """
+
+    def __init__(self, value=0.0, temp_dir=None):
+        self.path = tempfile.mkdtemp(prefix='py_em_shared_', dir=temp_dir)
+        self._owner = True
+        self._array = pd.np.memmap(os.path.join(self.path, 'value.dat'),
+                                   dtype=pd.np.float64, mode='w+',
+                                   shape=(1,))
+        self._array[0] = value
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_owner'] = False
+        state['_array'] = None
+        return state
+
+    def get(self):
+        """
+        Returns the current value.
+        """
+        return float(self._load()[0])
+
+    def set(self, value):
+        """
+        Sets the value, for all the processes.
+        """
+        self._load()[0] = value
+
+    def close(self):
+        """
+        Removes the file of the shared value (only in the process that
+        created it).
+        """
+        self._array = None
+        if self._owner and os.path.isdir(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def _load(self):
+        if self._array is None:
+            self._array = pd.np.memmap(os.path.join(self.path, 'value.dat'),
+                                       dtype=pd.np.float64, mode='r+',
+                                       shape=(1,))
+        return self._array
+
+
+def get_table(table, index_values=None):
+    """
+    Returns the DataFrame referred by a table given to a parallel worker.
+
+    The table can be a DataFrame (returned as it is), a slice of a
+    SharedTable, or a SharedTable. In the last case, if index_values is
+    given, only the rows with these index values are materialized.
+    """
+    if isinstance(table, _SharedTableSlice):
+        return table.to_dataframe()
+    if isinstance(table, SharedTable):
+        if index_values is None:
+            return table.take(pd.np.arange(len(table)))
+        positions = table.get_positions(pd.unique(pd.np.asarray(
+            index_values)))
+        return table.take(pd.np.sort(positions[positions >= 0]))
+    return table
+
+
+def get_object(obj):
+    """
+    Returns the object referred by an object given to a parallel worker.
+    """
+    if isinstance(obj, SharedObject):
+        return obj.get()
+    return obj
+
+
+def split_ranges(num_rows, num_splits):
+    """
+    Splits the positions from 0 to num_rows (excluded) into num_splits
+    ranges, the same way as pandas.np.array_split, and returns the (start,
+    stop) positions of the ranges.
+    """
+    sizes = [len(s) for s in pd.np.array_split(pd.np.arange(num_rows),
+                                               num_splits)]
+    bounds = pd.np.concatenate([[0], pd.np.cumsum(sizes)])
+    return [(int(bounds[i]), int(bounds[i + 1])) for i in range(len(sizes))]
+
+
+def get_num_procs(n_jobs, min_procs):
+    """
+    Returns the number of processes to launch for n_jobs (where negative
+    values count back from the number of CPUs, i.e., -1 means all CPUs), but
+    no more than min_procs to safeguard against small inputs.
+    """
+    n_cpus = multiprocessing.cpu_count()
+    n_procs = n_jobs
+    if n_jobs < 0:
+        n_procs = n_cpus + 1 + n_jobs
+    return min(n_procs, min_procs)
+
+
+def get_num_tasks(n_procs, num_items):
+    """
+    Returns the number of tasks to split num_items items into for n_procs
+    workers (tasks_per_proc tasks per worker, at most one task per item).
+    """
+    return max(1, min(n_procs * tasks_per_proc, num_items))
+
+
+def split_by_cost(costs, num_tasks):
+    """
+    Splits a sequence of items with estimated costs into about num_tasks
+    contiguous ranges of about the same total cost, and returns the (start,
+    stop) positions of the (non-empty) ranges. An item whose cost is larger
+    than the cost of a range ends up in a range of its own.
+    """
+    costs = pd.np.asarray(costs, dtype=pd.np.float64)
+    num_items = len(costs)
+    if num_items == 0:
+        return []
+    num_tasks = max(1, min(num_tasks, num_items))
+    cum_costs = pd.np.cumsum(costs)
+    if cum_costs[-1] <= 0:
+        return split_ranges(num_items, num_tasks)
+    # end each range after the item where the cumulative cost reaches a
+    # multiple of the cost of a range
+    range_cost = cum_costs[-1] / num_tasks
+    targets = range_cost * pd.np.arange(1, num_tasks)
+    bounds = pd.np.searchsorted(cum_costs, targets, side='left') + 1
+    # isolate the items that cost more than a range
+    heavy = pd.np.flatnonzero(costs > range_cost)
+    bounds = pd.np.concatenate([bounds, heavy, heavy + 1])
+    bounds = pd.np.unique(bounds[(bounds > 0) & (bounds < num_items)])
+    bounds = pd.np.concatenate([[0], bounds, [num_items]])
+    return [(int(bounds[i]), int(bounds[i + 1]))
+            for i in range(len(bounds) - 1)]
+
+
+def get_value_costs(values):
+    """
+    Returns the estimated cost of processing (e.g., cleaning up or
+    tokenizing) each value of an array: the length of the value as a string,
+    plus one (a missing value costs one).
+    """
+    return pd.np.asarray([1 if v is None or (isinstance(v, float) and
+                                             v != v) else len(str(v)) + 1
+                          for v in values], dtype=pd.np.int64)
+
+
+def split_cartesian_product(num_l, num_r, num_tasks):
+    """
+    Splits the cartesian product of two tables with num_l and num_r tuples
+    into about num_tasks tiles with the same number of tuple pairs, and
+    returns the ((l_start, l_stop), (r_start, r_stop)) positions of the
+    tiles. The tiles are as square as possible, so that each task reads few
+    tuples for the number of pairs it processes.
+    """
+    if num_l == 0 or num_r == 0:
+        return [((0, num_l), (0, num_r))]
+    num_tasks = max(1, min(num_tasks, num_l * num_r))
+    m = int(round(pd.np.sqrt(float(num_tasks) * num_l / num_r)))
+    m = max(1, min(m, num_l, num_tasks))
+    n = max(1, min(int(pd.np.ceil(float(num_tasks) / m)), num_r))
+    return [(l_range, r_range) for l_range in split_ranges(num_l, m)
+            for r_range in split_ranges(num_r, n)]
+
+
+def run_tasks(function, tasks, n_procs, costs=None, verbose=False):
+    """
+    Runs function(*args) for each tuple of arguments args in tasks using
+    n_procs processes, and yields the results in the order of the tasks.
+
+    The tasks are handed out one at a time to the processes as they become
+    free (rather than being assigned to the processes upfront), and the
+    results are yielded as soon as they (and the results of all the previous
+    tasks) are available. If verbose is True, the running time of each task
+    is logged, along with its estimated cost if the costs are given.
+    """
+    tasks = list(tasks)
+    if n_procs <= 1:
+        results = (_run_timed(function, args) for args in tasks)
+    else:
+        try:
+            parallel = Parallel(n_jobs=n_procs, batch_size=1,
+                                return_as='generator')
+        except TypeError:
+            # older versions of joblib return all the results at once
+            parallel = Parallel(n_jobs=n_procs, batch_size=1)
+        results = parallel(delayed(_run_timed)(function, args)
+                           for args in tasks)
+
+    for i, (elapsed, result) in enumerate(results):
+        if costs is None:
+            log_info(logger, 'Task %d/%d done in %.3f s' %
+                     (i + 1, len(tasks), elapsed), verbose)
+        else:
+            log_info(logger, 'Task %d/%d (estimated cost %d) done in %.3f s'
+                     % (i + 1, len(tasks), costs[i], elapsed), verbose)
+        yield result
+
+
+def _run_timed(function, args):
+    start = time.time()
+    result = function(*args)
+    return time.time() - start, result
+
+
+def _save_column(path, name, column):
+    values = column.values if hasattr(column, 'values') else column
+    if isinstance(values, pd.np.ndarray) and values.dtype.kind in 'biufcmM':
+        pd.np.save(os.path.join(path, name + '.npy'), values,
+                   allow_pickle=False)
+        return 'array', name
+
+    values = pd.np.asarray(values, dtype=object)
+    is_null = pd.isnull(values)
+    not_null_values = values[~is_null]
+    if all(isinstance(v, six.string_types) for v in not_null_values):
+        kind = 'str'
+        encoded = [v.encode('utf-8') if isinstance(v, six.text_type) else v
+                   for v in not_null_values]
+    else:
+        kind = 'pickle'
+        encoded = [pickle.dumps(v, protocol=2) for v in not_null_values]
+
+    lengths = pd.np.zeros(len(values), dtype=pd.np.int64)
+    lengths[~is_null] = [len(v) for v in encoded]
+    offsets = pd.np.concatenate([[0], pd.np.cumsum(lengths)]).astype(
+        pd.np.int64)
+    buf = pd.np.frombuffer(b''.join(encoded), dtype=pd.np.uint8)
+
+    pd.np.save(os.path.join(path, name + '_buf.npy'), buf)
+    pd.np.save(os.path.join(path, name + '_offsets.npy'), offsets)
+    pd.np.save(os.path.join(path, name + '_null.npy'),
+               pd.np.asarray(is_null, dtype=bool))
+    return kind, name
+
+
+def _load_array(path, name):
+    file_path = os.path.join(path, name + '.npy')
+    try:
+        return pd.np.load(file_path, mmap_mode='r')
+    except ValueError:
+        # empty arrays cannot be memory-mapped
+        return pd.np.load(file_path)
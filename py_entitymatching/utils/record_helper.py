@@ -0,0 +1,193 @@
+"""
+This module contains helper functions to access the records (tuples) of a
+table by their key values.
+
+Candidate set driven operations (e.g., blocking a candidate set, extracting
+feature vectors, applying rule based matchers) repeatedly look up the left
+and the right tuples of each tuple pair. Instead of doing a label based
+lookup (e.g., table.ix[key]) per pair, which builds a new pandas Series each
+time, a RecordAccessor builds a key to position map once per table and
+returns lightweight views of the records.
+"""
+import logging
+
+import pandas as pd
+import six
+
+logger = logging.getLogger(__name__)
+
+
+class RecordAccessor(object):
+    """
+    Provides fast access to the records of a table by key value or by
+    position.
+
+    Args:
+        table (DataFrame): The input table.
+        key (string): The key attribute of the table (defaults to None).
+            If it is not given, the index of the table is used as the key.
+
+    Raises:
+        AssertionError: If `table` is not of type pandas DataFrame.
+        AssertionError: If `key` is not in the table columns.
+
+    Examples:
+        >>> accessor = RecordAccessor(A, 'ID')
+        >>> ltuple = accessor.get_record('a1')
+        >>> ltuple['name']
+    """
+
+    def __init__(self, table, key=None):
+        if not isinstance(table, pd.DataFrame):
+            logger.error('Input table is not of type pandas dataframe')
+            raise AssertionError('Input table is not of type pandas dataframe')
+        if key is not None and key not in table.columns:
+            logger.error('Input key is not in the table columns')
+            raise AssertionError('Input key is not in the table columns')
+
+        self.columns = list(table.columns)
+        self._col_positions = dict((attr, i) for i, attr in
+                                   enumerate(self.columns))
+        self._col_values = [table.iloc[:, i].values
+                            for i in range(len(self.columns))]
+        if key is None:
+            self._keys = table.index
+        else:
+            self._keys = pd.Index(table[key].values)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get_positions(self, keys):
+        """
+        Returns the positions of the records with the given key values.
+
+        Raises:
+            KeyError: If some key value is not present in the table.
+        """
+        positions = self._keys.get_indexer(pd.np.asarray(keys))
+        if (positions < 0).any():
+            logger.error('Some key values are not present in the table')
+            raise KeyError('Some key values are not present in the table')
+        return positions
+
+    def get_record(self, key):
+        """
+        Returns a view of the record with the given key value.
+        """
+        return RecordView(self, self.get_positions([key])[0])
+
+    def get_record_at(self, pos):
+        """
+        Returns a view of the record at the given position.
+        """
+        return RecordView(self, pos)
+
+    def get_records(self, keys):
+        """
+        Returns the views of the records with the given key values (the
+        views of repeated key values are shared).
+        """
+        positions = self.get_positions(keys)
+        views = {}
+        records = []
+        for pos in positions:
+            view = views.get(pos)
+            if view is None:
+                view = views[pos] = RecordView(self, pos)
+            records.append(view)
+        return records
+
+    def get_values(self, attr, positions):
+        """
+        Returns the values of an attribute for the records at the given
+        positions (as a NumPy array).
+        """
+        return self._col_values[self._col_positions[attr]][positions]
+
+    def get_value(self, pos, attr):
+        return self._col_values[self._col_positions[attr]][pos]
+
+
+class RecordView(object):
+    """
+    A read-only view of a record of a table, compatible with the way the
+    feature, blocking and rule functions access the tuples (a pandas Series
+    returned by table.ix[key]): the value of an attribute is given by
+    record['attr'], and record[['attr1', 'attr2']] returns a pandas Series.
+    """
+    __slots__ = ('_accessor', '_pos')
+
+    def __init__(self, accessor, pos):
+        self._accessor = accessor
+        self._pos = pos
+
+    def __getitem__(self, attr):
+        if isinstance(attr, (list, pd.Index)):
+            return pd.Series([self[a] for a in attr], index=list(attr),
+                             name=self.name)
+        try:
+            return self._accessor.get_value(self._pos, attr)
+        except KeyError:
+            raise KeyError(attr)
+
+    def __contains__(self, attr):
+        return attr in self._accessor._col_positions
+
+    def __iter__(self):
+        # iterate over the values, the same way as a pandas Series
+        for attr in self._accessor.columns:
+            yield self[attr]
+
+    def __len__(self):
+        return len(self._accessor.columns)
+
+    def __repr__(self):
+        return repr(self.to_series())
+
+    @property
+    def name(self):
+        """
+        The key value of the record (same as the name of the pandas Series
+        returned by table.ix[key]).
+        """
+        return self._accessor._keys[self._pos]
+
+    @property
+    def index(self):
+        return pd.Index(self._accessor.columns)
+
+    @property
+    def values(self):
+        return pd.np.asarray([self[a] for a in self._accessor.columns],
+                             dtype=object)
+
+    def get(self, attr, default=None):
+        if attr in self:
+            return self[attr]
+        return default
+
+    def keys(self):
+        return list(self._accessor.columns)
+
+    def items(self):
+        return [(a, self[a]) for a in self._accessor.columns]
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def to_series(self):
+        """
+        Returns the record as a pandas Series.
+        """
+        return pd.Series(self.values, index=self.index, name=self.name)
+
+    def __getattr__(self, attr):
+        # attribute access (e.g., record.name_attr) as in a pandas Series
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        accessor = object.__getattribute__(self, '_accessor')
+        if isinstance(attr, six.string_types) and \
+                attr in accessor._col_positions:
+            return self[attr]
+        raise AttributeError(attr)